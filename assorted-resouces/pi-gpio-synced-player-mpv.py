@@ -1,3 +1,4 @@
+# NOTE: Superseded by pi-gpio-synced-player.py with "PlayerBackend = mpv" - kept for reference only.
 ver = 'pi-gpio-synced-player.py 0.5 - mpv edition'
 
 import time
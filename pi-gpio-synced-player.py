@@ -3,13 +3,32 @@ script_url = 'https://github.com/GeoMaciolek/pi-gpio-synced-player'
 version = '0.7.0'
 
 
+import os
+import sys
+import mmap
+import abc
+import ctypes
+import ctypes.util
+import shutil
+import json
+import hashlib
+import math
 import time
-import vlc
+import atexit
+import signal
+import socket
+import struct
+import heapq
+import bisect
+import random
+import itertools
+import threading
+import gc
 import configparser
-import inspect # For debugging (identify calling function)
 
+from collections import deque, namedtuple
 from datetime import datetime, timedelta
-from pprint import pprint
+from pprint import pformat
 
 ############################
 ### Application Settings ###
@@ -17,11 +36,17 @@ from pprint import pprint
 CONFIG_FILE = 'pi-gpio-synced-player.ini'
 
 # Set to "primary" for main / controller, or "secondary" for the listener units
+# - or "clock" on every unit, to follow a shared wall clock (no primary)
 MODE_DEFAULT = 'primary'
 
 # MEDIA_FILE - no default is included, this must be specified in the
 # pi-gpio-synced-player.ini file
 
+# Media files to play in turn, one per loop (comma separated) - rather than
+# looping MEDIA_FILE. The next item is loaded into a standby player while
+# the current one plays (so this turns DOUBLE_BUFFERED_PLAYERS on)
+PLAYLIST_DEFAULT = ''
+
 # Set to True to skip GPIO etc - for testing NOT on a pi
 TEST_MODE_FAKE_GPIO_DEFAULT = False
 
@@ -47,484 +72,6620 @@ PIN_TX_DURATION_SEC_DEFAULT: float = 2.0
 # delay (in seconds) after initial load command before pause. MUST BE AT LEAST 1 SECOND!
 LOAD_WAIT_DURATION_DEFAULT = 2
 
+# How to detect the end of each loop: "poll" (check player.get_time() every
+# 200ms), or "events" (libvlc event callbacks - lower CPU, frame-accurate)
+END_DETECTION_DEFAULT = 'poll'
+
+# In "events" mode, how many frames before the end of the media to restart
+END_LEAD_FRAMES_DEFAULT = 2
+
+# Frame rate to assume if VLC can't tell us (player.get_fps() returns 0)
+FALLBACK_FRAME_RATE_DEFAULT: float = 30.0
+
+# How the primary times each loop: "sleep" (relative sleeps between steps), or
+# "deadline" (absolute monotonic-clock deadlines derived from the duration)
+PRIMARY_TIMING_DEFAULT = 'sleep'
+
+# Deadline waits busy-wait (spin) for this long before each deadline (in
+# microseconds), rather than trusting time.sleep() to wake up on time
+SPIN_WINDOW_US_DEFAULT = 1000
+
+# Secondaries: continuously correct drift vs. the primary, by nudging the
+# playback rate (the loop-start edge is used as the reference point)
+DRIFT_CORRECTION_DEFAULT = False
+
+# Drift correction: how often to check (in seconds), and how large an error
+# (in ms) is corrected with a seek rather than a rate adjustment
+DRIFT_INTERVAL_SEC_DEFAULT: float = 0.5
+DRIFT_HARD_SEEK_MS_DEFAULT: float = 500
+
+# Drift correction tuning: rate adjustment per ms of error (P), per ms of
+# error per second (I), and the maximum adjustment (0.03 = +/- 3% speed)
+DRIFT_GAIN_P_DEFAULT: float = 0.0005
+DRIFT_GAIN_I_DEFAULT: float = 0.0001
+DRIFT_MAX_RATE_ADJUST_DEFAULT: float = 0.03
+
+# Interpolate the playback position between the player's (coarse) updates:
+# sample it every PLAYBACK_CLOCK_SAMPLE_MS in the background, & fit a position
+# & rate to the points where it changed. The end of loop wait & drift
+# correction then use the fitted position. No change for PLAYBACK_CLOCK_STALL_MS
+# while playing = a stall; a change more than PLAYBACK_CLOCK_JUMP_MS from the
+# fit = a jump (eg, a seek), & the fit starts again
+PLAYBACK_CLOCK_DEFAULT = False
+PLAYBACK_CLOCK_SAMPLE_MS_DEFAULT: float = 20
+PLAYBACK_CLOCK_STALL_MS_DEFAULT: float = 250
+PLAYBACK_CLOCK_JUMP_MS_DEFAULT: float = 100
+
+# How the primary signals the secondaries: "gpio" (TransmitPins / ListenPin
+# wiring), or "udp" (multicast packets on the local network)
+SYNC_TRANSPORT_DEFAULT = 'gpio'
+
+# UDP transport: multicast group & port (port + 1 is also used, for clock
+# sync requests to the primary), the local interface address to use
+# (0.0.0.0 = default, 127.0.0.1 to test on one machine), and the TTL
+MULTICAST_GROUP_DEFAULT = '239.255.77.77'
+MULTICAST_PORT_DEFAULT = 5405
+MULTICAST_INTERFACE_DEFAULT = '0.0.0.0'
+MULTICAST_TTL_DEFAULT = 1
+
+# UDP transport: how far ahead (in ms) the primary schedules each "go", so
+# the packet arrives before secondaries need to act on it
+GO_LEAD_MS_DEFAULT = 50
+
+# UDP transport: how often (in seconds) the primary sends its playback
+# position, and how often secondaries measure their clock offset to it
+POSITION_INTERVAL_SEC_DEFAULT: float = 1.0
+CLOCK_SYNC_INTERVAL_SEC_DEFAULT: float = 2.0
+
+# How to drive the transmit pins: "gpiod" (one libgpiod v2 request for all the
+# pins, so they change together), "gpiozero" (one pin after another), or
+# "auto" (gpiod if it's available, otherwise gpiozero.) GPIO_CHIP is the
+# gpiod chip the pins are on
+GPIO_OUTPUT_DEFAULT = 'auto'
+GPIO_CHIP_DEFAULT = '/dev/gpiochip0'
+
+# GPIO transport: how the transmit pins signal the secondaries. "legacy": all
+# pins high = prepare, low = go (one wire per secondary.) Or command frames
+# (prepare, go, position, seek, shutdown) - "serial": pulse widths, on every
+# transmit pin (still one wire per secondary), or "parallel": the first
+# transmit pin is a clock, the others carry data (each secondary needs every
+# pin wired to its LISTEN_PINS, in the same order.) PIN_BIT_MS is the time unit
+# of each pulse (2 is fine with EDGE_CAPTURE = gpiod.) Serial frames take up
+# to 100 units (500ms at 5ms) - position frames (every POSITION_INTERVAL_SEC)
+# are cut off for any other command, so a go is never late because of one, &
+# a prepare or seek waits at most 4 units (20ms)
+PIN_PROTOCOL_DEFAULT = 'legacy'
+PIN_BIT_MS_DEFAULT: float = 5
+
+# Chapter start times (seconds into the media, comma separated.) With
+# PIN_PROTOCOL = serial or parallel (& PRIMARY_TIMING = sleep), sending the
+# primary SIGUSR2 (eg, `pkill -USR2 -f pi-gpio-synced-player`) seeks it & its
+# secondaries to the next one - after the last, back to the first
+CHAPTERS_DEFAULT = ''
+
+# How secondaries capture ListenPin edges: "gpiozero" (timed when the callback
+# runs), or "gpiod" (libgpiod v2 edge events, timestamped by the kernel - so we
+# know how late we are acting on each edge.) Then, at each "go", if we're more
+# than EDGE_COMPENSATION_MIN_MS late: "seek" (resume that far into the media,
+# rather than at 0), "rate" (play faster, by DRIFT_MAX_RATE_ADJUST, until we've
+# caught up), or "off"
+EDGE_CAPTURE_DEFAULT = 'gpiozero'
+EDGE_COMPENSATION_DEFAULT = 'off'
+EDGE_COMPENSATION_MIN_MS_DEFAULT: float = 5
+
+# Hot-join: secondaries that (re)start mid-loop rejoin the primary from its
+# position beacons (sent every POSITION_INTERVAL_SEC - over UDP, with either
+# transport), rather than waiting for the next loop. Secondaries that are
+# more than HOT_JOIN_THRESHOLD_MS out from the primary are re-seeked too.
+# SEEK_LATENCY_MS is the initial guess at how long a seek takes (added to the
+# seek target) - it's refined from the error measured after each rejoin
+HOT_JOIN_DEFAULT = False
+HOT_JOIN_THRESHOLD_MS_DEFAULT: float = 1000
+SEEK_LATENCY_MS_DEFAULT: float = 100
+
+# Run every player command on a single thread (in order), rather than from
+# whichever thread happens to call it (the main loop, GPIO / UDP callbacks,
+# drift correction...) Loop start / go edges within COMMAND_DEBOUNCE_MS of
+# each other are coalesced (only the last one counts), & edges older than
+# the last one acted on are rejected. Commands that wait in the queue for
+# longer than COMMAND_LATENCY_WARN_MS are logged
+SERIALIZE_PLAYER_COMMANDS_DEFAULT = False
+COMMAND_DEBOUNCE_MS_DEFAULT: float = 20
+COMMAND_LATENCY_WARN_MS_DEFAULT: float = 50
+
+# PlayerMode = clock: loop n starts at CLOCK_EPOCH + n * the media duration
+# (CLOCK_EPOCH: unix time in seconds, or an ISO 8601 date/time), by the
+# "realtime" (wall) clock - which must be kept in sync on every unit (chrony /
+# PTP.) "monotonic" & CLOCK_OFFSET_MS are for testing (eg, several players
+# on one machine)
+CLOCK_EPOCH_DEFAULT = '0'
+CLOCK_SOURCE_DEFAULT = 'realtime'
+CLOCK_OFFSET_MS_DEFAULT: float = 0
+
+# Readiness barrier: the primary waits (up to READY_TIMEOUT_SEC) until every
+# secondary has loaded its media & is paused at the start, then starts the
+# first loop straight away. With the "gpio" transport, the secondaries hold
+# the shared READY_PIN line low until they're ready; with "udp", they send
+# "ready" messages, & the primary waits for EXPECTED_NODES (a list of node
+# names, or just how many secondaries there are)
+READY_BARRIER_DEFAULT = False
+READY_TIMEOUT_SEC_DEFAULT: float = 60
+READY_PIN_DEFAULT = 23
+EXPECTED_NODES_DEFAULT = ''
+
+# This node's name, for the readiness barrier (default: the hostname)
+NODE_NAME_DEFAULT = socket.gethostname()
+
+# Log messages at or above this level: debug, info, warning, or error
+LOG_LEVEL_DEFAULT = 'info'
+
+# How log messages are output: "print" (immediately, as they happen),
+# "thread" (buffered, & printed by a background thread - keeps printing out
+# of the timing-critical code), or "signal" (buffered, & only printed when
+# the process receives SIGUSR1 - eg, `pkill -USR1 -f pi-gpio-synced-player`)
+LOG_OUTPUT_DEFAULT = 'thread'
+
+# How many log messages the buffer holds (older ones are overwritten)
+LOG_BUFFER_SIZE_DEFAULT = 4096
+
+# Cache media metadata (duration, frame rate, codec), so startup doesn't need
+# to play the file briefly to learn its duration. Entries are keyed on the
+# file's path, size, modification time & a hash of its contents.
+METADATA_CACHE_DEFAULT = False
+METADATA_CACHE_FILE_DEFAULT = 'media-metadata-cache.json'
+
+# Which media player library to use: "vlc" (python-vlc), or "mpv" (python-mpv)
+PLAYER_BACKEND_DEFAULT = 'vlc'
+
+# Keep the media file in RAM, so playback never reads from the SD card:
+# "off", "cache" (read it into the page cache at startup), "lock" (as cache,
+# & mlock() it so it can't be evicted), or "tmpfs" (copy it to
+# MEDIA_RESIDENCY_TMPFS_DIR & play the copy)
+MEDIA_RESIDENCY_DEFAULT = 'off'
+MEDIA_RESIDENCY_TMPFS_DIR_DEFAULT = '/dev/shm'
+
+# How often (in seconds) to log how much of the media file is in RAM - 0 to disable
+MEDIA_RESIDENCY_REPORT_SEC_DEFAULT = 60
+
+# Check the media file's container layout (MP4 / MOV) at startup, & warn if
+# it's likely to load or seek slowly (moov atom at the end of the file, or
+# keyframes further apart than PREFLIGHT_MAX_KEYFRAME_INTERVAL_MS)
+PREFLIGHT_CHECK_DEFAULT = False
+PREFLIGHT_MAX_KEYFRAME_INTERVAL_MS_DEFAULT = 2000
+
+# Keep a second player paused on the first frame, & swap to it at each loop
+# restart (rather than seeking the playing one back to the start.) With VLC
+# full screen, the swap is shown by raising the players' own X11 windows (see
+# X11VideoWindows) - without an X display, it's turned off again (see
+# double_buffering_video_setup())
+DOUBLE_BUFFERED_PLAYERS_DEFAULT = False
+
+# Low-jitter runtime profile. The player (& its decoder threads) is kept on
+# PLAYER_CPUS, while our own control threads (main loop, GPIO / UDP
+# callbacks...) run on CONTROL_CPU (-1 = don't pin) with SCHED_FIFO priority
+# REALTIME_PRIORITY (1-99, 0 = don't change.) Memory is locked (mlockall), &
+# Python's garbage collector is frozen after init, & only run half way through
+# each loop (rather than at any moment, eg during the sync window.)
+# WAKEUP_SELF_TEST measures our wakeup latency before & after
+REALTIME_PROFILE_DEFAULT = False
+REALTIME_PRIORITY_DEFAULT = 50
+CONTROL_CPU_DEFAULT = 3
+PLAYER_CPUS_DEFAULT = [0, 1, 2]
+LOCK_MEMORY_DEFAULT = True
+MANAGE_GC_DEFAULT = True
+WAKEUP_SELF_TEST_DEFAULT = True
+
+# Reload the config file on SIGHUP (pkill -HUP -f pi-gpio-synced-player), or
+# when it changes (checked every CONFIG_WATCH_SEC - 0 for SIGHUP only.) Timing
+# & sync settings are applied half way through the next loop; a new MediaFile is
+# loaded into a standby player & switched to at a restart (needs
+# DOUBLE_BUFFERED_PLAYERS.) Anything else still needs a restart
+CONFIG_RELOAD_DEFAULT = False
+CONFIG_WATCH_SEC_DEFAULT: float = 2
+
+# Decode health (VLC only): sample the player's decoder statistics every
+# DECODE_HEALTH_INTERVAL_SEC, & check the last DECODE_HEALTH_WINDOW_SEC of them:
+# pictures lost (over DECODE_HEALTH_MAX_LOSS_PERCENT of those shown), & pictures
+# decoded per second vs the frame rate (under DECODE_HEALTH_MIN_DECODE_RATIO.)
+# When either is crossed, take DECODE_HEALTH_ACTIONS - at most once every
+# DECODE_HEALTH_COOLDOWN_SEC: "warn" (log it), "resync" (seek straight back
+# into sync - secondary / clock mode, with drift correction or hot-join),
+# "beacon" (tell the primary, over UDP), or "lite" (switch to a player with
+# DECODE_HEALTH_LITE_OPTIONS - a lighter decoder profile - at the next restart;
+# needs DOUBLE_BUFFERED_PLAYERS)
+DECODE_HEALTH_DEFAULT = False
+DECODE_HEALTH_INTERVAL_SEC_DEFAULT: float = 1
+DECODE_HEALTH_WINDOW_SEC_DEFAULT: float = 10
+DECODE_HEALTH_MAX_LOSS_PERCENT_DEFAULT: float = 2
+DECODE_HEALTH_MIN_DECODE_RATIO_DEFAULT: float = 0.95
+DECODE_HEALTH_ACTIONS_DEFAULT = ['warn']
+DECODE_HEALTH_COOLDOWN_SEC_DEFAULT: float = 30
+DECODE_HEALTH_LITE_OPTIONS_DEFAULT = ['avcodec-skip-loop-filter=4', 'avcodec-fast']
+
+# Record sync latency metrics (timestamps of each restart stage), & log a
+# summary every METRICS_SUMMARY_LOOPS loops
+METRICS_DEFAULT = False
+METRICS_SUMMARY_LOOPS_DEFAULT = 1
+
+# Where to write the metrics (as JSON) after each summary - blank to disable
+METRICS_FILE_DEFAULT = 'sync-metrics.json'
+
+# How many of the most recent loops the metrics percentiles cover
+METRICS_WINDOW_DEFAULT = 500
+
+# Record a binary trace of sync events (edges, prepare/go, player calls &
+# sampled positions) to TRACE_FILE - blank to disable. Compare traces from
+# several nodes with: pi-gpio-synced-player.py trace-analyze FILE [FILE ...]
+TRACE_FILE_DEFAULT = ''
+# Records held in memory between writes (a preallocated ring - if the writer
+# falls this far behind, the oldest records are dropped & counted)
+TRACE_BUFFER_RECORDS_DEFAULT = 8192
+# How often the player position is sampled, & the trace written out (sec)
+TRACE_SAMPLE_SEC_DEFAULT: float = 0.5
+# At this size the trace file is renamed to TRACE_FILE.1 (replacing any
+# previous one) & a new one started, so days of tracing stay bounded
+TRACE_MAX_MB_DEFAULT: float = 64
+
+# Simulation (the "simulate" command - see simulate()): how many secondaries,
+# how many loops of a media file of DurationMs, how the GPIO edges arrive
+# (latency, jitter & bounce), & the limits for each simulated player's
+# latencies & clock drift (each player gets random values up to these).
+# The [Sync] & [Advanced] timing settings are used as configured.
+SIMULATION_DEFAULTS = {
+    'Secondaries': 20,
+    'Loops': 5,
+    'DurationMs': 10000,
+    'FrameRate': 30.0,
+    'TransmitPinCount': 3,
+    'EdgeLatencyUs': 50.0,
+    'EdgeJitterUs': 30.0,
+    'BounceCount': 0,
+    'BounceUs': 200.0,
+    'SeekLatencyMs': 30.0,
+    'DecodeLatencyMs': 40.0,
+    'LatencyJitterMs': 15.0,
+    'DriftPpm': 200.0,
+    'SampleIntervalMs': 100.0,
+    'Seed': 1,
+    'LogLevel': 'warning',
+}
+
 # On-screen Time/playback Display Enabled? Normally set: False
 osd_enabled = True
 
 ### End Application Settings ###
 ################################
 
-def timestamp():
-    return datetime.now().strftime("%H:%M:%S.%f")[:11]
+def timestamp(time_ns: int = None):
+    if time_ns is None:
+        return datetime.now().strftime("%H:%M:%S.%f")[:11]
+    return datetime.fromtimestamp(time_ns / 1_000_000_000).strftime("%H:%M:%S.%f")[:11]
 
-def dprint(msg: str = None):
-    """Prints a message with a timestamp & the calling function name.
+LOG_LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+LOG_LEVEL_NAMES = {value: name for name, value in LOG_LEVELS.items()}
 
-    If no message is provided, only the timestamp & function name are printed.
+# Shown in each log line - main sets it from the config
+MODE = MODE_DEFAULT
 
-    Args:
-        msg (str): The message to print (optional)
-    """
-    module_name = str(inspect.stack()[1][3])
-    # module_name = str(inspect.stack()[1].function)
-    if module_name == '<module>':
-        module_name = 'MAIN'
-    debug_msg = f'[{timestamp()} {MODE[:3]}] {module_name}()'
+def log_format(time_ns: int, level: int, function_name: str, msg: str, args: tuple = ()) -> str:
+    if function_name == '<module>':
+        function_name = 'MAIN'
+    debug_msg = f'[{timestamp(time_ns)} {MODE[:3]}] {function_name}()'
+    if level != LOG_LEVELS['info']:
+        debug_msg += f' {LOG_LEVEL_NAMES[level].upper()}'
+    if args:
+        msg = msg % args
     if msg:
         debug_msg += f': {msg}'
+    return debug_msg
 
-    print(debug_msg)
+class LogRing:
+    """Fixed-size, preallocated ring buffer of log records.
 
-def config_split_list(config_string: str, delimiter: str = ',', cast_to_int: bool = True, strip = True) -> list:
-    """Splits a config string into a list, using the specified delimiter
+    Writing a record only fills in a preallocated slot (no formatting, no
+    I/O, no locks) so it's cheap enough for the timing-critical paths.
+    Records (with any % arguments) are formatted & printed later, by
+    flush(). Each slot's sequence number is written last, so the reader can
+    tell a complete record from one still being written - & checked again
+    after the record is copied, in case a writer lapped the reader meanwhile.
+    """
+    def __init__(self, size: int = LOG_BUFFER_SIZE_DEFAULT):
+        self.size = size
+        # Each slot: [sequence number, time (ns), level, function name, message, args]
+        self.slots = [[-1, 0, 0, '', None, ()] for _ in range(size)]
+        self.counter = itertools.count()
+        self.read_seq = 0
+        self.dropped = 0
+        self.flush_lock = threading.Lock()
 
-    Args:
-        config_string (str): The string to split
-        delimiter (str, optional): The delimiter to split on. Defaults to ','.
-        cast_to_int (bool, optional): Cast the output to an integer? Defaults to True.
-        strip (bool, optional): Strip whitespace from the output? Defaults to True.
+    def write(self, level: int, function_name: str, msg: str, args: tuple = ()):
+        seq = next(self.counter)    # atomic, so writes from any thread are safe
+        slot = self.slots[seq % self.size]
+        # Invalidated first, so a reader part way through copying it can tell
+        slot[0] = -1
+        slot[1] = time.time_ns()
+        slot[2] = level
+        slot[3] = function_name
+        slot[4] = msg
+        slot[5] = args
+        slot[0] = seq
 
-    Returns:
-        list: The list of strings
-    """
+    def flush(self, output=print):
+        """Formats & outputs all complete records not yet flushed."""
+        with self.flush_lock:
+            while True:
+                slot = self.slots[self.read_seq % self.size]
+                seq = slot[0]
+                if seq < self.read_seq:
+                    break   # Not written yet (or still being written)
+                if seq > self.read_seq:
+                    # We were lapped - skip to the oldest record still held
+                    oldest_seq = seq - self.size + 1
+                    self.dropped += oldest_seq - self.read_seq
+                    self.read_seq = oldest_seq
+                    continue
+                _, time_ns, level, function_name, msg, args = slot
+                if slot[0] != seq:
+                    # Overwritten while we copied it - the next pass skips ahead
+                    continue
+                output(log_format(time_ns, level, function_name, msg, args))
+                self.read_seq += 1
+            if self.dropped:
+                output(f'[{timestamp()} {MODE[:3]}] (log buffer overrun - {self.dropped} messages dropped)')
+                self.dropped = 0
 
-    output_list = []
-    for x in config_string.split(delimiter):
-        if strip:
-            x = x.strip()
-        if cast_to_int:
-            output_list.append(int(x.strip()))
-        else:
-            output_list.append(x.strip())
+log_ring = None
 
-    return(output_list)
+def log_write_print(level: int, function_name: str, msg: str, args: tuple = ()):
+    print(log_format(time.time_ns(), level, function_name, msg, args))
 
-def vid_quit(vlc_player, instance):
-    dprint('vid_quit() called. calling vlc_player.stop() & waiting 1 second')
-    vlc_player.stop()
-    time.sleep(1)
-    dprint('calling vlc_player.release()')
-    vlc_player.release()
-    dprint('calling instance.release()')
-    instance.release()
+def log_write_ring(level: int, function_name: str, msg: str, args: tuple = ()):
+    log_ring.write(level, function_name, msg, args)
 
-    dprint('Player and Instance have been released; exiting vid_quit()')
+# Replaced by log_configure() - messages are printed immediately until then
+log_write = log_write_print
 
-def gpio_setup_transmit_pins(transmit_pin_ids, do_initialization_pulse = True,
-                            init_pulse_len = 0.5, init_delay = 2) -> list:
-    """
-    do_initialization_pulse = do we want to do a quick playback-transmit cycle
-        during initialization, for caching purposes etc?
-        ** Note - this is needed due to some GPIO issue causing the initial
-        ** "high" event to be detected as a "low" event on the secondaries!)
+def dprint(msg: str = None, *args):
+    """Logs a message with a timestamp & the calling function name.
 
-    init_pulse_len = how many seconds to hold the tx pins high during init
-    init_delay =     how many seconds to wait after setting off again to continue 
+    If no message is provided, only the timestamp & function name are logged.
+    In timing-critical code, pass any values as `args` (for "%" formatting)
+    rather than an f-string: they're only formatted when the message is
+    output, & not at all when this level is disabled.
+
+    Args:
+        msg (str): The message to log (optional)
+        args: Values for the message's "%" placeholders (optional)
     """
-    # Set up the pins for the main/secondary communication
-    transmit_pins = []
-    if not TEST_MODE_FAKE_GPIO:
-        dprint(f"Setting up transmit pins [list of gpiozero.DigitalOutputDevice()]")
-        for pin_id in transmit_pin_ids:
-            new_pin = DigitalOutputDevice(pin=pin_id)
-            transmit_pins.append(new_pin)
-            if do_initialization_pulse:
-                new_pin.on()
-
-        if do_initialization_pulse:
-            time.sleep(init_pulse_len)
-            for pin in transmit_pins:
-                new_pin.off()
-            time.sleep(init_delay)
-    else:
-        dprint("[TEST MODE] - We would be setting up all transmit pins")
-        transmit_pins = [1,2,3]
-                         
-    return(transmit_pins)
+    log_write(LOG_LEVELS['info'], sys._getframe(1).f_code.co_name, msg, args)
 
+def ddebug(msg: str = None, *args):
+    """As dprint(), at "debug" level - use for detail in timing-critical code"""
+    log_write(LOG_LEVELS['debug'], sys._getframe(1).f_code.co_name, msg, args)
 
-def gpio_send_pin_high(transmit_pins: list):
-    dprint(f"Setting transmit pins to HIGH/on")
-    if not TEST_MODE_FAKE_GPIO:
-        for pin in transmit_pins:
-            pin.on()
-    else:
-        dprint("[TEST MODE] We would be setting the GPIO pins high.")
+def dwarn(msg: str = None, *args):
+    """As dprint(), at "warning" level"""
+    log_write(LOG_LEVELS['warning'], sys._getframe(1).f_code.co_name, msg, args)
 
+def log_noop(msg: str = None, *args):
+    pass
 
-def gpio_send_pin_low(transmit_pins: list):
-    dprint(f"Setting transmit pins to LOW/off")
-    if not TEST_MODE_FAKE_GPIO:
-        for pin in transmit_pins:
-            pin.off()
-    else:
-        dprint("[TEST MODE] We would be setting the GPIO pins low.")
+def log_flush():
+    if log_ring:
+        log_ring.flush()
+        sys.stdout.flush()
 
-def listen_pin_activate(player: vlc.MediaPlayer):
-    dprint(f'Listen pin activated! (rising edge)')
-    player_prepare_to_restart(player=player)
+def log_flush_loop(interval_sec: float = 0.1):
+    while True:
+        time.sleep(interval_sec)
+        log_flush()
 
-def listen_pin_deactivate(player: vlc.MediaPlayer):
-    dprint(f'Listen pin deactivated! (falling edge)')
-    player_resume(player=player)
+def log_configure(level: str = LOG_LEVEL_DEFAULT, output: str = LOG_OUTPUT_DEFAULT,
+                  buffer_size: int = LOG_BUFFER_SIZE_DEFAULT):
+    """Sets up logging. Levels below `level` are replaced with a no-op function.
 
-def gpio_setup_listen_pin(listen_pin_number: int, player: vlc.MediaPlayer):
-    if not TEST_MODE_FAKE_GPIO:
-        # GPIO.setup(gpio_listen_pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
-        dprint(f"Setting up pin {listen_pin_number} as input, with pull-down resistor enabled")
-        listen_pin = DigitalInputDevice(pin=listen_pin_number, pull_up=False, bounce_time=0.020)
+    Args:
+        level (str): Lowest level to log: debug, info, warning, or error
+        output (str): print (immediately), thread (buffered, printed by a
+            background thread), or signal (buffered, printed on SIGUSR1)
+        buffer_size (int): How many messages to buffer
+    """
+    global log_ring, log_write, ddebug, dprint, dwarn
 
-        # We use a lambda so we can pass the player object to the callback
-        listen_pin.when_activated = lambda : listen_pin_activate(player=player)
-        listen_pin.when_deactivated = lambda : listen_pin_deactivate(player=player)
-    else:
-        dprint("[TEST MODE] We would be setting up the GPIO listen pin.")
+    min_level = LOG_LEVELS[level]
+    if LOG_LEVELS['debug'] < min_level:
+        ddebug = log_noop
+    if LOG_LEVELS['info'] < min_level:
+        dprint = log_noop
+    if LOG_LEVELS['warning'] < min_level:
+        dwarn = log_noop
 
-    return(listen_pin)
+    if output == 'print':
+        return
 
-def player_launch(media_file:str,
-                  set_playback_count=1,
-                  toggle_fullscreen_during_init: bool = False,
-                  play_briefly_fullscreen_workaround: bool = False) -> (vlc.MediaPlayer, vlc.Instance, vlc.Media):
-    """launch the media player
+    log_ring = LogRing(size=buffer_size)
+    log_write = log_write_ring
+    # Whatever's left in the buffer is printed on exit, & on SIGUSR1
+    atexit.register(log_flush)
+    signal.signal(signal.SIGUSR1, lambda signum, frame: log_flush())
+    if output == 'thread':
+        threading.Thread(target=log_flush_loop, daemon=True).start()
 
-    Args:
-        media_file (str): The file to play.
-        set_playback_count (int, optional): The number of times to play the media. Defaults to 1.
-        toggle_fullscreen_during_init (bool, optional): Toggle fullscreen mode during initialization? Defaults to False.
-        play_briefly_fullscreen_workaround (bool, optional): Play briefly in fullscreen mode during initialization? Defaults to False.
+# Player states, as returned by Player.state()
+PLAYER_STATE_OPENING = 'opening'
+PLAYER_STATE_PLAYING = 'playing'
+PLAYER_STATE_PAUSED = 'paused'
+PLAYER_STATE_STOPPED = 'stopped'
+PLAYER_STATE_ENDED = 'ended'
+PLAYER_STATE_ERROR = 'error'
 
-    Returns:
-        (vlc.MediaPlayer, vlc.Instance, vlc.Media, duration [int]): a tuple of the player, instance, and media
+class Player(abc.ABC):
+    """The interface the sync code uses to control a media player.
+
+    Implemented by VlcPlayer (python-vlc) & MpvPlayer (python-mpv) - picked
+    with the PlayerBackend setting - and by SimPlayer, for simulate(). All
+    times are in ms. Event hooks, spawn(), decode_stats() & video visibility
+    are optional - not every backend can do them. Check `supports_events` &
+    `supports_spawn` before relying on the first two (the defaults do nothing.)
     """
-    dprint('Initializing VLC instance, player, and media, and loading media')
-    try:
+    # Set by backends that implement add_event_hook() / spawn()
+    supports_events = False
+    supports_spawn = False
 
-        # creating a vlc instance - with a LONG repeat number
-        vlc_instance = vlc.Instance(f'--input-repeat={set_playback_count}')
-     
-        # creating a media player
-        vlc_player = vlc_instance.media_player_new()
+    @abc.abstractmethod
+    def open(self, media_file: str) -> int:
+        """Loads media_file, paused at the start. Returns its duration (ms)"""
 
-        # load the media (and return the media object)
-        vlc_media = player_open_file(instance=vlc_instance, player=vlc_player, input_file=media_file)
+    @abc.abstractmethod
+    def preroll(self) -> bool:
+        """Gets the player decoded & paused on the first frame, ready to resume.
 
-    except vlc.VLCException as e:
-        dprint('Failed creating VLC context, error:')
-        dprint(e)
-        return 1
-    
-    if FULLSCREEN_MODE:
-        vlc_player.set_fullscreen(1)
-        if play_briefly_fullscreen_workaround:
-            dprint('Playing briefly (play_briefly_fullscreen_workaround=True)')
-            vlc_player.play()
-            time.sleep(PLAYBACK_AFTER_LOAD_DURATION_SEC)
-            vlc_player.stop()
-            time.sleep(PLAYBACK_AFTER_LOAD_DURATION_SEC)
-            vid_quit(vlc_player=vlc_player, instance=vlc_instance)
-            time.sleep(PLAYBACK_AFTER_LOAD_DURATION_SEC)
-            dprint('Done playing briefly & cleaning up, calling init again.')
-            player_launch(media_file=media_file,
-                        set_playback_count=set_playback_count,
-                        toggle_fullscreen_during_init = toggle_fullscreen_during_init,
-                        play_briefly_fullscreen_workaround = False)
+        Returns:
+            bool: False if the player didn't get there in time
+        """
 
-    # Play a little bit to get the duratioN!    
-    dprint('Playing briefly, to get video duration.')
-    vlc_player.play()
-    if toggle_fullscreen_during_init and FULLSCREEN_MODE:
-        dprint('Toggling fullscreen mode during initialization')
-        sleep_time = PLAYBACK_AFTER_LOAD_DURATION_SEC / 3
-        time.sleep(sleep_time)
-        vlc_player.set_fullscreen(0)
-        time.sleep(sleep_time)
-        vlc_player.set_fullscreen(1)
-        time.sleep(sleep_time)
-    else:
-        time.sleep(PLAYBACK_AFTER_LOAD_DURATION_SEC)
-    player_prepare_to_restart(player=vlc_player)
-    
-    dprint('Done with brief playback, retrieving media duration.')
+    @abc.abstractmethod
+    def pause(self):
+        """Pauses playback (where it is)"""
 
-    media_duration = vlc_media.get_duration()
-    dprint(f'vlc_media.get_duration() returned {media_duration}ms [{timedelta(milliseconds=media_duration)}]')
+    @abc.abstractmethod
+    def seek(self, time_ms: int):
+        """Moves playback to time_ms (playing or paused, as it was)"""
 
+    @abc.abstractmethod
+    def resume(self):
+        """Starts (or continues) playback"""
 
-    # if osd_enabled:
-    #     player.set_option('osc')
+    @abc.abstractmethod
+    def position(self) -> int:
+        """The current playback position (ms)"""
 
-    return vlc_player, vlc_instance, vlc_media, media_duration
+    @abc.abstractmethod
+    def state(self) -> str:
+        """One of the PLAYER_STATE_* values"""
 
-def player_open_file(instance, player, input_file) -> vlc.Media:
-    """_summary_
+    @abc.abstractmethod
+    def set_rate(self, rate: float):
+        """Sets the playback speed (1.0 = normal)"""
 
-    Args:
-        instance (vlc.Instance): the instance of the VLC module
-        player (vlc.MediaPlayer): the player instance itself
-        input_file (string): the filepath/filename of the file to play
+    @abc.abstractmethod
+    def frame_rate(self) -> float:
+        """The media's frame rate - or 0, if it isn't known (yet)"""
 
-    Returns:
-        vlc.Media: media file (instance)
-    """
-    # print(f'player_open_file([player], {input_file})')
+    def add_event_hook(self, on_update):
+        """Calls `on_update(kind, value)` on playback events (if `supports_events`.)
 
-    media = instance.media_new(input_file)
+        kind is one of 'time' (value in ms - sent when the time changes),
+        'position' (value 0.0 - 1.0, not sent by every backend), 'playing',
+        'paused', or 'end'. It's called from the backend's event thread, so
+        MUST NOT call back into the player (deadlock risk!) Without
+        `supports_events`, on_update is never called.
 
-    player.set_media(media)
+        Returns:
+            The hook, for remove_event_hook()
+        """
+        return None
 
-    return media
+    def remove_event_hook(self, hook):
+        pass
 
-def player_reset_to_start(player: vlc.MediaPlayer):
-    dprint('Resetting to start [player.set_time(0)]')
-    player.set_time(0)
-    dprint('Done, time reset.')
+    @abc.abstractmethod
+    def set_muted(self, muted: bool):
+        """Mutes (or unmutes) the audio"""
 
-def player_pause(player: vlc.MediaPlayer):
-    if player.get_state() == vlc.State.Paused:
-        dprint('Player is already paused, skipping pause command.')
-        return
-    elif player.get_state() != vlc.State.Playing:
-        dprint(f'Player is not playing (State: {player.get_state()}), skipping pause command.')
-        return
-    dprint('Pausing playback.')
-    player.pause()
-    dprint('(Pause function complete)')
+    @abc.abstractmethod
+    def set_fullscreen(self, fullscreen: bool):
+        """Switches fullscreen video on (or off)"""
 
-def player_prepare_to_restart(player: vlc.MediaPlayer):
-    dprint('Preparing to restart playback')
-    player_pause(player=player)
-    player_reset_to_start(player=player)
+    def set_video_visible(self, visible: bool):
+        """Shows this player's video in front of any other player's - or hides it (where the backend can)"""
+        pass
 
-def player_resume(player):
-    dprint('Resuming playback [calling player.play()]')
-    playing_status = player.get_state()
-    player.play()
+    def decode_stats(self) -> dict:
+        """The decoder's statistics (running totals) - or None, if they aren't available (yet, or from this backend.)
 
-def player_start_at_beginning(player):
-    dprint("Starting playback at beginning: player_reset_to_start(), then player_resume()")
-    player_reset_to_start(player=player)
-    if player.get_state() != vlc.State.Playing:
-        dprint(f'Playback is not currently playing (State: {player.get_state()})')
-        player_resume(player=player)
+        Returns:
+            dict: decoded, displayed & lost (pictures), corrupted (demux
+                  blocks), demux_kbps, & source (changes when the totals start again)
+        """
+        return None
 
-def player_wait_for_end(player: vlc.MediaPlayer, duration: int,
-                        ms_before_end_to_stop: float = 600,
-                        wait_state_ms: int  = 200,
-                        debug_message_frequency_sec: int = 5):
-    """
-    This function waits until the media player is near the end of the media
-    file, printing diagnostic messages every 5 seconds (by default).
+    def spawn(self, media_file: str = None, media_options: list = None) -> 'Player':
+        """Returns a second player of the same kind, with the same media (or `media_file`) open
+
+        Only if `supports_spawn` - otherwise None.
+
+        Args:
+            media_file (str, optional): Open this, rather than the same media file
+            media_options (list, optional): Backend options for the media (eg,
+                a lighter decoder profile), rather than the same ones
+        """
+        return None
+
+    @abc.abstractmethod
+    def close(self):
+        """Stops playback, & releases the player"""
+
+def config_split_list(config_string: str, delimiter: str = ',', cast_to_int: bool = True, strip = True) -> list:
+    """Splits a config string into a list, using the specified delimiter
 
     Args:
-        player (vlc.MediaPlayer): The media player instance.
-        duration (int): The total duration of the media file in ms.
-        ms_before_end_to_stop (float, optional): How many ms before the end of the media file to stop. Default: 600
-        wait_state_ms (int, optional): How many ms to wait between checks. Default: 200
-        debug_message_frequency_sec (int, optional): Print debug msgs every __ seconds. Defaults to 5. 0 to disable
+        config_string (str): The string to split
+        delimiter (str, optional): The delimiter to split on. Defaults to ','.
+        cast_to_int (bool, optional): Cast the output to an integer? Defaults to True.
+        strip (bool, optional): Strip whitespace from the output? Defaults to True.
 
+    Returns:
+        list: The list of strings
     """
 
-    # checks current time/pos of media player, compares  w/the specified duration
-    # If current time is less than the duration minus a small buffer (three times the wait state), 
-    # pause execution for a short period (defined by wait_state_ms) and check again.
+    output_list = []
+    for x in config_string.split(delimiter):
+        if strip:
+            x = x.strip()
+        if cast_to_int:
+            output_list.append(int(x.strip()))
+        else:
+            output_list.append(x.strip())
 
-    dprint('##### Beginning player_wait_for_end()  #####')
-    
-    # Always ensure we stop at least 3 wait states from the end of the video
-    if ms_before_end_to_stop > wait_state_ms * 3:
-        near_the_end = duration - ms_before_end_to_stop
-    else:
-        near_the_end = duration - (wait_state_ms * 3)
+    return(output_list)
 
-    dprint(f'near_the_end = duration - (wait_state_ms*3)')
-    dprint(f'{near_the_end} = {duration} - ({wait_state_ms}*3)')
+class MonotonicClock:
+    """Monotonic time source, with high-precision deadline sleeps.
 
-    debug_line_count = 0
-    lines_to_skip_between_print = (debug_message_frequency_sec * 1000) // wait_state_ms
-    # lines_to_skip_between_print = 0
+    Deadlines are absolute time.monotonic_ns() values. Sleeping until a
+    deadline uses time.sleep() for the bulk of the wait, then spins for the
+    last `spin_window_ns`, as time.sleep() alone can overshoot by whatever
+    the Linux scheduler gives us (often several ms on a busy Pi.)
+    """
+    def __init__(self, spin_window_ns: int = 1_000_000):
+        self.spin_window_ns = spin_window_ns
 
-    # dprint('lines_to_skip_between_print = debug_message_frequency_ms // wait_state_ms')
-    # dprint(f'{lines_to_skip_between_print} = {debug_message_frequency_ms} // {wait_state_ms}')
+    def now_ns(self) -> int:
+        return time.monotonic_ns()
 
-    readable_duration = str(timedelta(seconds=duration // 1000))
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
 
-    current_time = player.get_time()
-    current_time_seconds = current_time // 1000 
-    while current_time < near_the_end:
-        # Only print debugging stuff if debug_message_frequency_sec is enabled (ie  not 0)
-        if debug_message_frequency_sec != 0:
-            if debug_line_count == 0:
+    def sleep_until_ns(self, deadline_ns: int) -> int:
+        """Sleeps until the given deadline.
 
-                current_time_seconds = current_time // 1000 
-                current_playback_timestamp = str(timedelta(seconds=current_time_seconds))
+        Args:
+            deadline_ns (int): The monotonic time (in ns) to wake up at
 
-                percent_complete = int((current_time / duration) * 100)
-                dprint(f'Waiting for playback to finish. [{current_playback_timestamp} / {readable_duration}] ({percent_complete}%)')
-            if debug_line_count >= lines_to_skip_between_print:
-                debug_line_count = 0
-            else:
-                debug_line_count += 1
+        Returns:
+            int: How late (in ns) we woke up - if the deadline had already
+                 passed when called, this is how far past it we were.
+        """
+        remaining_ns = deadline_ns - time.monotonic_ns()
+        if remaining_ns > self.spin_window_ns:
+            time.sleep((remaining_ns - self.spin_window_ns) / 1_000_000_000)
+        now_ns = time.monotonic_ns()
+        while now_ns < deadline_ns:
+            now_ns = time.monotonic_ns()
+        return now_ns - deadline_ns
 
-        # dprint('All playback loops complete!')
-        time.sleep(wait_state_ms / 1000)
-        current_time = player.get_time()
+# The clock everything times itself with. Main replaces it with one using the
+# configured spin window (or a VirtualClock, to simulate.)
+clock = MonotonicClock()
 
+class LoopSchedule:
+    """Absolute (non-accumulating) deadlines for the primary's loop.
 
-    dprint('#### End of video player_wait_for_end() ####')
+    Loop `n` resumes playback at `start_ns + n * period_ns`, and raises the
+    transmit pins `pin_tx_ns` before that. As each deadline is derived from
+    the start time rather than from the previous wake up, scheduling error
+    doesn't accumulate into the loop period over a long run.
+    """
+    def __init__(self, start_ns: int, play_ns: int, pin_tx_ns: int):
+        """
+        Args:
+            start_ns (int): Monotonic time (ns) of the first resume (pins low)
+            play_ns (int): How long to play the media for, each loop (ns)
+            pin_tx_ns (int): How long to hold the transmit pins high (ns)
+        """
+        self.start_ns = start_ns
+        self.play_ns = play_ns
+        self.pin_tx_ns = pin_tx_ns
+        self.period_ns = play_ns + pin_tx_ns
 
+    def resume_ns(self, loop_index: int) -> int:
+        return self.start_ns + (loop_index * self.period_ns)
 
-################################
-# Begin Main Application Logic #
-################################
+    def rise_ns(self, loop_index: int) -> int:
+        return self.resume_ns(loop_index) - self.pin_tx_ns
 
-# Load configuration options
-config_parsed = configparser.ConfigParser()
-config_parsed.read(CONFIG_FILE)
+    def rebase(self, loop_index: int, resume_ns: int):
+        """Moves the schedule so loop `loop_index` resumes at `resume_ns`."""
+        self.start_ns = resume_ns - (loop_index * self.period_ns)
 
-# Check for media file - exit if none is specified
-if not config_parsed.has_option('Video', 'MediaFile'):
-    print(f'ERROR: No media file specified in {CONFIG_FILE}')
-    exit(1)
+    def retime(self, loop_index: int, play_ns: int, pin_tx_ns: int):
+        """Changes the loop timing from loop `loop_index` on (which keeps its resume time)"""
+        resume_ns = self.resume_ns(loop_index)
+        self.play_ns = play_ns
+        self.pin_tx_ns = pin_tx_ns
+        self.period_ns = play_ns + pin_tx_ns
+        self.rebase(loop_index, resume_ns)
 
-conf = {
-    #     # Video
-    'MEDIA_FILE': config_parsed.get('Video', 'MediaFile'),
-    'FULLSCREEN_MODE': config_parsed.getboolean('Video', 'Fullscreen', fallback=FULLSCREEN_MODE_DEFAULT),
-    'PLAY_FOREVER': config_parsed.getboolean('Video', 'PlayForever', fallback=PLAY_FOREVER_DEFAULT),
-    'PLAYBACK_COUNT': config_parsed.getint('Video', 'PlaybackCount', fallback=PLAYBACK_COUNT_DEFAULT),
+def phase_error_ms(error_ms: float, duration: float) -> float:
+    """Wraps a position error into +/- duration / 2 (ie, the short way round the loop)"""
+    return ((error_ms + (duration / 2)) % duration) - (duration / 2)
 
-    # Sync
-    'MODE': config_parsed.get('Sync', 'PlayerMode', fallback=MODE_DEFAULT),
-    # Split the below into a list
-    'GPIO_TRANSMIT_PINS': config_split_list(config_parsed.get('Sync', 'TransmitPins', fallback=','.join(str(x) for x in GPIO_TRANSMIT_PINS_DEFAULT))),
-    'GPIO_LISTEN_PIN': int(config_parsed.get('Sync', 'ListenPin', fallback=GPIO_LISTEN_PIN_DEFAULT)),
-    'LOAD_WAIT_DURATION': config_parsed.getfloat('Sync', 'LoadWaitDuration', fallback=LOAD_WAIT_DURATION_DEFAULT),
-    'PIN_TX_DURATION_SEC': config_parsed.getfloat('Sync', 'PinTxDurationSec', fallback=PIN_TX_DURATION_SEC_DEFAULT),
+class DriftController:
+    """Keeps a player aligned with a reference position, by nudging its rate.
 
-    # Advanced
-    'PLAYBACK_AFTER_LOAD_DURATION_SEC': config_parsed.getfloat('Advanced', 'PlaybackAfterLoadDurationSec', fallback=PLAYBACK_AFTER_LOAD_DURATION_SEC_DEFAULT),
-    'TOGGLE_FULLSCREEN_DURING_INIT': config_parsed.getboolean('Advanced', 'ToggleFullscreenDuringInit', fallback=False),
-    'PLAY_BRIEFLY_FULLSCREEN_WORKAROUND': config_parsed.getboolean('Advanced', 'PlayBrieflyFullscreenWorkaround', fallback=False),
+    The reference is a (position, monotonic time) pair - eg, "the primary was
+    at 0ms when the listen pin fell" - and is assumed to advance in real time
+    from there. Each update() compares the player's position to it, and
+    applies a PI (proportional + integral) rate adjustment, which corrects
+    small errors without a visible jump. Only errors above `hard_seek_ms` are
+    corrected with a seek.
+    """
+    def __init__(self, duration: int,
+                 gain_p: float = 0.0005,
+                 gain_i: float = 0.0001,
+                 max_rate_adjust: float = 0.03,
+                 deadband_ms: float = 10,
+                 hard_seek_ms: float = 500,
+                 seek_latency_ms: float = 0,
+                 wrap: bool = False,
+                 metrics=None,
+                 playback_clock=None):
+        """
+        Args:
+            duration (int): The total duration of the media file in ms
+            gain_p (float): Rate adjustment per ms of error
+            gain_i (float): Rate adjustment per ms of error, per second it persists
+            max_rate_adjust (float): Maximum rate adjustment (0.03 = 97% - 103%)
+            deadband_ms (float): Errors smaller than this are ignored
+            hard_seek_ms (float): Errors larger than this are fixed with a seek
+            seek_latency_ms (float): How long a seek takes, added to the seek target
+            wrap (bool): The reference loops (ie, wraps around to 0) at the
+                end of the media, so errors are measured the short way round
+            metrics (SyncMetrics, optional): Where to record each drift measurement
+            playback_clock (PlaybackClock, optional): Measure the player's
+                position with this, at exactly the same time as the reference
+        """
+        self.duration = duration
+        self.gain_p = gain_p
+        self.gain_i = gain_i
+        self.max_rate_adjust = max_rate_adjust
+        self.deadband_ms = deadband_ms
+        self.hard_seek_ms = hard_seek_ms
+        self.seek_latency_ms = seek_latency_ms
+        self.wrap = wrap
+        self.metrics = metrics
+        self.playback_clock = playback_clock
 
-    # Debug
-    'TEST_MODE_FAKE_GPIO': config_parsed.getboolean('Debug', 'FakeGPIO', fallback=TEST_MODE_FAKE_GPIO_DEFAULT),
-    # 'osd_enabled': config_parsed.getboolean('video', 'osd_enabled', fallback=osd_enabled)
-    # }
-}
+        self.reference_ms = None
+        self.reference_ns = None
+        self.integral = 0.0
+        self.last_update_ns = None
+        self.rate = 1.0
+        self.last_error_ms = None
 
-# Video
-MEDIA_FILE = conf['MEDIA_FILE']
-LOAD_WAIT_DURATION = conf['LOAD_WAIT_DURATION']
-FULLSCREEN_MODE = conf['FULLSCREEN_MODE']
-PLAY_FOREVER = conf['PLAY_FOREVER']
-PLAYBACK_COUNT = conf['PLAYBACK_COUNT']
+    def set_reference(self, position_ms: float, at_ns: int):
+        """Sets the reference: the primary was at `position_ms` at monotonic time `at_ns`."""
+        self.reference_ms = position_ms
+        self.reference_ns = at_ns
 
-# Sync
-MODE = conf['MODE']
-GPIO_TRANSMIT_PINS = conf['GPIO_TRANSMIT_PINS']
-GPIO_LISTEN_PIN = conf['GPIO_LISTEN_PIN']
-LOAD_WAIT_DURATION = conf['LOAD_WAIT_DURATION']
-PIN_TX_DURATION_SEC = conf['PIN_TX_DURATION_SEC']
+    def reference_position_ms(self, now_ns: int) -> float:
+        position_ms = self.reference_ms + ((now_ns - self.reference_ns) / 1_000_000)
+        if self.wrap:
+            position_ms %= self.duration
+        return position_ms
 
-# Advanced
-PLAYBACK_AFTER_LOAD_DURATION_SEC = conf['PLAYBACK_AFTER_LOAD_DURATION_SEC']
+    def reset(self, player: Player):
+        """Forgets the reference & controller state, and restores normal speed.
 
-# Debug
-TEST_MODE_FAKE_GPIO = conf['TEST_MODE_FAKE_GPIO']
-PIN_TX_DURATION_SEC = conf['PIN_TX_DURATION_SEC']
+        Called when playback is about to restart, as the old reference (and
+        any accumulated error) no longer applies.
+        """
+        self.reference_ms = None
+        self.reference_ns = None
+        self.integral = 0.0
+        self.last_update_ns = None
+        self.last_error_ms = None
+        if self.rate != 1.0:
+            self.rate = 1.0
+            player.set_rate(1.0)
 
-dprint('Configuration loaded from file:')
-pprint(conf)
+    def resync(self, player: Player) -> float:
+        """Seeks straight to the reference position, if we're out by more than the deadband.
 
+        For when we know we've fallen behind (eg, dropped frames), rather
+        than waiting for the error to grow past hard_seek_ms.
 
-# Initialize pi GPIO
+        Returns:
+            float: The error in ms that was corrected, or None if there was nothing to do
+        """
+        if self.reference_ms is None or player.state() != PLAYER_STATE_PLAYING:
+            return None
+        now_ns = clock.now_ns()
+        reference_ms = self.reference_position_ms(now_ns)
+        if reference_ms >= self.duration - self.hard_seek_ms:
+            return None
+        error_ms = reference_ms - player.position()
+        if self.wrap:
+            error_ms = phase_error_ms(error_ms, self.duration)
+        if abs(error_ms) <= self.deadband_ms:
+            return None
+        dprint(f'Resyncing: {error_ms:+.0f}ms out, seeking')
+        player.seek(int(reference_ms + self.seek_latency_ms))
+        self.integral = 0.0
+        self.last_update_ns = None
+        return error_ms
 
-if not TEST_MODE_FAKE_GPIO:
-    # import RPi.GPIO as GPIO
-    from gpiozero import DigitalInputDevice, DigitalOutputDevice
+    def update(self, player: Player):
+        """Measures the error vs. the reference, and corrects it.
 
-# Print version info and run mode
-dprint(f'{script_name} v{version} - {script_url}')
-dprint(f'Playback mode: {MODE} mode')
+        Returns:
+            float: The error in ms (positive = player is behind), or None if
+                   there was nothing to compare against.
+        """
+        if self.reference_ms is None or player.state() != PLAYER_STATE_PLAYING:
+            return None
 
+        now_ns = clock.now_ns()
+        reference_ms = self.reference_position_ms(now_ns)
+        # Near the loop point, the next restart will realign us anyway
+        if reference_ms >= self.duration - self.hard_seek_ms:
+            return None
 
-# dprint(f'{v} in mode: {MODE}')
+        if self.playback_clock:
+            error_ms = reference_ms - self.playback_clock.position_at(now_ns)
+        else:
+            error_ms = reference_ms - player.position()
+        if self.wrap:
+            error_ms = phase_error_ms(error_ms, self.duration)
+        self.last_error_ms = error_ms
+        if self.metrics:
+            self.metrics.observe('drift', error_ms)
 
-current_playback_count = 1
+        if abs(error_ms) > self.hard_seek_ms:
+            dprint(f'Drift of {error_ms:.0f}ms is over {self.hard_seek_ms}ms, seeking')
+            player.seek(int(reference_ms + self.seek_latency_ms))
+            self.integral = 0.0
+            self.last_update_ns = None
+            if self.rate != 1.0:
+                self.rate = 1.0
+                player.set_rate(1.0)
+            return error_ms
 
-if PLAY_FOREVER:
-    set_playback_count = 65535
-else:
-    set_playback_count = PLAYBACK_COUNT
+        if self.last_update_ns is not None:
+            dt_sec = (now_ns - self.last_update_ns) / 1_000_000_000
+            self.integral += error_ms * dt_sec
+            # Anti-windup: the integral term alone can't exceed the max adjustment
+            integral_limit = self.max_rate_adjust / self.gain_i if self.gain_i else 0
+            self.integral = max(-integral_limit, min(integral_limit, self.integral))
+        self.last_update_ns = now_ns
 
-# Initialize player (regardless of primary or secondary mode)
-player, instance, media, duration = player_launch(media_file=MEDIA_FILE,
-                                                  set_playback_count=set_playback_count,
-                                                  toggle_fullscreen_during_init = conf['TOGGLE_FULLSCREEN_DURING_INIT'],
-                                                  play_briefly_fullscreen_workaround = conf['PLAY_BRIEFLY_FULLSCREEN_WORKAROUND'])
+        proportional_ms = error_ms if abs(error_ms) > self.deadband_ms else 0
+        adjust = (self.gain_p * proportional_ms) + (self.gain_i * self.integral)
+        adjust = max(-self.max_rate_adjust, min(self.max_rate_adjust, adjust))
+        new_rate = round(1.0 + adjust, 3)
+        if new_rate != self.rate:
+            self.rate = new_rate
+            player.set_rate(new_rate)
 
-dprint('Player init should be done')
+        return error_ms
 
-# print(player)
-# print(instance)
+class SyncMetrics:
+    """Sync latency instrumentation: per-stage timings of each loop restart.
 
-if MODE == 'primary':
+    Each stage of a restart is marked with a monotonic timestamp, and timed
+    from the stage before it (see STAGE_FROM):
 
-    dprint('Primary mode initializing.')
-    transmit_pins = gpio_setup_transmit_pins(transmit_pin_ids=GPIO_TRANSMIT_PINS)
-    print('\n\nNote: to terminate prematurely, hit [Control]-[C] at the text screen. ([f] to  exit fullscreen, and/or [alt]-[tab] to switch windows)\n\n')
+        prepare         transmit pins high (primary), or the rising edge /
+                        "prepare" packet callback entry (secondary)
+        pause           player paused
+        seek            player.seek(0) returned
+        go              transmit pins low (primary), or the falling edge /
+                        "go" callback entry (secondary)
+        resume          player.resume() returned
+        first_advance   the player's time first changed after resuming
 
-    # Wait for file to load / buffer
-    # dprint(f'Sleeping for {LOAD_WAIT_DURATION} sec. for file to load / buffer')
-    # time.sleep(LOAD_WAIT_DURATION)      # (2 sec by default)
-    
-    # Begin standard playback loop
-    while (current_playback_count <= PLAYBACK_COUNT) or PLAY_FOREVER:
-        dprint(f'Video playback count: {current_playback_count}/{PLAYBACK_COUNT}')
-                                                                    
-        # Pins to high - 2nd trigger
-        gpio_send_pin_high(transmit_pins=transmit_pins)
-        player_prepare_to_restart(player=player)
-
-        # Wait, then pins to low
-        dprint(f'Waiting {PIN_TX_DURATION_SEC} seconds, then setting pins low')
-        time.sleep(PIN_TX_DURATION_SEC)
-        gpio_send_pin_low(transmit_pins=transmit_pins)
-        player_resume(player=player)
+    `slack` is the time between the seek completing and "go" - if this gets
+    close to zero, PinTxDurationSec is too short. Other measurements (eg,
+    drift) can be recorded with observe(). The last `window` values of each
+    are kept, for rolling percentiles. Other status (eg, decode health) can
+    be added to the metrics file with set_status().
+    """
+    STAGE_FROM = {
+        'pause': 'prepare',
+        'seek': 'pause',
+        'go': 'prepare',
+        'resume': 'go',
+        'first_advance': 'resume',
+    }
 
-        dprint(f'Waiting for the end of the video...')
-        player_wait_for_end(player=player, duration=duration, ms_before_end_to_stop=3000)
-        dprint(f'player_wait_for_end() returned - Video has ended!')
+    def __init__(self, window: int = METRICS_WINDOW_DEFAULT,
+                 summary_loops: int = METRICS_SUMMARY_LOOPS_DEFAULT,
+                 output_file: str = METRICS_FILE_DEFAULT):
+        self.window = window
+        self.summary_loops = summary_loops
+        self.output_file = output_file
+        self.history = {}
+        self.loop_marks = {}
+        self.last_loop = {}
+        self.loop_count = 0
+        self.status = {}
+        self.lock = threading.Lock()
+        self.first_advance_watcher = None
 
-        current_playback_count += 1
+    def watch_first_advance(self, player: Player):
+        """Marks 'first_advance' once the (just resumed) player moves, then ends the loop (see FirstAdvanceWatcher)"""
+        if self.first_advance_watcher is None:
+            self.first_advance_watcher = FirstAdvanceWatcher(metrics=self)
+        self.first_advance_watcher.watch(player)
 
-    dprint(f'We have played the number of times specified ({PLAYBACK_COUNT}), exiting media player')
-    vid_quit(vlc_player=player, instance=instance)
-    
-# Otherwise, run as secondary
-elif MODE == 'secondary':
-    # Set up listening pin & associated events    
-    listen_pin = gpio_setup_listen_pin(listen_pin_number=GPIO_LISTEN_PIN, player=player)
-  
-    # Wait for file to load / buffer, one second shorter than the primary
-    # dprint(f'Sleeping for {LOAD_WAIT_DURATION - 1} seconds, for file to load / buffer (1 sec shorter than primary)')
-    # time.sleep(LOAD_WAIT_DURATION - 1)      # [2 - 1] seconds by default
-    # dprint('Prepared to start (as secondary)')
-
-    # Begin standard playback loop
-    while (current_playback_count <= PLAYBACK_COUNT) or PLAY_FOREVER:
-        # Wait for RISE (GPIO going High on Main)
-
-        # wait_for_gpio(gpio_listen_pin=GPIO_LISTEN_PIN)
-        # player_start_at_beginning(player=player)
-        dprint(f'Waiting for the end of the video...')
-        player_wait_for_end(player=player, duration=duration, ms_before_end_to_stop=1000)
-        dprint(f'player_wait_for_end() returned - Video has ended!')
-
-    vid_quit(vlc_player=player, instance=instance)
-
-else:
-    print(f"ERROR: Mode should be set to 'primary' or 'secondary', not {MODE}")
-    exit
-
-dprint('Script complete, exiting.\r\rNote: if keyboard is not working, hit Control-C, then type "reset" and hit enter')
+    def mark(self, stage: str, t_ns: int = None):
+        """Records the time of a stage of the current restart (default: now)"""
+        if t_ns is None:
+            t_ns = clock.now_ns()
+        if stage == 'prepare':
+            # Normally already summarised by end_loop() - this is time
+            # critical, so anything left over (ie, no resume) is dropped
+            self.loop_marks = {}
+        self.loop_marks[stage] = t_ns
+
+    def observe(self, name: str, value: float):
+        """Records any other measurement (eg, drift in ms)"""
+        with self.lock:
+            if name not in self.history:
+                self.history[name] = deque(maxlen=self.window)
+            self.history[name].append(value)
+
+    def set_status(self, name: str, status: dict):
+        """Sets the latest status of something else (eg, decode health), for the metrics file"""
+        with self.lock:
+            self.status[name] = status
+
+    def end_loop(self):
+        """Converts the loop's marks to stage durations, & summarises.
+
+        Called once the restart is complete (by FirstAdvanceWatcher)
+        so the summary & file writing stay out of the restart itself.
+        """
+        marks = self.loop_marks
+        if not marks:
+            return
+        self.loop_marks = {}
+        loop = {}
+        for stage, from_stage in self.STAGE_FROM.items():
+            if stage in marks and from_stage in marks:
+                loop[stage] = (marks[stage] - marks[from_stage]) / 1_000_000
+        if 'seek' in marks and 'go' in marks:
+            loop['slack'] = (marks['go'] - marks['seek']) / 1_000_000
+        for name, value_ms in loop.items():
+            self.observe(name, value_ms)
+
+        self.last_loop = loop
+        self.loop_count += 1
+        if self.summary_loops and self.loop_count % self.summary_loops == 0:
+            dprint(self.summary_line())
+            if self.output_file:
+                self.write_file()
+
+    @staticmethod
+    def percentile(sorted_values: list, fraction: float) -> float:
+        index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+        return sorted_values[index]
+
+    def stats(self) -> dict:
+        with self.lock:
+            history = {name: sorted(values) for name, values in self.history.items() if values}
+        return {name: {
+                    'count': len(values),
+                    'p50': self.percentile(values, 0.50),
+                    'p95': self.percentile(values, 0.95),
+                    'p99': self.percentile(values, 0.99),
+                    'max': values[-1],
+                } for name, values in history.items()}
+
+    def summary_line(self) -> str:
+        parts = [f'{name} {s["p50"]:.1f}/{s["p95"]:.1f}/{s["p99"]:.1f}/{s["max"]:.1f}'
+                 for name, s in self.stats().items()]
+        return f'Sync metrics, loop {self.loop_count} (p50/p95/p99/max ms): ' + ' | '.join(parts)
+
+    def write_file(self):
+        """Writes the stats as JSON (via a temporary file, so readers never see half a file)"""
+        data = {
+            'mode': MODE,
+            'time': datetime.now().isoformat(),
+            'loops': self.loop_count,
+            'last_loop_ms': self.last_loop,
+            'stats_ms': self.stats(),
+        }
+        with self.lock:
+            data.update(self.status)
+        temp_file = f'{self.output_file}.tmp'
+        try:
+            with open(temp_file, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(temp_file, self.output_file)
+        except OSError as e:
+            dwarn(f'Failed writing metrics file {self.output_file}: {e}')
+
+class FirstAdvanceWatcher:
+    """Marks 'first_advance' when a resumed player's time first changes, then ends the loop.
+
+    The change comes from the player's own 'time' event (see
+    Player.add_event_hook()), so nothing polls the player - or queues behind
+    the next prepare / go on a PlayerExecutor. watch() hooks the player
+    straight after resume(); one long-lived thread then waits (up to
+    `timeout_sec`) for the advance, removes the hook & ends the loop. A
+    resume while still watching the last one just stops that watch (the
+    next restart's prepare has already dropped that loop's marks), & starts
+    watching again. Players without events only end the loop.
+    """
+    def __init__(self, metrics: SyncMetrics, timeout_sec: float = 2):
+        self.metrics = metrics
+        self.timeout_sec = timeout_sec
+        self.condition = threading.Condition()
+        self.pending = deque()
+        self.watching = None
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def watch(self, player: Player):
+        """Starts watching a (just resumed) player - on the thread that resumed it"""
+        advanced = threading.Event()
+
+        def on_update(kind, value):
+            if kind == 'time' and not advanced.is_set():
+                self.metrics.mark('first_advance')
+                advanced.set()
+
+        hook = player.add_event_hook(on_update) if player.supports_events else None
+        with self.condition:
+            if self.watching is not None:
+                # Superseded - stop waiting for the last one
+                self.watching.set()
+            self.watching = advanced
+            self.pending.append((player, hook, advanced))
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                player, hook, advanced = self.pending.popleft()
+            if hook is not None:
+                advanced.wait(timeout=self.timeout_sec)
+                advanced.set()
+                try:
+                    player.remove_event_hook(hook)
+                except RuntimeError:
+                    pass    # (the executor has closed)
+            with self.condition:
+                superseded = self.watching is not advanced
+            if not superseded:
+                self.metrics.end_loop()
+
+# Trace file format: a header, then fixed size records (all little-endian.)
+# A header starts each file, including each new one after a rotation.
+#   Header: magic, version, record size, node name, player mode
+#   Record: sequence number, monotonic time (ns), realtime (ns), value, loop,
+#           aux, event (& 1 byte padding)
+TRACE_MAGIC = b'PGSPTRC1'
+TRACE_VERSION = 1
+TRACE_HEADER = struct.Struct('<8sHH32s16s')
+TRACE_RECORD = struct.Struct('<QqqqIHBx')
+
+# Trace events - value & aux hold:
+TRACE_EDGE_RISING = 1   # value: how late it was handled (ns)
+TRACE_EDGE_FALLING = 2  # value: how late it was handled (ns)
+TRACE_PREPARE = 3       # (time = the signal, not when it was handled)
+TRACE_GO = 4            # (time = the go time) - starts a new loop
+TRACE_PAUSE = 5         # aux: call duration (us)
+TRACE_SEEK = 6          # value: position (ms), aux: call duration (us)
+TRACE_RESUME = 7        # aux: call duration (us)
+TRACE_RATE = 8          # value: rate x 1,000,000, aux: call duration (us)
+TRACE_POSITION = 9      # value: player position (ms)
+TRACE_DECODE = 10       # value: pictures lost since the last sample, aux: decode ratio x 1000
+TRACE_EVENT_NAMES = {TRACE_EDGE_RISING: 'edge_rising', TRACE_EDGE_FALLING: 'edge_falling',
+                     TRACE_PREPARE: 'prepare', TRACE_GO: 'go', TRACE_PAUSE: 'pause',
+                     TRACE_SEEK: 'seek', TRACE_RESUME: 'resume', TRACE_RATE: 'rate',
+                     TRACE_POSITION: 'position', TRACE_DECODE: 'decode'}
+
+class TraceRecorder:
+    """Records sync events to a binary trace file, via a preallocated ring buffer.
+
+    Like LogRing, recording only packs a record into its slot (no I/O, no
+    allocation to speak of), so it's safe in the timing-critical paths. A
+    background thread writes complete records out every `flush_sec`, and
+    samples the player position. Each record has the monotonic time, plus
+    the realtime clock equivalent (from an offset re-measured at each write,
+    so NTP adjustments are followed.)
+    """
+    def __init__(self, output_file: str, node_name: str, mode: str,
+                 size: int = TRACE_BUFFER_RECORDS_DEFAULT, flush_sec: float = TRACE_SAMPLE_SEC_DEFAULT,
+                 max_bytes: int = int(TRACE_MAX_MB_DEFAULT * 1024 * 1024)):
+        self.output_file = output_file
+        self.header = TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, TRACE_RECORD.size,
+                                        node_name.encode()[:32], mode.encode()[:16])
+        self.size = size
+        self.buffer = bytearray(size * TRACE_RECORD.size)
+        # Sequence numbers start at 1, so an empty (zeroed) slot reads as unwritten
+        self.counter = itertools.count(1)
+        self.read_seq = 1
+        self.dropped = 0
+        self.loop = 0
+        self.flush_sec = flush_sec
+        self.max_bytes = max_bytes
+        self.real_offset_ns = time.time_ns() - clock.now_ns()
+        self.player = None
+        self.running = False
+        # Every session starts with a header, even when appending (see trace_load())
+        self.file = open(output_file, 'ab')
+        self.file.write(self.header)
+
+    def record(self, event: int, value: int = 0, t_ns: int = None, aux: int = 0):
+        if t_ns is None:
+            t_ns = clock.now_ns()
+        if event == TRACE_GO:
+            self.loop += 1
+        seq = next(self.counter)    # atomic, so records from any thread are safe
+        TRACE_RECORD.pack_into(self.buffer, (seq % self.size) * TRACE_RECORD.size,
+                               seq, t_ns, t_ns + self.real_offset_ns, int(value), self.loop,
+                               min(aux, 0xFFFF), event)
+
+    def start(self, player: Player = None):
+        """Starts writing (& sampling the player's position, if given) in the background"""
+        self.player = player
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while self.running:
+            clock.sleep(self.flush_sec)
+            if self.player is not None:
+                try:
+                    self.record(TRACE_POSITION, self.player.position())
+                except Exception as e:
+                    ddebug(f'Trace: could not sample the position: {e}')
+            self.real_offset_ns = time.time_ns() - clock.now_ns()
+            self.flush()
+
+    def flush(self):
+        """Writes all complete records not yet written"""
+        chunks = []
+        while True:
+            offset = (self.read_seq % self.size) * TRACE_RECORD.size
+            seq = TRACE_RECORD.unpack_from(self.buffer, offset)[0]
+            if seq < self.read_seq:
+                break   # Not written yet
+            if seq > self.read_seq:
+                # We were lapped - skip to the oldest record still held
+                oldest_seq = seq - self.size + 1
+                self.dropped += oldest_seq - self.read_seq
+                self.read_seq = oldest_seq
+                continue
+            chunks.append(bytes(self.buffer[offset:offset + TRACE_RECORD.size]))
+            self.read_seq += 1
+        if self.dropped:
+            dwarn(f'Trace buffer overrun - {self.dropped} records dropped')
+            self.dropped = 0
+        if not chunks:
+            return
+        try:
+            if self.file.tell() >= self.max_bytes:
+                self.file.close()
+                os.replace(self.output_file, f'{self.output_file}.1')
+                self.file = open(self.output_file, 'ab')
+                self.file.write(self.header)
+            self.file.write(b''.join(chunks))
+            self.file.flush()
+        except OSError as e:
+            dwarn(f'Failed writing trace file {self.output_file}: {e}')
+
+    def close(self):
+        self.running = False
+        self.flush()
+        self.file.close()
+
+# Set in main when tracing is enabled (see trace_event())
+trace_recorder = None
+
+def trace_event(event: int, value: int = 0, t_ns: int = None, aux: int = 0):
+    """Records a trace event, if tracing is enabled (see TraceRecorder)"""
+    if trace_recorder is not None:
+        trace_recorder.record(event, value=value, t_ns=t_ns, aux=aux)
+
+def trace_load(trace_file: str) -> dict:
+    """Reads a trace file.
+
+    Returns:
+        dict: 'node', 'mode', & 'records' - a list of dicts (with 'event' as a name)
+    """
+    with open(trace_file, 'rb') as f:
+        data = f.read()
+    if len(data) < TRACE_HEADER.size or data[:len(TRACE_MAGIC)] != TRACE_MAGIC:
+        raise ValueError(f'{trace_file} is not a trace file')
+    _, version, record_size, node, mode = TRACE_HEADER.unpack_from(data, 0)
+    if version != TRACE_VERSION or record_size != TRACE_RECORD.size:
+        raise ValueError(f'{trace_file}: unsupported trace version {version}')
+    records = []
+    offset = TRACE_HEADER.size
+    while offset + record_size <= len(data):
+        if data[offset:offset + len(TRACE_MAGIC)] == TRACE_MAGIC:
+            offset += TRACE_HEADER.size     # (another session appended to the file)
+            continue
+        seq, mono_ns, real_ns, value, loop, aux, event, = TRACE_RECORD.unpack_from(data, offset)
+        records.append({'seq': seq, 'mono_ns': mono_ns, 'real_ns': real_ns, 'value': value,
+                        'loop': loop, 'aux': aux, 'event': TRACE_EVENT_NAMES.get(event, event)})
+        offset += record_size
+    return {'node': node.rstrip(b'\0').decode(errors='replace'),
+            'mode': mode.rstrip(b'\0').decode(errors='replace'),
+            'records': records}
+
+def trace_analyze(traces: list) -> dict:
+    """Merges the traces of several nodes, & works out the sync between them.
+
+    Each node's clock offset from the reference node (the primary, or the
+    first trace) is estimated from the "go"s: every node's go comes from the
+    same signal, so the median difference between a node's go times & the
+    nearest reference go is taken as its (realtime) clock offset. The loops
+    are matched up by those gos too (so late joiners are fine.)
+
+    Each node's start of a loop is then worked out from its position samples
+    (sample time - position, ie when it effectively started from 0), & its
+    drift is its position vs the reference's (interpolated) at each sample.
+
+    Args:
+        traces (list): From trace_load() - files from the same node (eg,
+            rotated ones) are merged
+
+    Returns:
+        dict: 'reference', 'offsets_ms' {node: ms}, 'loops' [{'loop', 'starts_ms'
+            {node: ms from the reference}, 'skew_ms'}], 'drift' {node: [(time_sec,
+            loop, drift_ms), ...]}, 'edge_lateness_ms' {node: [ms, ...]}
+    """
+    nodes = {}
+    for trace in traces:
+        nodes.setdefault(trace['node'], {'mode': trace['mode'], 'records': []})['records'].extend(trace['records'])
+    if not nodes:
+        raise ValueError('No traces')
+    for node in nodes.values():
+        node['records'].sort(key=lambda r: r['real_ns'])
+    reference = next((name for name, node in nodes.items() if node['mode'] == 'primary'), next(iter(nodes)))
+
+    gos = {name: [r['real_ns'] for r in node['records'] if r['event'] == 'go'] for name, node in nodes.items()}
+    ref_gos = gos[reference]
+    if not ref_gos:
+        raise ValueError(f'The reference trace ({reference}) has no "go" events')
+
+    def nearest_ref_loop(real_ns: int) -> int:
+        index = bisect.bisect_left(ref_gos, real_ns)
+        candidates = [i for i in (index - 1, index) if 0 <= i < len(ref_gos)]
+        return min(candidates, key=lambda i: abs(ref_gos[i] - real_ns))
+
+    offsets_ns = {}
+    for name in nodes:
+        differences = sorted(go_ns - ref_gos[nearest_ref_loop(go_ns)] for go_ns in gos[name])
+        offsets_ns[name] = differences[len(differences) // 2] if differences else 0
+
+    # Per node: reference loop -> (reference time of that loop's go, [(reference time, position ms)])
+    loops = {}
+    for name, node in nodes.items():
+        offset_ns = offsets_ns[name]
+        current = None
+        for r in node['records']:
+            ref_ns = r['real_ns'] - offset_ns
+            if r['event'] == 'go':
+                current = nearest_ref_loop(ref_ns)
+                loops.setdefault(name, {})[current] = (ref_ns, [])
+            elif r['event'] == 'position' and current is not None:
+                loops[name][current][1].append((ref_ns, r['value']))
+
+    t0_ns = ref_gos[0]
+    loop_report = []
+    drift = {name: [] for name in nodes}
+    ref_loops = loops.get(reference, {})
+    for loop_index in sorted(ref_loops):
+        starts_ns = {}
+        for name in nodes:
+            go_ns, samples = loops.get(name, {}).get(loop_index, (None, []))
+            # Only samples after playback got going (position > 0)
+            starts = sorted(t_ns - int(position_ms * 1_000_000) for t_ns, position_ms in samples if position_ms > 0)
+            if starts:
+                starts_ns[name] = starts[len(starts) // 2]
+
+            ref_samples = ref_loops[loop_index][1]
+            for t_ns, position_ms in samples:
+                index = bisect.bisect_left(ref_samples, (t_ns, -math.inf))
+                if index == 0 or index >= len(ref_samples):
+                    continue
+                (t1_ns, p1), (t2_ns, p2) = ref_samples[index - 1], ref_samples[index]
+                if t2_ns == t1_ns or p2 < p1:
+                    continue
+                ref_position_ms = p1 + (p2 - p1) * (t_ns - t1_ns) / (t2_ns - t1_ns)
+                drift[name].append(((t_ns - t0_ns) / 1_000_000_000, loop_index, position_ms - ref_position_ms))
+        if reference in starts_ns:
+            relative = {name: (start_ns - starts_ns[reference]) / 1_000_000 for name, start_ns in starts_ns.items()}
+            loop_report.append({'loop': loop_index, 'starts_ms': relative,
+                                'skew_ms': max(relative.values()) - min(relative.values())})
+
+    return {
+        'reference': reference,
+        'offsets_ms': {name: offset_ns / 1_000_000 for name, offset_ns in offsets_ns.items()},
+        'loops': loop_report,
+        'drift': drift,
+        'edge_lateness_ms': {name: [r['value'] / 1_000_000 for r in node['records']
+                                    if r['event'] in ('edge_rising', 'edge_falling')]
+                             for name, node in nodes.items()},
+    }
+
+def trace_report(analysis: dict) -> list:
+    """Returns trace_analyze()'s results as lines of text"""
+    lines = [f'Reference node: {analysis["reference"]}', 'Estimated clock offsets (from the gos):']
+    for name, offset_ms in analysis['offsets_ms'].items():
+        lines.append(f'  {name}: {offset_ms:+.3f}ms')
+    lines.append('Loop start skew (vs the reference, from position samples):')
+    for loop in analysis['loops']:
+        worst = max(loop['starts_ms'].items(), key=lambda item: abs(item[1]))
+        lines.append(f'  Loop {loop["loop"]}: {loop["skew_ms"]:.2f}ms across {len(loop["starts_ms"])} nodes '
+                     f'(furthest: {worst[0]} {worst[1]:+.2f}ms)')
+    lines.append('Drift vs the reference (p50/p95/max of |drift|):')
+    for name, points in analysis['drift'].items():
+        if name == analysis['reference'] or not points:
+            continue
+        values = sorted(abs(point[2]) for point in points)
+        lines.append(f'  {name}: {SyncMetrics.percentile(values, 0.5):.1f}/'
+                     f'{SyncMetrics.percentile(values, 0.95):.1f}/{values[-1]:.1f}ms ({len(values)} samples)')
+    for name, lateness in analysis['edge_lateness_ms'].items():
+        if lateness:
+            lateness = sorted(lateness)
+            lines.append(f'Edge lateness, {name}: p50 {SyncMetrics.percentile(lateness, 0.5):.3f}ms, '
+                         f'max {lateness[-1]:.3f}ms ({len(lateness)} edges)')
+    return lines
+
+class PlayerCommand:
+    """A queued player command (see PlayerExecutor)"""
+    __slots__ = ('function', 'args', 'issued_ns', 'edge', 'done', 'result', 'error')
+
+    def __init__(self, function, args: tuple = (), issued_ns: int = None, edge: str = None):
+        self.function = function
+        self.args = args
+        self.issued_ns = clock.now_ns() if issued_ns is None else issued_ns
+        self.edge = edge
+        self.done = None
+        self.result = None
+        self.error = None
+
+class PlayerExecutor:
+    """Runs player commands one at a time, in order, on its own thread.
+
+    Plain commands submitted with call() wait for their result (those
+    submitted with submit() don't.) Edges -
+    "prepare" & "go", from the listen pin or UDP callbacks - are submitted
+    with submit_edge(), timestamped when the edge happened, & don't wait:
+
+    - Repeats of an edge less than `debounce_ms` apart are coalesced: of the
+      same edges waiting in the queue, only the last is acted on (so a bounce
+      is a no-op), and a repeat of the last edge acted on is dropped
+    - A "prepare" & "go" less than `debounce_ms` apart (ie, a glitch pulse)
+      are both dropped
+    - Edges older than the last edge acted on are rejected (ie, they arrived
+      out of order)
+
+    Time spent waiting in the queue is logged if over `latency_warn_ms`, &
+    recorded in `metrics` as 'command_queue_ms'. Once closed, call() raises
+    RuntimeError (as do the calls still waiting in the queue.)
+    """
+    def __init__(self, debounce_ms: float = COMMAND_DEBOUNCE_MS_DEFAULT,
+                 latency_warn_ms: float = COMMAND_LATENCY_WARN_MS_DEFAULT,
+                 metrics: SyncMetrics = None):
+        self.debounce_ns = int(debounce_ms * 1_000_000)
+        self.latency_warn_ns = int(latency_warn_ms * 1_000_000)
+        self.metrics = metrics
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.last_edge = None
+        self.counts = {'executed': 0, 'coalesced': 0, 'rejected': 0}
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def call(self, function, *args):
+        """Runs function(*args) on the executor thread, & returns its result."""
+        if threading.current_thread() is self.thread and self.running:
+            return function(*args)
+        command = PlayerCommand(function, args)
+        command.done = threading.Event()
+        self._put(command)
+        command.done.wait()
+        if command.error is not None:
+            raise command.error
+        return command.result
+
+    def submit(self, function, *args):
+        """Queues function(*args) to run on the executor thread, without waiting for it."""
+        self._put(PlayerCommand(function, args))
+
+    def submit_edge(self, edge: str, function, issued_ns: int = None):
+        """Queues function() as the handler of an edge ("prepare" or "go") at issued_ns."""
+        self._put(PlayerCommand(function, issued_ns=issued_ns, edge=edge))
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            pending, self.queue = self.queue, deque()
+            self.condition.notify()
+        for command in pending:
+            if command.done is not None:
+                command.error = RuntimeError('Player executor closed')
+                command.done.set()
+        ddebug(f'Player commands: {self.counts}')
+
+    def _put(self, command: PlayerCommand):
+        with self.condition:
+            if not self.running:
+                raise RuntimeError('Player executor closed')
+            self.queue.append(command)
+            self.condition.notify()
+
+    def _next_command(self) -> PlayerCommand:
+        """Pops the next command to run - dropping superseded / stale edges."""
+        with self.condition:
+            while self.running:
+                while not self.queue:
+                    self.condition.wait()
+                    if not self.running:
+                        return None
+                command = self.queue.popleft()
+                if command.edge is None:
+                    return command
+
+                if self.last_edge is not None:
+                    last_edge, last_edge_ns = self.last_edge
+                    if command.issued_ns < last_edge_ns:
+                        self.counts['rejected'] += 1
+                        dwarn(f'Rejected out-of-order {command.edge} edge '
+                              f'({(last_edge_ns - command.issued_ns) / 1_000_000:.1f}ms older than the last)')
+                        continue
+                    if command.edge == last_edge and command.issued_ns - last_edge_ns < self.debounce_ns:
+                        self.counts['coalesced'] += 1
+                        ddebug('Dropped repeated %s edge %.0fus after the last',
+                               command.edge, (command.issued_ns - last_edge_ns) / 1000)
+                        continue
+                later_edge = next((queued for queued in self.queue if queued.edge is not None), None)
+                if later_edge is not None and 0 <= later_edge.issued_ns - command.issued_ns < self.debounce_ns:
+                    gap_us = (later_edge.issued_ns - command.issued_ns) / 1000
+                    if later_edge.edge == command.edge:
+                        self.counts['coalesced'] += 1
+                        ddebug('Coalesced %s edge with the repeat %.0fus later', command.edge, gap_us)
+                    else:
+                        # A glitch pulse - neither edge is real
+                        self.queue.remove(later_edge)
+                        self.counts['coalesced'] += 2
+                        dwarn(f'Dropped a {command.edge} & {later_edge.edge} edge {gap_us:.0f}us apart (glitch?)')
+                    continue
+                self.last_edge = (command.edge, command.issued_ns)
+                return command
+            return None
+
+    def _run(self):
+        while True:
+            command = self._next_command()
+            if command is None:
+                return
+            waited_ns = clock.now_ns() - command.issued_ns
+            if waited_ns > self.latency_warn_ns:
+                name = f'{command.edge} edge' if command.edge else getattr(command.function, '__name__', 'Command')
+                dwarn(f'{name} waited {waited_ns / 1_000_000:.1f}ms to run')
+            if self.metrics:
+                self.metrics.observe('command_queue_ms', waited_ns / 1_000_000)
+            try:
+                command.result = command.function(*command.args)
+            except Exception as e:
+                command.error = e
+                if command.done is None:
+                    name = f'{command.edge} edge handler' if command.edge else getattr(command.function, '__name__', 'Command')
+                    dwarn(f'{name} failed: {e!r}')
+            self.counts['executed'] += 1
+            if command.done is not None:
+                command.done.set()
+
+def vid_quit(vlc_player, instance):
+    dprint('vid_quit() called. calling vlc_player.stop() & waiting 1 second')
+    vlc_player.stop()
+    time.sleep(1)
+    dprint('calling vlc_player.release()')
+    vlc_player.release()
+    dprint('calling instance.release()')
+    instance.release()
+
+    dprint('Player and Instance have been released; exiting vid_quit()')
+
+class SequentialOutputLines:
+    """Drives several output pins, one after another (eg, gpiozero DigitalOutputDevices)"""
+    bulk = False
+
+    def __init__(self, pins: list):
+        """
+        Args:
+            pins (list): Anything with on() & off() - eg, DigitalOutputDevice
+        """
+        self.pins = pins
+
+    def set(self, value: bool) -> int:
+        """Sets every pin to `value`.
+
+        Returns:
+            int: Skew (ns) - from the first pin being set to the last
+        """
+        return self.set_values([value] * len(self.pins))
+
+    def set_values(self, values: list) -> int:
+        """Sets each pin to the matching value in `values` (see set())"""
+        first_ns = None
+        for pin, value in zip(self.pins, values):
+            if value:
+                pin.on()
+            else:
+                pin.off()
+            if first_ns is None:
+                first_ns = clock.now_ns()
+        return clock.now_ns() - first_ns if first_ns is not None else 0
+
+    def close(self):
+        for pin in self.pins:
+            if hasattr(pin, 'close'):
+                pin.close()
+
+class GpiodOutputLines:
+    """Drives several output pins in one operation, with a libgpiod (v2) multi-line request
+
+    All the lines are set by a single call (one ioctl), so the kernel sets
+    them together - on a Pi, pins in the same bank change with one register
+    write.
+    """
+    bulk = True
+
+    def __init__(self, pins: list, chip_path: str = GPIO_CHIP_DEFAULT, chip=None):
+        """
+        Args:
+            pins (list): GPIO (BCM) line numbers
+            chip_path (str): The gpiod chip the lines are on
+            chip (MockGpioChip, optional): Use this instead of a real chip (for testing)
+        """
+        self.pins = list(pins)
+        if chip is not None:
+            self.request = chip.request_lines(self.pins)
+            self.values = {True: True, False: False}
+        else:
+            settings = gpiod.LineSettings(direction=gpiod.line.Direction.OUTPUT,
+                                          output_value=gpiod.line.Value.INACTIVE)
+            self.request = gpiod.request_lines(chip_path, consumer=script_name,
+                                               config={tuple(self.pins): settings})
+            self.values = {True: gpiod.line.Value.ACTIVE, False: gpiod.line.Value.INACTIVE}
+
+    def set(self, value: bool) -> int:
+        """Sets every pin to `value`.
+
+        Returns:
+            int: Skew (ns) - the duration of the (single) call, as an upper bound
+        """
+        return self.set_values([value] * len(self.pins))
+
+    def set_values(self, values: list) -> int:
+        """Sets each pin to the matching value in `values` (see set())"""
+        line_values = {pin: self.values[bool(value)] for pin, value in zip(self.pins, values)}
+        start_ns = clock.now_ns()
+        self.request.set_values(line_values)
+        return clock.now_ns() - start_ns
+
+    def close(self):
+        self.request.release()
+
+class MockGpioChip:
+    """Stands in for a gpiod chip (& gpiozero pins), recording when each line changes.
+
+    Used with TestModeFakeGPIO, and for testing: `skew_ns()` is the spread of
+    the last change times of the lines, as a secondary wired to each would
+    see it.
+    """
+    def __init__(self, write_ns: int = 0):
+        """
+        Args:
+            write_ns (int): Simulated time each write takes (per call)
+        """
+        self.write_ns = write_ns
+        self.values = {}
+        self.changed_ns = {}
+
+    def _write(self, values: dict):
+        if self.write_ns:
+            clock.sleep_until_ns(clock.now_ns() + self.write_ns)
+        now_ns = clock.now_ns()
+        for pin, value in values.items():
+            if self.values.get(pin) != value:
+                self.values[pin] = value
+                self.changed_ns[pin] = now_ns
+
+    def request_lines(self, pins: list):
+        """A multi-line request (like gpiod.request_lines())"""
+        chip = self
+        for pin in pins:
+            chip.values[pin] = False
+
+        class MockLineRequest:
+            def set_values(self, values: dict):
+                chip._write(values)
+
+            def release(self):
+                pass
+
+        return MockLineRequest()
+
+    def line(self, pin: int):
+        """A single line, like a gpiozero DigitalOutputDevice"""
+        chip = self
+        chip.values[pin] = False
+
+        class MockLine:
+            def on(self):
+                chip._write({pin: True})
+
+            def off(self):
+                chip._write({pin: False})
+
+        return MockLine()
+
+    def skew_ns(self, pins: list) -> int:
+        times = [self.changed_ns[pin] for pin in pins if pin in self.changed_ns]
+        return max(times) - min(times) if times else 0
+
+def gpio_output_lines_create(pins: list, backend: str = GPIO_OUTPUT_DEFAULT,
+                             chip_path: str = GPIO_CHIP_DEFAULT):
+    """Sets up the transmit pins as outputs, with the requested backend.
+
+    Returns:
+        GpiodOutputLines | SequentialOutputLines
+    """
+    if backend in ('auto', 'gpiod') and gpiod is not None:
+        try:
+            return GpiodOutputLines(pins, chip_path=chip_path)
+        except (OSError, ValueError) as e:
+            if backend == 'gpiod':
+                raise
+            dwarn(f'Could not request {pins} on {chip_path} with gpiod ({e}) - using gpiozero')
+    return SequentialOutputLines([DigitalOutputDevice(pin=pin_id) for pin_id in pins])
+
+def gpio_setup_transmit_pins(transmit_pin_ids, do_initialization_pulse = True,
+                            init_pulse_len = 0.5, init_delay = 2,
+                            backend: str = GPIO_OUTPUT_DEFAULT, chip_path: str = GPIO_CHIP_DEFAULT):
+    """
+    do_initialization_pulse = do we want to do a quick playback-transmit cycle
+        during initialization, for caching purposes etc?
+        ** Note - this is needed due to some GPIO issue causing the initial
+        ** "high" event to be detected as a "low" event on the secondaries!)
+
+    init_pulse_len = how many seconds to hold the tx pins high during init
+    init_delay =     how many seconds to wait after setting off again to continue 
+    backend =        "gpiod", "gpiozero" or "auto" (see gpio_output_lines_create())
+
+    Returns the transmit pins (GpiodOutputLines | SequentialOutputLines)
+    """
+    # Set up the pins for the main/secondary communication
+    if not TEST_MODE_FAKE_GPIO:
+        transmit_pins = gpio_output_lines_create(transmit_pin_ids, backend=backend, chip_path=chip_path)
+        dprint(f"Set up transmit pins {transmit_pin_ids} ({type(transmit_pins).__name__})")
+    else:
+        dprint("[TEST MODE] - We would be setting up all transmit pins")
+        transmit_pins = GpiodOutputLines(transmit_pin_ids, chip=MockGpioChip())
+
+    if do_initialization_pulse:
+        skew_ns = transmit_pins.set(True)
+        time.sleep(init_pulse_len)
+        skew_ns = max(skew_ns, transmit_pins.set(False))
+        dprint(f'Transmit pin skew: {skew_ns / 1000:.1f}us' + (' (at most - set together)' if transmit_pins.bulk else ''))
+        time.sleep(init_delay)
+
+    return(transmit_pins)
+
+
+def gpio_setup_ready_pin(ready_pin_number: int):
+    """Sets up the ready line (primary): an input, with its pull-up enabled
+
+    Every secondary holds the line low until it's ready (a wired-AND), so it
+    only reads high once all of them are.
+    """
+    if TEST_MODE_FAKE_GPIO:
+        dprint("[TEST MODE] We would be setting up the GPIO ready pin.")
+        return None
+    dprint(f"Setting up pin {ready_pin_number} as the ready line input, with pull-up resistor enabled")
+    return DigitalInputDevice(pin=ready_pin_number, pull_up=True)
+
+def gpio_ready_line_hold(ready_pin_number: int):
+    """Holds the ready line low (secondary), until gpio_ready_line_release()"""
+    if TEST_MODE_FAKE_GPIO:
+        dprint("[TEST MODE] We would be holding the ready line low.")
+        return None
+    dprint(f"Holding the ready line (pin {ready_pin_number}) low until we're ready")
+    return DigitalOutputDevice(pin=ready_pin_number, initial_value=False)
+
+def gpio_ready_line_release(ready_line):
+    """Stops holding the ready line low
+
+    The pin goes back to being an input, rather than being driven high, so
+    it's safe to connect the secondaries' ready pins together.
+    """
+    dprint('Ready - releasing the ready line')
+    if ready_line is not None:
+        ready_line.close()
+
+def gpio_send_pin_high(transmit_pins) -> int:
+    """Sets the transmit pins high. Returns the skew between them (ns)"""
+    dprint(f"Setting transmit pins to HIGH/on")
+    if TEST_MODE_FAKE_GPIO:
+        dprint("[TEST MODE] We would be setting the GPIO pins high.")
+    return transmit_pins.set(True)
+
+
+def gpio_send_pin_low(transmit_pins) -> int:
+    """Sets the transmit pins low. Returns the skew between them (ns)"""
+    dprint(f"Setting transmit pins to LOW/off")
+    if TEST_MODE_FAKE_GPIO:
+        dprint("[TEST MODE] We would be setting the GPIO pins low.")
+    return transmit_pins.set(False)
+
+class GpioTransmitter:
+    """Signals the secondaries with the transmit pins (high = prepare, low = go)"""
+    # Pins act instantly, so "go" doesn't need to be sent ahead of time
+    go_lead_ns = 0
+
+    def __init__(self, transmit_pins, ready_pin=None, metrics=None):
+        """
+        Args:
+            transmit_pins (GpiodOutputLines | SequentialOutputLines): The
+                transmit pins (from gpio_setup_transmit_pins())
+            ready_pin (DigitalInputDevice, optional): The ready line, for
+                wait_for_ready() (from gpio_setup_ready_pin())
+            metrics (SyncMetrics, optional): Where to record the pin skew
+        """
+        self.transmit_pins = transmit_pins
+        self.ready_pin = ready_pin
+        self.metrics = metrics
+        self.max_skew_ns = 0
+
+    def record_skew(self, skew_ns: int):
+        if skew_ns > self.max_skew_ns:
+            self.max_skew_ns = skew_ns
+            ddebug('New maximum transmit pin skew: %.1fus', skew_ns / 1000)
+        if self.metrics:
+            self.metrics.observe('pin_skew_us', skew_ns / 1000)
+
+    def wait_for_ready(self, expected_nodes: list, timeout_sec: float) -> list:
+        """Waits until no secondary is holding the ready line low.
+
+        The line is shared, so there's no telling which secondaries aren't
+        ready - `expected_nodes` is only used for the report.
+
+        Returns:
+            list: What's missing (empty if everyone is ready)
+        """
+        if self.ready_pin is None:
+            dprint('[TEST MODE] We would be waiting for the ready line to go high')
+            return []
+        # Pulled up, so "active" = held low by a secondary
+        if self.ready_pin.wait_for_inactive(timeout=timeout_sec):
+            return []
+        return ['(ready line still held low by at least one secondary)']
+
+    def send_prepare(self, loop_index: int):
+        self.record_skew(gpio_send_pin_high(transmit_pins=self.transmit_pins))
+
+    def send_go(self, loop_index: int, go_ns: int):
+        clock.sleep_until_ns(go_ns)
+        self.record_skew(gpio_send_pin_low(transmit_pins=self.transmit_pins))
+
+    def close(self):
+        dprint(f'Maximum transmit pin skew: {self.max_skew_ns / 1000:.1f}us')
+        self.transmit_pins.close()
+
+# Pin protocol frames: a 4 bit command, 24 bit argument & 4 bit checksum
+PIN_FRAME_BITS = 32
+PIN_CMD_PREPARE = 1     # Pause & seek to the start (argument: loop index)
+PIN_CMD_GO = 2          # Resume, at the end of the frame (argument: loop index)
+PIN_CMD_POSITION = 3    # Primary is at `argument` ms, at the end of the frame
+PIN_CMD_SEEK = 4        # Seek to `argument` ms (eg, the start of a chapter), at the end of the frame
+PIN_CMD_SHUTDOWN = 5    # Stop playing & exit
+PIN_CMD_NAMES = {PIN_CMD_PREPARE: 'prepare', PIN_CMD_GO: 'go', PIN_CMD_POSITION: 'position',
+                 PIN_CMD_SEEK: 'seek', PIN_CMD_SHUTDOWN: 'shutdown'}
+
+# The longest a frame's pins stay put (the start pulse), in units - how long
+# a command can wait for a position frame to be cut off
+PIN_PREEMPT_UNITS = 4
+
+def pin_frame_checksum(command: int, argument: int) -> int:
+    return (command + sum((argument >> shift) & 0xF for shift in range(0, 24, 4))) & 0xF
+
+def pin_frame_encode(command: int, argument: int = 0) -> list:
+    """Returns the frame's bits (most significant first)"""
+    argument &= 0xFFFFFF
+    word = (command << 28) | (argument << 4) | pin_frame_checksum(command, argument)
+    return [(word >> (PIN_FRAME_BITS - 1 - i)) & 1 for i in range(PIN_FRAME_BITS)]
+
+def pin_frame_decode(bits: list) -> tuple:
+    """Returns (command, argument), or None if the checksum doesn't match"""
+    word = 0
+    for bit in bits:
+        word = (word << 1) | bit
+    command, argument, checksum = word >> 28, (word >> 4) & 0xFFFFFF, word & 0xF
+    if command == 0 or checksum != pin_frame_checksum(command, argument):
+        return None
+    return command, argument
+
+def pin_frame_edges(bits: list, mode: str, unit_ns: int, line_count: int) -> list:
+    """Returns a frame's waveform, as [(offset_ns, [value of each line]), ...]
+
+    Each frame starts with a 4 unit high pulse (on the clock line, in
+    "parallel" mode.) Then, in "serial" mode, each bit is a pulse on every
+    line - 1 unit high for a 0, 2 for a 1 - followed by 1 unit low. In
+    "parallel" mode, line 0 is a clock: each clock pulse (1 unit high, 1 low)
+    carries one bit on each of the other lines, set while the clock is low.
+
+    The last entry (a falling edge) is the end of the frame - which is when
+    the command takes effect.
+    """
+    edges = []
+    offset_ns = 0
+    if mode == 'serial':
+        edges.append((0, [True] * line_count))
+        offset_ns += 4 * unit_ns
+        for bit in bits:
+            edges.append((offset_ns, [False] * line_count))
+            offset_ns += unit_ns
+            edges.append((offset_ns, [True] * line_count))
+            offset_ns += (2 if bit else 1) * unit_ns
+        edges.append((offset_ns, [False] * line_count))
+        return edges
+
+    data_lines = line_count - 1
+    edges.append((0, [True] + ([False] * data_lines)))
+    offset_ns += 4 * unit_ns
+    for i in range(0, len(bits), data_lines):
+        data = [bool(bit) for bit in bits[i:i + data_lines]]
+        data += [False] * (data_lines - len(data))
+        edges.append((offset_ns, [False] + data))
+        offset_ns += unit_ns
+        edges.append((offset_ns, [True] + data))
+        offset_ns += unit_ns
+    edges.append((offset_ns, [False] * line_count))
+    return edges
+
+class GpioProtocolTransmitter(GpioTransmitter):
+    """Signals the secondaries with command frames on the transmit pins (see pin_frame_edges())
+
+    Stands in for GpioTransmitter. A "go" frame is started early (by up to
+    go_lead_ns), so that it ends at the go time. While playing, the primary's
+    position is sent every `position_interval_sec` (except near the end, so
+    the next prepare isn't held up - see clear_of_prepare().)
+
+    Position frames give way to every other command: one in progress is cut
+    off (its pins dropped low) at its next edge, which is at most
+    PIN_PREEMPT_UNITS away. go_lead_ns allows for that on top of the longest
+    frame, so a position frame never makes a go late.
+    """
+    def __init__(self, transmit_pins, mode: str = 'serial', bit_ms: float = PIN_BIT_MS_DEFAULT,
+                 ready_pin=None, metrics=None,
+                 position_interval_sec: float = POSITION_INTERVAL_SEC_DEFAULT,
+                 prepare_lead_ms: float = 0):
+        """
+        Args:
+            prepare_lead_ms (float): How long before the end of the media the
+                prepare is sent (PrimaryTiming = sleep.) With deadline timing,
+                set `schedule` to the primary's LoopSchedule instead
+        """
+        super().__init__(transmit_pins, ready_pin=ready_pin, metrics=metrics)
+        if mode == 'parallel' and len(transmit_pins.pins) < 2:
+            raise ValueError('PinProtocol = parallel needs at least 2 transmit pins (clock + data)')
+        self.mode = mode
+        self.unit_ns = int(bit_ms * 1_000_000)
+        self.line_count = len(transmit_pins.pins)
+        self.position_interval_sec = position_interval_sec
+        self.prepare_lead_ms = prepare_lead_ms
+        self.schedule = None
+        self.send_lock = threading.Lock()
+        # Set while a command is waiting for a position frame to get off the pins
+        self.preempt = threading.Event()
+        self.running = False
+        # The longest possible frame
+        self.frame_ns = pin_frame_edges([1] * PIN_FRAME_BITS, mode, self.unit_ns, self.line_count)[-1][0]
+        self.go_lead_ns = self.frame_ns + (PIN_PREEMPT_UNITS * self.unit_ns)
+
+    def send_command(self, command: int, argument: int = 0, end_ns: int = None, value_at_end=None) -> int:
+        """Sends a frame - ending at end_ns, or as soon as possible.
+
+        Position frames are cut off if another command wants the pins (see
+        the class docs.)
+
+        Args:
+            value_at_end (callable, optional): Called as value_at_end(end_ns)
+                just before sending, to get the argument (eg, the position then)
+
+        Returns:
+            int: When the frame ended (ns), or None if it was cut off
+        """
+        preemptible = command == PIN_CMD_POSITION
+        if not preemptible:
+            self.preempt.set()
+        with self.send_lock:
+            if not preemptible:
+                self.preempt.clear()
+            if value_at_end is not None:
+                # Frame lengths depend on the bits - estimate from the longest, then recalculate
+                end_ns = clock.now_ns() + self.frame_ns
+                argument = value_at_end(end_ns)
+            edges = pin_frame_edges(pin_frame_encode(command, argument), self.mode, self.unit_ns, self.line_count)
+            if end_ns is None:
+                end_ns = clock.now_ns() + edges[-1][0]
+            start_ns = end_ns - edges[-1][0]
+            for index, (offset_ns, values) in enumerate(edges):
+                if preemptible and self.preempt.is_set():
+                    if index > 0:
+                        self.transmit_pins.set_values([False] * self.line_count)
+                    ddebug('Cut off %s after %d of %d edges', PIN_CMD_NAMES[command], index, len(edges))
+                    return None
+                clock.sleep_until_ns(start_ns + offset_ns)
+                skew_ns = self.transmit_pins.set_values(values)
+            self.record_skew(skew_ns)
+        ddebug('Sent %s %s', PIN_CMD_NAMES.get(command, command), argument)
+        return end_ns
+
+    def send_prepare(self, loop_index: int):
+        self.send_command(PIN_CMD_PREPARE, loop_index)
+
+    def send_go(self, loop_index: int, go_ns: int):
+        self.send_command(PIN_CMD_GO, loop_index, end_ns=go_ns)
+
+    def send_seek(self, position_ms: int, end_ns: int = None) -> int:
+        return self.send_command(PIN_CMD_SEEK, position_ms, end_ns=end_ns)
+
+    def send_shutdown(self):
+        dprint('Sending shutdown command to the secondaries')
+        self.send_command(PIN_CMD_SHUTDOWN)
+
+    def start(self, player: Player, duration: int):
+        """Starts sending the primary's position while playing"""
+        if self.position_interval_sec <= 0:
+            return
+        self.duration = duration
+        self.running = True
+        threading.Thread(target=self._position_loop, args=(player,), daemon=True).start()
+
+    def clear_of_prepare(self, now_ns: int, position_ms: float) -> bool:
+        """Whether a frame started at now_ns (at position_ms) would be over before the next prepare is due"""
+        end_ns = now_ns + self.go_lead_ns
+        if self.schedule is not None:
+            # Prepares are sent pin_tx_ns before each loop's resume deadline
+            next_loop = -(-(now_ns + self.schedule.pin_tx_ns - self.schedule.start_ns) // self.schedule.period_ns)
+            return end_ns < self.schedule.rise_ns(next_loop)
+        return position_ms + (self.go_lead_ns / 1_000_000) < self.duration - self.prepare_lead_ms
+
+    def _position_loop(self, player: Player):
+        while self.running:
+            clock.sleep(self.position_interval_sec)
+            if player.state() != PLAYER_STATE_PLAYING:
+                continue
+            now_ns, position_ms = clock.now_ns(), player.position()
+            if not self.clear_of_prepare(now_ns, position_ms):
+                continue
+            self.send_command(PIN_CMD_POSITION, value_at_end=lambda end_ns: int(
+                position_ms + ((end_ns - now_ns) / 1_000_000)))
+
+    def close(self):
+        self.running = False
+        super().close()
+
+# UDP sync packets: magic, version, type, (reserved), sequence number, loop
+# index, sender's monotonic time (ns), event time (ns, sender's clock), value
+# - optionally followed by a short payload (eg, the node name in "ready")
+SYNC_PACKET_FORMAT = '!4sBBHIIqqq'
+SYNC_PACKET_SIZE = struct.calcsize(SYNC_PACKET_FORMAT)
+SYNC_PACKET_MAX_SIZE = SYNC_PACKET_SIZE + 64
+SYNC_PACKET_MAGIC = b'PGSP'
+SYNC_PACKET_VERSION = 1
+
+SYNC_MSG_PREPARE = 1    # Pause & seek to the start (event_ns: when sent)
+SYNC_MSG_GO = 2         # Resume playback at event_ns
+SYNC_MSG_POSITION = 3   # Primary was at `value` ms, at event_ns
+SYNC_MSG_PING = 4       # Clock sync request (sent_ns: requester's send time)
+SYNC_MSG_PONG = 5       # Reply (event_ns: echoed ping sent_ns, value: receive time)
+SYNC_MSG_READY = 6      # Secondary loaded & paused at the start (payload: node name)
+SYNC_MSG_HEALTH = 7     # Secondary is dropping frames (value: % lost x 100, event_ns:
+                        # decode ratio x 10,000, payload: node name)
+
+SyncPacket = namedtuple('SyncPacket', ['msg_type', 'seq', 'loop_index', 'sent_ns', 'event_ns', 'value', 'payload'],
+                        defaults=(b'',))
+
+def sync_packet_pack(msg_type: int, seq: int, loop_index: int = 0,
+                     sent_ns: int = 0, event_ns: int = 0, value: int = 0,
+                     payload: bytes = b'') -> bytes:
+    return struct.pack(SYNC_PACKET_FORMAT, SYNC_PACKET_MAGIC, SYNC_PACKET_VERSION,
+                       msg_type, 0, seq & 0xFFFFFFFF, loop_index & 0xFFFFFFFF,
+                       sent_ns, event_ns, value) + payload[:SYNC_PACKET_MAX_SIZE - SYNC_PACKET_SIZE]
+
+def sync_packet_unpack(data: bytes) -> SyncPacket:
+    """Decodes a sync packet. Returns None if it isn't one of ours."""
+    if not SYNC_PACKET_SIZE <= len(data) <= SYNC_PACKET_MAX_SIZE:
+        return None
+    magic, version, msg_type, _, seq, loop_index, sent_ns, event_ns, value = struct.unpack(
+        SYNC_PACKET_FORMAT, data[:SYNC_PACKET_SIZE])
+    if magic != SYNC_PACKET_MAGIC or version != SYNC_PACKET_VERSION:
+        return None
+    return SyncPacket(msg_type, seq, loop_index, sent_ns, event_ns, value, data[SYNC_PACKET_SIZE:])
+
+def ready_barrier_report(expected_nodes: list, ready_nodes: set) -> list:
+    """Returns which of expected_nodes aren't ready yet.
+
+    expected_nodes is a list of node names - or a single number (how many
+    secondaries there are), in which case placeholders stand in for the
+    missing ones.
+    """
+    if len(expected_nodes) == 1 and str(expected_nodes[0]).isdigit():
+        missing_count = int(expected_nodes[0]) - len(ready_nodes)
+        return [f'(unnamed node {i + 1})' for i in range(max(0, missing_count))]
+    return [node for node in expected_nodes if node not in ready_nodes]
+
+class ClockOffsetEstimator:
+    """Estimates the offset between our monotonic clock and the primary's.
+
+    NTP-style: each sample is a round trip - we send at t0, the primary
+    receives at t1 and replies at t2, and we receive the reply at t3. The
+    sample with the smallest round-trip delay (of the last `window`) is the
+    one least disturbed by network queuing, so its offset is used.
+    """
+    def __init__(self, window: int = 16):
+        self.samples = deque(maxlen=window)
+
+    def add_sample(self, t0: int, t1: int, t2: int, t3: int):
+        delay_ns = (t3 - t0) - (t2 - t1)
+        offset_ns = ((t1 - t0) + (t2 - t3)) // 2
+        self.samples.append((delay_ns, offset_ns))
+
+    @property
+    def offset_ns(self) -> int:
+        """Primary clock minus our clock (ns), or None if not yet measured."""
+        if not self.samples:
+            return None
+        return min(self.samples)[1]
+
+    @property
+    def delay_ns(self) -> int:
+        if not self.samples:
+            return None
+        return min(self.samples)[0]
+
+def net_multicast_send_socket(interface: str, ttl: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+    # Loopback on, so a primary & secondaries can all run on one machine
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+    if interface != '0.0.0.0':
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+    return sock
+
+def net_multicast_receive_socket(group: str, port: int, interface: str) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, 'SO_REUSEPORT'):
+        # Allows several secondaries on one machine (for testing)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(('', port))
+    membership = struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton(interface))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    return sock
+
+class UdpSyncPrimary:
+    """Signals the secondaries with multicast UDP packets.
+
+    Sends "prepare" and "go" packets (the equivalent of the transmit pins
+    going high and low), plus periodic "position" packets while playing, and
+    answers clock sync requests from the secondaries on port + 1 (where
+    "ready" & decode health warnings arrive too.)
+    """
+    def __init__(self, group: str, port: int, interface: str = '0.0.0.0', ttl: int = 1,
+                 go_lead_ms: float = GO_LEAD_MS_DEFAULT,
+                 position_interval_sec: float = POSITION_INTERVAL_SEC_DEFAULT):
+        self.address = (group, port)
+        self.membership = struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton(interface))
+        self.go_lead_ns = int(go_lead_ms * 1_000_000)
+        self.position_interval_sec = position_interval_sec
+        self.seq = 0
+        self.loop_index = 0
+        self.running = False
+        self.send_lock = threading.Lock()
+        self.sock = net_multicast_send_socket(interface=interface, ttl=ttl)
+        self.control_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.control_sock.bind(('', port + 1))
+        # Secondaries multicast "ready" to port + 1, before they know our address
+        self.control_sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, self.membership)
+        self.control_sock.settimeout(1)
+        self.ready_nodes = {}
+        self.health_reports = {}
+
+    def start(self, player: Player):
+        dprint(f'Sending sync packets to {self.address[0]}:{self.address[1]}')
+        self.running = True
+        threading.Thread(target=self._control_loop, daemon=True).start()
+        if self.position_interval_sec > 0:
+            threading.Thread(target=self._position_loop, args=(player,), daemon=True).start()
+
+    def close(self):
+        """Stops the threads, leaves the multicast group & frees both ports"""
+        self.running = False
+        try:
+            self.control_sock.setsockopt(socket.IPPROTO_IP, socket.IP_DROP_MEMBERSHIP, self.membership)
+        except OSError:
+            pass
+        self.control_sock.close()
+        with self.send_lock:
+            self.sock.close()
+
+    def send(self, msg_type: int, event_ns: int = 0, value: int = 0):
+        with self.send_lock:
+            if self.sock.fileno() == -1:
+                # Closed (the position thread can get here after close())
+                return
+            self.seq += 1
+            packet = sync_packet_pack(msg_type=msg_type, seq=self.seq, loop_index=self.loop_index,
+                                      sent_ns=clock.now_ns(), event_ns=event_ns, value=value)
+            self.sock.sendto(packet, self.address)
+
+    def send_prepare(self, loop_index: int):
+        dprint(f'Sending "prepare" (loop {loop_index})')
+        self.loop_index = loop_index
+        self.send(SYNC_MSG_PREPARE, event_ns=clock.now_ns())
+
+    def send_go(self, loop_index: int, go_ns: int):
+        """Sends "go" for `go_ns` (which should be go_lead_ns ahead), then waits for it."""
+        self.send(SYNC_MSG_GO, event_ns=go_ns)
+        clock.sleep_until_ns(go_ns)
+
+    def _control_loop(self):
+        while self.running:
+            try:
+                data, address = self.control_sock.recvfrom(SYNC_PACKET_MAX_SIZE)
+            except socket.timeout:
+                continue
+            except OSError:
+                # Closed
+                return
+            received_ns = clock.now_ns()
+            packet = sync_packet_unpack(data)
+            if packet and packet.msg_type == SYNC_MSG_READY:
+                node_name = packet.payload.decode('utf-8', errors='replace') or address[0]
+                if node_name not in self.ready_nodes:
+                    dprint(f'Secondary {node_name} ({address[0]}) is ready')
+                self.ready_nodes[node_name] = received_ns
+            elif packet and packet.msg_type == SYNC_MSG_HEALTH:
+                node_name = packet.payload.decode('utf-8', errors='replace') or address[0]
+                loss_pct, decode_ratio = packet.value / 100, packet.event_ns / 10_000
+                dwarn(f'Secondary {node_name} ({address[0]}) is dropping frames: {loss_pct:.1f}% lost, '
+                      f'decoding at {decode_ratio:.2f}x the frame rate')
+                self.health_reports[node_name] = (received_ns, loss_pct, decode_ratio)
+            elif packet and packet.msg_type == SYNC_MSG_PING:
+                reply = sync_packet_pack(msg_type=SYNC_MSG_PONG, seq=packet.seq,
+                                         sent_ns=clock.now_ns(), event_ns=packet.sent_ns,
+                                         value=received_ns)
+                try:
+                    self.control_sock.sendto(reply, address)
+                except OSError:
+                    return
+
+    def wait_for_ready(self, expected_nodes: list, timeout_sec: float, poll_sec: float = 0.01) -> list:
+        """Waits until every expected secondary has sent "ready".
+
+        Returns:
+            list: The nodes that weren't ready in time (empty if everyone is)
+        """
+        if not expected_nodes:
+            dwarn('ReadyBarrier needs ExpectedNodes with the udp transport - not waiting')
+            return []
+        deadline_ns = clock.now_ns() + int(timeout_sec * 1_000_000_000)
+        while True:
+            missing = ready_barrier_report(expected_nodes, set(self.ready_nodes))
+            if not missing or clock.now_ns() > deadline_ns:
+                return missing
+            clock.sleep(poll_sec)
+
+    def _position_loop(self, player: Player):
+        while self.running:
+            clock.sleep(self.position_interval_sec)
+            if player.state() == PLAYER_STATE_PLAYING:
+                position_ms = player.position()
+                self.send(SYNC_MSG_POSITION, event_ns=clock.now_ns(), value=position_ms)
+
+class SyncHealthReporter:
+    """Tells the primary (UdpSyncPrimary - so with the udp transport, or hot-join beacons) that we're dropping frames
+
+    One socket, opened on the first report & kept for the rest.
+    """
+    def __init__(self, node_name: str, group: str, port: int,
+                 interface: str = '0.0.0.0', ttl: int = MULTICAST_TTL_DEFAULT):
+        self.node_name = node_name
+        self.address = (group, port + 1)
+        self.interface = interface
+        self.ttl = ttl
+        self.sock = None
+        self.seq = 0
+
+    def send(self, loss_pct: float, decode_ratio: float):
+        if self.sock is None:
+            self.sock = net_multicast_send_socket(interface=self.interface, ttl=self.ttl)
+        self.seq += 1
+        packet = sync_packet_pack(msg_type=SYNC_MSG_HEALTH, seq=self.seq, sent_ns=clock.now_ns(),
+                                  event_ns=int(decode_ratio * 10_000), value=int(loss_pct * 100),
+                                  payload=self.node_name.encode('utf-8'))
+        self.sock.sendto(packet, self.address)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+class UdpSyncSecondary:
+    """Receives the primary's multicast sync packets, and acts on them.
+
+    Packet times are converted from the primary's clock to ours, using the
+    offset measured by round trips to the primary (ClockOffsetEstimator.)
+    Until the first measurement, the primary's lead time from each packet
+    is applied to its arrival time instead (ie, network latency is ignored.)
+    Each "go" is handed to a thread of its own to wait for, so packets keep
+    being received in the meantime.
+    """
+    def __init__(self, group: str, port: int, interface: str = '0.0.0.0',
+                 on_prepare=None, on_go=None, on_position=None,
+                 clock_sync_interval_sec: float = CLOCK_SYNC_INTERVAL_SEC_DEFAULT,
+                 ttl: int = MULTICAST_TTL_DEFAULT):
+        """
+        Args:
+            group (str): Multicast group address
+            port (int): Multicast port (port + 1 is used for clock sync requests
+                & "ready" messages)
+            interface (str): Local interface address to receive on
+            on_prepare (callable): Called as on_prepare(loop_index)
+            on_go (callable): Called as on_go(loop_index, go_ns) - at go_ns (our clock)
+            on_position (callable): Called as on_position(position_ms, at_ns) (our clock)
+            clock_sync_interval_sec (float): How often to measure the clock offset
+            ttl (int): Multicast TTL, for "ready" messages
+        """
+        self.group = group
+        self.interface = interface
+        self.ttl = ttl
+        self.prepared = threading.Event()
+        self.port = port
+        self.on_prepare = on_prepare
+        self.on_go = on_go
+        self.on_position = on_position
+        self.clock_sync_interval_sec = clock_sync_interval_sec
+        self.offset = ClockOffsetEstimator()
+        self.primary_host = None
+        self.last_seq = None
+        self.pending_gos = deque()
+        self.go_ready = threading.Condition()
+        self.running = False
+        self.sock = net_multicast_receive_socket(group=group, port=port, interface=interface)
+        self.sock.settimeout(1)
+        self.ping_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.ping_sock.settimeout(0.5)
+        self.ping_seq = 0
+
+    def start(self):
+        dprint(f'Listening for sync packets on port {self.port}')
+        self.running = True
+        threading.Thread(target=self._receive_loop, daemon=True).start()
+        threading.Thread(target=self._clock_sync_loop, daemon=True).start()
+        if self.on_go:
+            threading.Thread(target=self._go_loop, daemon=True).start()
+
+    def close(self):
+        self.running = False
+        self.prepared.set()
+        with self.go_ready:
+            self.go_ready.notify()
+
+    def announce_ready(self, node_name: str, interval_sec: float = 0.5):
+        """Sends "ready" every interval_sec (in a thread), until the first "prepare" arrives."""
+        def announce_loop():
+            sock = net_multicast_send_socket(interface=self.interface, ttl=self.ttl)
+            seq = 0
+            while not self.prepared.is_set():
+                seq += 1
+                packet = sync_packet_pack(msg_type=SYNC_MSG_READY, seq=seq, sent_ns=clock.now_ns(),
+                                          payload=node_name.encode('utf-8'))
+                sock.sendto(packet, (self.group, self.port + 1))
+                self.prepared.wait(timeout=interval_sec)
+            sock.close()
+
+        dprint(f'Ready - announcing as {node_name}')
+        threading.Thread(target=announce_loop, daemon=True).start()
+
+    def to_local_ns(self, packet: SyncPacket, received_ns: int) -> int:
+        """Converts the packet's event time to our clock."""
+        offset_ns = self.offset.offset_ns
+        if offset_ns is None:
+            return received_ns + (packet.event_ns - packet.sent_ns)
+        return packet.event_ns - offset_ns
+
+    def _receive_loop(self):
+        while self.running:
+            try:
+                data, (host, _) = self.sock.recvfrom(SYNC_PACKET_MAX_SIZE)
+            except socket.timeout:
+                continue
+            received_ns = clock.now_ns()
+            packet = sync_packet_unpack(data)
+            if packet is None:
+                continue
+
+            # Ignore duplicates / stale packets (but accept a restarted primary)
+            if self.last_seq is not None and self.last_seq - 1000 < packet.seq <= self.last_seq:
+                continue
+            self.last_seq = packet.seq
+            self.primary_host = host
+
+            if packet.msg_type == SYNC_MSG_PREPARE:
+                self.prepared.set()
+                if self.on_prepare:
+                    self.on_prepare(packet.loop_index)
+            elif packet.msg_type == SYNC_MSG_GO and self.on_go:
+                with self.go_ready:
+                    self.pending_gos.append((packet.loop_index, self.to_local_ns(packet, received_ns)))
+                    self.go_ready.notify()
+            elif packet.msg_type == SYNC_MSG_POSITION and self.on_position:
+                self.on_position(packet.value, self.to_local_ns(packet, received_ns))
+
+    def _go_loop(self):
+        """Calls on_go for each "go" received, at its time (our clock)"""
+        while True:
+            with self.go_ready:
+                while self.running and not self.pending_gos:
+                    self.go_ready.wait()
+                if not self.running:
+                    return
+                loop_index, go_ns = self.pending_gos.popleft()
+            clock.sleep_until_ns(go_ns)
+            self.on_go(loop_index, go_ns)
+
+    def _clock_sync_loop(self):
+        # A burst of quick samples to start with, then one every interval
+        quick_samples = 8
+        while self.running:
+            if self.primary_host is None:
+                clock.sleep(0.1)
+                continue
+            self.ping_seq += 1
+            t0 = clock.now_ns()
+            ping = sync_packet_pack(msg_type=SYNC_MSG_PING, seq=self.ping_seq, sent_ns=t0)
+            self.ping_sock.sendto(ping, (self.primary_host, self.port + 1))
+            try:
+                data = self.ping_sock.recv(SYNC_PACKET_MAX_SIZE)
+                t3 = clock.now_ns()
+                pong = sync_packet_unpack(data)
+                if pong and pong.msg_type == SYNC_MSG_PONG and pong.event_ns == t0:
+                    self.offset.add_sample(t0=t0, t1=pong.value, t2=pong.sent_ns, t3=t3)
+            except socket.timeout:
+                dprint('No clock sync reply from the primary')
+
+            if quick_samples > 0:
+                quick_samples -= 1
+                clock.sleep(0.1)
+            else:
+                clock.sleep(self.clock_sync_interval_sec)
+
+def primary_restart_at_deadlines(player: Player, transmitter,
+                                 schedule: LoopSchedule, loop_index: int,
+                                 metrics: SyncMetrics = None):
+    """Signals prepare, restarts, then signals go & resumes, at the loop's deadlines.
+
+    Sleeps until the "prepare" (pin rise) deadline of loop `loop_index` (ie,
+    the end of the previous loop), so no separate wait for the end of the
+    video is needed.
+
+    Args:
+        player (Player): The media player.
+        transmitter (GpioTransmitter | UdpSyncPrimary): How to signal the secondaries
+        schedule (LoopSchedule): The primary's loop schedule
+        loop_index (int): Which loop (0 = first) to start
+        metrics (SyncMetrics, optional): Where to record stage timings
+    """
+    rise_deadline_ns = schedule.rise_ns(loop_index)
+    rise_late_ns = clock.sleep_until_ns(rise_deadline_ns)
+    transmitter.send_prepare(loop_index)
+    trace_event(TRACE_PREPARE)
+    if metrics:
+        metrics.mark('prepare')
+    playlist_prepare(loop_index)
+    player_prepare_to_restart(player=player, metrics=metrics)
+
+    # If we're badly behind (stalled?), shift the schedule along rather than
+    # giving the secondaries too little time to restart
+    if rise_late_ns > schedule.pin_tx_ns // 2:
+        dprint('Prepare was %.1fms late, rescheduling from now', rise_late_ns / 1_000_000)
+        schedule.rebase(loop_index, rise_deadline_ns + rise_late_ns + schedule.pin_tx_ns)
+
+    resume_deadline_ns = schedule.resume_ns(loop_index)
+    clock.sleep_until_ns(resume_deadline_ns - transmitter.go_lead_ns)
+    transmitter.send_go(loop_index, go_ns=resume_deadline_ns)
+    resume_late_ns = clock.now_ns() - resume_deadline_ns
+    trace_event(TRACE_GO, t_ns=resume_deadline_ns)
+    if metrics:
+        metrics.mark('go')
+    player_resume(player=player, metrics=metrics)
+
+    dprint('Loop %s: prepare sent %.0fus late, go sent/resumed %.0fus late',
+           loop_index, rise_late_ns / 1000, resume_late_ns / 1000)
+
+def primary_restart_after_sleep(player: Player, transmitter, loop_index: int,
+                                pin_tx_sec: float, metrics: SyncMetrics = None):
+    """Signals prepare & restarts, waits pin_tx_sec, then signals go & resumes.
+
+    Args:
+        player (Player): The media player.
+        transmitter (GpioTransmitter | UdpSyncPrimary): How to signal the secondaries
+        loop_index (int): Which loop (0 = first) to start
+        pin_tx_sec (float): How long to wait between prepare & go
+        metrics (SyncMetrics, optional): Where to record stage timings
+    """
+    # Pins to high (or "prepare" packet) - 2nd trigger
+    transmitter.send_prepare(loop_index)
+    trace_event(TRACE_PREPARE)
+    if metrics:
+        metrics.mark('prepare')
+    playlist_prepare(loop_index)
+    player_prepare_to_restart(player=player, metrics=metrics)
+
+    # Wait, then pins to low (or "go" packet)
+    dprint(f'Waiting {pin_tx_sec} seconds, then setting pins low / sending go')
+    clock.sleep(pin_tx_sec)
+    go_ns = clock.now_ns() + transmitter.go_lead_ns
+    transmitter.send_go(loop_index, go_ns=go_ns)
+    trace_event(TRACE_GO, t_ns=go_ns)
+    if metrics:
+        metrics.mark('go')
+    player_resume(player=player, metrics=metrics)
+
+def primary_seek_to_next_chapter(player: Player, transmitter: 'GpioProtocolTransmitter', chapters_ms: list):
+    """Seeks the primary & its secondaries to the next chapter (after the last, back to the first)
+
+    The seek frame is sent first, & the primary seeks as it ends - which is
+    when the secondaries take the seek to have happened. Ignored while
+    paused, or if the frame would hold up the next prepare.
+
+    Args:
+        player (Player): The media player.
+        transmitter (GpioProtocolTransmitter): How to signal the secondaries
+        chapters_ms (list): The chapter start times (ms), in order
+    """
+    now_ns, position_ms = clock.now_ns(), player.position()
+    if player.state() != PLAYER_STATE_PLAYING:
+        dwarn('Chapter seek ignored - not playing')
+        return
+    if not transmitter.clear_of_prepare(now_ns, position_ms):
+        dwarn('Chapter seek ignored - too close to the end of the loop')
+        return
+    target_ms = next((chapter_ms for chapter_ms in chapters_ms if chapter_ms > position_ms), chapters_ms[0])
+    dprint(f'Seeking to the chapter at {target_ms}ms (from {position_ms}ms)')
+    end_ns = transmitter.send_seek(target_ms)
+    player.seek(int(target_ms + ((clock.now_ns() - end_ns) / 1_000_000)))
+
+def secondary_on_prepare(player: Player, drift: DriftController = None,
+                         metrics: SyncMetrics = None, prepare_ns: int = None, loop_index: int = None,
+                         rejoin: 'SecondaryRejoin' = None, compensator: 'EdgeCompensator' = None):
+    trace_event(TRACE_PREPARE, t_ns=prepare_ns)
+    if metrics:
+        metrics.mark('prepare', prepare_ns)
+    if rejoin:
+        rejoin.on_prepare()
+    playlist_prepare(loop_index)
+    if drift:
+        drift.reset(player=player)
+    if compensator:
+        compensator.cancel_catch_up(player=player)
+    player_prepare_to_restart(player=player, metrics=metrics)
+
+class EdgeCompensator:
+    """Makes up for acting late on a "go".
+
+    go_ns is when the primary resumed (eg, the kernel's timestamp of the
+    listen pin's falling edge) - by the time we resume, the primary is
+    already that far into the media. If we're at least `min_ms` late:
+
+    - "seek": resume `lateness + seek_latency_ms` into the media, rather than at 0
+    - "rate": resume at 0, but play `max_rate_adjust` faster until we've
+      caught up. (With drift correction, this is left to the drift controller,
+      which is given go_ns as its reference.) The catch-up is called off by
+      anything that moves the player - a prepare, a seek or a hot-join (see
+      cancel_catch_up().)
+    """
+    def __init__(self, mode: str = EDGE_COMPENSATION_DEFAULT, min_ms: float = EDGE_COMPENSATION_MIN_MS_DEFAULT,
+                 max_rate_adjust: float = DRIFT_MAX_RATE_ADJUST_DEFAULT, seek_latency_ms: float = 0):
+        self.mode = mode
+        self.min_ms = min_ms
+        self.max_rate_adjust = max_rate_adjust
+        self.seek_latency_ms = seek_latency_ms
+        self.rate_timer = None
+
+    def resume(self, player: Player, go_ns: int, drift: DriftController = None,
+               metrics: SyncMetrics = None) -> float:
+        """Resumes the player, compensating for how late we are.
+
+        Returns:
+            float: How late (ms) we were, when we came to resume
+        """
+        late_ms = (clock.now_ns() - go_ns) / 1_000_000
+        if self.mode == 'seek' and late_ms >= self.min_ms:
+            target_ms = int(late_ms + self.seek_latency_ms)
+            dprint('Resuming %.1fms after go - seeking to %sms to catch up', late_ms, target_ms)
+            player.seek(target_ms)
+            player_resume(player=player, metrics=metrics)
+        elif self.mode == 'rate' and late_ms >= self.min_ms and drift is None and self.max_rate_adjust > 0:
+            player_resume(player=player, metrics=metrics)
+            catch_up_sec = (late_ms / 1000) / self.max_rate_adjust
+            dprint('Resuming %.1fms after go - playing at %.3fx for %.2fs to catch up',
+                   late_ms, 1 + self.max_rate_adjust, catch_up_sec)
+            if self.rate_timer:
+                self.rate_timer.cancel()
+            player.set_rate(1 + self.max_rate_adjust)
+            self.rate_timer = threading.Timer(catch_up_sec, self._caught_up, args=(player,))
+            self.rate_timer.daemon = True
+            self.rate_timer.start()
+        else:
+            player_resume(player=player, metrics=metrics)
+        return late_ms
+
+    def _caught_up(self, player: Player):
+        self.rate_timer = None
+        player.set_rate(1.0)
+
+    def cancel_catch_up(self, player: Player):
+        """Stops a rate-mode catch-up early (& restores normal speed) - the player's been moved, so it no longer applies"""
+        rate_timer, self.rate_timer = self.rate_timer, None
+        if rate_timer:
+            rate_timer.cancel()
+            ddebug('Catch-up cancelled')
+            player.set_rate(1.0)
+
+def secondary_on_go(player: Player, go_ns: int, drift: DriftController = None,
+                    metrics: SyncMetrics = None, compensator: EdgeCompensator = None,
+                    rejoin: 'SecondaryRejoin' = None):
+    trace_event(TRACE_GO, t_ns=go_ns)
+    if metrics:
+        metrics.mark('go', go_ns)
+    if compensator:
+        compensator.resume(player=player, go_ns=go_ns, drift=drift, metrics=metrics)
+    else:
+        player_resume(player=player, metrics=metrics)
+    if drift:
+        # The primary resumed from 0 at go_ns
+        drift.set_reference(position_ms=0, at_ns=go_ns)
+    if rejoin:
+        rejoin.on_go()
+    loop_housekeeping_schedule()
+
+class SecondaryRejoin:
+    """Rejoins the primary mid-loop, using its position beacons.
+
+    A secondary that starts (or whose player restarts) mid-loop would
+    otherwise sit paused until the next loop starts - which may be minutes
+    away. Instead, on each beacon, if the player isn't playing (or is more
+    than `threshold_ms` out from the primary), it's seeked to where the
+    primary will be once the seek is done, and resumed.
+
+    The seek latency starts as a guess, and is refined from the error
+    measured at the next beacon after each rejoin.
+
+    Beacons between a "prepare" & its "go" are ignored - the player is
+    paused at 0 on purpose (& a beacon sent before the primary restarted
+    may arrive after the prepare.)
+    """
+    def __init__(self, duration: int, threshold_ms: float = 1000,
+                 seek_latency_ms: float = 100, end_margin_ms: float = 1000,
+                 compensator: EdgeCompensator = None):
+        """
+        Args:
+            duration (int): The total duration of the media file in ms
+            threshold_ms (float): Errors larger than this (while playing) are fixed with a seek
+            seek_latency_ms (float): Initial estimate of how long a seek (& resume) takes
+            end_margin_ms (float): Don't rejoin this close to the end - the
+                next loop start will pick us up anyway
+            compensator (EdgeCompensator, optional): Its catch-up is
+                cancelled when we seek
+        """
+        self.duration = duration
+        self.compensator = compensator
+        self.threshold_ms = threshold_ms
+        self.seek_latency_ms = seek_latency_ms
+        self.end_margin_ms = end_margin_ms
+        self.rejoin_pending = False
+        self.rejoin_count = 0
+        self.resync_pending = False
+        self.prepared = False
+
+    def on_prepare(self):
+        """The player has been paused at 0, to wait for a go"""
+        self.prepared = True
+        self.rejoin_pending = False
+
+    def on_go(self):
+        self.prepared = False
+
+    def request_resync(self):
+        """Re-seeks at the next beacon, if we're out at all (eg, after dropping frames)"""
+        self.resync_pending = True
+
+    def on_position(self, player: Player, position_ms: float, at_ns: int):
+        """Checks the player against a beacon: the primary was at `position_ms` at `at_ns` (our clock).
+
+        Returns:
+            float: The error in ms (positive = player is behind), or None if
+                   the player wasn't playing, it's too close to the end, or
+                   we're waiting for a "go"
+        """
+        if self.prepared:
+            return None
+        primary_ms = position_ms + ((clock.now_ns() - at_ns) / 1_000_000)
+        if primary_ms >= self.duration - self.end_margin_ms:
+            self.rejoin_pending = False
+            return None
+
+        state = player.state()
+        error_ms = None
+        if state == PLAYER_STATE_PLAYING:
+            error_ms = primary_ms - player.position()
+            if self.rejoin_pending:
+                # Whatever error is left after a rejoin is (mostly) seek latency we didn't allow for
+                self.rejoin_pending = False
+                self.seek_latency_ms = max(0.0, min(self.threshold_ms, self.seek_latency_ms + (error_ms / 2)))
+                dprint(f'Rejoined {error_ms:+.0f}ms from the primary, seek latency estimate now {self.seek_latency_ms:.0f}ms')
+            # On a resync request, any error over about what a seek can fix is worth seeking for
+            resync, self.resync_pending = self.resync_pending, False
+            if abs(error_ms) <= (self.seek_latency_ms / 2 if resync else self.threshold_ms):
+                return error_ms
+
+        target_ms = int(primary_ms + self.seek_latency_ms)
+        if state == PLAYER_STATE_PLAYING:
+            dwarn(f'{error_ms:+.0f}ms out from the primary, seeking to {target_ms}ms')
+        else:
+            dwarn(f'Hot-joining: primary is at {primary_ms:.0f}ms, seeking to {target_ms}ms & resuming (player was {state})')
+        if self.compensator:
+            self.compensator.cancel_catch_up(player=player)
+        player.seek(target_ms)
+        if state != PLAYER_STATE_PLAYING:
+            player_resume(player=player)
+        self.rejoin_pending = True
+        self.rejoin_count += 1
+        return error_ms
+
+def secondary_on_position(player: Player, position_ms: float, at_ns: int,
+                          drift: DriftController = None, rejoin: SecondaryRejoin = None):
+    if drift:
+        drift.set_reference(position_ms=position_ms, at_ns=at_ns)
+    if rejoin:
+        rejoin.on_position(player=player, position_ms=position_ms, at_ns=at_ns)
+
+def listen_pin_activate(player: Player, drift: DriftController = None,
+                        metrics: SyncMetrics = None, edge_ns: int = None, rejoin: SecondaryRejoin = None,
+                        compensator: EdgeCompensator = None):
+    if edge_ns is None:
+        edge_ns = clock.now_ns()
+    dprint('Listen pin activated! (rising edge)')
+    trace_event(TRACE_EDGE_RISING, value=clock.now_ns() - edge_ns, t_ns=edge_ns)
+    secondary_on_prepare(player=player, drift=drift, metrics=metrics, prepare_ns=edge_ns, rejoin=rejoin,
+                         compensator=compensator)
+
+def listen_pin_deactivate(player: Player, drift: DriftController = None,
+                          metrics: SyncMetrics = None, edge_ns: int = None,
+                          compensator: EdgeCompensator = None, rejoin: SecondaryRejoin = None):
+    if edge_ns is None:
+        edge_ns = clock.now_ns()
+    dprint('Listen pin deactivated! (falling edge)')
+    trace_event(TRACE_EDGE_FALLING, value=clock.now_ns() - edge_ns, t_ns=edge_ns)
+    secondary_on_go(player=player, go_ns=edge_ns, drift=drift, metrics=metrics, compensator=compensator,
+                    rejoin=rejoin)
+
+def listen_pin_handlers(player: Player, drift: DriftController = None, metrics: SyncMetrics = None,
+                        executor: PlayerExecutor = None, compensator: EdgeCompensator = None,
+                        rejoin: SecondaryRejoin = None) -> tuple:
+    """Returns (on_rising(edge_ns), on_falling(edge_ns)) - which restart the player on the listen pin's edges
+
+    With an executor, each edge is queued, rather than acted on in the
+    calling (callback) thread.
+    """
+    def on_rising(edge_ns: int):
+        listen_pin_activate(player=player, drift=drift, metrics=metrics, edge_ns=edge_ns, rejoin=rejoin,
+                            compensator=compensator)
+
+    def on_falling(edge_ns: int):
+        listen_pin_deactivate(player=player, drift=drift, metrics=metrics, edge_ns=edge_ns,
+                              compensator=compensator, rejoin=rejoin)
+
+    if not executor:
+        return on_rising, on_falling
+    return (lambda edge_ns: executor.submit_edge('prepare', lambda: on_rising(edge_ns), issued_ns=edge_ns),
+            lambda edge_ns: executor.submit_edge('go', lambda: on_falling(edge_ns), issued_ns=edge_ns))
+
+def listen_pin_attach(listen_pin, player: Player,
+                      drift: DriftController = None, metrics: SyncMetrics = None,
+                      executor: PlayerExecutor = None, compensator: EdgeCompensator = None,
+                      rejoin: SecondaryRejoin = None):
+    """Restarts the player on the listen pin's edges (DigitalInputDevice, or a VirtualInputPin)
+
+    Edges are timed when the callback runs.
+    """
+    on_rising, on_falling = listen_pin_handlers(player=player, drift=drift, metrics=metrics,
+                                                executor=executor, compensator=compensator, rejoin=rejoin)
+    listen_pin.when_activated = lambda : on_rising(clock.now_ns())
+    listen_pin.when_deactivated = lambda : on_falling(clock.now_ns())
+
+class GpiodEdgeSource:
+    """Edge events from one input line, timestamped by the kernel (libgpiod v2)
+
+    Timestamps are from the monotonic clock - the same as ours.
+    """
+    def __init__(self, pin: int, chip_path: str = GPIO_CHIP_DEFAULT, debounce_ms: float = 20,
+                 data_pins: list = ()):
+        """
+        Args:
+            pin (int): The line to watch for edges
+            chip_path (str): The gpiod chip the lines are on
+            debounce_ms (float): Ignore edges closer together than this
+            data_pins (list): Lines to read along with each batch of edges
+                (ie, data lines, for the pin protocol)
+        """
+        settings = gpiod.LineSettings(direction=gpiod.line.Direction.INPUT,
+                                      edge_detection=gpiod.line.Edge.BOTH,
+                                      bias=gpiod.line.Bias.PULL_DOWN,
+                                      debounce_period=timedelta(milliseconds=debounce_ms),
+                                      event_clock=gpiod.line.Clock.MONOTONIC)
+        self.request = gpiod.request_lines(chip_path, consumer=script_name, config={pin: settings})
+        self.data_request = None
+        if data_pins:
+            data_settings = gpiod.LineSettings(direction=gpiod.line.Direction.INPUT,
+                                               bias=gpiod.line.Bias.PULL_DOWN)
+            self.data_request = gpiod.request_lines(chip_path, consumer=script_name,
+                                                    config={tuple(data_pins): data_settings})
+
+    def read(self, timeout_sec: float) -> list:
+        """Waits up to timeout_sec for edges. Returns [(rising, timestamp_ns, data), ...]"""
+        if not self.request.wait_edge_events(timedelta(seconds=timeout_sec)):
+            return []
+        events = self.request.read_edge_events()
+        data = ()
+        if self.data_request:
+            data = tuple(int(value == gpiod.line.Value.ACTIVE) for value in self.data_request.get_values())
+        return [(event.event_type == gpiod.EdgeEvent.Type.RISING_EDGE, event.timestamp_ns, data)
+                for event in events]
+
+    def close(self):
+        self.request.release()
+        if self.data_request:
+            self.data_request.release()
+
+class FakeEdgeSource:
+    """Stands in for GpiodEdgeSource without a Pi - edges are added with inject()"""
+    def __init__(self):
+        self.events = deque()
+        self.condition = threading.Condition()
+
+    def inject(self, rising: bool, age_ms: float = 0, data: tuple = (), edge_ns: int = None):
+        """Adds an edge, which happened `age_ms` ago (ie, simulating a delay
+        before we see it) - or at edge_ns. `data`: the data lines' values"""
+        if edge_ns is None:
+            edge_ns = clock.now_ns() - int(age_ms * 1_000_000)
+        with self.condition:
+            self.events.append((rising, edge_ns, tuple(data)))
+            self.condition.notify()
+
+    def read(self, timeout_sec: float) -> list:
+        with self.condition:
+            if not self.events:
+                self.condition.wait(timeout=timeout_sec)
+            events = list(self.events)
+            self.events.clear()
+        return events
+
+    def close(self):
+        pass
+
+class EdgeListener:
+    """Calls on_rising(edge_ns) / on_falling(edge_ns) for each edge from an edge source (in a thread)
+
+    edge_ns is when the edge happened, rather than when we got round to it.
+    The difference (lateness) is logged for every edge (at debug level, with
+    on_edge - pin protocol frames are made of lots of edges.)
+    """
+    def __init__(self, source, on_rising=None, on_falling=None, metrics: SyncMetrics = None,
+                 on_edge=None):
+        """
+        Args:
+            source (GpiodEdgeSource | FakeEdgeSource): Where the edges come from
+            on_rising (callable): Called as on_rising(edge_ns)
+            on_falling (callable): Called as on_falling(edge_ns)
+            metrics (SyncMetrics, optional): Where to record the lateness of each edge
+            on_edge (callable, optional): Called as on_edge(rising, edge_ns,
+                data) instead of on_rising / on_falling
+        """
+        self.source = source
+        self.on_rising = on_rising
+        self.on_falling = on_falling
+        self.on_edge = on_edge
+        self.log = ddebug if on_edge else dprint
+        self.metrics = metrics
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while self.running:
+            for rising, edge_ns, data in self.source.read(timeout_sec=0.5):
+                late_us = (clock.now_ns() - edge_ns) / 1000
+                self.log(f'{"Rising" if rising else "Falling"} edge - handling it {late_us:.0f}us after it happened')
+                if self.metrics:
+                    self.metrics.observe('edge_lateness_us', late_us)
+                if self.on_edge:
+                    self.on_edge(rising, edge_ns, data)
+                elif rising:
+                    self.on_rising(edge_ns)
+                else:
+                    self.on_falling(edge_ns)
+
+    def close(self):
+        self.running = False
+        self.source.close()
+
+def gpio_setup_listen_pin(listen_pin_number: int, player: Player,
+                          drift: DriftController = None, metrics: SyncMetrics = None,
+                          executor: PlayerExecutor = None, compensator: EdgeCompensator = None,
+                          capture: str = EDGE_CAPTURE_DEFAULT, chip_path: str = GPIO_CHIP_DEFAULT,
+                          rejoin: SecondaryRejoin = None):
+    """Sets up the listen pin, to restart the player on its edges.
+
+    Returns:
+        DigitalInputDevice | EdgeListener: The listen pin (capture = "gpiozero"
+            or "gpiod".) In test mode: None, or an EdgeListener on a FakeEdgeSource
+    """
+    listen_pin = None
+    if capture == 'gpiod':
+        if not TEST_MODE_FAKE_GPIO:
+            dprint(f"Setting up pin {listen_pin_number} as input (gpiod edge events), with pull-down resistor enabled")
+            source = GpiodEdgeSource(pin=listen_pin_number, chip_path=chip_path, debounce_ms=20)
+        else:
+            dprint("[TEST MODE] Listening for edges from a fake edge source.")
+            source = FakeEdgeSource()
+        on_rising, on_falling = listen_pin_handlers(player=player, drift=drift, metrics=metrics,
+                                                    executor=executor, compensator=compensator, rejoin=rejoin)
+        listen_pin = EdgeListener(source=source, on_rising=on_rising, on_falling=on_falling, metrics=metrics)
+    elif not TEST_MODE_FAKE_GPIO:
+        # GPIO.setup(gpio_listen_pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+        dprint(f"Setting up pin {listen_pin_number} as input, with pull-down resistor enabled")
+        listen_pin = DigitalInputDevice(pin=listen_pin_number, pull_up=False, bounce_time=0.020)
+        listen_pin_attach(listen_pin=listen_pin, player=player, drift=drift, metrics=metrics,
+                          executor=executor, compensator=compensator, rejoin=rejoin)
+    else:
+        dprint("[TEST MODE] We would be setting up the GPIO listen pin.")
+
+    return(listen_pin)
+
+class PinProtocolDecoder:
+    """Decodes pin protocol frames (see pin_frame_edges()) from the listen pin edges.
+
+    Calls on_command(command, argument, end_ns) for each good frame - end_ns
+    being the time of its last edge. Frames with gaps of over 3 units are
+    abandoned (as happens to a position frame the primary cuts off), & frames
+    with bad checksums are dropped (& logged.)
+    """
+    def __init__(self, mode: str, bit_ms: float, on_command):
+        self.mode = mode
+        self.unit_ns = int(bit_ms * 1_000_000)
+        self.on_command = on_command
+        self.bits = None
+        self.rise_ns = None
+        self.rise_data = ()
+        self.fall_ns = None
+        self.errors = 0
+        self.abandoned = 0
+
+    def edge(self, rising: bool, edge_ns: int, data: tuple = ()):
+        if rising:
+            if self.bits is not None and self.fall_ns is not None and edge_ns - self.fall_ns > 3 * self.unit_ns:
+                ddebug('Pin protocol: frame abandoned after %d bits (gap too long)', len(self.bits))
+                self.abandoned += 1
+                self.bits = None
+            self.rise_ns = edge_ns
+            self.rise_data = data
+            return
+
+        if self.rise_ns is None:
+            return
+        width_ns = edge_ns - self.rise_ns
+        self.fall_ns = edge_ns
+        if width_ns >= 3 * self.unit_ns:
+            # Start of a frame
+            self.bits = []
+            return
+        if self.bits is None:
+            return
+
+        if self.mode == 'serial':
+            self.bits.append(1 if width_ns >= 1.5 * self.unit_ns else 0)
+        else:
+            self.bits.extend(self.rise_data)
+        if len(self.bits) >= PIN_FRAME_BITS:
+            frame = pin_frame_decode(self.bits[:PIN_FRAME_BITS])
+            self.bits = None
+            if frame is None:
+                self.errors += 1
+                dwarn(f'Pin protocol: dropped a frame with a bad checksum ({self.errors} errors so far)')
+                return
+            self.on_command(frame[0], frame[1], edge_ns)
+
+# Set by a shutdown command from the primary - the secondary's main loop
+# then finishes up (see secondary_on_pin_command())
+shutdown_requested = threading.Event()
+
+def secondary_on_seek(player: Player, position_ms: int, at_ns: int,
+                      drift: DriftController = None, metrics: SyncMetrics = None,
+                      compensator: EdgeCompensator = None):
+    """Follows the primary's seek (it was at position_ms at at_ns), & plays on from there"""
+    if drift:
+        drift.reset(player=player)
+    if compensator:
+        compensator.cancel_catch_up(player=player)
+    player.seek(int(position_ms + ((clock.now_ns() - at_ns) / 1_000_000)))
+    if player.state() != PLAYER_STATE_PLAYING:
+        player_resume(player=player, metrics=metrics)
+    if drift:
+        drift.set_reference(position_ms=position_ms, at_ns=at_ns)
+
+def secondary_on_pin_command(player: Player, command: int, argument: int, end_ns: int,
+                             drift: DriftController = None, metrics: SyncMetrics = None,
+                             executor: PlayerExecutor = None, compensator: EdgeCompensator = None,
+                             rejoin: SecondaryRejoin = None):
+    """Acts on a pin protocol command from the primary (which took effect at end_ns)"""
+    dprint('Pin command: %s %s', PIN_CMD_NAMES.get(command, command), argument)
+    if command == PIN_CMD_PREPARE:
+        handler = lambda: secondary_on_prepare(player=player, drift=drift, metrics=metrics, prepare_ns=end_ns,
+                                               loop_index=argument, rejoin=rejoin, compensator=compensator)
+    elif command == PIN_CMD_GO:
+        handler = lambda: secondary_on_go(player=player, go_ns=end_ns, drift=drift, metrics=metrics,
+                                          compensator=compensator, rejoin=rejoin)
+    elif command == PIN_CMD_POSITION:
+        secondary_on_position(player=player, position_ms=argument, at_ns=end_ns, drift=drift, rejoin=rejoin)
+        return
+    elif command == PIN_CMD_SEEK:
+        if executor:
+            executor.submit(secondary_on_seek, player, argument, end_ns, drift, metrics, compensator)
+        else:
+            secondary_on_seek(player=player, position_ms=argument, at_ns=end_ns, drift=drift, metrics=metrics,
+                              compensator=compensator)
+        return
+    elif command == PIN_CMD_SHUTDOWN:
+        dprint('Shutdown command from the primary - stopping')
+        shutdown_requested.set()
+        return
+    else:
+        dwarn(f'Pin protocol: unknown command {command}')
+        return
+
+    if executor:
+        executor.submit_edge('prepare' if command == PIN_CMD_PREPARE else 'go', handler, issued_ns=end_ns)
+    else:
+        handler()
+
+def gpio_setup_protocol_listener(listen_pins: list, decoder: PinProtocolDecoder,
+                                 capture: str = EDGE_CAPTURE_DEFAULT, chip_path: str = GPIO_CHIP_DEFAULT,
+                                 metrics: SyncMetrics = None):
+    """Sets up the listen pins (the first is the clock, in "parallel" mode) to feed the decoder.
+
+    Returns:
+        EdgeListener | DigitalInputDevice: The listen pin
+    """
+    if TEST_MODE_FAKE_GPIO:
+        dprint("[TEST MODE] Listening for pin protocol frames from a fake edge source.")
+        return EdgeListener(source=FakeEdgeSource(), on_edge=decoder.edge, metrics=metrics)
+
+    data_pins = listen_pins[1:] if decoder.mode == 'parallel' else []
+    if capture == 'gpiod':
+        dprint(f"Listening for pin protocol frames on pins {listen_pins} (gpiod edge events)")
+        source = GpiodEdgeSource(pin=listen_pins[0], chip_path=chip_path, debounce_ms=0, data_pins=data_pins)
+        return EdgeListener(source=source, on_edge=decoder.edge, metrics=metrics)
+
+    dprint(f"Listening for pin protocol frames on pins {listen_pins} (gpiozero)")
+    clock_pin = DigitalInputDevice(pin=listen_pins[0], pull_up=False)
+    data_inputs = [DigitalInputDevice(pin=pin_id, pull_up=False) for pin_id in data_pins]
+    read_data = lambda: tuple(int(data_input.value) for data_input in data_inputs)
+    clock_pin.when_activated = lambda : decoder.edge(True, clock.now_ns(), read_data())
+    clock_pin.when_deactivated = lambda : decoder.edge(False, clock.now_ns())
+    return clock_pin
+
+def config_parse_epoch(epoch: str) -> int:
+    """Parses ClockEpoch (unix time in seconds, or an ISO 8601 date/time) to ns"""
+    try:
+        return int(float(epoch) * 1_000_000_000)
+    except ValueError:
+        return int(datetime.fromisoformat(epoch).timestamp() * 1_000_000_000)
+
+class WallClockPhase:
+    """Where in the loop every node should be, according to a shared clock.
+
+    Loop n starts at `epoch + n * duration`, so the target position is just
+    (now - epoch) mod duration. No primary or messages are needed - as long as
+    every node's clock is in sync (chrony / PTP.) Times are converted to our
+    monotonic clock each time they're needed, so the clock being stepped or
+    slewed is followed.
+    """
+    def __init__(self, epoch_ns: int, duration: int, source: str = 'realtime', offset_ns: int = 0):
+        """
+        Args:
+            epoch_ns (int): When loop 0 started (ns, by the source clock)
+            duration (int): The total duration of the media file in ms
+            source (str): "realtime" (wall clock), or "monotonic" (only for
+                testing - eg, several players on one machine)
+            offset_ns (int): Added to the source clock (for testing)
+        """
+        self.epoch_ns = epoch_ns
+        self.duration_ns = int(duration * 1_000_000)
+        self.offset_ns = offset_ns
+        self.read_ns = time.time_ns if source == 'realtime' else clock.now_ns
+
+    def now(self) -> tuple:
+        """Returns (monotonic time in ns, target position in ms, loop number)"""
+        now_ns = clock.now_ns()
+        loop_index, phase_ns = divmod(self.read_ns() + self.offset_ns - self.epoch_ns, self.duration_ns)
+        return now_ns, phase_ns / 1_000_000, loop_index
+
+    def loop_start_ns(self, loop_index: int) -> int:
+        """Returns when loop `loop_index` starts, by our monotonic clock"""
+        now_ns = clock.now_ns()
+        source_now_ns = self.read_ns() + self.offset_ns
+        return now_ns + (self.epoch_ns + (loop_index * self.duration_ns) - source_now_ns)
+
+def clock_mode_run(player: Player, phase: WallClockPhase, drift: DriftController,
+                   lead_ms: float, seek_latency_ms: float = 0, loops: int = None,
+                   drift_interval_sec: float = DRIFT_INTERVAL_SEC_DEFAULT,
+                   metrics: SyncMetrics = None):
+    """Follows the shared clock: joins the current loop, then restarts at each loop start.
+
+    Between restarts, the player is kept on the clock's phase by the drift
+    controller (rate adjustment, or a seek for large errors.)
+
+    Args:
+        player (Player): The media player (opened, & paused)
+        phase (WallClockPhase): The shared loop timing
+        drift (DriftController): Keeps the player on the phase (wrap=True)
+        lead_ms (float): How long before each loop start to pause & seek back
+        seek_latency_ms (float): How long a seek takes (added to the first seek target)
+        loops (int, optional): How many loop starts to play (None = forever)
+        drift_interval_sec (float): How often to correct drift
+        metrics (SyncMetrics, optional): Where to record stage timings
+    """
+    duration = phase.duration_ns / 1_000_000
+    _, phase_ms, loop_index = phase.now()
+    if phase_ms + seek_latency_ms < duration - lead_ms:
+        target_ms = int(phase_ms + seek_latency_ms)
+        dprint(f'Joining loop {loop_index} at {target_ms}ms')
+        player.seek(target_ms)
+        player.resume()
+    else:
+        dprint(f'Too close to the end of loop {loop_index} to join - waiting for the next')
+
+    loops_started = 0
+    while loops is None or loops_started < loops:
+        # Recalculated every loop, in case the clock has been stepped
+        _, _, loop_index = phase.now()
+        loop_index += 1
+        prepare_ns = phase.loop_start_ns(loop_index) - int(lead_ms * 1_000_000)
+        while clock.now_ns() + (drift_interval_sec * 1_000_000_000) < prepare_ns:
+            clock.sleep(drift_interval_sec)
+            now_ns, phase_ms, _ = phase.now()
+            drift.set_reference(position_ms=phase_ms, at_ns=now_ns)
+            error_ms = drift.update(player=player)
+            if error_ms is not None and abs(error_ms) > drift.deadband_ms:
+                dprint(f'Drift: {error_ms:+.0f}ms, rate now {drift.rate:.3f}')
+            prepare_ns = phase.loop_start_ns(loop_index) - int(lead_ms * 1_000_000)
+
+        clock.sleep_until_ns(prepare_ns)
+        trace_event(TRACE_PREPARE)
+        if metrics:
+            metrics.mark('prepare')
+        drift.reset(player=player)
+        player_prepare_to_restart(player=player, metrics=metrics)
+
+        start_ns = phase.loop_start_ns(loop_index)
+        late_ns = clock.sleep_until_ns(start_ns)
+        trace_event(TRACE_GO, t_ns=start_ns)
+        if metrics:
+            metrics.mark('go', start_ns)
+        player_resume(player=player, metrics=metrics)
+        loop_housekeeping_schedule()
+        loops_started += 1
+        dprint(f'Loop {loop_index} started {late_ns / 1000:.0f}us late')
+
+# MP4 / MOV atoms which contain other atoms (that we need to look inside)
+MP4_CONTAINER_ATOMS = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts', b'dinf', b'mvex', b'udta'}
+
+def mp4_iter_atoms(read_at, start: int, end: int):
+    """Iterates over the atoms between `start` and `end`.
+
+    Args:
+        read_at (callable): read_at(offset, length) -> bytes
+        start (int): Offset of the first atom
+        end (int): Offset of the end of the enclosing atom (or file)
+
+    Yields:
+        (bytes, int, int, int): atom type, offset, header size, total size
+    """
+    offset = start
+    while offset + 8 <= end:
+        size, atom_type = struct.unpack('>I4s', read_at(offset, 8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', read_at(offset + 8, 8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset     # Extends to the end of the file
+        if size < header_size or offset + size > end:
+            raise ValueError(f'Invalid {atom_type!r} atom at offset {offset} (size {size})')
+        yield atom_type, offset, header_size, size
+        offset += size
+
+def mp4_find_atoms(data: bytes, path: list, start: int = 0, end: int = None):
+    """Finds atoms within `data` (eg, a moov atom) by path, eg [b'trak', b'mdia']
+
+    Yields:
+        (int, int, int): offset, header size & total size of each matching atom
+    """
+    if end is None:
+        end = len(data)
+    read_at = lambda offset, length: data[offset:offset + length]
+    for atom_type, offset, header_size, size in mp4_iter_atoms(read_at, start, end):
+        if atom_type != path[0]:
+            continue
+        if len(path) == 1:
+            yield offset, header_size, size
+        else:
+            yield from mp4_find_atoms(data, path[1:], offset + header_size, offset + size)
+
+def mp4_atom_payload(data: bytes, path: list, start: int = 0, end: int = None) -> bytes:
+    """Returns the payload of the first atom matching `path` (or None)"""
+    for offset, header_size, size in mp4_find_atoms(data, path, start, end):
+        return data[offset + header_size:offset + size]
+    return None
+
+def mp4_track_index(moov: bytes, trak_offset: int, trak_header: int, trak_size: int) -> dict:
+    """Reads the timing & sample table details of one track ('trak' atom)"""
+    start, end = trak_offset + trak_header, trak_offset + trak_size
+    track = {'handler': None, 'codec': None, 'timescale': None, 'duration_ms': None,
+             'sample_count': 0, 'sync_samples': None, 'stts_runs': [], 'sample_table_bytes': 0}
+
+    hdlr = mp4_atom_payload(moov, [b'mdia', b'hdlr'], start, end)
+    if hdlr:
+        track['handler'] = hdlr[8:12].decode('ascii', errors='replace')
+
+    mdhd = mp4_atom_payload(moov, [b'mdia', b'mdhd'], start, end)
+    if mdhd:
+        if mdhd[0] == 1:
+            timescale, duration = struct.unpack('>IQ', mdhd[20:32])
+        else:
+            timescale, duration = struct.unpack('>II', mdhd[12:20])
+        track['timescale'] = timescale
+        if timescale:
+            track['duration_ms'] = duration * 1000 / timescale
+
+    stbl_path = [b'mdia', b'minf', b'stbl']
+    for offset, header_size, size in mp4_find_atoms(moov, stbl_path, start, end):
+        track['sample_table_bytes'] = size
+
+    stsd = mp4_atom_payload(moov, stbl_path + [b'stsd'], start, end)
+    if stsd and len(stsd) >= 16:
+        track['codec'] = stsd[12:16].decode('ascii', errors='replace')
+
+    # Sample durations, as (count, delta) runs - see mp4_keyframe_times()
+    stts = mp4_atom_payload(moov, stbl_path + [b'stts'], start, end)
+    if stts:
+        entry_count = min(struct.unpack('>I', stts[4:8])[0], (len(stts) - 8) // 8)
+        track['stts_runs'] = list(struct.iter_unpack('>II', stts[8:8 + (entry_count * 8)]))
+        track['sample_count'] = sum(count for count, _ in track['stts_runs'])
+
+    # Sync samples (keyframes), 1-based. No stss atom = every sample is a keyframe
+    stss = mp4_atom_payload(moov, stbl_path + [b'stss'], start, end)
+    if stss:
+        entry_count = struct.unpack('>I', stss[4:8])[0]
+        track['sync_samples'] = list(struct.unpack(f'>{entry_count}I', stss[8:8 + (entry_count * 4)]))
+
+    return track
+
+def mp4_keyframe_times(stts_runs: list, sync_samples: list):
+    """Yields the decode time of each sync sample (keyframe), in timescale units.
+
+    Walks the stts (count, delta) runs alongside the sync sample numbers
+    (1-based, ascending, as in stss), rather than expanding the runs into a
+    time per sample - a long video has hundreds of thousands of samples, but
+    only a handful of runs. Numbers past the last sample are ignored.
+    """
+    runs = iter(stts_runs)
+    run_first, run_time, run_count, run_delta = 1, 0, 0, 0
+    for sample in sync_samples:
+        while sample >= run_first + run_count:
+            run_first += run_count
+            run_time += run_count * run_delta
+            try:
+                run_count, run_delta = next(runs)
+            except StopIteration:
+                return
+        if sample >= run_first:
+            yield run_time + ((sample - run_first) * run_delta)
+
+def mp4_index(media_file: str) -> dict:
+    """Stream-parses an MP4 / MOV file's layout & keyframe index.
+
+    Only the top-level atom headers & the moov atom are read - the media
+    data itself is skipped over, so this is quick even for large files.
+
+    Returns:
+        dict: The file layout (top-level atoms, whether moov is before mdat,
+              ie "faststart") & details of the video track, including the
+              keyframe (GOP) interval & time of the first keyframe.
+
+    Raises:
+        ValueError: If the file isn't a valid MP4 / MOV file
+    """
+    file_size = os.path.getsize(media_file)
+    with open(media_file, 'rb') as f:
+        def read_at(offset, length):
+            f.seek(offset)
+            return f.read(length)
+
+        atoms = [(atom_type, offset, size) for atom_type, offset, _, size in mp4_iter_atoms(read_at, 0, file_size)]
+        offsets = {atom_type: offset for atom_type, offset, _ in reversed(atoms)}
+        if b'moov' not in offsets:
+            raise ValueError(f'No moov atom found in {media_file}')
+        moov_offset = offsets[b'moov']
+        moov_size = next(size for atom_type, offset, size in atoms if offset == moov_offset)
+        moov = read_at(moov_offset, moov_size)
+
+    index = {
+        'file_size': file_size,
+        'atoms': [(atom_type.decode('ascii', errors='replace'), offset, size) for atom_type, offset, size in atoms],
+        'moov_offset': moov_offset,
+        'moov_bytes': moov_size,
+        'mdat_offset': offsets.get(b'mdat'),
+        'faststart': b'mdat' not in offsets or moov_offset < offsets[b'mdat'],
+        'video': None,
+    }
+
+    moov_header = 16 if struct.unpack('>I', moov[:4])[0] == 1 else 8
+    for trak in mp4_find_atoms(moov, [b'trak'], moov_header, len(moov)):
+        track = mp4_track_index(moov, *trak)
+        if track['handler'] != 'vide':
+            continue
+        stts_runs = track.pop('stts_runs')
+        sync_samples = track.pop('sync_samples')
+        timescale = track['timescale'] or 1
+        if sync_samples is None:
+            # Every sample is a keyframe
+            sync_samples = range(1, track['sample_count'] + 1)
+        keyframe_count, first_time, last_time, max_interval = 0, None, None, None
+        for keyframe_time in mp4_keyframe_times(stts_runs, sync_samples):
+            if last_time is None:
+                first_time = keyframe_time
+            elif max_interval is None or keyframe_time - last_time > max_interval:
+                max_interval = keyframe_time - last_time
+            last_time = keyframe_time
+            keyframe_count += 1
+        track['keyframe_count'] = keyframe_count
+        track['first_keyframe_ms'] = first_time * 1000 / timescale if keyframe_count else None
+        track['keyframe_interval_ms_avg'] = ((last_time - first_time) * 1000 / timescale / (keyframe_count - 1)
+                                             if keyframe_count > 1 else None)
+        track['keyframe_interval_ms_max'] = max_interval * 1000 / timescale if keyframe_count > 1 else None
+        if track['duration_ms'] and track['sample_count']:
+            track['frame_rate'] = track['sample_count'] * 1000 / track['duration_ms']
+        index['video'] = track
+        break
+
+    return index
+
+def mp4_preflight_report(index: dict, max_keyframe_interval_ms: float = 2000) -> list:
+    """Summarises mp4_index() results as lines of text, including warnings."""
+    lines = [
+        f'File size: {index["file_size"]} bytes',
+        'Top-level atoms: ' + ', '.join(f'{name}@{offset}' for name, offset, _ in index['atoms']),
+        f'moov: {index["moov_bytes"]} bytes at offset {index["moov_offset"]}'
+        f' ({"before" if index["faststart"] else "AFTER"} mdat)',
+    ]
+    if not index['faststart']:
+        lines.append('WARNING: moov is at the end of the file - loading needs an extra seek. '
+                     'Rewrite with: preflight <file> --faststart <output file>')
+    video = index['video']
+    if not video:
+        lines.append('WARNING: No video track found')
+        return lines
+    lines += [
+        f'Video codec: {video["codec"]}, {video["sample_count"]} frames, {video["duration_ms"]:.0f}ms'
+        + (f', {video["frame_rate"]:.3f} fps' if video.get('frame_rate') else ''),
+        f'Sample table: {video["sample_table_bytes"]} bytes',
+        f'Keyframes: {video["keyframe_count"]}'
+        + (f', first at {video["first_keyframe_ms"]:.0f}ms' if video['first_keyframe_ms'] is not None else ''),
+    ]
+    if video['keyframe_interval_ms_avg'] is not None:
+        lines.append(f'Keyframe interval: {video["keyframe_interval_ms_avg"]:.0f}ms average, '
+                     f'{video["keyframe_interval_ms_max"]:.0f}ms max')
+        if video['keyframe_interval_ms_max'] > max_keyframe_interval_ms:
+            lines.append(f'WARNING: Keyframe interval over {max_keyframe_interval_ms:.0f}ms - '
+                         'seeking (and so restarting) may be slow. Consider re-encoding with a shorter GOP.')
+    if video['first_keyframe_ms']:
+        lines.append('WARNING: The first frame is not a keyframe - seeking to 0 may be slow')
+    return lines
+
+def mp4_write_faststart(media_file: str, output_file: str, chunk_size: int = 1024 * 1024):
+    """Rewrites an MP4 / MOV file with the moov atom before the media data.
+
+    The moov atom is read into memory, its chunk offsets (stco / co64) are
+    adjusted for the new layout, and everything is written out in a single
+    streaming pass.
+
+    Raises:
+        ValueError: If the file isn't a valid MP4 / MOV file, or if 32-bit
+            chunk offsets would overflow
+    """
+    index = mp4_index(media_file)
+    if index['faststart']:
+        raise ValueError(f'{media_file} is already faststart (moov before mdat)')
+
+    atoms = [(name.encode('ascii'), offset, size) for name, offset, size in index['atoms']]
+    moov_atom = next(atom for atom in atoms if atom[0] == b'moov')
+    first_mdat_index = next(i for i, atom in enumerate(atoms) if atom[0] == b'mdat')
+    new_order = [atom for atom in atoms[:first_mdat_index] if atom[0] != b'moov']
+    new_order.append(moov_atom)
+    new_order += [atom for atom in atoms[first_mdat_index:] if atom[0] != b'moov']
+
+    # Where each atom's data moves to
+    moves = []
+    new_offset = 0
+    for atom_type, offset, size in new_order:
+        moves.append((offset, offset + size, new_offset - offset))
+        new_offset += size
+
+    def new_position(old_offset):
+        for start, end, shift in moves:
+            if start <= old_offset < end:
+                return old_offset + shift
+        raise ValueError(f'Chunk offset {old_offset} is outside of all atoms')
+
+    with open(media_file, 'rb') as f:
+        f.seek(moov_atom[1])
+        moov = bytearray(f.read(moov_atom[2]))
+
+    moov_header = 16 if struct.unpack('>I', moov[:4])[0] == 1 else 8
+    stbl_path = [b'trak', b'mdia', b'minf', b'stbl']
+    for offset_format, entry_size, atom_name in (('>I', 4, b'stco'), ('>Q', 8, b'co64')):
+        for offset, header_size, size in mp4_find_atoms(moov, stbl_path + [atom_name], moov_header, len(moov)):
+            entries_start = offset + header_size + 8
+            entry_count = struct.unpack('>I', moov[offset + header_size + 4:entries_start])[0]
+            for i in range(entry_count):
+                position = entries_start + (i * entry_size)
+                chunk_offset = new_position(struct.unpack_from(offset_format, moov, position)[0])
+                if entry_size == 4 and chunk_offset > 0xFFFFFFFF:
+                    raise ValueError('Chunk offsets would overflow 32 bits (stco) - not supported')
+                struct.pack_into(offset_format, moov, position, chunk_offset)
+
+    with open(media_file, 'rb') as f, open(output_file, 'wb') as out:
+        for atom_type, offset, size in new_order:
+            if atom_type == b'moov':
+                out.write(moov)
+                continue
+            f.seek(offset)
+            remaining = size
+            while remaining > 0:
+                data = f.read(min(chunk_size, remaining))
+                if not data:
+                    raise ValueError(f'Unexpected end of file in {atom_type!r} atom')
+                out.write(data)
+                remaining -= len(data)
+
+def media_file_fingerprint(media_file: str, sample_bytes: int = 1024 * 1024) -> dict:
+    """Identifies a media file's contents, without reading all of it.
+
+    The content hash covers the first & last `sample_bytes` of the file (plus
+    its size) - reading a whole multi-GB file from an SD card on every boot
+    would cost more than the brief playback we're trying to avoid.
+    """
+    stat = os.stat(media_file)
+    content_hash = hashlib.sha1(str(stat.st_size).encode())
+    with open(media_file, 'rb') as f:
+        content_hash.update(f.read(sample_bytes))
+        if stat.st_size > sample_bytes:
+            f.seek(max(sample_bytes, stat.st_size - sample_bytes))
+            content_hash.update(f.read(sample_bytes))
+    return {
+        'path': os.path.abspath(media_file),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'hash': content_hash.hexdigest(),
+    }
+
+def metadata_cache_load(cache_file: str) -> dict:
+    try:
+        with open(cache_file) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        dwarn(f'Ignoring unreadable metadata cache {cache_file}: {e}')
+        return {}
+
+def metadata_cache_save(cache_file: str, cache: dict):
+    temp_file = f'{cache_file}.tmp'
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump(cache, f, indent=2)
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        dwarn(f'Failed writing metadata cache {cache_file}: {e}')
+
+def media_probe_metadata(instance: 'vlc.Instance', media_file: str, timeout_sec: float = 10) -> dict:
+    """Reads a media file's metadata with libvlc's parser (no playback needed)
+
+    Returns:
+        dict: duration_ms, frame_rate, codec & first_keyframe_ms (None if
+              unknown) - or None if the file couldn't be parsed.
+    """
+    media = instance.media_new(media_file)
+    media.parse_with_options(vlc.MediaParseFlag.local, int(timeout_sec * 1000))
+    deadline_ns = clock.now_ns() + int((timeout_sec + 1) * 1_000_000_000)
+    while media.get_parsed_status() not in (vlc.MediaParsedStatus.done,
+                                            vlc.MediaParsedStatus.failed,
+                                            vlc.MediaParsedStatus.timeout,
+                                            vlc.MediaParsedStatus.skipped):
+        if clock.now_ns() > deadline_ns:
+            break
+        clock.sleep(0.01)
+
+    duration = media.get_duration()
+    if media.get_parsed_status() != vlc.MediaParsedStatus.done or duration <= 0:
+        dwarn(f'Could not parse {media_file} (status: {media.get_parsed_status()}, duration: {duration})')
+        media.release()
+        return None
+
+    metadata = {'duration_ms': duration, 'frame_rate': None, 'codec': None, 'first_keyframe_ms': None}
+    for track in media.tracks_get() or []:
+        if track.type == vlc.TrackType.video:
+            video = track.video.contents
+            if video.frame_rate_den:
+                metadata['frame_rate'] = video.frame_rate_num / video.frame_rate_den
+            # The codec is a fourcc, packed into an int
+            metadata['codec'] = struct.pack('<I', track.codec).decode('ascii', errors='replace').strip()
+            break
+    media.release()
+
+    # libvlc doesn't expose the keyframe index - read it from the container
+    try:
+        video = mp4_index(media_file)['video']
+        if video:
+            metadata['first_keyframe_ms'] = video['first_keyframe_ms']
+    except (OSError, ValueError, struct.error):
+        pass    # Not an MP4 / MOV file
+    return metadata
+
+def media_get_metadata(instance: 'vlc.Instance', media_file: str,
+                       cache_file: str = METADATA_CACHE_FILE_DEFAULT) -> dict:
+    """Returns the media file's metadata, from the cache if possible.
+
+    On a cache miss (new file, or the file has changed), the file is parsed
+    with media_probe_metadata() & the result is cached for next time.
+
+    Returns:
+        dict: As media_probe_metadata() - or None if it isn't available
+    """
+    fingerprint = media_file_fingerprint(media_file)
+    cache = metadata_cache_load(cache_file)
+    entry = cache.get(fingerprint['path'])
+    if entry and entry.get('fingerprint') == fingerprint:
+        dprint(f'Media metadata from cache: {entry["metadata"]}')
+        return entry['metadata']
+
+    dprint(f'No cached metadata for {media_file}, parsing it')
+    metadata = media_probe_metadata(instance=instance, media_file=media_file)
+    if metadata:
+        cache[fingerprint['path']] = {'fingerprint': fingerprint, 'metadata': metadata}
+        metadata_cache_save(cache_file, cache)
+        dprint(f'Media metadata: {metadata}')
+    return metadata
+
+# libc, for mlock() & mincore() (which the mmap module doesn't provide) - see runtime_libc()
+_libc = None
+
+def runtime_libc() -> ctypes.CDLL:
+    """libc, loaded the first time it's needed (so importing this script doesn't)"""
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.mlock.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        libc.munlock.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_ubyte)]
+        libc.mlockall.argtypes = [ctypes.c_int]
+        _libc = libc
+    return _libc
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+class MediaResidency:
+    """Keeps the media file in RAM, so playback never waits on the SD card.
+
+    Modes:
+        cache: Read the whole file into the page cache at startup
+               (mmap + madvise(WILLNEED)) - the kernel may still evict it
+        lock:  As "cache", but also mlock() the pages so they can't be
+               evicted (needs a large enough RLIMIT_MEMLOCK, or root)
+        tmpfs: Copy the file to a RAM-backed directory (eg /dev/shm), &
+               play the copy
+    """
+    def __init__(self, media_file: str, mode: str, tmpfs_dir: str = MEDIA_RESIDENCY_TMPFS_DIR_DEFAULT):
+        self.media_file = media_file
+        self.mode = mode
+        self.tmpfs_dir = tmpfs_dir
+        self.resident_file = media_file
+        self.copied = False
+        self.file = None
+        self.map = None
+        self.buffer = None
+        self.address = None
+        self.length = 0
+        self.locked = False
+        self.page_count = 0
+        self.running = False
+
+    def start(self) -> str:
+        """Loads the media file into RAM.
+
+        Returns:
+            str: The file to play - a copy in tmpfs_dir in "tmpfs" mode,
+                 otherwise the original media file.
+        """
+        start_ns = time.monotonic_ns()
+        if self.mode == 'tmpfs':
+            self.copy_to_tmpfs()
+
+        self.file = open(self.resident_file, 'rb')
+        self.length = os.fstat(self.file.fileno()).st_size
+        self.page_count = (self.length + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+        # A private (copy on write) mapping, so ctypes can get its address -
+        # nothing is written to it, so it stays backed by the page cache
+        self.map = mmap.mmap(self.file.fileno(), self.length, access=mmap.ACCESS_COPY)
+        self.buffer = (ctypes.c_ubyte * self.length).from_buffer(self.map)
+        self.address = ctypes.addressof(self.buffer)
+
+        self.map.madvise(mmap.MADV_WILLNEED)
+        # WILLNEED only starts the read-ahead - touch every page to wait for it
+        for offset in range(0, self.length, mmap.PAGESIZE):
+            self.buffer[offset]
+
+        if self.mode == 'lock':
+            if runtime_libc().mlock(self.address, self.length) == 0:
+                self.locked = True
+            else:
+                errno = ctypes.get_errno()
+                dwarn(f'mlock() failed ({os.strerror(errno)}) - the media may be evicted from the page cache. '
+                      'Raise the memlock limit (ulimit -l) or run as root.')
+
+        atexit.register(self.close)
+        dprint(f'{self.resident_file} ({self.length / 1024 / 1024:.1f}MiB) loaded into RAM '
+               f'({self.mode}{", locked" if self.locked else ""}) in '
+               f'{(time.monotonic_ns() - start_ns) / 1_000_000:.0f}ms - {self.resident_percent():.1f}% resident')
+        return self.resident_file
+
+    def copy_to_tmpfs(self):
+        """Copies the media file to tmpfs_dir (skipped if an identical copy is already there)"""
+        stat = os.stat(self.media_file)
+        resident_file = os.path.join(self.tmpfs_dir, os.path.basename(self.media_file))
+        try:
+            copy_stat = os.stat(resident_file)
+            if copy_stat.st_size == stat.st_size and int(copy_stat.st_mtime) == int(stat.st_mtime):
+                dprint(f'Using existing copy {resident_file}')
+                self.resident_file = resident_file
+                return
+        except FileNotFoundError:
+            pass
+        free_bytes = shutil.disk_usage(self.tmpfs_dir).free
+        if free_bytes < stat.st_size:
+            raise OSError(f'Not enough space in {self.tmpfs_dir} for {self.media_file} '
+                          f'({free_bytes} bytes free, {stat.st_size} needed)')
+        dprint(f'Copying {self.media_file} to {resident_file}')
+        shutil.copy2(self.media_file, resident_file)
+        self.resident_file = resident_file
+        self.copied = True
+
+    def resident_percent(self) -> float:
+        """How much of the file is in RAM right now (mincore()), as a percentage"""
+        if not self.page_count:
+            return 100.0
+        pages = (ctypes.c_ubyte * self.page_count)()
+        if runtime_libc().mincore(self.address, self.length, pages) != 0:
+            return float('nan')
+        return sum(page & 1 for page in pages) * 100 / self.page_count
+
+    def report_loop(self, interval_sec: float):
+        """Logs how much of the file is resident every interval_sec (run in a thread)"""
+        while self.running:
+            time.sleep(interval_sec)
+            percent = self.resident_percent()
+            if percent < 100:
+                dwarn(f'Media file only {percent:.1f}% resident in RAM - playback may read from the SD card')
+            else:
+                ddebug(f'Media file {percent:.1f}% resident in RAM')
+
+    def start_reporting(self, interval_sec: float):
+        """Starts logging residency every interval_sec in a background thread"""
+        self.running = True
+        threading.Thread(target=self.report_loop, args=(interval_sec,), daemon=True).start()
+
+    def close(self):
+        """Unlocks & unmaps the file, & removes the tmpfs copy (if we made it)"""
+        self.running = False
+        if self.locked:
+            runtime_libc().munlock(self.address, self.length)
+            self.locked = False
+        if self.map is not None:
+            self.buffer = None    # Release the ctypes view first, or the mmap can't close
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.copied:
+            self.copied = False
+            try:
+                os.remove(self.resident_file)
+            except OSError as e:
+                dwarn(f'Failed removing {self.resident_file}: {e}')
+
+def runtime_set_affinity(cpus: set) -> bool:
+    """Pins the calling thread (& any threads it starts from now on) to `cpus`"""
+    try:
+        os.sched_setaffinity(0, cpus)
+        return True
+    except (OSError, ValueError) as e:
+        dwarn(f'Could not set CPU affinity to {sorted(cpus)}: {e}')
+        return False
+
+def runtime_set_realtime(priority: int) -> bool:
+    """Gives the calling thread (& any threads it starts from now on) SCHED_FIFO priority"""
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        return True
+    except (OSError, AttributeError) as e:
+        dwarn(f'Could not set SCHED_FIFO priority {priority} (needs root / CAP_SYS_NICE): {e}')
+        return False
+
+# Set by the realtime profile (part 2, in main) - the CPUs player threads
+# belong on (see runtime_player_thread())
+runtime_player_cpus = None
+
+def runtime_player_thread():
+    """Moves the calling thread back to the player's CPUs, at normal (SCHED_OTHER) priority.
+
+    For our threads that load or preroll players, after the realtime profile
+    has moved the main thread to the control CPU at SCHED_FIFO priority -
+    otherwise libvlc's input & decoder threads would inherit both, & could
+    starve the control thread.
+    """
+    if runtime_player_cpus is None:
+        return
+    try:
+        os.sched_setscheduler(0, os.SCHED_OTHER, os.sched_param(0))
+        os.sched_setaffinity(0, runtime_player_cpus)
+    except (OSError, AttributeError) as e:
+        dwarn(f'Could not move the player thread back to normal scheduling on CPUs {sorted(runtime_player_cpus)}: {e}')
+
+def runtime_lock_memory() -> bool:
+    """Locks all current & future memory into RAM, so we never wait on a page fault"""
+    if runtime_libc().mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        dwarn(f'Could not lock memory (mlockall): {os.strerror(ctypes.get_errno())}')
+        return False
+    return True
+
+# Set by runtime_gc_freeze() - the garbage collector then only runs in runtime_gc_collect()
+gc_managed = False
+
+def runtime_gc_freeze():
+    """Moves everything allocated during init out of the collector's reach, & disables automatic collection"""
+    global gc_managed
+    gc.collect()
+    gc.freeze()
+    gc.disable()
+    gc_managed = True
+    dprint(f'Garbage collector frozen ({gc.get_freeze_count()} objects) - only collecting half way through each loop')
+
+def runtime_gc_collect():
+    """Runs the garbage collector, if it's being managed - call only outside the sync window"""
+    if not gc_managed:
+        return
+    start_ns = time.monotonic_ns()
+    collected = gc.collect()
+    ddebug(f'Garbage collection: {collected} objects in {(time.monotonic_ns() - start_ns) / 1000:.0f}us')
+
+class LoopHousekeeping:
+    """Runs the garbage collector & any requested config reload half way through each loop.
+
+    schedule() is called at each restart. A timer then runs the
+    housekeeping `duration / 2` later - well clear of the go just gone (&
+    the first frames after it), and of the next prepare. Given an
+    `executor`, it runs on the executor's thread, in order with the player
+    commands. Another restart before then (eg, a hot-join) reschedules it.
+    """
+    def __init__(self, duration: int, executor: PlayerExecutor = None):
+        """
+        Args:
+            duration (int): The loop duration (ms) - kept up to date as the media changes
+            executor (PlayerExecutor, optional): Run the housekeeping on its thread
+        """
+        self.duration = duration
+        self.executor = executor
+        self.timer = None
+
+    def schedule(self):
+        if self.timer:
+            self.timer.cancel()
+        self.timer = threading.Timer(self.duration / 2000, self._due)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _due(self):
+        if self.executor is None:
+            self.run()
+            return
+        try:
+            self.executor.submit(self.run)
+        except RuntimeError:
+            pass    # (the executor has closed)
+
+    def run(self):
+        runtime_gc_collect()
+        config_apply_pending()
+
+    def close(self):
+        if self.timer:
+            self.timer.cancel()
+
+# Set in main (see loop_housekeeping_schedule())
+loop_housekeeping = None
+
+def loop_housekeeping_schedule():
+    """Schedules the GC & config reload for half way through the loop that's just started (see LoopHousekeeping)"""
+    if loop_housekeeping is not None:
+        loop_housekeeping.schedule()
+
+def wakeup_latency_test(samples: int = 500, sleep_us: int = 1000) -> dict:
+    """Measures how late the calling thread wakes up from a short sleep.
+
+    Returns:
+        dict: Lateness in us - median, 99th percentile & max
+    """
+    lateness = []
+    for _ in range(samples):
+        start_ns = time.monotonic_ns()
+        time.sleep(sleep_us / 1_000_000)
+        lateness.append(((time.monotonic_ns() - start_ns) / 1000) - sleep_us)
+    lateness.sort()
+    return {
+        'median_us': round(lateness[len(lateness) // 2]),
+        'p99_us': round(lateness[min(len(lateness) - 1, int(len(lateness) * 0.99))]),
+        'max_us': round(lateness[-1]),
+    }
+
+def player_launch(media_file:str,
+                  set_playback_count=1,
+                  toggle_fullscreen_during_init: bool = False,
+                  play_briefly_fullscreen_workaround: bool = False,
+                  use_metadata_cache: bool = False) -> ('vlc.MediaPlayer', 'vlc.Instance', 'vlc.Media', int):
+    """launch the media player (VlcPlayer backend)
+
+    Args:
+        media_file (str): The file to play.
+        set_playback_count (int, optional): The number of times to play the media. Defaults to 1.
+        toggle_fullscreen_during_init (bool, optional): Toggle fullscreen mode during initialization? Defaults to False.
+        play_briefly_fullscreen_workaround (bool, optional): Play briefly in fullscreen mode during initialization? Defaults to False.
+        use_metadata_cache (bool, optional): Get the duration from the metadata cache (or by parsing the file),
+            rather than by playing briefly? Defaults to False.
+
+    Returns:
+        (vlc.MediaPlayer, vlc.Instance, vlc.Media, duration [int]): a tuple of the player, instance, and media
+
+    Raises:
+        vlc.VLCException: If VLC couldn't be started, or the media loaded
+    """
+    dprint('Initializing VLC instance, player, and media, and loading media')
+    try:
+
+        # creating a vlc instance - with a LONG repeat number
+        vlc_instance = vlc.Instance(f'--input-repeat={set_playback_count}')
+     
+        # creating a media player
+        vlc_player = vlc_instance.media_player_new()
+
+        # load the media (and return the media object)
+        vlc_media = player_open_file(instance=vlc_instance, player=vlc_player, input_file=media_file)
+
+    except vlc.VLCException as e:
+        dprint('Failed creating VLC context, error:')
+        dprint(e)
+        raise
+    
+    if FULLSCREEN_MODE:
+        vlc_player.set_fullscreen(1)
+        if play_briefly_fullscreen_workaround:
+            dprint('Playing briefly (play_briefly_fullscreen_workaround=True)')
+            vlc_player.play()
+            time.sleep(PLAYBACK_AFTER_LOAD_DURATION_SEC)
+            vlc_player.stop()
+            time.sleep(PLAYBACK_AFTER_LOAD_DURATION_SEC)
+            vid_quit(vlc_player=vlc_player, instance=vlc_instance)
+            time.sleep(PLAYBACK_AFTER_LOAD_DURATION_SEC)
+            dprint('Done playing briefly & cleaning up, calling init again.')
+            return player_launch(media_file=media_file,
+                                 set_playback_count=set_playback_count,
+                                 toggle_fullscreen_during_init = toggle_fullscreen_during_init,
+                                 play_briefly_fullscreen_workaround = False,
+                                 use_metadata_cache = use_metadata_cache)
+
+    metadata = None
+    if use_metadata_cache and not toggle_fullscreen_during_init:
+        metadata = media_get_metadata(instance=vlc_instance, media_file=media_file,
+                                      cache_file=METADATA_CACHE_FILE)
+
+    if metadata:
+        # We already know the duration - VlcPlayer.open() prerolls instead of the brief playback
+        media_duration = metadata['duration_ms']
+        dprint(f'Cached duration is {media_duration}ms [{timedelta(milliseconds=media_duration)}]')
+        return vlc_player, vlc_instance, vlc_media, media_duration
+
+    # Play a little bit to get the duratioN!    
+    dprint('Playing briefly, to get video duration.')
+    vlc_player.play()
+    if toggle_fullscreen_during_init and FULLSCREEN_MODE:
+        dprint('Toggling fullscreen mode during initialization')
+        sleep_time = PLAYBACK_AFTER_LOAD_DURATION_SEC / 3
+        time.sleep(sleep_time)
+        vlc_player.set_fullscreen(0)
+        time.sleep(sleep_time)
+        vlc_player.set_fullscreen(1)
+        time.sleep(sleep_time)
+    else:
+        time.sleep(PLAYBACK_AFTER_LOAD_DURATION_SEC)
+    vlc_player.set_pause(1)
+    vlc_player.set_time(0)
+    
+    dprint('Done with brief playback, retrieving media duration.')
+
+    media_duration = vlc_media.get_duration()
+    dprint(f'vlc_media.get_duration() returned {media_duration}ms [{timedelta(milliseconds=media_duration)}]')
+
+
+    # if osd_enabled:
+    #     player.set_option('osc')
+
+    return vlc_player, vlc_instance, vlc_media, media_duration
+
+def player_open_file(instance, player, input_file, options: list = ()) -> 'vlc.Media':
+    """_summary_
+
+    Args:
+        instance (vlc.Instance): the instance of the VLC module
+        player (vlc.MediaPlayer): the player instance itself
+        input_file (string): the filepath/filename of the file to play
+        options (list, optional): VLC options for the media (without the leading ":")
+
+    Returns:
+        vlc.Media: media file (instance)
+    """
+    # print(f'player_open_file([player], {input_file})')
+
+    media = instance.media_new(input_file, *[f':{option}' for option in options])
+
+    player.set_media(media)
+
+    return media
+
+def player_reset_to_start(player: Player):
+    ddebug('Resetting to start [player.seek(0)]')
+    player.seek(0)
+    ddebug('Done, time reset.')
+
+def player_pause(player: Player):
+    state = player.state()
+    if state == PLAYER_STATE_PAUSED:
+        ddebug('Player is already paused, skipping pause command.')
+        return
+    elif state != PLAYER_STATE_PLAYING:
+        ddebug('Player is not playing (State: %s), skipping pause command.', state)
+        return
+    ddebug('Pausing playback.')
+    player.pause()
+    ddebug('(Pause function complete)')
+
+def player_prepare_to_restart(player: Player, metrics: SyncMetrics = None):
+    ddebug('Preparing to restart playback')
+    player_pause(player=player)
+    if metrics:
+        metrics.mark('pause')
+    player_reset_to_start(player=player)
+    if metrics:
+        metrics.mark('seek')
+
+def player_resume(player: Player, metrics: SyncMetrics = None):
+    ddebug('Resuming playback [calling player.resume()]')
+    player.resume()
+    if metrics:
+        metrics.mark('resume')
+        metrics.watch_first_advance(player)
+
+def player_start_at_beginning(player: Player):
+    dprint("Starting playback at beginning: player_reset_to_start(), then player_resume()")
+    player_reset_to_start(player=player)
+    state = player.state()
+    if state != PLAYER_STATE_PLAYING:
+        dprint('Playback is not currently playing (State: %s)', state)
+        player_resume(player=player)
+
+def player_preroll(player: Player, timeout_sec: float = 10, poll_sec: float = 0.01) -> bool:
+    """Gets a player decoded & paused on the first frame, ready to resume.
+
+    Starts playback, waits (up to `timeout_sec`) until the player reports
+    it's playing, then pauses & seeks to the start.
+
+    Returns:
+        bool: True if the player reached the playing state in time
+    """
+    player.resume()
+    deadline_ns = clock.now_ns() + int(timeout_sec * 1_000_000_000)
+    while player.state() != PLAYER_STATE_PLAYING:
+        if clock.now_ns() > deadline_ns:
+            dwarn(f'Player did not start playing within {timeout_sec}s (State: {player.state()})')
+            return False
+        clock.sleep(poll_sec)
+    player.pause()
+    player.seek(0)
+    return True
+
+class _XSetWindowAttributes(ctypes.Structure):
+    _fields_ = [('background_pixmap', ctypes.c_ulong), ('background_pixel', ctypes.c_ulong),
+                ('border_pixmap', ctypes.c_ulong), ('border_pixel', ctypes.c_ulong),
+                ('bit_gravity', ctypes.c_int), ('win_gravity', ctypes.c_int), ('backing_store', ctypes.c_int),
+                ('backing_planes', ctypes.c_ulong), ('backing_pixel', ctypes.c_ulong), ('save_under', ctypes.c_int),
+                ('event_mask', ctypes.c_long), ('do_not_propagate_mask', ctypes.c_long),
+                ('override_redirect', ctypes.c_int), ('colormap', ctypes.c_ulong), ('cursor', ctypes.c_ulong)]
+
+class X11VideoWindows:
+    """Full screen X11 windows for VLC players to draw into, so we choose whose video is on top.
+
+    libvlc has no way to raise a player's own video window, so a spawned
+    player (eg, DoubleBufferedPlayer's standby) draws into one of these
+    instead (see VlcPlayer.set_video_visible().) They're borderless, &
+    bypass the window manager, so raising one takes effect straight away.
+    Uses libX11 directly (via ctypes) - no GUI toolkit needed, but it does
+    need an X display.
+    """
+    CW_BACK_PIXEL = 1 << 1
+    CW_OVERRIDE_REDIRECT = 1 << 9
+
+    def __init__(self, display_name: str = None):
+        path = ctypes.util.find_library('X11')
+        if path is None:
+            raise OSError('libX11 not found')
+        self.xlib = ctypes.CDLL(path)
+        self.xlib.XOpenDisplay.restype = ctypes.c_void_p
+        self.xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        self.xlib.XRootWindow.restype = ctypes.c_ulong
+        self.xlib.XBlackPixel.restype = ctypes.c_ulong
+        self.xlib.XCreateWindow.restype = ctypes.c_ulong
+        self.xlib.XCreateWindow.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int, ctypes.c_int,
+                                            ctypes.c_uint, ctypes.c_uint, ctypes.c_uint, ctypes.c_int,
+                                            ctypes.c_uint, ctypes.c_void_p, ctypes.c_ulong,
+                                            ctypes.POINTER(_XSetWindowAttributes)]
+        for name in ('XDefaultScreen', 'XFlush', 'XCloseDisplay'):
+            getattr(self.xlib, name).argtypes = [ctypes.c_void_p]
+        for name in ('XRootWindow', 'XBlackPixel', 'XDisplayWidth', 'XDisplayHeight'):
+            getattr(self.xlib, name).argtypes = [ctypes.c_void_p, ctypes.c_int]
+        for name in ('XMapRaised', 'XUnmapWindow', 'XDestroyWindow'):
+            getattr(self.xlib, name).argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        # The players (& VLC's video outputs) use the display from several threads
+        self.xlib.XInitThreads()
+        self.display = self.xlib.XOpenDisplay(display_name.encode() if display_name else None)
+        if not self.display:
+            raise OSError(f'Could not open X display {display_name or os.environ.get("DISPLAY")}')
+        self.screen = self.xlib.XDefaultScreen(self.display)
+        self.lock = threading.Lock()
+
+    def create(self) -> int:
+        """A new (unmapped, so hidden) window covering the screen. Returns its id (XID)"""
+        attributes = _XSetWindowAttributes(background_pixel=self.xlib.XBlackPixel(self.display, self.screen),
+                                           override_redirect=1)
+        with self.lock:
+            window = self.xlib.XCreateWindow(self.display, self.xlib.XRootWindow(self.display, self.screen), 0, 0,
+                                             self.xlib.XDisplayWidth(self.display, self.screen),
+                                             self.xlib.XDisplayHeight(self.display, self.screen),
+                                             0, 0, 1, None, self.CW_BACK_PIXEL | self.CW_OVERRIDE_REDIRECT,
+                                             ctypes.byref(attributes))
+            self.xlib.XFlush(self.display)
+        return window
+
+    def show(self, window: int, visible: bool = True):
+        """Maps & raises `window` over everything else - or unmaps it"""
+        with self.lock:
+            if visible:
+                self.xlib.XMapRaised(self.display, window)
+            else:
+                self.xlib.XUnmapWindow(self.display, window)
+            self.xlib.XFlush(self.display)
+
+    def destroy(self, window: int):
+        with self.lock:
+            self.xlib.XDestroyWindow(self.display, window)
+            self.xlib.XFlush(self.display)
+
+# Set in main, if the standby players get their own windows (see X11VideoWindows)
+video_windows = None
+
+def double_buffering_video_setup(player_backend: str, fullscreen: bool, playlist: list,
+                                 display_name: str = None) -> tuple:
+    """Gets the players' video windows ready for DoubleBufferedPlayers.
+
+    VLC full screen needs X11VideoWindows to show each swap. Without an X
+    display (or libX11), the standby player's video can't be put behind the
+    active one's, so double buffering is turned off - restarts seek the one
+    player back instead. A Playlist can't do without it.
+
+    Returns:
+        tuple: (whether to keep DoubleBufferedPlayers on, X11VideoWindows or None)
+
+    Raises:
+        ValueError: If there's a playlist, but no X display to show the swaps
+    """
+    if player_backend != 'vlc' or not fullscreen:
+        return True, None
+    try:
+        return True, X11VideoWindows(display_name)
+    except OSError as e:
+        if playlist:
+            raise ValueError(f'Playlist (with PlayerBackend = vlc & Fullscreen) needs an X display, '
+                             f'to show the switch between players ({e})')
+        dwarn(f'No X display for the standby player\'s window ({e}) - DoubleBufferedPlayers is off')
+        return False, None
+
+class VlcPlayer(Player):
+    """The python-vlc Player backend (PlayerBackend = vlc)"""
+    supports_events = True
+    supports_spawn = True
+
+    def __init__(self, set_playback_count: int = 1,
+                 toggle_fullscreen_during_init: bool = False,
+                 play_briefly_fullscreen_workaround: bool = False,
+                 use_metadata_cache: bool = False,
+                 instance: 'vlc.Instance' = None,
+                 media_options: list = None):
+        """
+        Args:
+            set_playback_count (int, optional): The number of times VLC plays the media (by itself)
+            toggle_fullscreen_during_init (bool, optional): See player_launch()
+            play_briefly_fullscreen_workaround (bool, optional): See player_launch()
+            use_metadata_cache (bool, optional): See player_launch()
+            instance (vlc.Instance, optional): Share an existing instance (see spawn())
+                rather than launching a new one
+            media_options (list, optional): VLC options for the media, without
+                the leading ":" (eg, "avcodec-fast") - spawned players only
+        """
+        self.set_playback_count = set_playback_count
+        self.toggle_fullscreen_during_init = toggle_fullscreen_during_init
+        self.play_briefly_fullscreen_workaround = play_briefly_fullscreen_workaround
+        self.use_metadata_cache = use_metadata_cache
+        self.instance = instance
+        self.owns_instance = instance is None
+        self.media_options = media_options or []
+        self.media_file = None
+        self.player = None
+        self.media = None
+        self.duration = None
+        self.window = None
+        # libvlc takes one callback per event type - ours calls every hook
+        # (see add_event_hook().) Replaced, never changed in place, so the
+        # event thread can go through it without the lock
+        self.event_hooks = []
+        self.event_hooks_lock = threading.Lock()
+        self.events_attached = False
+
+    def open(self, media_file: str) -> int:
+        self.media_file = media_file
+        if self.owns_instance:
+            self.player, self.instance, self.media, self.duration = player_launch(
+                media_file=media_file,
+                set_playback_count=self.set_playback_count,
+                toggle_fullscreen_during_init=self.toggle_fullscreen_during_init,
+                play_briefly_fullscreen_workaround=self.play_briefly_fullscreen_workaround,
+                use_metadata_cache=self.use_metadata_cache)
+        else:
+            self.player = self.instance.media_player_new()
+            if FULLSCREEN_MODE and video_windows:
+                # Hidden until set_video_visible()
+                self.window = video_windows.create()
+                self.player.set_xwindow(self.window)
+            self.media = player_open_file(instance=self.instance, player=self.player, input_file=media_file,
+                                          options=self.media_options)
+            if FULLSCREEN_MODE and not self.window:
+                self.player.set_fullscreen(1)
+            self.duration = self.media.get_duration()
+
+        if self.owns_instance and self.state() != PLAYER_STATE_PAUSED:
+            # The duration came from the metadata cache, so there was no
+            # brief playback (which leaves the player paused at the start)
+            dprint('Prerolling (playing until the first frame is shown, then pausing at the start)')
+            self.preroll()
+        return self.duration
+
+    def preroll(self) -> bool:
+        return player_preroll(player=self)
+
+    def pause(self):
+        self.player.set_pause(1)
+
+    def seek(self, time_ms: int):
+        self.player.set_time(int(time_ms))
+
+    def resume(self):
+        self.player.play()
+
+    def position(self) -> int:
+        return self.player.get_time()
+
+    def state(self) -> str:
+        vlc_state = self.player.get_state()
+        if vlc_state == vlc.State.Playing:
+            return PLAYER_STATE_PLAYING
+        elif vlc_state == vlc.State.Paused:
+            return PLAYER_STATE_PAUSED
+        elif vlc_state == vlc.State.Stopped:
+            return PLAYER_STATE_STOPPED
+        elif vlc_state == vlc.State.Ended:
+            return PLAYER_STATE_ENDED
+        elif vlc_state == vlc.State.Error:
+            return PLAYER_STATE_ERROR
+        return PLAYER_STATE_OPENING
+
+    def set_rate(self, rate: float):
+        self.player.set_rate(rate)
+
+    def frame_rate(self) -> float:
+        return self.player.get_fps()
+
+    def _on_event(self, kind: str, value):
+        for on_update in self.event_hooks:
+            on_update(kind, value)
+
+    def add_event_hook(self, on_update):
+        with self.event_hooks_lock:
+            if not self.events_attached:
+                event_manager = self.player.event_manager()
+                handlers = {
+                    vlc.EventType.MediaPlayerTimeChanged: lambda event: self._on_event('time', event.u.new_time),
+                    vlc.EventType.MediaPlayerPositionChanged: lambda event: self._on_event('position', event.u.new_position),
+                    vlc.EventType.MediaPlayerPlaying: lambda event: self._on_event('playing', None),
+                    vlc.EventType.MediaPlayerPaused: lambda event: self._on_event('paused', None),
+                    vlc.EventType.MediaPlayerEndReached: lambda event: self._on_event('end', None),
+                }
+                for event_type, handler in handlers.items():
+                    event_manager.event_attach(event_type, handler)
+                self.events_attached = True
+            self.event_hooks = self.event_hooks + [on_update]
+        return on_update
+
+    def remove_event_hook(self, hook):
+        with self.event_hooks_lock:
+            self.event_hooks = [on_update for on_update in self.event_hooks if on_update is not hook]
+
+    def set_muted(self, muted: bool):
+        self.player.audio_set_mute(muted)
+
+    def set_fullscreen(self, fullscreen: bool):
+        self.player.set_fullscreen(1 if fullscreen else 0)
+
+    def set_video_visible(self, visible: bool):
+        # The player that launched VLC has VLC's own window - it's uncovered by hiding the others
+        if self.window:
+            video_windows.show(self.window, visible)
+
+    def decode_stats(self) -> dict:
+        stats = vlc.MediaStats()
+        if not self.media.get_stats(stats):
+            return None
+        return {'decoded': stats.decoded_video, 'displayed': stats.displayed_pictures,
+                'lost': stats.lost_pictures, 'corrupted': stats.demux_corrupted,
+                # libvlc's bitrates are in bytes per microsecond
+                'demux_kbps': stats.demux_bitrate * 8000, 'source': id(self.media)}
+
+    def spawn(self, media_file: str = None, media_options: list = None) -> 'VlcPlayer':
+        standby = VlcPlayer(instance=self.instance,
+                            media_options=self.media_options if media_options is None else media_options)
+        standby.open(media_file or self.media_file)
+        if media_file is None:
+            standby.duration = self.duration
+        else:
+            # The new media isn't parsed until it plays - get the duration from the metadata cache
+            metadata = media_get_metadata(instance=self.instance, media_file=media_file,
+                                          cache_file=METADATA_CACHE_FILE)
+            if metadata:
+                standby.duration = metadata['duration_ms']
+        return standby
+
+    def close(self):
+        if self.owns_instance:
+            vid_quit(vlc_player=self.player, instance=self.instance)
+        else:
+            self.player.stop()
+            self.player.release()
+            if self.window:
+                video_windows.destroy(self.window)
+
+class MpvPlayer(Player):
+    """The python-mpv Player backend (PlayerBackend = mpv)
+
+    The file is loaded paused, so mpv decodes the first frame without any
+    playback, and a restart is an exact seek while paused, then unpausing.
+    Time updates come from mpv's property observers.
+    """
+    supports_events = True
+    supports_spawn = True
+
+    def __init__(self, set_playback_count: int = 1, load_timeout_sec: float = 10,
+                 media_options: list = None):
+        """
+        Args:
+            set_playback_count (int, optional): The number of times mpv plays the media (by itself)
+            load_timeout_sec (float, optional): How long to wait for the file to load
+            media_options (list, optional): mpv options, as "name=value" (or
+                just "name", for "yes") - eg, "vd-lavc-skiploopfilter=all"
+        """
+        self.set_playback_count = set_playback_count
+        self.load_timeout_sec = load_timeout_sec
+        self.media_options = media_options or []
+        self.media_file = None
+        self.mpv = None
+        self.duration = None
+
+    def open(self, media_file: str) -> int:
+        dprint(f'Initializing mpv, and loading {media_file}')
+        self.media_file = media_file
+        self.mpv = mpv.MPV(pause=True,
+                           keep_open='yes',
+                           loop_file=max(0, self.set_playback_count - 1),
+                           hr_seek='yes',
+                           fullscreen=FULLSCREEN_MODE,
+                           input_default_bindings=True,
+                           input_vo_keyboard=True)
+        for option in self.media_options:
+            name, _, value = option.partition('=')
+            self.mpv[name] = value or 'yes'
+        self.mpv.play(media_file)
+        deadline_ns = clock.now_ns() + int(self.load_timeout_sec * 1_000_000_000)
+        while self.mpv.duration is None:
+            if clock.now_ns() > deadline_ns:
+                raise RuntimeError(f'mpv did not load {media_file} within {self.load_timeout_sec}s')
+            clock.sleep(0.01)
+        self.duration = int(self.mpv.duration * 1000)
+        dprint(f'mpv reports a duration of {self.duration}ms [{timedelta(milliseconds=self.duration)}]')
+        self.preroll()
+        return self.duration
+
+    def preroll(self, timeout_sec: float = 10, poll_sec: float = 0.01) -> bool:
+        # Paused, so seeking decodes (& shows) the first frame without playing
+        self.mpv.pause = True
+        self.seek(0)
+        deadline_ns = clock.now_ns() + int(timeout_sec * 1_000_000_000)
+        while self.mpv.time_pos is None or self.mpv.seeking:
+            if clock.now_ns() > deadline_ns:
+                dwarn(f'mpv did not finish seeking to the start within {timeout_sec}s')
+                return False
+            clock.sleep(poll_sec)
+        return True
+
+    def pause(self):
+        self.mpv.pause = True
+
+    def seek(self, time_ms: int):
+        self.mpv.seek(time_ms / 1000, reference='absolute', precision='exact')
+
+    def resume(self):
+        self.mpv.pause = False
+
+    def position(self) -> int:
+        time_pos = self.mpv.time_pos
+        return int(time_pos * 1000) if time_pos is not None else 0
+
+    def state(self) -> str:
+        if self.mpv.idle_active:
+            return PLAYER_STATE_STOPPED
+        elif self.mpv.eof_reached:
+            return PLAYER_STATE_ENDED
+        elif self.mpv.pause:
+            return PLAYER_STATE_PAUSED
+        return PLAYER_STATE_PLAYING
+
+    def set_rate(self, rate: float):
+        self.mpv.speed = rate
+
+    def frame_rate(self) -> float:
+        return self.mpv.container_fps or 0
+
+    def add_event_hook(self, on_update) -> list:
+        # mpv reports the current value straight away - only pass on changes
+        last_time = {'value': self.mpv.time_pos}
+
+        def on_time(name, value):
+            if value is not None and value != last_time['value']:
+                last_time['value'] = value
+                on_update('time', value * 1000)
+
+        def on_pause(name, value):
+            on_update('paused' if value else 'playing', None)
+
+        def on_eof(name, value):
+            if value:
+                on_update('end', None)
+
+        observers = [('time-pos', on_time), ('pause', on_pause), ('eof-reached', on_eof)]
+        for name, handler in observers:
+            self.mpv.observe_property(name, handler)
+        return observers
+
+    def remove_event_hook(self, hook: list):
+        for name, handler in hook:
+            self.mpv.unobserve_property(name, handler)
+
+    def set_muted(self, muted: bool):
+        self.mpv.mute = muted
+
+    def set_fullscreen(self, fullscreen: bool):
+        self.mpv.fullscreen = fullscreen
+
+    def set_video_visible(self, visible: bool):
+        # Each player has its own window - the window manager keeps "ontop" ones above the rest
+        self.mpv.ontop = visible
+
+    def spawn(self, media_file: str = None, media_options: list = None) -> 'MpvPlayer':
+        standby = MpvPlayer(set_playback_count=self.set_playback_count,
+                            load_timeout_sec=self.load_timeout_sec,
+                            media_options=self.media_options if media_options is None else media_options)
+        standby.open(media_file or self.media_file)
+        return standby
+
+    def close(self):
+        dprint('Closing mpv')
+        self.mpv.terminate()
+
+def player_create(backend: str, set_playback_count: int = 1,
+                  toggle_fullscreen_during_init: bool = False,
+                  play_briefly_fullscreen_workaround: bool = False,
+                  use_metadata_cache: bool = False) -> Player:
+    """Returns a (not yet opened) Player, for PlayerBackend `backend`
+
+    The VLC-only options are ignored by the mpv backend, which doesn't need
+    the brief playback at startup.
+    """
+    if backend == 'mpv':
+        return MpvPlayer(set_playback_count=set_playback_count)
+    return VlcPlayer(set_playback_count=set_playback_count,
+                     toggle_fullscreen_during_init=toggle_fullscreen_during_init,
+                     play_briefly_fullscreen_workaround=play_briefly_fullscreen_workaround,
+                     use_metadata_cache=use_metadata_cache)
+
+class DoubleBufferedPlayer:
+    """Two players - one playing, one paused on frame 0.
+
+    Stands in for a Player (anything not defined here is passed on to the
+    active player), with one difference: between a pause and a seek(0),
+    resume() swaps to the standby player (already decoded & paused at the
+    start) rather than waiting for the active player to seek back & decode
+    the first frames. Restarting then costs the same "unpause" on every
+    node. The player that just finished is seeked back to the start in the
+    background, ready for the next loop.
+
+    The standby player can be on a different media file (see change_media(),
+    & next_media, which a Playlist sets before each restart), or have
+    different media options (see set_media_options()): it's loaded in the
+    background, & the next restart switches to it.
+
+    Note: each player has its own video window - after each swap, the newly
+    active player's is shown in front (see Player.set_video_visible()), &
+    the other's hidden. With VLC, that needs an X display (the standby
+    players then draw into X11VideoWindows) - see double_buffering_video_setup().
+    """
+    def __init__(self, active: Player, on_media_changed=None):
+        """
+        Args:
+            active (Player): The (opened) player to start with - the standby
+                player is spawned from it
+            on_media_changed (callable, optional): Called as on_media_changed(duration)
+                after a restart switches to a different media file
+        """
+        if not active.supports_spawn:
+            raise ValueError(f'{type(active).__name__} can\'t spawn a standby player')
+        self.active = active
+        self.standby = active.spawn()
+        self.standby_ready = threading.Event()
+        self.restart_pending = False
+        self.swap_lock = threading.Lock()
+        self.on_media_changed = on_media_changed
+        # The media file for the standby player after the next restart (None:
+        # the same as the active player's), what the standby player is (or is
+        # being loaded) on, & what's being loaded
+        self.next_media = None
+        self.standby_media = active.media_file
+        self.loading_media = None
+        # Media options for the players loaded from now on
+        self.media_options = active.media_options
+        # Retired players that own the (shared) VLC instance - only closed at the end
+        self.retired = []
+        threading.Thread(target=self._preroll_standby, args=(True,), daemon=True).start()
+
+    def __getattr__(self, name):
+        return getattr(self.active, name)
+
+    def add_event_hook(self, on_update) -> tuple:
+        """Hooks the active player's events - the hook stays on that player after a swap"""
+        player = self.active
+        return player, player.add_event_hook(on_update)
+
+    def remove_event_hook(self, hook: tuple):
+        player, player_hook = hook
+        player.remove_event_hook(player_hook)
+
+    def _preroll_standby(self, first_time: bool = False):
+        runtime_player_thread()
+        standby = self.standby
+        standby.set_muted(True)
+        if first_time:
+            standby.preroll()
+        else:
+            # Already paused (at the end of the last loop) - just seek back
+            standby.seek(0)
+        self.standby_ready.set()
+        ddebug('Standby player prerolled')
+
+    def change_media(self, media_file: str):
+        """Loads `media_file` into the standby player (in the background) - the next restart switches to it.
+
+        Args:
+            media_file (str): The new media file (which stays on after that)
+        """
+        dprint(f'Loading {media_file} into the standby player')
+        with self.swap_lock:
+            self.next_media = media_file
+            self.standby_media = self.loading_media = media_file
+        threading.Thread(target=self._replace_standby, args=(media_file,), daemon=True).start()
+
+    def set_media_options(self, media_options: list):
+        """Loads the standby player again with `media_options` (eg, a lighter decoder profile) - the next restart switches to it.
+
+        Args:
+            media_options (list): Backend options for the media (see Player.spawn()),
+                for every player loaded from now on
+        """
+        dprint(f'Loading the standby player with media options {media_options}')
+        with self.swap_lock:
+            self.media_options = media_options
+        self.change_media(self.next_media or self.active.media_file)
+
+    def _replace_standby(self, media_file: str):
+        runtime_player_thread()
+        try:
+            standby = self.active.spawn(media_file=media_file, media_options=self.media_options)
+        except Exception as e:
+            dwarn(f'Could not load {media_file} ({e}) - carrying on with the current media')
+            with self.swap_lock:
+                if media_file != self.standby_media:
+                    return
+                self.standby_media = self.standby.media_file
+                self.loading_media = None
+            self._preroll_standby()
+            return
+        standby.set_muted(True)
+        standby.preroll()
+        with self.swap_lock:
+            if media_file != self.standby_media or standby.media_options != self.media_options:
+                # Superseded (by a later change) while loading
+                retired = standby
+            else:
+                self.standby_ready.clear()
+                retired, self.standby = self.standby, standby
+                self.loading_media = None
+                self.standby_ready.set()
+        self._retire(retired)
+        ddebug(f'{media_file} is loaded into the standby player')
+
+    def _retire(self, player: Player):
+        if getattr(player, 'owns_instance', False):
+            self.retired.append(player)
+        else:
+            player.close()
+
+    def pause(self):
+        self.active.pause()
+
+    def seek(self, time_ms: int):
+        if time_ms == 0 and self.standby_ready.is_set():
+            # No need to seek - resume() will swap to the standby player
+            self.restart_pending = True
+            return
+        if time_ms == 0 and self.standby_media != self.active.media_file:
+            dwarn(f'{self.standby_media} is still loading - restarting {self.active.media_file} instead')
+        self.restart_pending = False
+        self.active.seek(time_ms)
+
+    def resume(self):
+        if not self.restart_pending:
+            return self.active.resume()
+
+        with self.swap_lock:
+            self.restart_pending = False
+            self.standby_ready.clear()
+            finished, self.active = self.active, self.standby
+            self.active.set_muted(False)
+            self.active.resume()
+            # The swap is done - tidy up the previous player off the critical path
+            self.standby = finished
+            next_media = self.next_media or self.active.media_file
+            self.standby_media = next_media
+            stale = next_media != finished.media_file or finished.media_options != self.media_options
+            load = stale and next_media != self.loading_media
+            if load:
+                self.loading_media = next_media
+        if FULLSCREEN_MODE:
+            self.active.set_video_visible(True)
+            finished.set_video_visible(False)
+        if self.on_media_changed and self.active.media_file != finished.media_file:
+            self.on_media_changed(self.active.duration)
+        if load:
+            threading.Thread(target=self._replace_standby, args=(next_media,), daemon=True).start()
+        elif not stale:
+            threading.Thread(target=self._preroll_standby, daemon=True).start()
+
+    def close(self):
+        # Any player that owns the (shared) VLC instance goes last
+        players = [self.standby, self.active] + self.retired
+        for player in sorted(players, key=lambda player: getattr(player, 'owns_instance', False)):
+            player.close()
+
+class Playlist:
+    """Media files played in turn - loop `n` plays item `n % len(items)` on every node.
+
+    The loop index comes from the primary with each "prepare" (the UDP
+    packet's loop index, or the pin protocol prepare command's argument), so
+    a node that joins late, or misses a loop, plays the same item as
+    everyone else. Legacy GPIO signalling has no index - loops are counted
+    locally instead. (The pin protocol's argument is 24 bits, so the index
+    is taken modulo 2^24 on every node - they still agree once it wraps.)
+
+    While each item plays, the next one is loaded into the
+    DoubleBufferedPlayer's standby player (parsed, & paused on frame 0), so
+    switching items costs the same as restarting a single file.
+    """
+    def __init__(self, items: list, player: DoubleBufferedPlayer):
+        """
+        Args:
+            items (list): The media files, in order (the first is already open in `player`)
+            player (DoubleBufferedPlayer): The player (not a wrapper around it)
+        """
+        self.items = items
+        self.player = player
+        self.loop_index = -1
+
+    def index(self, loop_index: int) -> int:
+        return (loop_index & 0xFFFFFF) % len(self.items)
+
+    def item(self, loop_index: int) -> str:
+        return self.items[self.index(loop_index)]
+
+    def prepare(self, loop_index: int = None):
+        """Called on "prepare" for loop `loop_index` (None: the loop after the last one)
+
+        Checks that the standby player is on this loop's item, & queues the
+        next loop's item to be loaded once this loop has started.
+        """
+        if loop_index is None:
+            loop_index = self.loop_index + 1
+        self.loop_index = loop_index
+        expected = self.item(loop_index)
+        dprint(f'Playlist: loop {loop_index} is item {self.index(loop_index)} ({expected})')
+        if self.player.standby_media != expected:
+            # Joined late, or the playlist changed - too late for this loop, so get the next loop's item ready
+            dwarn(f'Playlist: loop {loop_index} should be {expected}, but the standby player is on '
+                  f'{self.player.standby_media} - back in step from loop {loop_index + 1}')
+            self.player.change_media(self.item(loop_index + 1))
+        else:
+            self.player.next_media = self.item(loop_index + 1)
+
+    def set_items(self, items: list):
+        """Changes the playlist (eg, on a config reload) - from the next loop on"""
+        self.items = items
+        dprint(f'Playlist: now {len(items)} items')
+        self.player.change_media(self.item(self.loop_index + 1))
+
+playlist = None
+
+def playlist_prepare(loop_index: int = None):
+    """Moves the playlist (if any) on to loop `loop_index` - called on each "prepare" (see Playlist)"""
+    if playlist is not None:
+        playlist.prepare(loop_index)
+
+class DecodeHealthMonitor:
+    """Watches the player's decoding, & responds when it's dropping frames or falling behind.
+
+    A background thread samples the player's decoder statistics (see
+    Player.decode_stats() - pictures decoded, shown & lost, corrupted demux
+    blocks & the demux bitrate) & its position every `interval_sec`, while
+    it's playing. Over the last `window_sec` of samples:
+
+        loss_pct        pictures lost, as a % of those shown + lost
+        decode_ratio    pictures decoded per second / the frame rate
+        advance_ratio   how far the position moved / how long it took
+        demux_kbps      the latest demux bitrate (kbit/s)
+        corrupted       corrupted demux blocks
+
+    These (& the SoC temperature, if there's a thermal zone) go to the
+    metrics file & the trace, so a failing SD card or thermal throttling
+    shows up early. Once the samples cover at least half the window, if
+    loss_pct is over `max_loss_pct` or decode_ratio is under
+    `min_decode_ratio`, the `actions` are taken (at most once every
+    `cooldown_sec`):
+
+        warn        log it
+        resync      on_resync() - seek straight back into sync
+        beacon      on_beacon(loss_pct, decode_ratio) - tell the primary
+        lite        on_lite() - switch to a lighter decoder profile (just once)
+
+    The samples start again after each pause, backwards seek or swap to
+    another player (ie, when the totals start again, or go backwards.)
+    """
+    ACTIONS = ('warn', 'resync', 'beacon', 'lite')
+    TEMPERATURE_FILE = '/sys/class/thermal/thermal_zone0/temp'
+
+    def __init__(self, player: Player,
+                 interval_sec: float = DECODE_HEALTH_INTERVAL_SEC_DEFAULT,
+                 window_sec: float = DECODE_HEALTH_WINDOW_SEC_DEFAULT,
+                 max_loss_pct: float = DECODE_HEALTH_MAX_LOSS_PERCENT_DEFAULT,
+                 min_decode_ratio: float = DECODE_HEALTH_MIN_DECODE_RATIO_DEFAULT,
+                 actions: list = DECODE_HEALTH_ACTIONS_DEFAULT,
+                 cooldown_sec: float = DECODE_HEALTH_COOLDOWN_SEC_DEFAULT,
+                 on_resync=None, on_beacon=None, on_lite=None,
+                 metrics: SyncMetrics = None):
+        self.player = player
+        self.interval_sec = interval_sec
+        self.window_sec = window_sec
+        self.max_loss_pct = max_loss_pct
+        self.min_decode_ratio = min_decode_ratio
+        self.actions = actions
+        self.cooldown_sec = cooldown_sec
+        self.on_resync = on_resync
+        self.on_beacon = on_beacon
+        self.on_lite = on_lite
+        self.metrics = metrics
+        # (monotonic time, decode stats, position) samples
+        self.samples = deque()
+        self.last_response_ns = None
+        self.response_count = 0
+        self.lite = False
+        self.running = False
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._sample_loop, daemon=True).start()
+
+    def close(self):
+        self.running = False
+
+    def _sample_loop(self):
+        while self.running:
+            clock.sleep(self.interval_sec)
+            if self.running:
+                self.sample()
+
+    def soc_temperature(self) -> float:
+        """The SoC temperature (C), or None if there's no thermal zone"""
+        try:
+            with open(self.TEMPERATURE_FILE) as f:
+                return int(f.read()) / 1000
+        except (OSError, ValueError):
+            return None
+
+    def sample(self) -> dict:
+        """Takes a sample, & responds if the decoding is in trouble.
+
+        Returns:
+            dict: The health measurements (see above), or None if there aren't enough samples yet
+        """
+        stats = self.player.decode_stats() if self.player.state() == PLAYER_STATE_PLAYING else None
+        if stats is None:
+            self.samples.clear()
+            return None
+        now_ns, position_ms = clock.now_ns(), self.player.position()
+        lost_since_last = 0
+        if self.samples:
+            _, last_stats, last_position_ms = self.samples[-1]
+            if (stats['source'] != last_stats['source'] or position_ms < last_position_ms
+                    or any(stats[key] < last_stats[key] for key in ('decoded', 'displayed', 'lost'))):
+                self.samples.clear()
+            else:
+                lost_since_last = stats['lost'] - last_stats['lost']
+        self.samples.append((now_ns, stats, position_ms))
+        while now_ns - self.samples[0][0] > self.window_sec * 1_000_000_000:
+            self.samples.popleft()
+        if len(self.samples) < 2:
+            return None
+
+        first_ns, first, first_position_ms = self.samples[0]
+        span_sec = (now_ns - first_ns) / 1_000_000_000
+        shown = stats['displayed'] - first['displayed']
+        lost = stats['lost'] - first['lost']
+        frame_rate = 1000 / player_get_frame_duration_ms(self.player)
+        health = {
+            'loss_pct': (100 * lost / (shown + lost)) if shown + lost else 0.0,
+            'decode_ratio': (stats['decoded'] - first['decoded']) / span_sec / frame_rate,
+            'advance_ratio': (position_ms - first_position_ms) / 1000 / span_sec,
+            'demux_kbps': stats['demux_kbps'],
+            'corrupted': stats['corrupted'] - first['corrupted'],
+            'soc_temp_c': self.soc_temperature(),
+            'window_sec': span_sec,
+        }
+        ddebug(f'Decode health: {health["loss_pct"]:.1f}% lost, decoding at {health["decode_ratio"]:.2f}x, '
+               f'advancing at {health["advance_ratio"]:.2f}x, {health["demux_kbps"]:.0f}kbit/s, '
+               f'{health["corrupted"]} corrupted blocks')
+        trace_event(TRACE_DECODE, value=lost_since_last, t_ns=now_ns,
+                    aux=min(0xFFFF, int(health['decode_ratio'] * 1000)))
+        if self.metrics:
+            self.metrics.set_status('decode_health', dict(health, responses=self.response_count, lite=self.lite))
+
+        problems = []
+        if health['loss_pct'] > self.max_loss_pct:
+            problems.append(f'{health["loss_pct"]:.1f}% of pictures lost')
+        if health['decode_ratio'] < self.min_decode_ratio:
+            problems.append(f'decoding at {health["decode_ratio"]:.2f}x the frame rate')
+        cooled_down = (self.last_response_ns is None
+                       or now_ns - self.last_response_ns >= self.cooldown_sec * 1_000_000_000)
+        if problems and span_sec >= self.window_sec / 2 and cooled_down:
+            self.respond(health, problems)
+        return health
+
+    def respond(self, health: dict, problems: list):
+        self.last_response_ns = clock.now_ns()
+        self.response_count += 1
+        # The next window shouldn't include whatever the response does (eg, a seek)
+        self.samples.clear()
+        if 'warn' in self.actions:
+            temperature = f', SoC at {health["soc_temp_c"]:.0f}C' if health['soc_temp_c'] is not None else ''
+            dwarn(f'Decode trouble: {", ".join(problems)} over the last {health["window_sec"]:.0f}s '
+                  f'({health["corrupted"]} corrupted blocks, {health["demux_kbps"]:.0f}kbit/s{temperature})')
+        if 'resync' in self.actions and self.on_resync:
+            self.on_resync()
+        if 'beacon' in self.actions and self.on_beacon:
+            self.on_beacon(health['loss_pct'], health['decode_ratio'])
+        if 'lite' in self.actions and self.on_lite and not self.lite:
+            dwarn('Decode trouble: switching to the lighter decoder profile at the next restart')
+            self.lite = True
+            self.on_lite()
+
+class SerializedPlayer:
+    """Stands in for a Player, running every call on a PlayerExecutor's thread.
+
+    So the player is only ever used by one thread at a time, whichever
+    thread calls it. Event hooks are still called from the player's own
+    event thread (they mustn't call the player.)
+    """
+    def __init__(self, player: Player, executor: PlayerExecutor):
+        self.player = player
+        self.executor = executor
+
+    def __getattr__(self, name):
+        attribute = getattr(self.player, name)
+        if not callable(attribute):
+            return attribute
+        return lambda *args, **kwargs: self.executor.call(lambda: attribute(*args, **kwargs))
+
+    def close(self):
+        self.executor.call(self.player.close)
+        self.executor.close()
+
+class TracedPlayer:
+    """Stands in for a Player, recording each pause, seek, resume & rate change to the trace"""
+    TRACED_CALLS = {'pause': TRACE_PAUSE, 'seek': TRACE_SEEK, 'resume': TRACE_RESUME, 'set_rate': TRACE_RATE}
+
+    def __init__(self, player: Player):
+        self.player = player
+
+    def __getattr__(self, name):
+        attribute = getattr(self.player, name)
+        if name not in self.TRACED_CALLS:
+            return attribute
+        event = self.TRACED_CALLS[name]
+
+        def traced(*args, **kwargs):
+            start_ns = clock.now_ns()
+            result = attribute(*args, **kwargs)
+            value = 0
+            if args:
+                value = args[0] * 1_000_000 if event == TRACE_RATE else args[0]
+            trace_event(event, value=value, t_ns=start_ns, aux=(clock.now_ns() - start_ns) // 1000)
+            return result
+        return traced
+
+class PlaybackClock:
+    """Stands in for a Player, interpolating its position between the player's own updates.
+
+    VLC's get_time() only changes at demux / audio output granularity - it
+    can sit still for tens of ms, then jump. A background thread samples the
+    player every `sample_ms`, keeping the points where the position changed
+    (timed halfway between the samples either side of the change.) A
+    least-squares line through the last `window` of them gives the position
+    & rate, so position() is just arithmetic - no call into the player.
+
+    While playing, no change for `stall_ms` marks the player as stalled (the
+    position then stays put), & a change over `jump_ms` away from the line is
+    a jump - the fit starts again from there. Seeks, pauses & rate changes
+    made through this object restart the fit straight away.
+
+    Given an `executor`, the samples are taken on its thread (so the player
+    is still only used by one thread at a time.)
+    """
+    def __init__(self, player: Player,
+                 sample_ms: float = PLAYBACK_CLOCK_SAMPLE_MS_DEFAULT,
+                 stall_ms: float = PLAYBACK_CLOCK_STALL_MS_DEFAULT,
+                 jump_ms: float = PLAYBACK_CLOCK_JUMP_MS_DEFAULT,
+                 window: int = 8, metrics: SyncMetrics = None,
+                 executor: PlayerExecutor = None):
+        self.player = player
+        self.executor = executor
+        self.sample_ms = sample_ms
+        self.stall_ns = int(stall_ms * 1_000_000)
+        self.jump_ms = jump_ms
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.changes = deque(maxlen=window)
+        self.nominal_rate = 1.0
+        self.playing = False
+        self.stalled = False
+        self.stalls = 0
+        self.jumps = 0
+        self.last_raw_ms = 0
+        self.last_sample_ns = None
+        self.last_change_ns = None
+        # The fitted line: position_ms = base_ms + (rate * ms since base_ns)
+        self.base_ns = clock.now_ns()
+        self.base_ms = 0.0
+        self.rate = 0.0
+        self.running = False
+
+    def __getattr__(self, name):
+        return getattr(self.player, name)
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while self.running:
+            try:
+                self.sample(*(self.executor.call(self._read) if self.executor else self._read()))
+            except RuntimeError:
+                # The executor has closed
+                return
+            clock.sleep(self.sample_ms / 1000)
+
+    def _read(self) -> tuple:
+        """Reads the player: (when, position (ms), whether it's playing)"""
+        before_ns = clock.now_ns()
+        position_ms = self.player.position()
+        playing = self.player.state() == PLAYER_STATE_PLAYING
+        return (before_ns + clock.now_ns()) // 2, position_ms, playing
+
+    def sample(self, t_ns: int, position_ms: float, playing: bool):
+        """Adds a raw position sample (normally called by the sampling thread)"""
+        with self.lock:
+            previous_sample_ns = self.last_sample_ns
+            self.last_sample_ns = t_ns
+            if not playing:
+                self._hold(position_ms, t_ns)
+                return
+            if not self.playing:
+                # Hold still until the position actually starts moving
+                self._hold(position_ms, t_ns)
+                self.playing = True
+                self.last_change_ns = t_ns
+
+            if position_ms == self.last_raw_ms:
+                if not self.stalled and self.last_change_ns is not None and t_ns - self.last_change_ns > self.stall_ns:
+                    self.stalled = True
+                    self.stalls += 1
+                    self._set_line(t_ns, position_ms, 0.0)
+                    dwarn(f'Playback stalled at {position_ms}ms (no progress for '
+                          f'{(t_ns - self.last_change_ns) / 1_000_000:.0f}ms)')
+                return
+
+            # The change happened somewhere since the last sample - call it halfway
+            change_ns = t_ns if previous_sample_ns is None else (previous_sample_ns + t_ns) // 2
+            if self.stalled:
+                self.stalled = False
+                self.changes.clear()
+                dprint(f'Playback resumed after a stall, at {position_ms}ms')
+            elif self.changes:
+                residual_ms = position_ms - self._line_at(change_ns)
+                if self.metrics:
+                    self.metrics.observe('playback_clock_residual', residual_ms)
+                if abs(residual_ms) > self.jump_ms:
+                    self.jumps += 1
+                    ddebug('Playback position jumped %+.0fms (to %sms) - refitting', residual_ms, position_ms)
+                    self.changes.clear()
+            self.last_raw_ms = position_ms
+            self.last_change_ns = change_ns
+            self.changes.append((change_ns, position_ms))
+            self._fit()
+
+    def _hold(self, position_ms: float, t_ns: int):
+        self.playing = False
+        self.stalled = False
+        self.changes.clear()
+        self.last_raw_ms = position_ms
+        self.last_change_ns = None
+        self._set_line(t_ns, position_ms, 0.0)
+
+    def _set_line(self, base_ns: int, base_ms: float, rate: float):
+        self.base_ns, self.base_ms, self.rate = base_ns, base_ms, rate
+
+    def _line_at(self, t_ns: int) -> float:
+        return self.base_ms + (self.rate * (t_ns - self.base_ns) / 1_000_000)
+
+    def _fit(self):
+        """Least squares line through the recent changes (the nominal rate, with only one)"""
+        n = len(self.changes)
+        last_ns, last_ms = self.changes[-1]
+        if n < 3:
+            self._set_line(last_ns, last_ms, self.nominal_rate)
+            return
+        first_ns = self.changes[0][0]
+        xs = [(t_ns - first_ns) / 1_000_000 for t_ns, _ in self.changes]
+        ys = [position_ms for _, position_ms in self.changes]
+        mean_x, mean_y = sum(xs) / n, sum(ys) / n
+        variance = sum((x - mean_x) ** 2 for x in xs)
+        if variance == 0:
+            self._set_line(last_ns, last_ms, self.nominal_rate)
+            return
+        rate = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+        # Keep it sane - a wild fit is worse than the nominal rate
+        if not 0.5 * self.nominal_rate < rate < 2 * self.nominal_rate:
+            rate = self.nominal_rate
+        self._set_line(first_ns + int(mean_x * 1_000_000), mean_y, rate)
+
+    def position_at(self, t_ns: int) -> float:
+        """The (interpolated) playback position at monotonic time t_ns (ms)"""
+        with self.lock:
+            if not self.running:
+                return self.player.position()
+            return max(0.0, self._line_at(t_ns))
+
+    def position(self) -> int:
+        return int(round(self.position_at(clock.now_ns())))
+
+    def estimated_rate(self) -> float:
+        """The fitted playback rate (0 when paused or stalled)"""
+        return self.rate
+
+    def seek(self, time_ms: int):
+        self.player.seek(time_ms)
+        with self.lock:
+            self._hold(time_ms, clock.now_ns())
+
+    def pause(self):
+        self.player.pause()
+        with self.lock:
+            self._hold(self.last_raw_ms, clock.now_ns())
+
+    def set_rate(self, rate: float):
+        self.player.set_rate(rate)
+        with self.lock:
+            self.nominal_rate = rate
+            # Keep the latest point as an anchor - the old slope no longer applies
+            if self.changes:
+                anchor = self.changes[-1]
+                self.changes.clear()
+                self.changes.append(anchor)
+                self._fit()
+
+    def close(self):
+        self.running = False
+        dprint(f'Playback clock: {self.stalls} stalls, {self.jumps} jumps')
+        self.player.close()
+
+def player_wait_for_end(player: Player, duration: int,
+                        ms_before_end_to_stop: float = 600,
+                        wait_state_ms: int  = 200,
+                        debug_message_frequency_sec: int = 5,
+                        playback_clock: PlaybackClock = None,
+                        stop: threading.Event = None):
+    """
+    This function waits until the media player is near the end of the media
+    file, printing diagnostic messages every 5 seconds (by default).
+
+    Args:
+        player (Player): The media player.
+        duration (int): The total duration of the media file in ms.
+        ms_before_end_to_stop (float, optional): How many ms before the end of the media file to stop. Default: 600
+        wait_state_ms (int, optional): How many ms to wait between checks. Default: 200
+        debug_message_frequency_sec (int, optional): Print debug msgs every __ seconds. Defaults to 5. 0 to disable
+        playback_clock (PlaybackClock, optional): Use its interpolated position
+            (so the last wait ends right at near_the_end, rather than up to
+            wait_state_ms past it)
+        stop (threading.Event, optional): Return early once this is set
+
+    """
+
+    # checks current time/pos of media player, compares  w/the specified duration
+    # If current time is less than the duration minus a small buffer (three times the wait state), 
+    # pause execution for a short period (defined by wait_state_ms) and check again.
+
+    dprint('##### Beginning player_wait_for_end()  #####')
+    
+    # Always ensure we stop at least 3 wait states from the end of the video
+    if ms_before_end_to_stop > wait_state_ms * 3:
+        near_the_end = duration - ms_before_end_to_stop
+    else:
+        near_the_end = duration - (wait_state_ms * 3)
+
+    dprint(f'near_the_end = duration - (wait_state_ms*3)')
+    dprint(f'{near_the_end} = {duration} - ({wait_state_ms}*3)')
+
+    debug_line_count = 0
+    lines_to_skip_between_print = (debug_message_frequency_sec * 1000) // wait_state_ms
+    # lines_to_skip_between_print = 0
+
+    # dprint('lines_to_skip_between_print = debug_message_frequency_ms // wait_state_ms')
+    # dprint(f'{lines_to_skip_between_print} = {debug_message_frequency_ms} // {wait_state_ms}')
+
+    readable_duration = str(timedelta(seconds=duration // 1000))
+
+    current_time = player.position()
+    current_time_seconds = current_time // 1000 
+    while current_time < near_the_end and not (stop and stop.is_set()):
+        # Only print debugging stuff if debug_message_frequency_sec is enabled (ie  not 0)
+        if debug_message_frequency_sec != 0:
+            if debug_line_count == 0:
+
+                current_time_seconds = current_time // 1000 
+                current_playback_timestamp = str(timedelta(seconds=current_time_seconds))
+
+                percent_complete = int((current_time / duration) * 100)
+                dprint(f'Waiting for playback to finish. [{current_playback_timestamp} / {readable_duration}] ({percent_complete}%)')
+            if debug_line_count >= lines_to_skip_between_print:
+                debug_line_count = 0
+            else:
+                debug_line_count += 1
+
+        # dprint('All playback loops complete!')
+        sleep_ms = wait_state_ms
+        if playback_clock and playback_clock.estimated_rate() > 0:
+            sleep_ms = min(wait_state_ms, max(1, (near_the_end - current_time) / playback_clock.estimated_rate()))
+        clock.sleep(sleep_ms / 1000)
+        current_time = playback_clock.position() if playback_clock else player.position()
+
+
+    dprint('#### End of video player_wait_for_end() ####')
+
+def player_get_frame_duration_ms(player: Player) -> float:
+    """Returns the duration of a single frame (in ms) of the loaded media.
+
+    Falls back to FALLBACK_FRAME_RATE if the player doesn't (yet) know the frame rate.
+    """
+    fps = player.frame_rate()
+    if not fps or fps <= 0:
+        fps = FALLBACK_FRAME_RATE
+    return 1000 / fps
+
+def player_wait_for_end_events(player: Player, duration: int,
+                               lead_frames: int = END_LEAD_FRAMES_DEFAULT,
+                               debug_message_frequency_sec: int = 5,
+                               stop: threading.Event = None):
+    """
+    Event-driven version of player_wait_for_end(). Rather than polling
+    player.position(), this sleeps until the player reports a time change, and
+    extrapolates between (coarse) time updates with the monotonic clock, so
+    it can wake up within a frame of the requested point.
+
+    Returns when the player is `lead_frames` frames from the end, when the
+    end is reached, or when playback wraps around to the start (ie, we missed
+    the end - for example if the player looped the media itself.)
+
+    Args:
+        player (Player): The media player.
+        duration (int): The total duration of the media file in ms.
+        lead_frames (int, optional): How many frames before the end to return. Default: 2
+        debug_message_frequency_sec (int, optional): Print debug msgs every __ seconds. Defaults to 5. 0 to disable
+        stop (threading.Event, optional): Return early once this is set (checked at least every 200ms)
+    """
+    dprint('##### Beginning player_wait_for_end_events() #####')
+    if not player.supports_events:
+        dwarn('The player has no playback events - polling instead')
+        player_wait_for_end(player=player, duration=duration,
+                            ms_before_end_to_stop=lead_frames * player_get_frame_duration_ms(player),
+                            debug_message_frequency_sec=debug_message_frequency_sec, stop=stop)
+        return
+
+    frame_ms = player_get_frame_duration_ms(player)
+    near_the_end = duration - (lead_frames * frame_ms)
+    dprint(f'near_the_end = {near_the_end:.1f} = {duration} - ({lead_frames} frames * {frame_ms:.2f}ms)')
+
+    readable_duration = str(timedelta(seconds=duration // 1000))
+    wake = threading.Event()
+    # Updated from the player's event thread - plain values only, no player calls
+    latest = {
+        'time': player.position(),
+        'mono_ns': time.monotonic_ns(),
+        'playing': player.state() == PLAYER_STATE_PLAYING,
+        'wrapped': False,
+        'ended': False,
+    }
+
+    def on_update(kind, value):
+        now_ns = time.monotonic_ns()
+        if kind == 'time':
+            if value < latest['time'] - (duration / 2):
+                latest['wrapped'] = True
+            latest['time'] = value
+            latest['mono_ns'] = now_ns
+        elif kind == 'position':
+            # Only used if it's ahead of the (coarser) time updates
+            position_time = value * duration
+            if position_time > latest['time']:
+                latest['time'] = position_time
+                latest['mono_ns'] = now_ns
+        elif kind == 'playing':
+            latest['playing'] = True
+            latest['mono_ns'] = now_ns
+        elif kind == 'paused':
+            latest['playing'] = False
+        elif kind == 'end':
+            latest['ended'] = True
+        wake.set()
+
+    hook = player.add_event_hook(on_update)
+    next_debug_ns = 0
+    try:
+        while True:
+            now_ns = time.monotonic_ns()
+            predicted_time = latest['time']
+            if latest['playing']:
+                predicted_time += (now_ns - latest['mono_ns']) / 1_000_000
+
+            if latest['ended'] or latest['wrapped'] or predicted_time >= near_the_end:
+                break
+            if stop and stop.is_set():
+                break
+
+            if debug_message_frequency_sec != 0 and now_ns >= next_debug_ns:
+                current_playback_timestamp = str(timedelta(seconds=int(predicted_time) // 1000))
+                percent_complete = int((predicted_time / duration) * 100)
+                dprint(f'Waiting for playback to finish. [{current_playback_timestamp} / {readable_duration}] ({percent_complete}%)')
+                next_debug_ns = now_ns + (debug_message_frequency_sec * 1_000_000_000)
+
+            # Sleep until the next event, or until we'd predict the end is
+            # near (whichever is first.) If paused, only an event can wake us.
+            if latest['playing']:
+                timeout = (near_the_end - predicted_time) / 1000
+            else:
+                timeout = None
+            if stop:
+                timeout = 0.2 if timeout is None else min(timeout, 0.2)
+            wake.wait(timeout=timeout)
+            wake.clear()
+    finally:
+        player.remove_event_hook(hook)
+
+    if latest['wrapped']:
+        dprint('Playback wrapped around to the start before the end was detected!')
+    dprint('#### End of video player_wait_for_end_events() ####')
+
+def player_wait_for_restart_events(player: Player, duration: int, stop: threading.Event = None):
+    """Sleeps until playback is restarted (time jumps back towards 0), or `stop` is set.
+
+    Used by secondaries in "events" mode, which have nothing to do between
+    the end of the media and the next restart from the primary. (A player
+    without events is polled every 200ms instead.)
+    """
+    dprint('Waiting for playback to restart')
+    restarted = threading.Event()
+    last_time = {'time': player.position()}
+
+    def on_update(kind, value):
+        if kind == 'time':
+            if value < last_time['time'] - (duration / 2):
+                restarted.set()
+            last_time['time'] = value
+
+    if not player.supports_events:
+        while not (stop and stop.is_set()):
+            clock.sleep(0.2)
+            on_update('time', player.position())
+            if restarted.is_set():
+                dprint('Playback restarted')
+                return
+        return
+
+    hook = player.add_event_hook(on_update)
+    try:
+        while not restarted.wait(timeout=0.2 if stop else None):
+            if stop.is_set():
+                return
+    finally:
+        player.remove_event_hook(hook)
+    dprint('Playback restarted')
+
+
+class VirtualClock(MonotonicClock):
+    """A simulated monotonic clock, for simulate().
+
+    Time only moves when something sleeps: sleeping runs every event
+    scheduled (with call_at()) up to the deadline, in order, then jumps to
+    the deadline. So one thread can play the primary, while the secondaries,
+    GPIO edges & players are driven by events - deterministically, and much
+    faster than real time.
+    """
+    def __init__(self, start_ns: int = 0):
+        super().__init__(spin_window_ns=0)
+        self.current_ns = start_ns
+        self.events = []
+        self.sequence = itertools.count()
+
+    def now_ns(self) -> int:
+        return self.current_ns
+
+    def call_at(self, at_ns: int, callback):
+        """Runs callback() at (virtual) time at_ns"""
+        heapq.heappush(self.events, (at_ns, next(self.sequence), callback))
+
+    def call_later(self, delay_ns: int, callback):
+        self.call_at(self.current_ns + int(delay_ns), callback)
+
+    def sleep(self, seconds: float):
+        self.sleep_until_ns(self.current_ns + int(seconds * 1_000_000_000))
+
+    def sleep_until_ns(self, deadline_ns: int) -> int:
+        while self.events and self.events[0][0] <= deadline_ns:
+            at_ns, _, callback = heapq.heappop(self.events)
+            self.current_ns = max(self.current_ns, at_ns)
+            callback()
+        late_ns = max(0, self.current_ns - deadline_ns)
+        self.current_ns = max(self.current_ns, deadline_ns)
+        return late_ns
+
+class SimPlayer(Player):
+    """A simulated Player, for simulate().
+
+    Implements the Player methods the sync code uses, on the virtual
+    clock. Seeks take `seek_latency_ms` to complete, & playback only starts
+    advancing `decode_latency_ms` after play() (or after the seek completes,
+    if that's later) - both +/- `jitter_ms`. The playback clock runs
+    `drift_ppm` parts per million fast (or slow, if negative).
+    """
+    def __init__(self, duration: int, fps: float = 30, seek_latency_ms: float = 30,
+                 decode_latency_ms: float = 40, jitter_ms: float = 0, drift_ppm: float = 0,
+                 rng: random.Random = None):
+        self.duration = duration
+        self.fps = fps
+        self.seek_latency_ms = seek_latency_ms
+        self.decode_latency_ms = decode_latency_ms
+        self.jitter_ms = jitter_ms
+        self.drift_ppm = drift_ppm
+        self.rng = rng or random.Random()
+
+        self.playback_state = PLAYER_STATE_PAUSED
+        self.rate = 1.0
+        self.position_ms = 0.0      # Position at anchor_ns
+        self.anchor_ns = None       # When playback (re)started advancing from position_ms
+        self.seek_done_ns = 0
+        self.restart_ns = []        # When each restart (from 0) started advancing
+
+    def latency_ns(self, latency_ms: float) -> int:
+        jitter_ms = self.rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return int(max(0, latency_ms + jitter_ms) * 1_000_000)
+
+    def position_at(self, now_ns: int) -> float:
+        """The actual (displayed) position at now_ns, in ms"""
+        if self.anchor_ns is None or now_ns <= self.anchor_ns:
+            return self.position_ms
+        elapsed_ms = (now_ns - self.anchor_ns) / 1_000_000
+        position_ms = self.position_ms + (elapsed_ms * self.rate * (1 + (self.drift_ppm / 1_000_000)))
+        return min(position_ms, self.duration)
+
+    def advancing(self, now_ns: int) -> bool:
+        return (self.anchor_ns is not None and now_ns > self.anchor_ns
+                and self.position_at(now_ns) < self.duration)
+
+    def rebase(self, now_ns: int):
+        """Moves the anchor to now (before changing the rate or position)"""
+        if self.anchor_ns is not None and now_ns > self.anchor_ns:
+            self.position_ms = self.position_at(now_ns)
+            self.anchor_ns = now_ns
+
+    def open(self, media_file: str) -> int:
+        return self.duration
+
+    def preroll(self) -> bool:
+        self.pause()
+        self.seek(0)
+        return True
+
+    def resume(self):
+        if self.playback_state == PLAYER_STATE_PLAYING:
+            return
+        now_ns = clock.now_ns()
+        self.playback_state = PLAYER_STATE_PLAYING
+        self.anchor_ns = max(now_ns, self.seek_done_ns) + self.latency_ns(self.decode_latency_ms)
+        if self.position_ms == 0:
+            self.restart_ns.append(self.anchor_ns)
+
+    def pause(self):
+        now_ns = clock.now_ns()
+        self.position_ms = self.position_at(now_ns)
+        self.anchor_ns = None
+        self.playback_state = PLAYER_STATE_PAUSED
+
+    def seek(self, time_ms: int):
+        now_ns = clock.now_ns()
+        self.seek_done_ns = now_ns + self.latency_ns(self.seek_latency_ms)
+        self.position_ms = float(time_ms)
+        if self.playback_state == PLAYER_STATE_PLAYING:
+            # Carries on from the new position once the seek completes
+            self.anchor_ns = self.seek_done_ns
+
+    def position(self) -> int:
+        return int(self.position_at(clock.now_ns()))
+
+    def state(self) -> str:
+        if self.playback_state == PLAYER_STATE_PLAYING and self.position_at(clock.now_ns()) >= self.duration:
+            return PLAYER_STATE_ENDED
+        return self.playback_state
+
+    def set_rate(self, rate: float):
+        self.rebase(clock.now_ns())
+        self.rate = rate
+
+    def frame_rate(self) -> float:
+        return self.fps
+
+    def set_muted(self, muted: bool):
+        pass
+
+    def set_fullscreen(self, fullscreen: bool):
+        pass
+
+    def close(self):
+        self.pause()
+        self.playback_state = PLAYER_STATE_STOPPED
+
+class VirtualInputPin:
+    """Stands in for gpiozero's DigitalInputDevice (as a listen pin) in simulate().
+
+    Like gpiozero, edges within `bounce_time` seconds of the last reported
+    edge are ignored.
+    """
+    def __init__(self, bounce_time: float = 0.020):
+        self.bounce_ns = int(bounce_time * 1_000_000_000)
+        self.value = False
+        self.last_edge_ns = None
+        self.when_activated = None
+        self.when_deactivated = None
+
+    def set_level(self, value: bool):
+        if value == self.value:
+            return
+        self.value = value
+        now_ns = clock.now_ns()
+        if self.last_edge_ns is not None and now_ns - self.last_edge_ns < self.bounce_ns:
+            return
+        self.last_edge_ns = now_ns
+        callback = self.when_activated if value else self.when_deactivated
+        if callback:
+            callback()
+
+class VirtualOutputPin:
+    """Stands in for gpiozero's DigitalOutputDevice (as a transmit pin) in simulate().
+
+    Each transmit pin is wired to its own set of listen pins, via the bus.
+    """
+    def __init__(self, bus, listen_pins: list):
+        self.bus = bus
+        self.listen_pins = listen_pins
+
+    def on(self):
+        self.bus.drive(self.listen_pins, True)
+
+    def off(self):
+        self.bus.drive(self.listen_pins, False)
+
+class VirtualGpioBus:
+    """Wires virtual transmit pins to listen pins, for simulate().
+
+    Each edge reaches each listen pin `edge_latency_us` (+ up to
+    `edge_jitter_us`) later, followed by `bounce_count` bounces (the level
+    flipping back & forth, `bounce_us` apart).
+    """
+    def __init__(self, edge_latency_us: float = 50, edge_jitter_us: float = 0,
+                 bounce_count: int = 0, bounce_us: float = 200, rng: random.Random = None):
+        self.edge_latency_us = edge_latency_us
+        self.edge_jitter_us = edge_jitter_us
+        self.bounce_count = bounce_count
+        self.bounce_us = bounce_us
+        self.rng = rng or random.Random()
+
+    def drive(self, listen_pins: list, value: bool):
+        for listen_pin in listen_pins:
+            delay_us = self.edge_latency_us + self.rng.uniform(0, self.edge_jitter_us)
+            clock.call_later(delay_us * 1000, lambda pin=listen_pin: pin.set_level(value))
+            for bounce in range(1, self.bounce_count + 1):
+                bounce_delay_us = delay_us + ((2 * bounce - 1) * self.bounce_us)
+                clock.call_later(bounce_delay_us * 1000, lambda pin=listen_pin: pin.set_level(not value))
+                clock.call_later((bounce_delay_us + self.bounce_us) * 1000, lambda pin=listen_pin: pin.set_level(value))
+
+def simulate(secondaries: int = 20, loops: int = 5, duration_ms: int = 10000, fps: float = 30,
+             transmit_pin_count: int = 3, edge_latency_us: float = 50, edge_jitter_us: float = 30,
+             bounce_count: int = 0, bounce_us: float = 200, seek_latency_ms: float = 30,
+             decode_latency_ms: float = 40, latency_jitter_ms: float = 15, drift_ppm: float = 200,
+             sample_interval_ms: float = 100, seed: int = 1) -> dict:
+    """Runs the primary & secondary sync logic against simulated players & GPIO.
+
+    One primary & `secondaries` secondaries each get a SimPlayer (with
+    latencies & drift randomised from the given limits). The primary's
+    transmit pins are wired to the secondaries' listen pins (round robin)
+    with a VirtualGpioBus. The primary runs `loops` loops using the
+    configured PrimaryTiming, & secondaries restart on the listen pin edges,
+    (with drift correction, if DriftCorrection is enabled) - all on the
+    VirtualClock, which must already be installed as `clock`.
+
+    Returns:
+        dict: "start_skew_ms" - for each loop, how far each secondary's
+              restart was from the primary's (max - min, & worst offset);
+              "position_error_ms" - stats of |secondary - primary| position,
+              sampled every sample_interval_ms while all nodes are playing
+    """
+    rng = random.Random(seed)
+
+    def new_player():
+        return SimPlayer(duration=duration_ms, fps=fps,
+                         seek_latency_ms=rng.uniform(0, seek_latency_ms),
+                         decode_latency_ms=rng.uniform(0, decode_latency_ms),
+                         jitter_ms=latency_jitter_ms,
+                         drift_ppm=rng.uniform(-drift_ppm, drift_ppm), rng=rng)
+
+    def schedule_drift_updates(player, drift):
+        # As the secondary's main loop: drift.update() every DRIFT_INTERVAL_SEC
+        def drift_update():
+            drift.update(player=player)
+            clock.call_later(DRIFT_INTERVAL_SEC * 1_000_000_000, drift_update)
+        clock.call_later(DRIFT_INTERVAL_SEC * 1_000_000_000, drift_update)
+
+    primary = new_player()
+    bus = VirtualGpioBus(edge_latency_us=edge_latency_us, edge_jitter_us=edge_jitter_us,
+                         bounce_count=bounce_count, bounce_us=bounce_us, rng=rng)
+    wiring = [[] for _ in range(transmit_pin_count)]
+    nodes = []
+    for node_index in range(secondaries):
+        player = new_player()
+        drift = None
+        if DRIFT_CORRECTION:
+            drift = DriftController(duration=duration_ms, gain_p=DRIFT_GAIN_P, gain_i=DRIFT_GAIN_I,
+                                    max_rate_adjust=DRIFT_MAX_RATE_ADJUST, hard_seek_ms=DRIFT_HARD_SEEK_MS)
+            schedule_drift_updates(player, drift)
+        listen_pin = VirtualInputPin(bounce_time=0.020)
+        listen_pin_attach(listen_pin=listen_pin, player=player, drift=drift)
+        wiring[node_index % transmit_pin_count].append(listen_pin)
+        nodes.append(player)
+
+    position_errors_ms = []
+
+    def sample_positions():
+        now_ns = clock.now_ns()
+        if primary.advancing(now_ns) and all(node.advancing(now_ns) for node in nodes):
+            primary_ms = primary.position_at(now_ns)
+            position_errors_ms.extend(abs(node.position_at(now_ns) - primary_ms) for node in nodes)
+        clock.call_later(sample_interval_ms * 1_000_000, sample_positions)
+    clock.call_later(sample_interval_ms * 1_000_000, sample_positions)
+
+    transmitter = GpioTransmitter(SequentialOutputLines([VirtualOutputPin(bus, listen_pins) for listen_pins in wiring]))
+    pin_tx_ns = int(PIN_TX_DURATION_SEC * 1_000_000_000)
+    if PRIMARY_TIMING == 'deadline':
+        play_ms = duration_ms - (END_LEAD_FRAMES * player_get_frame_duration_ms(primary))
+        schedule = LoopSchedule(start_ns=clock.now_ns() + pin_tx_ns,
+                                play_ns=int(play_ms * 1_000_000), pin_tx_ns=pin_tx_ns)
+        for loop_index in range(loops):
+            primary_restart_at_deadlines(player=primary, transmitter=transmitter,
+                                         schedule=schedule, loop_index=loop_index)
+        clock.sleep(play_ms / 1000)
+    else:
+        for loop_index in range(loops):
+            primary_restart_after_sleep(player=primary, transmitter=transmitter,
+                                        loop_index=loop_index, pin_tx_sec=PIN_TX_DURATION_SEC)
+            player_wait_for_end(player=primary, duration=duration_ms, ms_before_end_to_stop=3000,
+                                debug_message_frequency_sec=0)
+
+    start_skew_ms = []
+    for loop_index, primary_start_ns in enumerate(primary.restart_ns):
+        offsets_ms = [(node.restart_ns[loop_index] - primary_start_ns) / 1_000_000
+                      for node in nodes if len(node.restart_ns) > loop_index]
+        if len(offsets_ms) < len(nodes):
+            dwarn(f'Loop {loop_index}: only {len(offsets_ms)}/{len(nodes)} secondaries restarted')
+        if offsets_ms:
+            start_skew_ms.append({'spread': max(offsets_ms) - min(offsets_ms),
+                                  'worst': max(offsets_ms, key=abs)})
+
+    position_errors_ms.sort()
+    def percentile(fraction):
+        return position_errors_ms[min(len(position_errors_ms) - 1, int(len(position_errors_ms) * fraction))]
+    return {
+        'nodes': secondaries + 1,
+        'loops': len(primary.restart_ns),
+        'start_skew_ms': start_skew_ms,
+        'position_error_ms': {
+            'samples': len(position_errors_ms),
+            'p50': percentile(0.50) if position_errors_ms else None,
+            'p95': percentile(0.95) if position_errors_ms else None,
+            'max': position_errors_ms[-1] if position_errors_ms else None,
+        },
+    }
+
+def config_build(config_parsed: configparser.ConfigParser) -> dict:
+    """Reads the settings from a parsed config file, with defaults for any not set.
+
+    Raises:
+        ValueError: If a setting isn't of the right type (eg, "abc" for a number)
+    """
+    return {
+        #     # Video
+        'MEDIA_FILE': config_parsed.get('Video', 'MediaFile', fallback=None),
+        'PLAYLIST': [item for item in config_split_list(config_parsed.get('Video', 'Playlist', fallback=PLAYLIST_DEFAULT), cast_to_int=False) if item],
+        'FULLSCREEN_MODE': config_parsed.getboolean('Video', 'Fullscreen', fallback=FULLSCREEN_MODE_DEFAULT),
+        'PLAY_FOREVER': config_parsed.getboolean('Video', 'PlayForever', fallback=PLAY_FOREVER_DEFAULT),
+        'PLAYBACK_COUNT': config_parsed.getint('Video', 'PlaybackCount', fallback=PLAYBACK_COUNT_DEFAULT),
+        'PLAYER_BACKEND': config_parsed.get('Video', 'PlayerBackend', fallback=PLAYER_BACKEND_DEFAULT),
+        'MEDIA_RESIDENCY': config_parsed.get('Video', 'MediaResidency', fallback=MEDIA_RESIDENCY_DEFAULT),
+        'MEDIA_RESIDENCY_TMPFS_DIR': config_parsed.get('Video', 'MediaResidencyTmpfsDir', fallback=MEDIA_RESIDENCY_TMPFS_DIR_DEFAULT),
+        'MEDIA_RESIDENCY_REPORT_SEC': config_parsed.getfloat('Video', 'MediaResidencyReportSec', fallback=MEDIA_RESIDENCY_REPORT_SEC_DEFAULT),
+
+        # Sync
+        'MODE': config_parsed.get('Sync', 'PlayerMode', fallback=MODE_DEFAULT),
+        # Split the below into a list
+        'GPIO_TRANSMIT_PINS': config_split_list(config_parsed.get('Sync', 'TransmitPins', fallback=','.join(str(x) for x in GPIO_TRANSMIT_PINS_DEFAULT))),
+        'GPIO_LISTEN_PIN': int(config_parsed.get('Sync', 'ListenPin', fallback=GPIO_LISTEN_PIN_DEFAULT)),
+        'LOAD_WAIT_DURATION': config_parsed.getfloat('Sync', 'LoadWaitDuration', fallback=LOAD_WAIT_DURATION_DEFAULT),
+        'PIN_TX_DURATION_SEC': config_parsed.getfloat('Sync', 'PinTxDurationSec', fallback=PIN_TX_DURATION_SEC_DEFAULT),
+        'END_DETECTION': config_parsed.get('Sync', 'EndDetection', fallback=END_DETECTION_DEFAULT),
+        'END_LEAD_FRAMES': config_parsed.getint('Sync', 'EndLeadFrames', fallback=END_LEAD_FRAMES_DEFAULT),
+        'PRIMARY_TIMING': config_parsed.get('Sync', 'PrimaryTiming', fallback=PRIMARY_TIMING_DEFAULT),
+        'SYNC_TRANSPORT': config_parsed.get('Sync', 'Transport', fallback=SYNC_TRANSPORT_DEFAULT),
+        'MULTICAST_GROUP': config_parsed.get('Sync', 'MulticastGroup', fallback=MULTICAST_GROUP_DEFAULT),
+        'MULTICAST_PORT': config_parsed.getint('Sync', 'MulticastPort', fallback=MULTICAST_PORT_DEFAULT),
+        'MULTICAST_INTERFACE': config_parsed.get('Sync', 'MulticastInterface', fallback=MULTICAST_INTERFACE_DEFAULT),
+        'MULTICAST_TTL': config_parsed.getint('Sync', 'MulticastTTL', fallback=MULTICAST_TTL_DEFAULT),
+        'GO_LEAD_MS': config_parsed.getfloat('Sync', 'GoLeadMs', fallback=GO_LEAD_MS_DEFAULT),
+        'POSITION_INTERVAL_SEC': config_parsed.getfloat('Sync', 'PositionIntervalSec', fallback=POSITION_INTERVAL_SEC_DEFAULT),
+        'CLOCK_SYNC_INTERVAL_SEC': config_parsed.getfloat('Sync', 'ClockSyncIntervalSec', fallback=CLOCK_SYNC_INTERVAL_SEC_DEFAULT),
+        'PLAYBACK_CLOCK': config_parsed.getboolean('Sync', 'PlaybackClock', fallback=PLAYBACK_CLOCK_DEFAULT),
+        'PLAYBACK_CLOCK_SAMPLE_MS': config_parsed.getfloat('Sync', 'PlaybackClockSampleMs', fallback=PLAYBACK_CLOCK_SAMPLE_MS_DEFAULT),
+        'PLAYBACK_CLOCK_STALL_MS': config_parsed.getfloat('Sync', 'PlaybackClockStallMs', fallback=PLAYBACK_CLOCK_STALL_MS_DEFAULT),
+        'PLAYBACK_CLOCK_JUMP_MS': config_parsed.getfloat('Sync', 'PlaybackClockJumpMs', fallback=PLAYBACK_CLOCK_JUMP_MS_DEFAULT),
+        'DRIFT_CORRECTION': config_parsed.getboolean('Sync', 'DriftCorrection', fallback=DRIFT_CORRECTION_DEFAULT),
+        'DRIFT_INTERVAL_SEC': config_parsed.getfloat('Sync', 'DriftIntervalSec', fallback=DRIFT_INTERVAL_SEC_DEFAULT),
+        'DRIFT_HARD_SEEK_MS': config_parsed.getfloat('Sync', 'DriftHardSeekMs', fallback=DRIFT_HARD_SEEK_MS_DEFAULT),
+        'SERIALIZE_PLAYER_COMMANDS': config_parsed.getboolean('Sync', 'SerializePlayerCommands', fallback=SERIALIZE_PLAYER_COMMANDS_DEFAULT),
+        'COMMAND_DEBOUNCE_MS': config_parsed.getfloat('Sync', 'CommandDebounceMs', fallback=COMMAND_DEBOUNCE_MS_DEFAULT),
+        'COMMAND_LATENCY_WARN_MS': config_parsed.getfloat('Sync', 'CommandLatencyWarnMs', fallback=COMMAND_LATENCY_WARN_MS_DEFAULT),
+        'GPIO_OUTPUT': config_parsed.get('Sync', 'GpioOutput', fallback=GPIO_OUTPUT_DEFAULT),
+        'GPIO_CHIP': config_parsed.get('Sync', 'GpioChip', fallback=GPIO_CHIP_DEFAULT),
+        'PIN_PROTOCOL': config_parsed.get('Sync', 'PinProtocol', fallback=PIN_PROTOCOL_DEFAULT),
+        'PIN_BIT_MS': config_parsed.getfloat('Sync', 'PinBitMs', fallback=PIN_BIT_MS_DEFAULT),
+        'CHAPTERS': [float(chapter) for chapter in config_split_list(config_parsed.get('Sync', 'Chapters', fallback=CHAPTERS_DEFAULT), cast_to_int=False) if chapter],
+        'LISTEN_PINS': config_split_list(config_parsed.get('Sync', 'ListenPins', fallback=config_parsed.get('Sync', 'ListenPin', fallback=str(GPIO_LISTEN_PIN_DEFAULT)))),
+        'EDGE_CAPTURE': config_parsed.get('Sync', 'EdgeCapture', fallback=EDGE_CAPTURE_DEFAULT),
+        'EDGE_COMPENSATION': config_parsed.get('Sync', 'EdgeCompensation', fallback=EDGE_COMPENSATION_DEFAULT),
+        'EDGE_COMPENSATION_MIN_MS': config_parsed.getfloat('Sync', 'EdgeCompensationMinMs', fallback=EDGE_COMPENSATION_MIN_MS_DEFAULT),
+        'HOT_JOIN': config_parsed.getboolean('Sync', 'HotJoin', fallback=HOT_JOIN_DEFAULT),
+        'HOT_JOIN_THRESHOLD_MS': config_parsed.getfloat('Sync', 'HotJoinThresholdMs', fallback=HOT_JOIN_THRESHOLD_MS_DEFAULT),
+        'SEEK_LATENCY_MS': config_parsed.getfloat('Sync', 'SeekLatencyMs', fallback=SEEK_LATENCY_MS_DEFAULT),
+        'CLOCK_EPOCH': config_parsed.get('Sync', 'ClockEpoch', fallback=CLOCK_EPOCH_DEFAULT),
+        'CLOCK_SOURCE': config_parsed.get('Sync', 'ClockSource', fallback=CLOCK_SOURCE_DEFAULT),
+        'CLOCK_OFFSET_MS': config_parsed.getfloat('Sync', 'ClockOffsetMs', fallback=CLOCK_OFFSET_MS_DEFAULT),
+        'READY_BARRIER': config_parsed.getboolean('Sync', 'ReadyBarrier', fallback=READY_BARRIER_DEFAULT),
+        'READY_TIMEOUT_SEC': config_parsed.getfloat('Sync', 'ReadyTimeoutSec', fallback=READY_TIMEOUT_SEC_DEFAULT),
+        'READY_PIN': config_parsed.getint('Sync', 'ReadyPin', fallback=READY_PIN_DEFAULT),
+        'NODE_NAME': config_parsed.get('Sync', 'NodeName', fallback=NODE_NAME_DEFAULT),
+        'EXPECTED_NODES': [node for node in config_split_list(config_parsed.get('Sync', 'ExpectedNodes', fallback=EXPECTED_NODES_DEFAULT), cast_to_int=False) if node],
+
+        # Advanced
+        'PLAYBACK_AFTER_LOAD_DURATION_SEC': config_parsed.getfloat('Advanced', 'PlaybackAfterLoadDurationSec', fallback=PLAYBACK_AFTER_LOAD_DURATION_SEC_DEFAULT),
+        'TOGGLE_FULLSCREEN_DURING_INIT': config_parsed.getboolean('Advanced', 'ToggleFullscreenDuringInit', fallback=False),
+        'PLAY_BRIEFLY_FULLSCREEN_WORKAROUND': config_parsed.getboolean('Advanced', 'PlayBrieflyFullscreenWorkaround', fallback=False),
+        'METADATA_CACHE': config_parsed.getboolean('Advanced', 'MetadataCache', fallback=METADATA_CACHE_DEFAULT),
+        'METADATA_CACHE_FILE': config_parsed.get('Advanced', 'MetadataCacheFile', fallback=METADATA_CACHE_FILE_DEFAULT),
+        'DOUBLE_BUFFERED_PLAYERS': config_parsed.getboolean('Advanced', 'DoubleBufferedPlayers', fallback=DOUBLE_BUFFERED_PLAYERS_DEFAULT),
+        'REALTIME_PROFILE': config_parsed.getboolean('Advanced', 'RealtimeProfile', fallback=REALTIME_PROFILE_DEFAULT),
+        'REALTIME_PRIORITY': config_parsed.getint('Advanced', 'RealtimePriority', fallback=REALTIME_PRIORITY_DEFAULT),
+        'CONTROL_CPU': config_parsed.getint('Advanced', 'ControlCpu', fallback=CONTROL_CPU_DEFAULT),
+        'PLAYER_CPUS': config_split_list(config_parsed.get('Advanced', 'PlayerCpus', fallback=', '.join(str(cpu) for cpu in PLAYER_CPUS_DEFAULT))),
+        'LOCK_MEMORY': config_parsed.getboolean('Advanced', 'LockMemory', fallback=LOCK_MEMORY_DEFAULT),
+        'MANAGE_GC': config_parsed.getboolean('Advanced', 'ManageGc', fallback=MANAGE_GC_DEFAULT),
+        'WAKEUP_SELF_TEST': config_parsed.getboolean('Advanced', 'WakeupSelfTest', fallback=WAKEUP_SELF_TEST_DEFAULT),
+        'CONFIG_RELOAD': config_parsed.getboolean('Advanced', 'ConfigReload', fallback=CONFIG_RELOAD_DEFAULT),
+        'CONFIG_WATCH_SEC': config_parsed.getfloat('Advanced', 'ConfigWatchSec', fallback=CONFIG_WATCH_SEC_DEFAULT),
+        'DECODE_HEALTH': config_parsed.getboolean('Advanced', 'DecodeHealth', fallback=DECODE_HEALTH_DEFAULT),
+        'DECODE_HEALTH_INTERVAL_SEC': config_parsed.getfloat('Advanced', 'DecodeHealthIntervalSec', fallback=DECODE_HEALTH_INTERVAL_SEC_DEFAULT),
+        'DECODE_HEALTH_WINDOW_SEC': config_parsed.getfloat('Advanced', 'DecodeHealthWindowSec', fallback=DECODE_HEALTH_WINDOW_SEC_DEFAULT),
+        'DECODE_HEALTH_MAX_LOSS_PERCENT': config_parsed.getfloat('Advanced', 'DecodeHealthMaxLossPercent', fallback=DECODE_HEALTH_MAX_LOSS_PERCENT_DEFAULT),
+        'DECODE_HEALTH_MIN_DECODE_RATIO': config_parsed.getfloat('Advanced', 'DecodeHealthMinDecodeRatio', fallback=DECODE_HEALTH_MIN_DECODE_RATIO_DEFAULT),
+        'DECODE_HEALTH_ACTIONS': [action for action in config_split_list(config_parsed.get('Advanced', 'DecodeHealthActions', fallback=', '.join(DECODE_HEALTH_ACTIONS_DEFAULT)), cast_to_int=False) if action],
+        'DECODE_HEALTH_COOLDOWN_SEC': config_parsed.getfloat('Advanced', 'DecodeHealthCooldownSec', fallback=DECODE_HEALTH_COOLDOWN_SEC_DEFAULT),
+        'DECODE_HEALTH_LITE_OPTIONS': [option for option in config_split_list(config_parsed.get('Advanced', 'DecodeHealthLiteOptions', fallback=', '.join(DECODE_HEALTH_LITE_OPTIONS_DEFAULT)), cast_to_int=False) if option],
+        'PREFLIGHT_CHECK': config_parsed.getboolean('Advanced', 'PreflightCheck', fallback=PREFLIGHT_CHECK_DEFAULT),
+        'PREFLIGHT_MAX_KEYFRAME_INTERVAL_MS': config_parsed.getfloat('Advanced', 'PreflightMaxKeyframeIntervalMs', fallback=PREFLIGHT_MAX_KEYFRAME_INTERVAL_MS_DEFAULT),
+        'FALLBACK_FRAME_RATE': config_parsed.getfloat('Advanced', 'FallbackFrameRate', fallback=FALLBACK_FRAME_RATE_DEFAULT),
+        'SPIN_WINDOW_US': config_parsed.getint('Advanced', 'SpinWindowUs', fallback=SPIN_WINDOW_US_DEFAULT),
+        'DRIFT_GAIN_P': config_parsed.getfloat('Advanced', 'DriftGainP', fallback=DRIFT_GAIN_P_DEFAULT),
+        'DRIFT_GAIN_I': config_parsed.getfloat('Advanced', 'DriftGainI', fallback=DRIFT_GAIN_I_DEFAULT),
+        'DRIFT_MAX_RATE_ADJUST': config_parsed.getfloat('Advanced', 'DriftMaxRateAdjust', fallback=DRIFT_MAX_RATE_ADJUST_DEFAULT),
+
+        # Debug
+        'TEST_MODE_FAKE_GPIO': config_parsed.getboolean('Debug', 'FakeGPIO', fallback=TEST_MODE_FAKE_GPIO_DEFAULT),
+        'METRICS': config_parsed.getboolean('Debug', 'Metrics', fallback=METRICS_DEFAULT),
+        'METRICS_SUMMARY_LOOPS': config_parsed.getint('Debug', 'MetricsSummaryLoops', fallback=METRICS_SUMMARY_LOOPS_DEFAULT),
+        'METRICS_FILE': config_parsed.get('Debug', 'MetricsFile', fallback=METRICS_FILE_DEFAULT),
+        'METRICS_WINDOW': config_parsed.getint('Debug', 'MetricsWindow', fallback=METRICS_WINDOW_DEFAULT),
+        'TRACE_FILE': config_parsed.get('Debug', 'TraceFile', fallback=TRACE_FILE_DEFAULT),
+        'TRACE_BUFFER_RECORDS': config_parsed.getint('Debug', 'TraceBufferRecords', fallback=TRACE_BUFFER_RECORDS_DEFAULT),
+        'TRACE_SAMPLE_SEC': config_parsed.getfloat('Debug', 'TraceSampleSec', fallback=TRACE_SAMPLE_SEC_DEFAULT),
+        'TRACE_MAX_MB': config_parsed.getfloat('Debug', 'TraceMaxMb', fallback=TRACE_MAX_MB_DEFAULT),
+        'LOG_LEVEL': config_parsed.get('Debug', 'LogLevel', fallback=LOG_LEVEL_DEFAULT),
+        'LOG_OUTPUT': config_parsed.get('Debug', 'LogOutput', fallback=LOG_OUTPUT_DEFAULT),
+        'LOG_BUFFER_SIZE': config_parsed.getint('Debug', 'LogBufferSize', fallback=LOG_BUFFER_SIZE_DEFAULT),
+        # 'osd_enabled': config_parsed.getboolean('video', 'osd_enabled', fallback=osd_enabled)
+        # }
+    }
+
+# Settings with a fixed set of values: config key -> (ini option, allowed values)
+CONFIG_CHOICES = {
+    'MODE': ('PlayerMode', ('primary', 'secondary', 'clock')),
+    'PLAYER_BACKEND': ('PlayerBackend', ('vlc', 'mpv')),
+    'MEDIA_RESIDENCY': ('MediaResidency', ('off', 'cache', 'lock', 'tmpfs')),
+    'END_DETECTION': ('EndDetection', ('poll', 'events')),
+    'PRIMARY_TIMING': ('PrimaryTiming', ('sleep', 'deadline')),
+    'SYNC_TRANSPORT': ('Transport', ('gpio', 'udp')),
+    'GPIO_OUTPUT': ('GpioOutput', ('auto', 'gpiod', 'gpiozero')),
+    'PIN_PROTOCOL': ('PinProtocol', ('legacy', 'serial', 'parallel')),
+    'EDGE_CAPTURE': ('EdgeCapture', ('gpiozero', 'gpiod')),
+    'EDGE_COMPENSATION': ('EdgeCompensation', ('off', 'seek', 'rate')),
+    'CLOCK_SOURCE': ('ClockSource', ('realtime', 'monotonic')),
+    'LOG_LEVEL': ('LogLevel', tuple(LOG_LEVELS)),
+    'LOG_OUTPUT': ('LogOutput', ('print', 'thread', 'signal')),
+}
+
+# Settings that can't be negative (or zero, for the ones marked True)
+CONFIG_POSITIVE = {
+    'PLAYBACK_COUNT': ('PlaybackCount', True),
+    'PIN_TX_DURATION_SEC': ('PinTxDurationSec', True),
+    'DRIFT_INTERVAL_SEC': ('DriftIntervalSec', True),
+    'PIN_BIT_MS': ('PinBitMs', True),
+    'END_LEAD_FRAMES': ('EndLeadFrames', False),
+    'GO_LEAD_MS': ('GoLeadMs', False),
+    'DRIFT_HARD_SEEK_MS': ('DriftHardSeekMs', False),
+    'DRIFT_MAX_RATE_ADJUST': ('DriftMaxRateAdjust', False),
+    'SEEK_LATENCY_MS': ('SeekLatencyMs', False),
+    'COMMAND_DEBOUNCE_MS': ('CommandDebounceMs', False),
+    'EDGE_COMPENSATION_MIN_MS': ('EdgeCompensationMinMs', False),
+    'DECODE_HEALTH_INTERVAL_SEC': ('DecodeHealthIntervalSec', True),
+    'DECODE_HEALTH_WINDOW_SEC': ('DecodeHealthWindowSec', True),
+    'DECODE_HEALTH_MAX_LOSS_PERCENT': ('DecodeHealthMaxLossPercent', False),
+    'DECODE_HEALTH_MIN_DECODE_RATIO': ('DecodeHealthMinDecodeRatio', False),
+    'DECODE_HEALTH_COOLDOWN_SEC': ('DecodeHealthCooldownSec', False),
+}
+
+def config_validate(conf: dict) -> list:
+    """Checks the settings from config_build().
+
+    Returns:
+        list: What's wrong (empty if all is well)
+    """
+    errors = []
+    for key, (option, choices) in CONFIG_CHOICES.items():
+        if conf[key] not in choices:
+            allowed = ', '.join(f"'{choice}'" for choice in choices[:-1]) + f" or '{choices[-1]}'"
+            errors.append(f'{option} should be set to {allowed}, not {conf[key]}')
+    for key, (option, nonzero) in CONFIG_POSITIVE.items():
+        if conf[key] < 0 or (nonzero and conf[key] == 0):
+            errors.append(f'{option} should be {"more than" if nonzero else "at least"} 0, not {conf[key]}')
+    if conf['PLAYLIST'] and conf['MODE'] == 'clock':
+        errors.append('Playlist needs PlayerMode = primary or secondary (clock mode loops a single MediaFile)')
+    for item in conf['PLAYLIST']:
+        if not os.path.isfile(item):
+            errors.append(f'Playlist item {item} not found')
+    if conf['CHAPTERS'] and (conf['SYNC_TRANSPORT'] != 'gpio' or conf['PIN_PROTOCOL'] == 'legacy'
+                             or conf['PRIMARY_TIMING'] != 'sleep'):
+        errors.append('Chapters needs Transport = gpio, PinProtocol = serial or parallel, & PrimaryTiming = sleep')
+    if any(chapter < 0 for chapter in conf['CHAPTERS']):
+        errors.append(f'Chapters should all be at least 0, not {conf["CHAPTERS"]}')
+    for action in conf['DECODE_HEALTH_ACTIONS']:
+        if action not in DecodeHealthMonitor.ACTIONS:
+            errors.append(f'DecodeHealthActions should be a list of {", ".join(DecodeHealthMonitor.ACTIONS)} - not {action}')
+    return errors
+
+# Settings that can change while running (see ConfigReloader) - they're read
+# afresh each loop, or passed on by the bindings set up in main
+CONFIG_LIVE_KEYS = {
+    'PLAY_FOREVER', 'PLAYBACK_COUNT', 'PIN_TX_DURATION_SEC', 'END_LEAD_FRAMES', 'GO_LEAD_MS',
+    'DRIFT_INTERVAL_SEC', 'DRIFT_HARD_SEEK_MS', 'DRIFT_GAIN_P', 'DRIFT_GAIN_I', 'DRIFT_MAX_RATE_ADJUST',
+    'SEEK_LATENCY_MS', 'HOT_JOIN_THRESHOLD_MS', 'COMMAND_DEBOUNCE_MS', 'COMMAND_LATENCY_WARN_MS',
+    'EDGE_COMPENSATION_MIN_MS', 'CLOCK_OFFSET_MS', 'FALLBACK_FRAME_RATE', 'METRICS_SUMMARY_LOOPS',
+    'DECODE_HEALTH_LITE_OPTIONS',
+}
+
+class ConfigReloader:
+    """Re-reads the config file on SIGHUP (or when it changes), applying it half way through the next loop.
+
+    The file is read, checked (with config_validate()) & compared with the
+    current settings on a thread of its own - if anything is wrong, the
+    current settings are kept. Changed settings in CONFIG_LIVE_KEYS (or with
+    a binding) are queued; other changes are logged as needing a restart.
+    apply_pending() then only has to set the queued values (as globals, & in
+    `conf`) & pass them to their bindings (eg, to update a DriftController.)
+    """
+    def __init__(self, config_file: str, conf: dict, watch_sec: float = CONFIG_WATCH_SEC_DEFAULT):
+        """
+        Args:
+            config_file (str): The config file
+            conf (dict): The current settings (updated as changes are applied)
+            watch_sec (float): How often to check the file for changes (0 =
+                only reload on SIGHUP)
+        """
+        self.config_file = config_file
+        self.conf = conf
+        self.watch_sec = watch_sec
+        self.bindings = {}
+        self.requested = threading.Event()
+        # Changes read from the file, waiting for apply_pending() - {key: value}
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.mtime_ns = self._mtime_ns()
+
+    def bind(self, key: str, apply):
+        """Calls apply(new value) whenever the setting `key` changes"""
+        self.bindings.setdefault(key, []).append(apply)
+
+    def request(self):
+        self.requested.set()
+
+    def start(self):
+        """Reloads on SIGHUP (must be called from the main thread), & starts the loading thread"""
+        signal.signal(signal.SIGHUP, lambda signum, frame: self.request())
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _mtime_ns(self) -> int:
+        try:
+            return os.stat(self.config_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _run(self):
+        while True:
+            if not self.requested.wait(timeout=self.watch_sec if self.watch_sec > 0 else None):
+                mtime_ns = self._mtime_ns()
+                if mtime_ns is None or mtime_ns == self.mtime_ns:
+                    continue
+                ddebug('%s changed', self.config_file)
+            self.requested.clear()
+            self.load()
+
+    def load(self) -> dict:
+        """Reads & checks the config file, & queues what's changed for apply_pending()
+
+        Returns:
+            dict: The changes queued ({key: new value})
+        """
+        self.mtime_ns = self._mtime_ns()
+        config_parsed = configparser.ConfigParser()
+        try:
+            if not config_parsed.read(self.config_file):
+                raise ValueError('could not read the file')
+            new_conf = config_build(config_parsed)
+        except (ValueError, configparser.Error) as e:
+            dwarn(f'Config reload: {self.config_file}: {e} - keeping the current settings')
+            return {}
+        errors = config_validate(new_conf)
+        if errors:
+            dwarn(f'Config reload: {"; ".join(errors)} - keeping the current settings')
+            return {}
+
+        changes = {}
+        with self.pending_lock:
+            for key, value in new_conf.items():
+                if value == self.pending.get(key, self.conf[key]):
+                    continue
+                if key not in CONFIG_LIVE_KEYS and key not in self.bindings:
+                    dwarn(f'Config reload: {key} changed - this needs a restart to take effect')
+                elif value == self.conf[key]:
+                    # Changed back before it was applied
+                    del self.pending[key]
+                else:
+                    self.pending[key] = changes[key] = value
+        if changes:
+            ddebug('Config reload: %s queued', ', '.join(changes))
+        return changes
+
+    def apply_pending(self) -> list:
+        """Applies the changes queued by load(). Call only at a quiet point (see LoopHousekeeping).
+
+        Returns:
+            list: The settings that changed
+        """
+        with self.pending_lock:
+            if not self.pending:
+                return []
+            changes, self.pending = self.pending, {}
+            self.conf.update(changes)
+        globals().update(changes)
+        for key, value in changes.items():
+            for apply in self.bindings.get(key, ()):
+                apply(value)
+        dprint('Config reloaded: ' + ', '.join(f'{key} = {value}' for key, value in changes.items()))
+        return list(changes)
+
+# Set in main when ConfigReload is enabled (see config_apply_pending())
+config_reloader = None
+
+def config_apply_pending():
+    """Applies a requested config reload - called half way through each loop (see LoopHousekeeping)"""
+    if config_reloader is not None:
+        config_reloader.apply_pending()
+
+def config_bind_attributes(reloader: ConfigReloader, target, attributes: dict):
+    """Binds settings to attributes of `target` - {config key: attribute name}"""
+    for key, attribute in attributes.items():
+        reloader.bind(key, lambda value, attribute=attribute: setattr(target, attribute, value))
+
+# Live settings held by a DriftController
+DRIFT_CONFIG_ATTRIBUTES = {
+    'DRIFT_GAIN_P': 'gain_p',
+    'DRIFT_GAIN_I': 'gain_i',
+    'DRIFT_MAX_RATE_ADJUST': 'max_rate_adjust',
+    'DRIFT_HARD_SEEK_MS': 'hard_seek_ms',
+    'SEEK_LATENCY_MS': 'seek_latency_ms',
+}
+
+def media_duration_changed(new_duration: int, targets: list):
+    """After switching to a new media file: updates the main loop's duration, & `targets`' (eg, a DriftController)
+
+    Args:
+        new_duration (int): The new media's duration (ms)
+        targets (list): Objects with a `duration` (or a WallClockPhase), or
+            functions to call with the new duration
+    """
+    global duration
+    dprint(f'Media duration is now {new_duration}ms [{timedelta(milliseconds=new_duration)}]')
+    duration = new_duration
+    for target in targets:
+        if callable(target):
+            target(new_duration)
+        elif isinstance(target, WallClockPhase):
+            target.duration_ns = int(new_duration * 1_000_000)
+        elif target is not None:
+            target.duration = new_duration
+
+################################
+# Begin Main Application Logic #
+################################
+
+# Only when run as a script - importing it (eg, for the tests) just defines everything above
+if __name__ == '__main__':
+    # Load configuration options
+    config_parsed = configparser.ConfigParser()
+    config_parsed.read(CONFIG_FILE)
+
+    # Preflight subcommand: check (& optionally rewrite) the media file, then exit
+    #   pi-gpio-synced-player.py preflight [media file] [--faststart output file]
+    if len(sys.argv) > 1 and sys.argv[1] == 'preflight':
+        preflight_args = sys.argv[2:]
+        faststart_output = None
+        if '--faststart' in preflight_args:
+            option_index = preflight_args.index('--faststart')
+            if option_index + 1 >= len(preflight_args):
+                print('ERROR: --faststart needs an output file')
+                exit(1)
+            faststart_output = preflight_args[option_index + 1]
+            del preflight_args[option_index:option_index + 2]
+        if preflight_args:
+            preflight_file = preflight_args[0]
+        elif config_parsed.has_option('Video', 'MediaFile'):
+            preflight_file = config_parsed.get('Video', 'MediaFile')
+        else:
+            print(f'ERROR: No media file given, or specified in {CONFIG_FILE}')
+            exit(1)
+        try:
+            preflight_index = mp4_index(preflight_file)
+            print(f'Preflight: {preflight_file}')
+            for line in mp4_preflight_report(preflight_index, config_parsed.getfloat(
+                    'Advanced', 'PreflightMaxKeyframeIntervalMs', fallback=PREFLIGHT_MAX_KEYFRAME_INTERVAL_MS_DEFAULT)):
+                print(f'  {line}')
+            if faststart_output:
+                if preflight_index['faststart']:
+                    print('Already faststart - no need to rewrite')
+                else:
+                    mp4_write_faststart(preflight_file, faststart_output)
+                    print(f'Wrote faststart copy to {faststart_output}')
+        except (OSError, ValueError, struct.error) as e:
+            print(f'ERROR: {e}')
+            exit(1)
+        exit(0)
+
+    # Merge & analyze trace files (from TraceFile on each node), then exit
+    #   pi-gpio-synced-player.py trace-analyze FILE [FILE ...] [--csv DRIFT_FILE]
+    if len(sys.argv) > 1 and sys.argv[1] == 'trace-analyze':
+        trace_args = sys.argv[2:]
+        drift_csv = None
+        if '--csv' in trace_args:
+            option_index = trace_args.index('--csv')
+            if option_index + 1 >= len(trace_args):
+                print('ERROR: --csv needs an output file')
+                exit(1)
+            drift_csv = trace_args[option_index + 1]
+            del trace_args[option_index:option_index + 2]
+        if not trace_args:
+            print('ERROR: No trace files given')
+            exit(1)
+        try:
+            clock = MonotonicClock()
+            analysis = trace_analyze([trace_load(trace_file) for trace_file in trace_args])
+            for line in trace_report(analysis):
+                print(line)
+            if drift_csv:
+                with open(drift_csv, 'w') as f:
+                    f.write('node,time_sec,loop,drift_ms\n')
+                    for name, points in analysis['drift'].items():
+                        for time_sec, loop_index, drift_ms in points:
+                            f.write(f'{name},{time_sec:.3f},{loop_index},{drift_ms:.3f}\n')
+                print(f'Wrote drift curves to {drift_csv}')
+        except (OSError, ValueError, struct.error) as e:
+            print(f'ERROR: {e}')
+            exit(1)
+        exit(0)
+
+    # The simulate command doesn't need a media file (or a Pi)
+    SIMULATE = len(sys.argv) > 1 and sys.argv[1] == 'simulate'
+
+    # Check for media file - exit if none is specified
+    if not config_parsed.has_option('Video', 'MediaFile') and not SIMULATE:
+        print(f'ERROR: No media file specified in {CONFIG_FILE}')
+        exit(1)
+
+    try:
+        conf = config_build(config_parsed)
+    except ValueError as e:
+        print(f'ERROR: {CONFIG_FILE}: {e}')
+        exit(1)
+
+    # Video
+    MEDIA_FILE = conf['MEDIA_FILE']
+    PLAYLIST = conf['PLAYLIST']
+    if PLAYLIST:
+        # The first item is opened as usual (see Playlist)
+        MEDIA_FILE = PLAYLIST[0]
+    LOAD_WAIT_DURATION = conf['LOAD_WAIT_DURATION']
+    FULLSCREEN_MODE = conf['FULLSCREEN_MODE']
+    PLAY_FOREVER = conf['PLAY_FOREVER']
+    PLAYBACK_COUNT = conf['PLAYBACK_COUNT']
+    PLAYER_BACKEND = conf['PLAYER_BACKEND']
+    MEDIA_RESIDENCY = conf['MEDIA_RESIDENCY']
+    MEDIA_RESIDENCY_TMPFS_DIR = conf['MEDIA_RESIDENCY_TMPFS_DIR']
+    MEDIA_RESIDENCY_REPORT_SEC = conf['MEDIA_RESIDENCY_REPORT_SEC']
+
+    # Sync
+    MODE = conf['MODE']
+    GPIO_TRANSMIT_PINS = conf['GPIO_TRANSMIT_PINS']
+    GPIO_LISTEN_PIN = conf['GPIO_LISTEN_PIN']
+    LOAD_WAIT_DURATION = conf['LOAD_WAIT_DURATION']
+    PIN_TX_DURATION_SEC = conf['PIN_TX_DURATION_SEC']
+    END_DETECTION = conf['END_DETECTION']
+    END_LEAD_FRAMES = conf['END_LEAD_FRAMES']
+    PRIMARY_TIMING = conf['PRIMARY_TIMING']
+    SYNC_TRANSPORT = conf['SYNC_TRANSPORT']
+    MULTICAST_GROUP = conf['MULTICAST_GROUP']
+    MULTICAST_PORT = conf['MULTICAST_PORT']
+    MULTICAST_INTERFACE = conf['MULTICAST_INTERFACE']
+    MULTICAST_TTL = conf['MULTICAST_TTL']
+    GO_LEAD_MS = conf['GO_LEAD_MS']
+    POSITION_INTERVAL_SEC = conf['POSITION_INTERVAL_SEC']
+    CLOCK_SYNC_INTERVAL_SEC = conf['CLOCK_SYNC_INTERVAL_SEC']
+    DRIFT_CORRECTION = conf['DRIFT_CORRECTION']
+    PLAYBACK_CLOCK = conf['PLAYBACK_CLOCK']
+    PLAYBACK_CLOCK_SAMPLE_MS = conf['PLAYBACK_CLOCK_SAMPLE_MS']
+    PLAYBACK_CLOCK_STALL_MS = conf['PLAYBACK_CLOCK_STALL_MS']
+    PLAYBACK_CLOCK_JUMP_MS = conf['PLAYBACK_CLOCK_JUMP_MS']
+    DRIFT_INTERVAL_SEC = conf['DRIFT_INTERVAL_SEC']
+    DRIFT_HARD_SEEK_MS = conf['DRIFT_HARD_SEEK_MS']
+    SERIALIZE_PLAYER_COMMANDS = conf['SERIALIZE_PLAYER_COMMANDS']
+    COMMAND_DEBOUNCE_MS = conf['COMMAND_DEBOUNCE_MS']
+    COMMAND_LATENCY_WARN_MS = conf['COMMAND_LATENCY_WARN_MS']
+    GPIO_OUTPUT = conf['GPIO_OUTPUT']
+    GPIO_CHIP = conf['GPIO_CHIP']
+    PIN_PROTOCOL = conf['PIN_PROTOCOL']
+    PIN_BIT_MS = conf['PIN_BIT_MS']
+    CHAPTERS = conf['CHAPTERS']
+    LISTEN_PINS = conf['LISTEN_PINS']
+    EDGE_CAPTURE = conf['EDGE_CAPTURE']
+    EDGE_COMPENSATION = conf['EDGE_COMPENSATION']
+    EDGE_COMPENSATION_MIN_MS = conf['EDGE_COMPENSATION_MIN_MS']
+    HOT_JOIN = conf['HOT_JOIN']
+    HOT_JOIN_THRESHOLD_MS = conf['HOT_JOIN_THRESHOLD_MS']
+    SEEK_LATENCY_MS = conf['SEEK_LATENCY_MS']
+    CLOCK_EPOCH = conf['CLOCK_EPOCH']
+    CLOCK_SOURCE = conf['CLOCK_SOURCE']
+    CLOCK_OFFSET_MS = conf['CLOCK_OFFSET_MS']
+    READY_BARRIER = conf['READY_BARRIER']
+    READY_TIMEOUT_SEC = conf['READY_TIMEOUT_SEC']
+    READY_PIN = conf['READY_PIN']
+    NODE_NAME = conf['NODE_NAME']
+    EXPECTED_NODES = conf['EXPECTED_NODES']
+
+    # Advanced
+    PLAYBACK_AFTER_LOAD_DURATION_SEC = conf['PLAYBACK_AFTER_LOAD_DURATION_SEC']
+    FALLBACK_FRAME_RATE = conf['FALLBACK_FRAME_RATE']
+    DOUBLE_BUFFERED_PLAYERS = conf['DOUBLE_BUFFERED_PLAYERS'] or bool(PLAYLIST)
+    REALTIME_PROFILE = conf['REALTIME_PROFILE']
+    REALTIME_PRIORITY = conf['REALTIME_PRIORITY']
+    CONTROL_CPU = conf['CONTROL_CPU']
+    PLAYER_CPUS = conf['PLAYER_CPUS']
+    LOCK_MEMORY = conf['LOCK_MEMORY']
+    MANAGE_GC = conf['MANAGE_GC']
+    WAKEUP_SELF_TEST = conf['WAKEUP_SELF_TEST']
+    CONFIG_RELOAD = conf['CONFIG_RELOAD']
+    CONFIG_WATCH_SEC = conf['CONFIG_WATCH_SEC']
+    DECODE_HEALTH = conf['DECODE_HEALTH']
+    DECODE_HEALTH_INTERVAL_SEC = conf['DECODE_HEALTH_INTERVAL_SEC']
+    DECODE_HEALTH_WINDOW_SEC = conf['DECODE_HEALTH_WINDOW_SEC']
+    DECODE_HEALTH_MAX_LOSS_PERCENT = conf['DECODE_HEALTH_MAX_LOSS_PERCENT']
+    DECODE_HEALTH_MIN_DECODE_RATIO = conf['DECODE_HEALTH_MIN_DECODE_RATIO']
+    DECODE_HEALTH_ACTIONS = conf['DECODE_HEALTH_ACTIONS']
+    DECODE_HEALTH_COOLDOWN_SEC = conf['DECODE_HEALTH_COOLDOWN_SEC']
+    DECODE_HEALTH_LITE_OPTIONS = conf['DECODE_HEALTH_LITE_OPTIONS']
+    PREFLIGHT_CHECK = conf['PREFLIGHT_CHECK']
+    PREFLIGHT_MAX_KEYFRAME_INTERVAL_MS = conf['PREFLIGHT_MAX_KEYFRAME_INTERVAL_MS']
+    METADATA_CACHE = conf['METADATA_CACHE']
+    METADATA_CACHE_FILE = conf['METADATA_CACHE_FILE']
+    SPIN_WINDOW_US = conf['SPIN_WINDOW_US']
+    DRIFT_GAIN_P = conf['DRIFT_GAIN_P']
+    DRIFT_GAIN_I = conf['DRIFT_GAIN_I']
+    DRIFT_MAX_RATE_ADJUST = conf['DRIFT_MAX_RATE_ADJUST']
+
+    # Debug
+    TEST_MODE_FAKE_GPIO = conf['TEST_MODE_FAKE_GPIO']
+    METRICS = conf['METRICS']
+    METRICS_SUMMARY_LOOPS = conf['METRICS_SUMMARY_LOOPS']
+    METRICS_FILE = conf['METRICS_FILE']
+    METRICS_WINDOW = conf['METRICS_WINDOW']
+    TRACE_FILE = conf['TRACE_FILE']
+    TRACE_BUFFER_RECORDS = conf['TRACE_BUFFER_RECORDS']
+    TRACE_SAMPLE_SEC = conf['TRACE_SAMPLE_SEC']
+    TRACE_MAX_MB = conf['TRACE_MAX_MB']
+    PIN_TX_DURATION_SEC = conf['PIN_TX_DURATION_SEC']
+
+    config_errors = config_validate(conf)
+    if config_errors:
+        for error in config_errors:
+            print(f'ERROR: {error}')
+        exit(1)
+
+    # Simulate a primary & many secondaries (with the configured timing), then exit
+    #   pi-gpio-synced-player.py simulate
+    if SIMULATE:
+        simulation = {}
+        for key, default in SIMULATION_DEFAULTS.items():
+            if isinstance(default, float):
+                simulation[key] = config_parsed.getfloat('Simulation', key, fallback=default)
+            elif isinstance(default, int):
+                simulation[key] = config_parsed.getint('Simulation', key, fallback=default)
+            else:
+                simulation[key] = config_parsed.get('Simulation', key, fallback=default)
+        if simulation['LogLevel'] not in LOG_LEVELS:
+            print(f"ERROR: [Simulation] LogLevel should be one of {', '.join(LOG_LEVELS)}, not {simulation['LogLevel']}")
+            exit(1)
+        log_configure(level=simulation['LogLevel'], output='print')
+
+        # Everything runs on virtual time, & the virtual pins stand in for gpiozero
+        clock = VirtualClock()
+        TEST_MODE_FAKE_GPIO = False
+        print(f'Simulating {simulation["Secondaries"]} secondaries, {simulation["Loops"]} loops '
+              f'(PrimaryTiming = {PRIMARY_TIMING}, DriftCorrection = {DRIFT_CORRECTION})')
+        result = simulate(secondaries=simulation['Secondaries'], loops=simulation['Loops'],
+                          duration_ms=simulation['DurationMs'], fps=simulation['FrameRate'],
+                          transmit_pin_count=simulation['TransmitPinCount'],
+                          edge_latency_us=simulation['EdgeLatencyUs'], edge_jitter_us=simulation['EdgeJitterUs'],
+                          bounce_count=simulation['BounceCount'], bounce_us=simulation['BounceUs'],
+                          seek_latency_ms=simulation['SeekLatencyMs'], decode_latency_ms=simulation['DecodeLatencyMs'],
+                          latency_jitter_ms=simulation['LatencyJitterMs'], drift_ppm=simulation['DriftPpm'],
+                          sample_interval_ms=simulation['SampleIntervalMs'], seed=simulation['Seed'])
+        for loop_index, skew in enumerate(result['start_skew_ms']):
+            print(f'Loop {loop_index}: start skew {skew["spread"]:.2f}ms '
+                  f'(furthest secondary {skew["worst"]:+.2f}ms from the primary)')
+        errors = result['position_error_ms']
+        if errors['samples']:
+            print(f'Position error vs. primary ({errors["samples"]} samples): '
+                  f'p50 {errors["p50"]:.2f}ms, p95 {errors["p95"]:.2f}ms, max {errors["max"]:.2f}ms')
+        exit(0)
+
+    log_configure(level=conf['LOG_LEVEL'], output=conf['LOG_OUTPUT'], buffer_size=conf['LOG_BUFFER_SIZE'])
+
+    dprint(f'Configuration loaded from file:\n{pformat(conf)}')
+
+    # Monotonic clock used for all deadline-based timing
+    clock = MonotonicClock(spin_window_ns=SPIN_WINDOW_US * 1000)
+
+    metrics = None
+    if METRICS:
+        metrics = SyncMetrics(window=METRICS_WINDOW, summary_loops=METRICS_SUMMARY_LOOPS,
+                              output_file=METRICS_FILE)
+
+    if TRACE_FILE:
+        try:
+            trace_recorder = TraceRecorder(output_file=TRACE_FILE, node_name=NODE_NAME, mode=MODE,
+                                           size=TRACE_BUFFER_RECORDS, flush_sec=TRACE_SAMPLE_SEC,
+                                           max_bytes=int(TRACE_MAX_MB * 1024 * 1024))
+        except OSError as e:
+            print(f'ERROR: Could not open trace file {TRACE_FILE}: {e}')
+            exit(1)
+        dprint(f'Tracing sync events to {TRACE_FILE}')
+
+
+    # Initialize pi GPIO
+
+    gpiod = None
+    if not TEST_MODE_FAKE_GPIO:
+        # import RPi.GPIO as GPIO
+        from gpiozero import DigitalInputDevice, DigitalOutputDevice
+        if GPIO_OUTPUT != 'gpiozero' or EDGE_CAPTURE == 'gpiod':
+            try:
+                import gpiod
+            except ImportError:
+                gpiod = None
+            # request_lines() is new in libgpiod v2
+            if gpiod is not None and not hasattr(gpiod, 'request_lines'):
+                gpiod = None
+            if gpiod is None and (GPIO_OUTPUT == 'gpiod' or EDGE_CAPTURE == 'gpiod'):
+                print("ERROR: GpioOutput / EdgeCapture = gpiod needs the gpiod (libgpiod v2) Python module - pip3 install gpiod")
+                exit(1)
+
+    # Import the player backend
+    if PLAYER_BACKEND == 'mpv':
+        import mpv
+    else:
+        import vlc
+
+    # Print version info and run mode
+    dprint(f'{script_name} v{version} - {script_url}')
+    dprint(f'Playback mode: {MODE} mode')
+
+
+    # dprint(f'{v} in mode: {MODE}')
+
+    if PREFLIGHT_CHECK:
+        for preflight_file in PLAYLIST or [MEDIA_FILE]:
+            try:
+                for line in mp4_preflight_report(mp4_index(preflight_file), PREFLIGHT_MAX_KEYFRAME_INTERVAL_MS):
+                    if line.startswith('WARNING: '):
+                        dwarn(line[len('WARNING: '):])
+                    else:
+                        dprint(f'Preflight: {line}')
+            except (OSError, ValueError, struct.error) as e:
+                dwarn(f'Preflight check skipped - could not index {preflight_file} as MP4 / MOV: {e}')
+
+    # Load the media file into RAM (if enabled) - the player then opens the resident copy
+    playback_file = MEDIA_FILE
+    residency = None
+    if MEDIA_RESIDENCY != 'off' and PLAYLIST:
+        dwarn(f'MediaResidency = {MEDIA_RESIDENCY} is for a single MediaFile - the playlist is played from disk')
+    elif MEDIA_RESIDENCY != 'off':
+        residency = MediaResidency(media_file=MEDIA_FILE, mode=MEDIA_RESIDENCY, tmpfs_dir=MEDIA_RESIDENCY_TMPFS_DIR)
+        try:
+            playback_file = residency.start()
+        except (OSError, ValueError) as e:
+            dwarn(f'Could not load {MEDIA_FILE} into RAM ({e}) - playing it from disk')
+            residency.close()
+            residency = None
+        if residency and MEDIA_RESIDENCY_REPORT_SEC > 0:
+            residency.start_reporting(interval_sec=MEDIA_RESIDENCY_REPORT_SEC)
+
+    # Hold the ready line low while we load (secondary) - the primary won't
+    # start until every secondary has let go of it
+    ready_line = None
+    if READY_BARRIER and MODE == 'secondary' and SYNC_TRANSPORT == 'gpio':
+        ready_line = gpio_ready_line_hold(READY_PIN)
+
+    current_playback_count = 1
+
+    if PLAY_FOREVER:
+        set_playback_count = 65535
+    else:
+        set_playback_count = PLAYBACK_COUNT
+
+    # Realtime profile, part 1: measure the starting point, & keep the player
+    # (which inherits our affinity when it starts its threads) off the control CPU
+    if REALTIME_PROFILE:
+        if WAKEUP_SELF_TEST:
+            dprint(f'Wakeup latency before the realtime profile: {wakeup_latency_test()}')
+        if PLAYER_CPUS:
+            dprint(f'Player threads on CPUs {PLAYER_CPUS}')
+            runtime_set_affinity(set(PLAYER_CPUS))
+
+    # Initialize player (regardless of primary or secondary mode)
+    player = player_create(backend=PLAYER_BACKEND,
+                           set_playback_count=set_playback_count,
+                           toggle_fullscreen_during_init = conf['TOGGLE_FULLSCREEN_DURING_INIT'],
+                           play_briefly_fullscreen_workaround = conf['PLAY_BRIEFLY_FULLSCREEN_WORKAROUND'],
+                           use_metadata_cache = METADATA_CACHE)
+    try:
+        duration = player.open(playback_file)
+    except Exception as e:
+        print(f'ERROR: Could not open {playback_file} with the {PLAYER_BACKEND} player: {e!r}')
+        exit(1)
+
+    # Follow the duration of each new media file (the media_targets are added by each mode)
+    media_targets = []
+    double_buffered = None
+    if DOUBLE_BUFFERED_PLAYERS and not player.supports_spawn:
+        if PLAYLIST:
+            print(f'ERROR: Playlist needs a second player, which PlayerBackend = {PLAYER_BACKEND} can\'t create')
+            exit(1)
+        dwarn(f'PlayerBackend = {PLAYER_BACKEND} can\'t create a standby player - DoubleBufferedPlayers is off')
+        DOUBLE_BUFFERED_PLAYERS = False
+    if END_DETECTION == 'events' and not player.supports_events:
+        dwarn(f'PlayerBackend = {PLAYER_BACKEND} has no playback events - using EndDetection = poll')
+        END_DETECTION = 'poll'
+    if DOUBLE_BUFFERED_PLAYERS:
+        try:
+            DOUBLE_BUFFERED_PLAYERS, video_windows = double_buffering_video_setup(
+                player_backend=PLAYER_BACKEND, fullscreen=FULLSCREEN_MODE, playlist=PLAYLIST)
+        except ValueError as e:
+            print(f'ERROR: {e}')
+            exit(1)
+    if DOUBLE_BUFFERED_PLAYERS:
+        dprint('Creating standby player (DoubleBufferedPlayers = True)')
+        player = double_buffered = DoubleBufferedPlayer(
+            active=player, on_media_changed=lambda new_duration: media_duration_changed(new_duration, media_targets))
+
+    if PLAYLIST:
+        if PLAYER_BACKEND == 'vlc':
+            # Get each item's duration into the metadata cache now, rather than while the one before it plays
+            for item in PLAYLIST:
+                metadata = media_get_metadata(instance=double_buffered.instance, media_file=item,
+                                              cache_file=METADATA_CACHE_FILE)
+                dprint(f'Playlist: {item} - {timedelta(milliseconds=metadata["duration_ms"]) if metadata else "unknown duration"}')
+        if SYNC_TRANSPORT == 'gpio' and PIN_PROTOCOL == 'legacy':
+            dwarn('Playlist: the legacy pin signals have no loop index, so each node counts loops itself - '
+                  'use PinProtocol = serial / parallel (or Transport = udp) to keep them on the same item')
+        playlist = Playlist(items=PLAYLIST, player=double_buffered)
+
+    # Realtime profile, part 2: everything from here on (main loop, executor,
+    # GPIO / UDP callback threads) runs on the control CPU, at realtime priority -
+    # except the threads that load players later (see runtime_player_thread())
+    if REALTIME_PROFILE:
+        runtime_player_cpus = os.sched_getaffinity(0)
+        if CONTROL_CPU >= 0:
+            dprint(f'Control threads on CPU {CONTROL_CPU}')
+            runtime_set_affinity({CONTROL_CPU})
+        if REALTIME_PRIORITY > 0:
+            dprint(f'Control threads at SCHED_FIFO priority {REALTIME_PRIORITY}')
+            runtime_set_realtime(REALTIME_PRIORITY)
+        if LOCK_MEMORY:
+            dprint('Locking memory (mlockall)')
+            runtime_lock_memory()
+        if MANAGE_GC:
+            runtime_gc_freeze()
+        if WAKEUP_SELF_TEST:
+            dprint(f'Wakeup latency with the realtime profile: {wakeup_latency_test()}')
+
+    if trace_recorder:
+        # Inside any executor, so calls are traced when they actually run
+        player = traced_player = TracedPlayer(player=player)
+        atexit.register(trace_recorder.close)
+
+    # Created first, so the playback clock can sample through it too
+    executor = None
+    if SERIALIZE_PLAYER_COMMANDS:
+        dprint(f'Running player commands on a single thread (coalescing edges within {COMMAND_DEBOUNCE_MS}ms)')
+        executor = PlayerExecutor(debounce_ms=COMMAND_DEBOUNCE_MS, latency_warn_ms=COMMAND_LATENCY_WARN_MS,
+                                  metrics=metrics)
+
+    playback_clock = None
+    if PLAYBACK_CLOCK:
+        dprint(f'Interpolating the playback position (sampling every {PLAYBACK_CLOCK_SAMPLE_MS}ms)')
+        playback_clock = PlaybackClock(player=player, sample_ms=PLAYBACK_CLOCK_SAMPLE_MS,
+                                       stall_ms=PLAYBACK_CLOCK_STALL_MS, jump_ms=PLAYBACK_CLOCK_JUMP_MS,
+                                       metrics=metrics, executor=executor)
+        playback_clock.start()
+        player = playback_clock
+
+    if executor:
+        player = SerializedPlayer(player=player, executor=executor)
+
+    if trace_recorder:
+        # The raw position (not the playback clock's), sampled through the executor
+        trace_recorder.start(player=SerializedPlayer(player=traced_player, executor=executor) if executor
+                             else traced_player)
+
+    dprint('Player init should be done')
+
+    # print(player)
+    # print(instance)
+
+    # Reload the config file on SIGHUP / when it changes (applied half way through a loop)
+    if CONFIG_RELOAD:
+        dprint(f'Config reload enabled (on SIGHUP{f", or changes to {CONFIG_FILE}" if CONFIG_WATCH_SEC > 0 else ""})')
+        config_reloader = ConfigReloader(config_file=CONFIG_FILE, conf=conf, watch_sec=CONFIG_WATCH_SEC)
+        if playlist:
+            config_reloader.bind('PLAYLIST', lambda items: playlist.set_items(items) if items else
+                                 dwarn('Playlist: emptied - needs a restart to go back to MediaFile'))
+        elif double_buffered:
+            config_reloader.bind('MEDIA_FILE', double_buffered.change_media)
+        if executor:
+            config_reloader.bind('COMMAND_DEBOUNCE_MS', lambda value: setattr(executor, 'debounce_ns', int(value * 1_000_000)))
+            config_reloader.bind('COMMAND_LATENCY_WARN_MS', lambda value: setattr(executor, 'latency_warn_ns', int(value * 1_000_000)))
+        if metrics:
+            config_bind_attributes(config_reloader, metrics, {'METRICS_SUMMARY_LOOPS': 'summary_loops'})
+        config_reloader.start()
+
+    # Watch for dropped frames (each mode adds the resync & beacon responses it can make)
+    health = None
+    if DECODE_HEALTH and PLAYER_BACKEND != 'vlc':
+        dwarn('DecodeHealth needs PlayerBackend = vlc (libvlc media statistics) - not monitoring')
+    elif DECODE_HEALTH:
+        if 'lite' in DECODE_HEALTH_ACTIONS and not double_buffered:
+            dwarn('DecodeHealthActions = lite needs DoubleBufferedPlayers - it will be skipped')
+        dprint(f'Decode health monitor: {", ".join(DECODE_HEALTH_ACTIONS)} on over {DECODE_HEALTH_MAX_LOSS_PERCENT}% '
+               f'frames lost, or decoding under {DECODE_HEALTH_MIN_DECODE_RATIO}x the frame rate')
+        health = DecodeHealthMonitor(player=player, interval_sec=DECODE_HEALTH_INTERVAL_SEC,
+                                     window_sec=DECODE_HEALTH_WINDOW_SEC,
+                                     max_loss_pct=DECODE_HEALTH_MAX_LOSS_PERCENT,
+                                     min_decode_ratio=DECODE_HEALTH_MIN_DECODE_RATIO,
+                                     actions=DECODE_HEALTH_ACTIONS, cooldown_sec=DECODE_HEALTH_COOLDOWN_SEC,
+                                     metrics=metrics)
+        if double_buffered:
+            health.on_lite = lambda: double_buffered.set_media_options(DECODE_HEALTH_LITE_OPTIONS)
+        if config_reloader:
+            config_bind_attributes(config_reloader, health, {
+                'DECODE_HEALTH_MAX_LOSS_PERCENT': 'max_loss_pct',
+                'DECODE_HEALTH_MIN_DECODE_RATIO': 'min_decode_ratio',
+                'DECODE_HEALTH_ACTIONS': 'actions',
+                'DECODE_HEALTH_COOLDOWN_SEC': 'cooldown_sec',
+            })
+        health.start()
+
+    # The GC & config reloads run half way through each loop, away from the restarts
+    if (REALTIME_PROFILE and MANAGE_GC) or config_reloader:
+        loop_housekeeping = LoopHousekeeping(duration=duration, executor=executor)
+        media_targets.append(loop_housekeeping)
+        atexit.register(loop_housekeeping.close)
+
+    if MODE == 'primary':
+
+        dprint('Primary mode initializing.')
+        # PrimaryTiming = sleep: how long before the end of the media we stop waiting, & send the prepare
+        end_wait_ms = 3000
+        if SYNC_TRANSPORT == 'udp':
+            transmitter = UdpSyncPrimary(group=MULTICAST_GROUP, port=MULTICAST_PORT,
+                                         interface=MULTICAST_INTERFACE, ttl=MULTICAST_TTL,
+                                         go_lead_ms=GO_LEAD_MS,
+                                         position_interval_sec=POSITION_INTERVAL_SEC)
+            transmitter.start(player=player)
+            if config_reloader:
+                config_reloader.bind('GO_LEAD_MS', lambda value: setattr(transmitter, 'go_lead_ns', int(value * 1_000_000)))
+        else:
+            transmit_pins = gpio_setup_transmit_pins(transmit_pin_ids=GPIO_TRANSMIT_PINS,
+                                                     backend=GPIO_OUTPUT, chip_path=GPIO_CHIP)
+            ready_pin = gpio_setup_ready_pin(READY_PIN) if READY_BARRIER else None
+            if PIN_PROTOCOL == 'legacy':
+                transmitter = GpioTransmitter(transmit_pins, ready_pin=ready_pin, metrics=metrics)
+            else:
+                transmitter = GpioProtocolTransmitter(transmit_pins, mode=PIN_PROTOCOL, bit_ms=PIN_BIT_MS,
+                                                      ready_pin=ready_pin, metrics=metrics,
+                                                      position_interval_sec=POSITION_INTERVAL_SEC,
+                                                      prepare_lead_ms=end_wait_ms)
+                dprint(f'Pin protocol: {PIN_PROTOCOL}, frames of up to {transmitter.frame_ns / 1_000_000:.0f}ms, '
+                       f'go frames started {transmitter.go_lead_ns / 1_000_000:.0f}ms ahead')
+                if PIN_TX_DURATION_SEC * 1_000_000_000 < 2 * transmitter.go_lead_ns:
+                    dwarn(f'PinTxDurationSec should be at least {2 * transmitter.go_lead_ns / 1_000_000_000:.2f}s '
+                          f'(time for the prepare & go frames)')
+                transmitter.start(player=player, duration=duration)
+                media_targets.append(transmitter)
+                if CHAPTERS:
+                    chapters_ms = sorted(int(chapter * 1000) for chapter in CHAPTERS)
+                    dprint(f'Chapters at {chapters_ms}ms - SIGUSR2 seeks everyone to the next')
+                    signal.signal(signal.SIGUSR2, lambda signum, frame: threading.Thread(
+                        target=primary_seek_to_next_chapter, args=(player, transmitter, chapters_ms), daemon=True).start())
+
+        beacon = None
+        if HOT_JOIN and SYNC_TRANSPORT == 'gpio' and PIN_PROTOCOL == 'legacy':
+            # The pins are for loop starts only - position beacons go over UDP
+            dprint(f'Hot-join enabled: sending position beacons every {POSITION_INTERVAL_SEC}s over UDP')
+            beacon = UdpSyncPrimary(group=MULTICAST_GROUP, port=MULTICAST_PORT,
+                                    interface=MULTICAST_INTERFACE, ttl=MULTICAST_TTL,
+                                    position_interval_sec=POSITION_INTERVAL_SEC)
+            beacon.start(player=player)
+
+        if READY_BARRIER:
+            dprint(f'Waiting up to {READY_TIMEOUT_SEC}s for the secondaries to be ready...')
+            wait_start_ns = clock.now_ns()
+            missing = transmitter.wait_for_ready(expected_nodes=EXPECTED_NODES, timeout_sec=READY_TIMEOUT_SEC)
+            waited_sec = (clock.now_ns() - wait_start_ns) / 1_000_000_000
+            if missing:
+                dwarn(f'Not everyone was ready after {waited_sec:.1f}s - starting anyway. Missing: {", ".join(missing)}')
+            else:
+                dprint(f'All secondaries ready after {waited_sec:.1f}s')
+        print('\n\nNote: to terminate prematurely, hit [Control]-[C] at the text screen. ([f] to  exit fullscreen, and/or [alt]-[tab] to switch windows)\n\n')
+
+        # Wait for file to load / buffer
+        # dprint(f'Sleeping for {LOAD_WAIT_DURATION} sec. for file to load / buffer')
+        # time.sleep(LOAD_WAIT_DURATION)      # (2 sec by default)
+
+        if PRIMARY_TIMING == 'deadline':
+            # Play until END_LEAD_FRAMES before the end, then hold the pins high
+            # for PIN_TX_DURATION_SEC - the first loop's pins go high right away
+            pin_tx_ns = int(PIN_TX_DURATION_SEC * 1_000_000_000)
+            play_ms = duration - (END_LEAD_FRAMES * player_get_frame_duration_ms(player))
+            schedule = LoopSchedule(start_ns=clock.now_ns() + pin_tx_ns,
+                                    play_ns=int(play_ms * 1_000_000),
+                                    pin_tx_ns=pin_tx_ns)
+            dprint(f'Deadline timing: loop period {schedule.period_ns / 1_000_000:.1f}ms')
+            if isinstance(transmitter, GpioProtocolTransmitter):
+                transmitter.schedule = schedule
+            # New media (eg, the next playlist item, at its own frame rate) takes effect from
+            # the loop that's just started. New timings are applied half way through a loop
+            # (see LoopHousekeeping), after the count has moved on - so from the next loop
+            retime_schedule = lambda _: schedule.retime(
+                loop_index=current_playback_count - 1,
+                play_ns=int((duration - (END_LEAD_FRAMES * player_get_frame_duration_ms(player))) * 1_000_000),
+                pin_tx_ns=int(PIN_TX_DURATION_SEC * 1_000_000_000))
+            media_targets.append(retime_schedule)
+            if config_reloader:
+                config_reloader.bind('PIN_TX_DURATION_SEC', retime_schedule)
+                config_reloader.bind('END_LEAD_FRAMES', retime_schedule)
+
+        # Begin standard playback loop
+        while (current_playback_count <= PLAYBACK_COUNT) or PLAY_FOREVER:
+            dprint(f'Video playback count: {current_playback_count}/{PLAYBACK_COUNT}')
+
+            if PRIMARY_TIMING == 'deadline':
+                dprint(f'Waiting for the next loop deadline...')
+                primary_restart_at_deadlines(player=player, transmitter=transmitter,
+                                             schedule=schedule, loop_index=current_playback_count - 1,
+                                             metrics=metrics)
+                loop_housekeeping_schedule()
+                current_playback_count += 1
+                continue
+
+            primary_restart_after_sleep(player=player, transmitter=transmitter,
+                                        loop_index=current_playback_count - 1,
+                                        pin_tx_sec=PIN_TX_DURATION_SEC, metrics=metrics)
+            loop_housekeeping_schedule()
+
+            dprint(f'Waiting for the end of the video...')
+            if END_DETECTION == 'events':
+                player_wait_for_end_events(player=player, duration=duration, lead_frames=END_LEAD_FRAMES)
+            else:
+                player_wait_for_end(player=player, duration=duration, ms_before_end_to_stop=end_wait_ms,
+                                    playback_clock=playback_clock)
+            dprint(f'player_wait_for_end() returned - Video has ended!')
+
+            current_playback_count += 1
+
+        dprint(f'We have played the number of times specified ({PLAYBACK_COUNT}), exiting media player')
+        if isinstance(transmitter, GpioProtocolTransmitter):
+            transmitter.send_shutdown()
+        transmitter.close()
+        if beacon:
+            beacon.close()
+        if health:
+            health.close()
+        player.close()
+
+    # Otherwise, run as secondary
+    elif MODE == 'secondary':
+        drift = None
+        if DRIFT_CORRECTION:
+            dprint(f'Drift correction enabled (every {DRIFT_INTERVAL_SEC}s, seeking above {DRIFT_HARD_SEEK_MS}ms)')
+            drift = DriftController(duration=duration,
+                                    gain_p=DRIFT_GAIN_P,
+                                    gain_i=DRIFT_GAIN_I,
+                                    max_rate_adjust=DRIFT_MAX_RATE_ADJUST,
+                                    hard_seek_ms=DRIFT_HARD_SEEK_MS,
+                                    seek_latency_ms=SEEK_LATENCY_MS,
+                                    metrics=metrics,
+                                    playback_clock=playback_clock)
+
+        compensator = None
+        if EDGE_COMPENSATION != 'off':
+            dprint(f'Compensating for late "go"s over {EDGE_COMPENSATION_MIN_MS}ms ({EDGE_COMPENSATION})')
+            compensator = EdgeCompensator(mode=EDGE_COMPENSATION, min_ms=EDGE_COMPENSATION_MIN_MS,
+                                          max_rate_adjust=DRIFT_MAX_RATE_ADJUST, seek_latency_ms=SEEK_LATENCY_MS)
+
+        rejoin = None
+        if HOT_JOIN:
+            dprint(f'Hot-join enabled (re-seeking above {HOT_JOIN_THRESHOLD_MS}ms)')
+            rejoin = SecondaryRejoin(duration=duration, threshold_ms=HOT_JOIN_THRESHOLD_MS,
+                                     seek_latency_ms=SEEK_LATENCY_MS, compensator=compensator)
+        if config_reloader:
+            if drift:
+                config_bind_attributes(config_reloader, drift, DRIFT_CONFIG_ATTRIBUTES)
+            if compensator:
+                config_bind_attributes(config_reloader, compensator, {'EDGE_COMPENSATION_MIN_MS': 'min_ms'})
+            if rejoin:
+                config_bind_attributes(config_reloader, rejoin, {'HOT_JOIN_THRESHOLD_MS': 'threshold_ms'})
+        media_targets.extend([drift, rejoin])
+
+        if health:
+            if drift:
+                health.on_resync = lambda: drift.resync(player=player)
+            elif rejoin:
+                health.on_resync = rejoin.request_resync
+            if 'beacon' in DECODE_HEALTH_ACTIONS and SYNC_TRANSPORT == 'gpio' and not (HOT_JOIN and PIN_PROTOCOL == 'legacy'):
+                dwarn('DecodeHealthActions = beacon: the primary only listens with Transport = udp, '
+                      'or HotJoin (with PinProtocol = legacy)')
+            health_reporter = SyncHealthReporter(node_name=NODE_NAME, group=MULTICAST_GROUP, port=MULTICAST_PORT,
+                                                 interface=MULTICAST_INTERFACE, ttl=MULTICAST_TTL)
+            health.on_beacon = health_reporter.send
+            atexit.register(health_reporter.close)
+
+        on_position = None
+        if drift or rejoin:
+            on_position = lambda position_ms, at_ns: secondary_on_position(player=player, position_ms=position_ms,
+                                                                           at_ns=at_ns, drift=drift, rejoin=rejoin)
+
+        if SYNC_TRANSPORT == 'udp':
+            on_prepare = lambda loop_index: secondary_on_prepare(player=player, drift=drift, metrics=metrics,
+                                                                 loop_index=loop_index, rejoin=rejoin,
+                                                                 compensator=compensator)
+            on_go = lambda loop_index, go_ns: secondary_on_go(player=player, go_ns=go_ns, drift=drift, metrics=metrics,
+                                                              compensator=compensator, rejoin=rejoin)
+            if executor:
+                on_prepare = lambda loop_index, on_prepare=on_prepare: executor.submit_edge(
+                    'prepare', lambda: on_prepare(loop_index))
+                on_go = lambda loop_index, go_ns, on_go=on_go: executor.submit_edge(
+                    'go', lambda: on_go(loop_index, go_ns), issued_ns=go_ns)
+            receiver = UdpSyncSecondary(group=MULTICAST_GROUP, port=MULTICAST_PORT,
+                                        interface=MULTICAST_INTERFACE,
+                                        on_prepare=on_prepare,
+                                        on_go=on_go,
+                                        on_position=on_position,
+                                        clock_sync_interval_sec=CLOCK_SYNC_INTERVAL_SEC,
+                                        ttl=MULTICAST_TTL)
+            receiver.start()
+            if READY_BARRIER:
+                receiver.announce_ready(node_name=NODE_NAME)
+        else:
+            # Set up listening pin & associated events    
+            if PIN_PROTOCOL == 'legacy':
+                listen_pin = gpio_setup_listen_pin(listen_pin_number=GPIO_LISTEN_PIN, player=player,
+                                                   drift=drift, metrics=metrics, executor=executor,
+                                                   compensator=compensator, capture=EDGE_CAPTURE, chip_path=GPIO_CHIP,
+                                                   rejoin=rejoin)
+            else:
+                decoder = PinProtocolDecoder(mode=PIN_PROTOCOL, bit_ms=PIN_BIT_MS,
+                                             on_command=lambda command, argument, end_ns: secondary_on_pin_command(
+                                                 player=player, command=command, argument=argument, end_ns=end_ns,
+                                                 drift=drift, metrics=metrics, executor=executor,
+                                                 compensator=compensator, rejoin=rejoin))
+                listen_pin = gpio_setup_protocol_listener(listen_pins=LISTEN_PINS, decoder=decoder,
+                                                          capture=EDGE_CAPTURE, chip_path=GPIO_CHIP,
+                                                          metrics=metrics)
+            if READY_BARRIER:
+                gpio_ready_line_release(ready_line)
+            if rejoin and PIN_PROTOCOL == 'legacy':
+                # Loop starts come from the listen pin, position beacons over UDP
+                receiver = UdpSyncSecondary(group=MULTICAST_GROUP, port=MULTICAST_PORT,
+                                            interface=MULTICAST_INTERFACE, on_position=on_position,
+                                            clock_sync_interval_sec=CLOCK_SYNC_INTERVAL_SEC)
+                receiver.start()
+
+        # Wait for file to load / buffer, one second shorter than the primary
+        # dprint(f'Sleeping for {LOAD_WAIT_DURATION - 1} seconds, for file to load / buffer (1 sec shorter than primary)')
+        # time.sleep(LOAD_WAIT_DURATION - 1)      # [2 - 1] seconds by default
+        # dprint('Prepared to start (as secondary)')
+
+        # Begin standard playback loop (until the primary sends a shutdown command, if it can)
+        while ((current_playback_count <= PLAYBACK_COUNT) or PLAY_FOREVER) and not shutdown_requested.is_set():
+            # Wait for RISE (GPIO going High on Main)
+
+            # wait_for_gpio(gpio_listen_pin=GPIO_LISTEN_PIN)
+            # player_start_at_beginning(player=player)
+            if drift:
+                # The restarts themselves are handled by the listen pin callbacks
+                clock.sleep(DRIFT_INTERVAL_SEC)
+                error_ms = drift.update(player=player)
+                if error_ms is not None and abs(error_ms) > drift.deadband_ms:
+                    dprint(f'Drift: {error_ms:+.0f}ms, rate now {drift.rate:.3f}')
+                continue
+
+            dprint(f'Waiting for the end of the video...')
+            if END_DETECTION == 'events':
+                player_wait_for_end_events(player=player, duration=duration, lead_frames=END_LEAD_FRAMES,
+                                           stop=shutdown_requested)
+                player_wait_for_restart_events(player=player, duration=duration, stop=shutdown_requested)
+            else:
+                player_wait_for_end(player=player, duration=duration, ms_before_end_to_stop=1000,
+                                    playback_clock=playback_clock, stop=shutdown_requested)
+            dprint(f'player_wait_for_end() returned - Video has ended!')
+
+        if health:
+            health.close()
+        player.close()
+
+    # Or follow the shared clock (no primary)
+    elif MODE == 'clock':
+        try:
+            epoch_ns = config_parse_epoch(CLOCK_EPOCH)
+        except ValueError:
+            print(f"ERROR: ClockEpoch should be a unix time (in seconds) or an ISO 8601 date/time, not {CLOCK_EPOCH}")
+            exit(1)
+
+        phase = WallClockPhase(epoch_ns=epoch_ns, duration=duration, source=CLOCK_SOURCE,
+                               offset_ns=int(CLOCK_OFFSET_MS * 1_000_000))
+        # Without DriftCorrection, only errors over DriftHardSeekMs are corrected (by seeking)
+        drift = DriftController(duration=duration,
+                                gain_p=DRIFT_GAIN_P if DRIFT_CORRECTION else 0,
+                                gain_i=DRIFT_GAIN_I if DRIFT_CORRECTION else 0,
+                                max_rate_adjust=DRIFT_MAX_RATE_ADJUST,
+                                hard_seek_ms=DRIFT_HARD_SEEK_MS,
+                                seek_latency_ms=SEEK_LATENCY_MS,
+                                wrap=True,
+                                metrics=metrics,
+                                playback_clock=playback_clock)
+        if config_reloader:
+            config_bind_attributes(config_reloader, drift, DRIFT_CONFIG_ATTRIBUTES)
+            config_reloader.bind('CLOCK_OFFSET_MS', lambda value: setattr(phase, 'offset_ns', int(value * 1_000_000)))
+        media_targets.extend([drift, phase])
+        if health:
+            health.on_resync = lambda: drift.resync(player=player)
+        lead_ms = max(END_LEAD_FRAMES * player_get_frame_duration_ms(player), SEEK_LATENCY_MS)
+        dprint(f'Clock mode: following the {CLOCK_SOURCE} clock, loops starting every {duration}ms '
+               f'from {epoch_ns / 1_000_000_000:.3f}')
+
+        clock_mode_run(player=player, phase=phase, drift=drift, lead_ms=lead_ms,
+                       seek_latency_ms=SEEK_LATENCY_MS,
+                       loops=None if PLAY_FOREVER else PLAYBACK_COUNT,
+                       drift_interval_sec=DRIFT_INTERVAL_SEC, metrics=metrics)
+        if health:
+            health.close()
+        player.close()
+
+    dprint('Script complete, exiting.\r\rNote: if keyboard is not working, hit Control-C, then type "reset" and hit enter')
@@ -0,0 +1,52 @@
+import configparser
+import importlib.util
+import os
+import socket
+import sys
+
+import pytest
+
+# The player is a script (with hyphens in its name), so load it by path -
+# the tests can then "import pi_gpio_synced_player"
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pi-gpio-synced-player.py')
+
+if 'pi_gpio_synced_player' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('pi_gpio_synced_player', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['pi_gpio_synced_player'] = module
+    spec.loader.exec_module(module)
+
+import pi_gpio_synced_player as sp  # noqa: E402
+
+
+@pytest.fixture
+def config(monkeypatch):
+    """Sets the config globals to their defaults (as main does, from an empty config file)"""
+    conf = sp.config_build(configparser.ConfigParser())
+    for key, value in conf.items():
+        monkeypatch.setattr(sp, key, value, raising=False)
+    return conf
+
+
+@pytest.fixture
+def virtual_clock(monkeypatch, config):
+    """Runs everything on a VirtualClock (& virtual pins), as simulate() does"""
+    clock = sp.VirtualClock()
+    monkeypatch.setattr(sp, 'clock', clock)
+    monkeypatch.setattr(sp, 'TEST_MODE_FAKE_GPIO', False)
+    return clock
+
+
+@pytest.fixture
+def udp_port():
+    """A free UDP port, with port + 1 free too (UdpSyncPrimary binds both)"""
+    while True:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+            probe.bind(('', 0))
+            port = probe.getsockname()[1]
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+                probe.bind(('', port + 1))
+            return port
+        except OSError:
+            continue
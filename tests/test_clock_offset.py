@@ -0,0 +1,59 @@
+import socket
+
+import pi_gpio_synced_player as sp
+
+
+def test_clock_offset_estimator_empty():
+    estimator = sp.ClockOffsetEstimator()
+    assert estimator.offset_ns is None
+    assert estimator.delay_ns is None
+
+
+def test_clock_offset_estimator_symmetric_round_trip():
+    estimator = sp.ClockOffsetEstimator()
+    # Primary is 1000ns ahead, 100ns each way, 20ns to reply
+    estimator.add_sample(t0=0, t1=1_100, t2=1_120, t3=220)
+    assert estimator.offset_ns == 1_000
+    assert estimator.delay_ns == 200
+
+
+def test_clock_offset_estimator_uses_least_delayed_sample():
+    estimator = sp.ClockOffsetEstimator()
+    # Queued on the way back (an inaccurate offset), then a clean sample
+    estimator.add_sample(t0=0, t1=1_100, t2=1_120, t3=5_220)
+    estimator.add_sample(t0=10_000, t1=11_050, t2=11_060, t3=10_110)
+    assert estimator.offset_ns == 1_000
+    assert estimator.delay_ns == 100
+
+
+def test_clock_offset_estimator_window():
+    estimator = sp.ClockOffsetEstimator(window=2)
+    estimator.add_sample(t0=0, t1=1_010, t2=1_010, t3=20)   # Best, but drops out of the window
+    estimator.add_sample(t0=0, t1=2_100, t2=2_100, t3=200)
+    estimator.add_sample(t0=0, t1=2_150, t2=2_150, t3=300)
+    assert estimator.offset_ns == 2_000
+
+
+def test_udp_sync_primary_close_frees_its_sockets(config, udp_port):
+    primary = sp.UdpSyncPrimary(group='239.0.0.1', port=udp_port, interface='127.0.0.1', position_interval_sec=0)
+    primary.close()
+    assert primary.sock.fileno() == -1
+    assert primary.control_sock.fileno() == -1
+    # Sends after close are dropped, & port + 1 can be bound again (eg, by the next primary)
+    primary.send(sp.SYNC_MSG_POSITION)
+    sp.UdpSyncPrimary(group='239.0.0.1', port=udp_port, interface='127.0.0.1', position_interval_sec=0).close()
+
+
+def test_sync_health_reporter_reuses_its_socket(config, udp_port):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as listener:
+        listener.bind(('127.0.0.1', udp_port + 1))
+        listener.settimeout(1)
+        reporter = sp.SyncHealthReporter(node_name='left', group='127.0.0.1', port=udp_port)
+        reporter.send(loss_pct=12.5, decode_ratio=0.9)
+        sock = reporter.sock
+        reporter.send(loss_pct=20, decode_ratio=0.8)
+        assert reporter.sock is sock
+        packets = [sp.sync_packet_unpack(listener.recv(sp.SYNC_PACKET_MAX_SIZE)) for _ in range(2)]
+        reporter.close()
+    assert [(packet.seq, packet.value, packet.payload) for packet in packets] == [(1, 1250, b'left'), (2, 2000, b'left')]
+    assert sock.fileno() == -1
@@ -0,0 +1,89 @@
+import configparser
+
+import pytest
+
+import pi_gpio_synced_player as sp
+
+
+def build(**sections):
+    config_parsed = configparser.ConfigParser()
+    config_parsed.read_dict(sections)
+    return sp.config_build(config_parsed)
+
+
+def test_defaults_are_valid():
+    assert sp.config_validate(build()) == []
+
+
+def test_bad_choice_and_negative_values():
+    errors = sp.config_validate(build(Sync={'PlayerMode': 'tertiary', 'PinTxDurationSec': '0'}))
+    assert errors == ["PlayerMode should be set to 'primary', 'secondary' or 'clock', not tertiary",
+                      'PinTxDurationSec should be more than 0, not 0.0']
+
+
+def test_playlist_items_must_exist(tmp_path):
+    present = tmp_path / 'a.mp4'
+    present.write_bytes(b'')
+    errors = sp.config_validate(build(Video={'Playlist': f'{present}, {tmp_path / "b.mp4"}'}))
+    assert errors == [f'Playlist item {tmp_path / "b.mp4"} not found']
+
+
+def test_chapters_need_the_pin_protocol():
+    assert sp.config_validate(build(Sync={'Chapters': '0, 30'})) == [
+        'Chapters needs Transport = gpio, PinProtocol = serial or parallel, & PrimaryTiming = sleep']
+    assert sp.config_validate(build(Sync={'Chapters': '0, 30', 'PinProtocol': 'serial'})) == []
+
+
+@pytest.fixture
+def reloader(config, tmp_path):
+    config_file = tmp_path / 'player.ini'
+    config_file.write_text('[Advanced]\nDriftGainP = 0.0005\n')
+    return sp.ConfigReloader(config_file=str(config_file), conf=dict(config), watch_sec=0)
+
+
+def test_reload_is_queued_then_applied(reloader):
+    applied = []
+    reloader.bind('DRIFT_GAIN_P', applied.append)
+    with open(reloader.config_file, 'w') as f:
+        f.write('[Advanced]\nDriftGainP = 0.002\n')
+    assert reloader.load() == {'DRIFT_GAIN_P': 0.002}
+    # Nothing changes until the loop gets to it
+    assert sp.DRIFT_GAIN_P == sp.DRIFT_GAIN_P_DEFAULT
+    assert applied == []
+    assert reloader.apply_pending() == ['DRIFT_GAIN_P']
+    assert sp.DRIFT_GAIN_P == 0.002
+    assert reloader.conf['DRIFT_GAIN_P'] == 0.002
+    assert applied == [0.002]
+    assert reloader.apply_pending() == []
+
+
+def test_only_changes_are_queued(reloader):
+    assert reloader.load() == {}
+    assert reloader.apply_pending() == []
+
+
+def test_change_reverted_before_it_was_applied(reloader):
+    with open(reloader.config_file, 'w') as f:
+        f.write('[Advanced]\nDriftGainP = 0.002\n')
+    reloader.load()
+    with open(reloader.config_file, 'w') as f:
+        f.write('[Advanced]\nDriftGainP = 0.0005\n')
+    assert reloader.load() == {}
+    assert reloader.apply_pending() == []
+
+
+def test_invalid_config_is_not_queued(reloader):
+    with open(reloader.config_file, 'w') as f:
+        f.write('[Advanced]\nDriftGainP = 0.002\n[Sync]\nPinTxDurationSec = -1\n')
+    assert reloader.load() == {}
+    with open(reloader.config_file, 'w') as f:
+        f.write('[Advanced]\nDriftGainP = lots\n')
+    assert reloader.load() == {}
+    assert reloader.apply_pending() == []
+
+
+def test_settings_that_need_a_restart_are_not_queued(reloader, capsys):
+    with open(reloader.config_file, 'w') as f:
+        f.write('[Sync]\nListenPin = 5\n')
+    assert reloader.load() == {}
+    assert 'GPIO_LISTEN_PIN changed - this needs a restart' in capsys.readouterr().out
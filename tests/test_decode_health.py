@@ -0,0 +1,129 @@
+import pytest
+
+import pi_gpio_synced_player as sp
+
+
+class DecodingPlayer:
+    """A 25fps player whose decoder statistics advance by `decoded` & `lost` pictures a second"""
+    def __init__(self, decoded=25, lost=0):
+        self.decoded_per_sec = decoded
+        self.lost_per_sec = lost
+        self.playback_state = sp.PLAYER_STATE_PLAYING
+        self.totals = {'decoded': 0, 'displayed': 0, 'lost': 0}
+        self.position_ms = 0
+
+    def advance(self, seconds):
+        self.totals['decoded'] += self.decoded_per_sec * seconds
+        self.totals['displayed'] += (self.decoded_per_sec - self.lost_per_sec) * seconds
+        self.totals['lost'] += self.lost_per_sec * seconds
+        self.position_ms += 1000 * seconds
+
+    def state(self):
+        return self.playback_state
+
+    def position(self):
+        return self.position_ms
+
+    def frame_rate(self):
+        return 25
+
+    def decode_stats(self):
+        return dict(self.totals, source='a', corrupted=0, demux_kbps=4000)
+
+
+@pytest.fixture
+def responses(virtual_clock, monkeypatch):
+    monkeypatch.setattr(sp.DecodeHealthMonitor, 'TEMPERATURE_FILE', '/nonexistent')
+    return []
+
+
+def monitor(player, responses, **kwargs):
+    return sp.DecodeHealthMonitor(player, interval_sec=1, window_sec=10, max_loss_pct=5, min_decode_ratio=0.9,
+                                  actions=['warn', 'resync', 'beacon'], cooldown_sec=30,
+                                  on_resync=lambda: responses.append('resync'),
+                                  on_beacon=lambda loss_pct, decode_ratio: responses.append(
+                                      ('beacon', loss_pct, decode_ratio)),
+                                  **kwargs)
+
+
+def run(health, player, seconds):
+    results = []
+    for _ in range(seconds):
+        player.advance(1)
+        sp.clock.sleep(1)
+        results.append(health.sample())
+    return results
+
+
+def test_healthy_decoding(responses):
+    player = DecodingPlayer()
+    health = monitor(player, responses)
+    assert health.sample() is None
+    result = run(health, player, 10)[-1]
+    assert result['loss_pct'] == 0
+    assert result['decode_ratio'] == pytest.approx(1)
+    assert result['advance_ratio'] == pytest.approx(1)
+    assert responses == []
+
+
+def test_losses_over_the_threshold_respond(responses):
+    player = DecodingPlayer(decoded=25, lost=5)
+    health = monitor(player, responses)
+    health.sample()
+    # Once the samples cover half the window (5s)
+    run(health, player, 5)
+    assert responses == ['resync', ('beacon', 20.0, 1.0)]
+    assert health.response_count == 1
+
+
+def test_slow_decoding_responds(responses):
+    player = DecodingPlayer(decoded=20)
+    health = monitor(player, responses)
+    health.sample()
+    run(health, player, 5)
+    assert responses == ['resync', ('beacon', 0.0, pytest.approx(0.8))]
+
+
+def test_no_response_before_half_the_window(responses):
+    player = DecodingPlayer(decoded=25, lost=5)
+    health = monitor(player, responses)
+    health.sample()
+    run(health, player, 4)
+    assert responses == []
+
+
+def test_cooldown_between_responses(responses):
+    player = DecodingPlayer(decoded=25, lost=5)
+    health = monitor(player, responses)
+    health.sample()
+    # First response at 5s - then nothing for 30s, despite the losses
+    run(health, player, 34)
+    assert health.response_count == 1
+    run(health, player, 1)
+    assert health.response_count == 2
+
+
+def test_samples_restart_after_a_pause_or_seek_back(responses):
+    player = DecodingPlayer(decoded=25, lost=5)
+    health = monitor(player, responses)
+    run(health, player, 3)
+    player.playback_state = sp.PLAYER_STATE_PAUSED
+    assert health.sample() is None
+    assert not health.samples
+    player.playback_state = sp.PLAYER_STATE_PLAYING
+    run(health, player, 3)
+    player.position_ms = 0
+    assert health.sample() is None
+    assert len(health.samples) == 1
+    assert responses == []
+
+
+def test_lite_profile_is_switched_to_once(responses):
+    player = DecodingPlayer(decoded=25, lost=5)
+    health = monitor(player, responses)
+    health.actions = ['lite']
+    health.on_lite = lambda: responses.append('lite')
+    health.cooldown_sec = 0
+    run(health, player, 20)
+    assert health.response_count > 1
+    assert responses == ['lite']
@@ -0,0 +1,111 @@
+import pytest
+
+import pi_gpio_synced_player as sp
+
+
+class StubPlayer:
+    """Reports a fixed position, & records seeks & rate changes"""
+    def __init__(self, position_ms=0, state=sp.PLAYER_STATE_PLAYING):
+        self.position_ms = position_ms
+        self.playback_state = state
+        self.seeks = []
+        self.rates = []
+
+    def position(self):
+        return self.position_ms
+
+    def state(self):
+        return self.playback_state
+
+    def seek(self, time_ms):
+        self.seeks.append(time_ms)
+
+    def set_rate(self, rate):
+        self.rates.append(rate)
+
+
+def controller(**kwargs):
+    return sp.DriftController(duration=60_000, **kwargs)
+
+
+def test_nothing_to_compare_against(virtual_clock):
+    drift = controller()
+    assert drift.update(StubPlayer()) is None
+    drift.set_reference(position_ms=1000, at_ns=virtual_clock.now_ns())
+    assert drift.update(StubPlayer(state=sp.PLAYER_STATE_PAUSED)) is None
+
+
+def test_deadband_leaves_the_rate_alone(virtual_clock):
+    drift = controller(gain_i=0, deadband_ms=10)
+    drift.set_reference(position_ms=1000, at_ns=virtual_clock.now_ns())
+    player = StubPlayer(position_ms=995)
+    assert drift.update(player) == 5
+    assert player.rates == []
+
+
+def test_proportional_adjustment(virtual_clock):
+    drift = controller(gain_p=0.0005, gain_i=0)
+    drift.set_reference(position_ms=1000, at_ns=virtual_clock.now_ns())
+    player = StubPlayer(position_ms=980)
+    assert drift.update(player) == 20
+    assert player.rates == [1.01]
+    # Ahead: slow down
+    player.position_ms = 1020
+    drift.update(player)
+    assert player.rates == [1.01, 0.99]
+
+
+def test_adjustment_is_clamped(virtual_clock):
+    drift = controller(gain_p=0.0005, gain_i=0, max_rate_adjust=0.03, hard_seek_ms=500)
+    drift.set_reference(position_ms=1000, at_ns=virtual_clock.now_ns())
+    player = StubPlayer(position_ms=600)
+    assert drift.update(player) == 400
+    assert player.rates == [1.03]
+    player.position_ms = 1400
+    drift.update(player)
+    assert player.rates == [1.03, 0.97]
+
+
+def test_integral_winds_up_no_further_than_the_clamp(virtual_clock):
+    drift = controller(gain_p=0, gain_i=0.0001, max_rate_adjust=0.03)
+    drift.set_reference(position_ms=1000, at_ns=virtual_clock.now_ns())
+    player = StubPlayer()
+    for _ in range(10):
+        player.position_ms = drift.reference_position_ms(virtual_clock.now_ns()) - 100
+        drift.update(player)
+        virtual_clock.sleep(1)
+    # 100ms for 9s would be 900ms.s - but the integral alone can only reach the max adjustment
+    assert drift.integral == pytest.approx(300)
+    assert drift.rate == 1.03
+    # So it unwinds as soon as the error changes sign, rather than after 900ms.s
+    player.position_ms = drift.reference_position_ms(virtual_clock.now_ns()) + 100
+    drift.update(player)
+    assert drift.integral == pytest.approx(200)
+    assert drift.rate == 1.02
+
+
+def test_hard_seek_resets_the_controller(virtual_clock):
+    drift = controller(gain_p=0.0005, hard_seek_ms=500, seek_latency_ms=50)
+    drift.set_reference(position_ms=1000, at_ns=virtual_clock.now_ns())
+    player = StubPlayer(position_ms=980)
+    drift.update(player)
+    virtual_clock.sleep(1)
+    player.position_ms = 1300
+    assert drift.update(player) == 700
+    assert player.seeks == [2050]
+    assert player.rates[-1] == 1.0
+    assert drift.integral == 0 and drift.last_update_ns is None
+
+
+def test_no_corrections_near_the_end(virtual_clock):
+    drift = controller(hard_seek_ms=500)
+    drift.set_reference(position_ms=59_600, at_ns=virtual_clock.now_ns())
+    assert drift.update(StubPlayer(position_ms=0)) is None
+
+
+def test_wrapped_errors_go_the_short_way_round(virtual_clock):
+    drift = controller(gain_p=0.0005, gain_i=0, wrap=True)
+    drift.set_reference(position_ms=100, at_ns=virtual_clock.now_ns())
+    player = StubPlayer(position_ms=59_950)
+    assert drift.update(player) == 150
+    assert player.seeks == []
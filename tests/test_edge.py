@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pi_gpio_synced_player as sp
+
+
+class RatePlayer(sp.SimPlayer):
+    """A SimPlayer that records its rate changes"""
+    def __init__(self):
+        super().__init__(duration=10_000)
+        self.rates = []
+
+    def set_rate(self, rate):
+        self.rates.append(rate)
+        super().set_rate(rate)
+
+
+def wait_for(condition, timeout_sec=2):
+    deadline = time.monotonic() + timeout_sec
+    while not condition():
+        assert time.monotonic() < deadline, 'Timed out'
+        time.sleep(0.001)
+
+
+def test_fake_edge_source_timestamps_and_drains(virtual_clock):
+    source = sp.FakeEdgeSource()
+    virtual_clock.sleep(1)
+    source.inject(rising=True, age_ms=5)
+    source.inject(rising=False, edge_ns=123, data=(1, 0))
+    assert source.read(timeout_sec=0) == [(True, virtual_clock.now_ns() - 5_000_000, ()), (False, 123, (1, 0))]
+    assert source.read(timeout_sec=0) == []
+
+
+def test_fake_edge_source_read_waits_for_an_edge(config):
+    source = sp.FakeEdgeSource()
+    threading.Timer(0.01, source.inject, args=(True,)).start()
+    assert [rising for rising, _, _ in source.read(timeout_sec=2)] == [True]
+
+
+def test_edge_listener_passes_the_edge_times_on(config):
+    source = sp.FakeEdgeSource()
+    rising, falling = [], []
+    listener = sp.EdgeListener(source, on_rising=rising.append, on_falling=falling.append)
+    source.inject(rising=True, edge_ns=100)
+    source.inject(rising=False, edge_ns=200)
+    wait_for(lambda: falling)
+    listener.close()
+    assert (rising, falling) == ([100], [200])
+
+
+def test_edge_listener_on_edge_gets_the_data_lines(config):
+    source = sp.FakeEdgeSource()
+    edges = []
+    listener = sp.EdgeListener(source, on_edge=lambda *edge: edges.append(edge))
+    source.inject(rising=True, edge_ns=100, data=(1, 1))
+    wait_for(lambda: edges)
+    listener.close()
+    assert edges == [(True, 100, (1, 1))]
+
+
+def test_compensator_seek_mode_seeks_past_the_lateness(virtual_clock):
+    player = RatePlayer()
+    compensator = sp.EdgeCompensator(mode='seek', min_ms=10, seek_latency_ms=30)
+    late_ms = compensator.resume(player, go_ns=virtual_clock.now_ns() - 50_000_000)
+    assert late_ms == 50
+    assert player.position_ms == 80
+    assert player.rates == []
+
+
+def test_compensator_ignores_small_lateness(virtual_clock):
+    player = RatePlayer()
+    compensator = sp.EdgeCompensator(mode='seek', min_ms=10)
+    compensator.resume(player, go_ns=virtual_clock.now_ns() - 5_000_000)
+    assert player.position_ms == 0
+
+
+def test_compensator_rate_mode_catches_up_then_restores_the_rate(virtual_clock):
+    player = RatePlayer()
+    compensator = sp.EdgeCompensator(mode='rate', min_ms=10, max_rate_adjust=5)
+    compensator.resume(player, go_ns=virtual_clock.now_ns() - 50_000_000)
+    assert player.rates == [6]
+    # 50ms at +5x takes 10ms to make up
+    wait_for(lambda: player.rates == [6, 1.0])
+    assert compensator.rate_timer is None
+
+
+def test_compensator_rate_mode_leaves_it_to_drift_correction(virtual_clock):
+    player = RatePlayer()
+    compensator = sp.EdgeCompensator(mode='rate', min_ms=10, max_rate_adjust=0.05)
+    compensator.resume(player, go_ns=virtual_clock.now_ns() - 50_000_000, drift=sp.DriftController(duration=10_000))
+    assert player.rates == []
+
+
+def test_prepare_cancels_the_catch_up(virtual_clock):
+    player = RatePlayer()
+    compensator = sp.EdgeCompensator(mode='rate', min_ms=10, max_rate_adjust=0.05)
+    compensator.resume(player, go_ns=virtual_clock.now_ns() - 50_000_000)
+    rate_timer = compensator.rate_timer
+    sp.secondary_on_prepare(player, compensator=compensator)
+    assert player.rates == [1.05, 1.0]
+    assert rate_timer.finished.is_set()
+    # Nothing to cancel now
+    compensator.cancel_catch_up(player)
+    assert player.rates == [1.05, 1.0]
+
+
+def test_seek_and_hot_join_cancel_the_catch_up(virtual_clock):
+    player = RatePlayer()
+    compensator = sp.EdgeCompensator(mode='rate', min_ms=10, max_rate_adjust=0.05)
+    compensator.resume(player, go_ns=virtual_clock.now_ns() - 50_000_000)
+    sp.secondary_on_seek(player, position_ms=5000, at_ns=virtual_clock.now_ns(), compensator=compensator)
+    assert player.rates == [1.05, 1.0]
+
+    rejoin = sp.SecondaryRejoin(duration=10_000, threshold_ms=100, compensator=compensator)
+    compensator.resume(player, go_ns=virtual_clock.now_ns() - 50_000_000)
+    rejoin.on_position(player, position_ms=8000, at_ns=virtual_clock.now_ns())
+    assert player.rates == [1.05, 1.0, 1.05, 1.0]
+    assert compensator.rate_timer is None
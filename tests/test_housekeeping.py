@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+import pi_gpio_synced_player as sp
+
+
+class FakeReloader:
+    def __init__(self):
+        self.applied = threading.Event()
+        self.thread = None
+
+    def apply_pending(self):
+        self.thread = threading.current_thread()
+        self.applied.set()
+        return []
+
+
+@pytest.fixture
+def reloader(monkeypatch):
+    reloader = FakeReloader()
+    monkeypatch.setattr(sp, 'config_reloader', reloader)
+    return reloader
+
+
+def test_runs_half_way_through_the_loop(reloader):
+    housekeeping = sp.LoopHousekeeping(duration=200)
+    housekeeping.schedule()
+    assert not reloader.applied.wait(0.05)
+    assert reloader.applied.wait(1)
+
+
+def test_restart_reschedules(reloader):
+    housekeeping = sp.LoopHousekeeping(duration=200)
+    housekeeping.schedule()
+    reloader.applied.wait(0.07)
+    housekeeping.schedule()
+    # Not at 100ms from the first restart
+    assert not reloader.applied.wait(0.06)
+    assert reloader.applied.wait(1)
+
+
+def test_runs_on_the_executor_thread(reloader):
+    executor = sp.PlayerExecutor()
+    try:
+        housekeeping = sp.LoopHousekeeping(duration=20, executor=executor)
+        housekeeping.schedule()
+        assert reloader.applied.wait(1)
+        assert reloader.thread is executor.thread
+    finally:
+        executor.close()
+
+
+def test_go_schedules_instead_of_collecting(monkeypatch, virtual_clock):
+    scheduled = []
+    monkeypatch.setattr(sp, 'loop_housekeeping', type('Housekeeping', (), {'schedule': lambda self: scheduled.append(1)})())
+    monkeypatch.setattr(sp, 'runtime_gc_collect', lambda: pytest.fail('Collected in the go handler'))
+    player = sp.SimPlayer(duration=1000)
+    sp.secondary_on_go(player=player, go_ns=virtual_clock.now_ns())
+    assert scheduled == [1]
@@ -0,0 +1,80 @@
+import pytest
+
+import pi_gpio_synced_player as sp
+
+
+class Counted:
+    """Counts how often it's formatted"""
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return 'value'
+
+
+def test_ring_formats_args_on_flush():
+    ring = sp.LogRing(size=8)
+    value = Counted()
+    ring.write(sp.LOG_LEVELS['info'], 'function', 'got %s (%.1fms)', (value, 2.25))
+    assert value.formatted == 0
+    lines = []
+    ring.flush(output=lines.append)
+    assert len(lines) == 1
+    assert lines[0].endswith('function(): got value (2.2ms)')
+    assert value.formatted == 1
+
+
+def test_ring_outputs_in_order_once():
+    ring = sp.LogRing(size=8)
+    for i in range(5):
+        ring.write(sp.LOG_LEVELS['info'], 'function', f'message {i}')
+    lines = []
+    ring.flush(output=lines.append)
+    ring.flush(output=lines.append)
+    assert [line.rsplit(' ', 1)[1] for line in lines] == ['0', '1', '2', '3', '4']
+
+
+def test_ring_overrun_drops_oldest():
+    ring = sp.LogRing(size=4)
+    for i in range(7):
+        ring.write(sp.LOG_LEVELS['warning'], 'function', f'message {i}')
+    lines = []
+    ring.flush(output=lines.append)
+    assert [line.rsplit(' ', 1)[1] for line in lines[:-1]] == ['3', '4', '5', '6']
+    assert '3 messages dropped' in lines[-1]
+
+
+def test_ring_discards_a_record_overwritten_while_copied():
+    ring = sp.LogRing(size=2)
+    ring.write(sp.LOG_LEVELS['info'], 'function', 'old')
+
+    class LappedSlot(list):
+        lapped = False
+
+        def __iter__(self):
+            if not self.lapped:
+                # A writer laps the reader, part way through reading this slot
+                self.lapped = True
+                for i in range(2):
+                    ring.write(sp.LOG_LEVELS['info'], 'function', f'new {i}')
+            return super().__iter__()
+    ring.slots[0] = LappedSlot(ring.slots[0])
+
+    lines = []
+    ring.flush(output=lines.append)
+    assert not any(line.endswith('old') for line in lines)
+    assert [line.rsplit(': ', 1)[1] for line in lines[:-1]] == ['new 0', 'new 1']
+    assert '1 messages dropped' in lines[-1]
+
+
+def test_disabled_levels_skip_formatting(monkeypatch, capsys):
+    for name in ('ddebug', 'dprint', 'dwarn', 'log_write', 'log_ring'):
+        monkeypatch.setattr(sp, name, getattr(sp, name))
+    sp.log_configure(level='warning', output='print')
+    value = Counted()
+    sp.ddebug('debug %s', value)
+    sp.dprint('info %s', value)
+    sp.dwarn('warning %s', value)
+    assert value.formatted == 1
+    assert capsys.readouterr().out.strip().endswith('WARNING: warning value')
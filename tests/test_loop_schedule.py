@@ -0,0 +1,26 @@
+import pi_gpio_synced_player as sp
+
+
+def test_loop_schedule_deadlines():
+    schedule = sp.LoopSchedule(start_ns=1_000, play_ns=10_000, pin_tx_ns=500)
+    assert schedule.period_ns == 10_500
+    assert schedule.resume_ns(0) == 1_000
+    assert schedule.resume_ns(3) == 1_000 + 3 * 10_500
+    assert schedule.rise_ns(3) == schedule.resume_ns(3) - 500
+
+
+def test_loop_schedule_rebase():
+    schedule = sp.LoopSchedule(start_ns=0, play_ns=10_000, pin_tx_ns=500)
+    schedule.rebase(2, 25_000)
+    assert schedule.resume_ns(2) == 25_000
+    assert schedule.resume_ns(3) == 35_500
+    assert schedule.period_ns == 10_500
+
+
+def test_loop_schedule_retime_keeps_resume_time():
+    schedule = sp.LoopSchedule(start_ns=0, play_ns=10_000, pin_tx_ns=500)
+    resume_ns = schedule.resume_ns(4)
+    schedule.retime(4, play_ns=20_000, pin_tx_ns=1_000)
+    assert schedule.resume_ns(4) == resume_ns
+    assert schedule.resume_ns(5) == resume_ns + 21_000
+    assert schedule.rise_ns(5) == resume_ns + 20_000
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pi_gpio_synced_player as sp
+
+
+class EventPlayer(sp.SimPlayer):
+    """A SimPlayer with event hooks, which must not be polled"""
+    supports_events = True
+
+    def __init__(self):
+        super().__init__(duration=10_000)
+        self.hooks = []
+        self.hooked = threading.Event()
+
+    def add_event_hook(self, on_update):
+        self.hooks.append(on_update)
+        self.hooked.set()
+        return on_update
+
+    def remove_event_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def emit(self, kind, value=None):
+        for on_update in list(self.hooks):
+            on_update(kind, value)
+
+    def position(self):
+        raise AssertionError('position() polled')
+
+
+def wait_for(condition, timeout_sec=2):
+    deadline = time.monotonic() + timeout_sec
+    while not condition():
+        assert time.monotonic() < deadline, 'Timed out'
+        time.sleep(0.001)
+
+
+def new_metrics():
+    return sp.SyncMetrics(summary_loops=0, output_file=None)
+
+
+def test_first_advance_from_time_event():
+    metrics = new_metrics()
+    player = EventPlayer()
+    metrics.mark('resume')
+    metrics.watch_first_advance(player)
+    assert player.hooks
+    player.emit('playing')
+    player.emit('time', 40)
+    wait_for(lambda: metrics.loop_count == 1)
+    assert 'first_advance' in metrics.last_loop
+    assert player.hooks == []
+
+
+def test_first_advance_times_out():
+    metrics = new_metrics()
+    metrics.first_advance_watcher = sp.FirstAdvanceWatcher(metrics, timeout_sec=0.05)
+    player = EventPlayer()
+    metrics.mark('resume')
+    metrics.watch_first_advance(player)
+    wait_for(lambda: metrics.loop_count == 1)
+    assert 'first_advance' not in metrics.last_loop
+    assert player.hooks == []
+
+
+def test_new_resume_supersedes_the_watch():
+    metrics = new_metrics()
+    first, second = EventPlayer(), EventPlayer()
+    metrics.mark('resume')
+    metrics.watch_first_advance(first)
+    metrics.mark('prepare')
+    metrics.mark('resume')
+    metrics.watch_first_advance(second)
+    wait_for(lambda: first.hooks == [])
+    # The old player's events no longer count, & only the new loop is ended
+    first.emit('time', 40)
+    second.emit('time', 40)
+    wait_for(lambda: metrics.loop_count == 1)
+    assert 'first_advance' in metrics.last_loop
+
+
+def test_player_without_events_just_ends_the_loop(virtual_clock):
+    metrics = new_metrics()
+    metrics.mark('resume')
+    metrics.watch_first_advance(sp.SimPlayer(duration=1000))
+    wait_for(lambda: metrics.loop_count == 1)
+    assert 'first_advance' not in metrics.last_loop
@@ -0,0 +1,96 @@
+import struct
+
+import pytest
+
+import pi_gpio_synced_player as sp
+
+
+def atom(atom_type: bytes, *children: bytes) -> bytes:
+    payload = b''.join(children)
+    return struct.pack('>I4s', 8 + len(payload), atom_type) + payload
+
+
+def video_moov(timescale=1000, frame_ms=40, frame_count=100, sync_samples=None, handler=b'vide'):
+    stts = struct.pack('>4xIII', 1, frame_count, frame_ms * timescale // 1000)
+    stbl = [atom(b'stsd', struct.pack('>4xI', 1), atom(b'avc1', b'\0' * 8)), atom(b'stts', stts)]
+    if sync_samples is not None:
+        stbl.append(atom(b'stss', struct.pack(f'>4xI{len(sync_samples)}I', len(sync_samples), *sync_samples)))
+    trak = atom(b'trak', atom(b'mdia',
+                              atom(b'mdhd', struct.pack('>12xII4x', timescale, frame_count * frame_ms * timescale // 1000)),
+                              atom(b'hdlr', struct.pack('>8x4s12x', handler)),
+                              atom(b'minf', atom(b'stbl', *stbl))))
+    return atom(b'moov', atom(b'mvhd', b'\0' * 100), trak)
+
+
+def write_mp4(path, *atoms):
+    path.write_bytes(atom(b'ftyp', b'isom\0\0\0\0') + b''.join(atoms))
+    return str(path)
+
+
+def test_faststart_keyframes(tmp_path):
+    media_file = write_mp4(tmp_path / 'fast.mp4', video_moov(sync_samples=[1, 26, 51, 76]),
+                           atom(b'mdat', b'\0' * 1000))
+    index = sp.mp4_index(media_file)
+    assert index['faststart']
+    assert [name for name, _, _ in index['atoms']] == ['ftyp', 'moov', 'mdat']
+    video = index['video']
+    assert video['codec'] == 'avc1'
+    assert video['timescale'] == 1000
+    assert video['duration_ms'] == 4000
+    assert video['sample_count'] == 100
+    assert video['frame_rate'] == 25
+    assert video['keyframe_count'] == 4
+    assert video['first_keyframe_ms'] == 0
+    assert video['keyframe_interval_ms_avg'] == 1000
+    assert video['keyframe_interval_ms_max'] == 1000
+
+
+def test_moov_after_mdat(tmp_path):
+    media_file = write_mp4(tmp_path / 'slow.mp4', atom(b'mdat', b'\0' * 1000), video_moov())
+    index = sp.mp4_index(media_file)
+    assert not index['faststart']
+    assert index['mdat_offset'] < index['moov_offset']
+
+
+def test_no_stss_means_every_frame_is_a_keyframe(tmp_path):
+    index = sp.mp4_index(write_mp4(tmp_path / 'intra.mp4', video_moov(frame_count=10)))
+    assert index['video']['keyframe_count'] == 10
+    assert index['video']['keyframe_interval_ms_max'] == 40
+
+
+def test_no_video_track(tmp_path):
+    index = sp.mp4_index(write_mp4(tmp_path / 'audio.mp4', video_moov(handler=b'soun')))
+    assert index['video'] is None
+
+
+def test_missing_moov(tmp_path):
+    with pytest.raises(ValueError):
+        sp.mp4_index(write_mp4(tmp_path / 'nomoov.mp4', atom(b'mdat', b'\0' * 10)))
+
+
+def test_truncated_atom(tmp_path):
+    media_file = write_mp4(tmp_path / 'truncated.mp4', video_moov())
+    with open(media_file, 'r+b') as f:
+        f.truncate(f.seek(0, 2) - 10)
+    with pytest.raises(ValueError):
+        sp.mp4_index(media_file)
+
+
+def test_keyframe_times_walk_the_stts_runs():
+    # 3 samples of 10, none of 99, 2 of 20, then 4 of 30
+    runs = [(3, 10), (0, 99), (2, 20), (4, 30)]
+    assert list(sp.mp4_keyframe_times(runs, [1, 3, 4, 5, 6, 9])) == [0, 20, 30, 50, 70, 160]
+    # Sample 0 (invalid) & samples past the end are skipped
+    assert list(sp.mp4_keyframe_times(runs, [0, 2, 10, 50])) == [10]
+    assert list(sp.mp4_keyframe_times([], [1])) == []
+
+
+def test_keyframe_stats_without_expanding_the_samples(tmp_path):
+    # 10 hours at 25fps, a keyframe every 2 seconds - the index is built from the single stts run
+    frame_count = 25 * 60 * 60 * 10
+    index = sp.mp4_index(write_mp4(tmp_path / 'long.mp4', video_moov(
+        frame_count=frame_count, sync_samples=list(range(1, frame_count + 1, 50)))))
+    assert index['video']['sample_count'] == frame_count
+    assert index['video']['keyframe_count'] == frame_count // 50
+    assert index['video']['keyframe_interval_ms_avg'] == 2000
+    assert index['video']['keyframe_interval_ms_max'] == 2000
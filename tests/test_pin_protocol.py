@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+import pi_gpio_synced_player as sp
+
+
+@pytest.mark.parametrize('command, argument', [
+    (sp.PIN_CMD_PREPARE, 0),
+    (sp.PIN_CMD_GO, 7),
+    (sp.PIN_CMD_POSITION, 123_456),
+    (sp.PIN_CMD_SEEK, 0xFFFFFF),
+    (sp.PIN_CMD_SHUTDOWN, 0),
+])
+def test_frame_round_trip(command, argument):
+    bits = sp.pin_frame_encode(command, argument)
+    assert len(bits) == sp.PIN_FRAME_BITS
+    assert sp.pin_frame_decode(bits) == (command, argument)
+
+
+def test_argument_is_truncated_to_24_bits():
+    assert sp.pin_frame_decode(sp.pin_frame_encode(sp.PIN_CMD_SEEK, 0x1000005)) == (sp.PIN_CMD_SEEK, 5)
+
+
+def test_corrupt_frame_is_rejected():
+    bits = sp.pin_frame_encode(sp.PIN_CMD_POSITION, 1000)
+    bits[10] ^= 1
+    assert sp.pin_frame_decode(bits) is None
+
+
+def test_empty_command_is_rejected():
+    assert sp.pin_frame_decode([0] * sp.PIN_FRAME_BITS) is None
+
+
+def test_frame_ends_low():
+    for mode, line_count in (('serial', 1), ('parallel', 3)):
+        edges = sp.pin_frame_edges(sp.pin_frame_encode(sp.PIN_CMD_GO, 1), mode, 1000, line_count)
+        assert edges[0] == (0, [True] + [mode == 'serial'] * (line_count - 1))
+        assert edges[-1][1] == [False] * line_count
+        assert [offset for offset, _ in edges] == sorted(offset for offset, _ in edges)
+
+
+def decode_edges(edges, mode, unit_ns, start_ns=0):
+    """Feeds a waveform from pin_frame_edges() to a PinProtocolDecoder (as the listen pins would)"""
+    commands = []
+    decoder = sp.PinProtocolDecoder(mode, unit_ns / 1_000_000, lambda *command: commands.append(command))
+    level = False
+    for offset_ns, lines in edges:
+        # Edges are on line 0 (the clock, in parallel mode) - the other lines are data
+        if lines[0] != level:
+            level = lines[0]
+            decoder.edge(level, start_ns + offset_ns, tuple(int(line) for line in lines[1:]))
+    return decoder, commands
+
+
+@pytest.mark.parametrize('mode, line_count', [('serial', 1), ('parallel', 2), ('parallel', 5)])
+def test_decoder_decodes_frames(mode, line_count):
+    unit_ns = 1_000_000
+    edges = sp.pin_frame_edges(sp.pin_frame_encode(sp.PIN_CMD_POSITION, 54_321), mode, unit_ns, line_count)
+    decoder, commands = decode_edges(edges, mode, unit_ns, start_ns=5_000_000)
+    assert commands == [(sp.PIN_CMD_POSITION, 54_321, 5_000_000 + edges[-1][0])]
+    assert decoder.errors == 0
+
+
+def test_decoder_decodes_consecutive_frames():
+    unit_ns = 1_000_000
+    first = sp.pin_frame_edges(sp.pin_frame_encode(sp.PIN_CMD_PREPARE, 3), 'serial', unit_ns, 1)
+    second = sp.pin_frame_edges(sp.pin_frame_encode(sp.PIN_CMD_GO, 3), 'serial', unit_ns, 1)
+    gap_ns = first[-1][0] + 10 * unit_ns
+    edges = first + [(offset_ns + gap_ns, lines) for offset_ns, lines in second]
+    _, commands = decode_edges(edges, 'serial', unit_ns)
+    assert [command[:2] for command in commands] == [(sp.PIN_CMD_PREPARE, 3), (sp.PIN_CMD_GO, 3)]
+
+
+def test_decoder_drops_bad_checksum():
+    unit_ns = 1_000_000
+    bits = sp.pin_frame_encode(sp.PIN_CMD_SEEK, 2000)
+    bits[20] ^= 1
+    decoder, commands = decode_edges(sp.pin_frame_edges(bits, 'serial', unit_ns, 1), 'serial', unit_ns)
+    assert commands == []
+    assert decoder.errors == 1
+
+
+def test_decoder_abandons_frame_after_long_gap():
+    unit_ns = 1_000_000
+    edges = sp.pin_frame_edges(sp.pin_frame_encode(sp.PIN_CMD_GO, 1), 'serial', unit_ns, 1)
+    # Stall for 5 units (with the line low) half way through
+    half = next(i for i in range(len(edges) // 2, len(edges)) if edges[i][1][0])
+    edges = edges[:half] + [(offset_ns + 5 * unit_ns, lines) for offset_ns, lines in edges[half:]]
+    decoder, commands = decode_edges(edges, 'serial', unit_ns)
+    assert commands == []
+    assert decoder.abandoned == 1
+    assert decoder.errors == 0
+
+
+class RecordingPins:
+    """Transmit pins that record (time, values) for each change"""
+    def __init__(self, line_count=1):
+        self.pins = [None] * line_count
+        self.changes = []
+
+    def set_values(self, values):
+        self.changes.append((sp.clock.now_ns(), list(values)))
+        return 0
+
+    def close(self):
+        pass
+
+
+def test_position_frame_is_cut_off_for_a_command():
+    pins = RecordingPins()
+    transmitter = sp.GpioProtocolTransmitter(pins, bit_ms=1)
+    transmitter.preempt.set()
+    assert transmitter.send_command(sp.PIN_CMD_POSITION, 1000) is None
+    assert pins.changes == []
+
+
+def test_go_is_not_held_up_by_a_position_frame(config):
+    pins = RecordingPins()
+    transmitter = sp.GpioProtocolTransmitter(pins, bit_ms=1)
+    beacon = threading.Thread(target=transmitter.send_command, args=(sp.PIN_CMD_POSITION,),
+                              kwargs={'value_at_end': lambda end_ns: 0xFFFFFF})
+    beacon.start()
+    while len(pins.changes) < 10:
+        time.sleep(0.001)
+    go_ns = sp.clock.now_ns() + transmitter.go_lead_ns
+    assert transmitter.send_command(sp.PIN_CMD_GO, 1, end_ns=go_ns) == go_ns
+    beacon.join()
+    assert pins.changes[-1] == (pytest.approx(go_ns, abs=5_000_000), [False])
+    # The position frame was dropped low, then the go frame went out whole
+    go_edges = sp.pin_frame_edges(sp.pin_frame_encode(sp.PIN_CMD_GO, 1), 'serial', transmitter.unit_ns, 1)
+    assert [values for _, values in pins.changes[-len(go_edges):]] == [values for _, values in go_edges]
+    assert pins.changes[-len(go_edges) - 1][1] == [False]
+    assert not transmitter.preempt.is_set()
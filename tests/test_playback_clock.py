@@ -0,0 +1,109 @@
+import pytest
+
+import pi_gpio_synced_player as sp
+
+
+class StubPlayer:
+    def __init__(self):
+        self.seeks = []
+        self.rates = []
+
+    def seek(self, time_ms):
+        self.seeks.append(time_ms)
+
+    def set_rate(self, rate):
+        self.rates.append(rate)
+
+
+def new_clock(**kwargs):
+    playback_clock = sp.PlaybackClock(StubPlayer(), stall_ms=250, jump_ms=100, **kwargs)
+    # Sampled by hand, rather than by the thread
+    playback_clock.running = True
+    return playback_clock
+
+
+def feed(playback_clock, virtual_clock, until_ms, start_ms=0, step_ms=40, sample_ms=10, rate=1.0):
+    """Samples a player whose position only updates every step_ms (like VLC's get_time())"""
+    start_ns = virtual_clock.now_ns()
+    while virtual_clock.now_ns() - start_ns < until_ms * 1_000_000:
+        elapsed_ms = (virtual_clock.now_ns() - start_ns) / 1_000_000
+        playback_clock.sample(virtual_clock.now_ns(), start_ms + (elapsed_ms * rate // step_ms) * step_ms, True)
+        virtual_clock.sleep(sample_ms / 1000)
+
+
+def test_interpolates_between_coarse_updates(virtual_clock):
+    playback_clock = new_clock()
+    feed(playback_clock, virtual_clock, until_ms=1000)
+    # True position is 1000ms - the raw player still says 960
+    assert playback_clock.position_at(virtual_clock.now_ns()) == pytest.approx(1000, abs=10)
+    assert playback_clock.estimated_rate() == pytest.approx(1.0, abs=0.02)
+    assert playback_clock.stalls == 0 and playback_clock.jumps == 0
+
+
+def test_follows_the_fitted_rate(virtual_clock):
+    playback_clock = new_clock()
+    feed(playback_clock, virtual_clock, until_ms=2000, rate=1.05)
+    assert playback_clock.estimated_rate() == pytest.approx(1.05, abs=0.02)
+
+
+def test_stall_holds_the_position(virtual_clock):
+    playback_clock = new_clock()
+    feed(playback_clock, virtual_clock, until_ms=1000)
+    for _ in range(20):
+        playback_clock.sample(virtual_clock.now_ns(), 1000, True)
+        virtual_clock.sleep(0.02)
+    assert playback_clock.stalled
+    assert playback_clock.stalls == 1
+    assert playback_clock.estimated_rate() == 0
+    position_ms = playback_clock.position_at(virtual_clock.now_ns())
+    virtual_clock.sleep(1)
+    assert playback_clock.position_at(virtual_clock.now_ns()) == position_ms
+
+    # Moving again: the fit starts over, from the new position
+    feed(playback_clock, virtual_clock, until_ms=200, start_ms=1040)
+    assert not playback_clock.stalled
+    assert playback_clock.position_at(virtual_clock.now_ns()) == pytest.approx(1240, abs=25)
+
+
+def test_jump_restarts_the_fit(virtual_clock):
+    playback_clock = new_clock()
+    feed(playback_clock, virtual_clock, until_ms=1000)
+    playback_clock.sample(virtual_clock.now_ns(), 5000, True)
+    assert playback_clock.jumps == 1
+    assert playback_clock.position_at(virtual_clock.now_ns()) == pytest.approx(5000, abs=10)
+
+
+def test_small_wobbles_are_not_jumps(virtual_clock):
+    playback_clock = new_clock()
+    feed(playback_clock, virtual_clock, until_ms=1000)
+    playback_clock.sample(virtual_clock.now_ns(), 1050, True)
+    assert playback_clock.jumps == 0
+
+
+def test_paused_player_holds_still(virtual_clock):
+    playback_clock = new_clock()
+    feed(playback_clock, virtual_clock, until_ms=500)
+    playback_clock.sample(virtual_clock.now_ns(), 480, False)
+    virtual_clock.sleep(1)
+    assert playback_clock.position_at(virtual_clock.now_ns()) == 480
+    assert playback_clock.estimated_rate() == 0
+
+
+def test_seek_holds_at_the_target(virtual_clock):
+    playback_clock = new_clock()
+    feed(playback_clock, virtual_clock, until_ms=500)
+    playback_clock.seek(3000)
+    assert playback_clock.player.seeks == [3000]
+    virtual_clock.sleep(0.5)
+    assert playback_clock.position_at(virtual_clock.now_ns()) == 3000
+
+
+def test_set_rate_changes_the_nominal_rate(virtual_clock):
+    playback_clock = new_clock()
+    playback_clock.set_rate(1.5)
+    assert playback_clock.player.rates == [1.5]
+    # Until there are enough points for a fit, the nominal rate is used
+    playback_clock.sample(virtual_clock.now_ns(), 0, True)
+    virtual_clock.sleep(0.1)
+    playback_clock.sample(virtual_clock.now_ns(), 150, True)
+    assert playback_clock.estimated_rate() == 1.5
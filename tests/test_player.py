@@ -0,0 +1,45 @@
+import pytest
+
+import pi_gpio_synced_player as sp
+
+
+def test_player_is_abstract():
+    with pytest.raises(TypeError):
+        sp.Player()
+
+    class NoClose(sp.SimPlayer):
+        close = sp.Player.close
+    with pytest.raises(TypeError):
+        NoClose(duration=1000)
+
+
+def test_optional_methods_have_defaults(virtual_clock):
+    player = sp.SimPlayer(duration=1000)
+    assert not player.supports_events
+    assert not player.supports_spawn
+    hook = player.add_event_hook(lambda kind, value: pytest.fail('No events expected'))
+    player.remove_event_hook(hook)
+    assert player.spawn() is None
+    assert player.decode_stats() is None
+    player.set_video_visible(False)
+
+
+def test_double_buffering_needs_spawn(virtual_clock):
+    with pytest.raises(ValueError):
+        sp.DoubleBufferedPlayer(active=sp.SimPlayer(duration=1000))
+
+
+def test_wait_for_end_events_polls_without_events(virtual_clock):
+    player = sp.SimPlayer(duration=5000, decode_latency_ms=0, seek_latency_ms=0)
+    player.resume()
+    sp.player_wait_for_end_events(player=player, duration=5000, lead_frames=3, debug_message_frequency_sec=0)
+    assert 4000 < player.position() < 5000
+
+
+def test_wait_for_restart_events_polls_without_events(virtual_clock):
+    player = sp.SimPlayer(duration=5000, decode_latency_ms=0, seek_latency_ms=0)
+    player.seek(4000)
+    player.resume()
+    virtual_clock.call_later(500_000_000, lambda: player.seek(0))
+    sp.player_wait_for_restart_events(player=player, duration=5000)
+    assert player.position() < 1000
@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+import pi_gpio_synced_player as sp
+
+
+@pytest.fixture
+def executor():
+    executor = sp.PlayerExecutor(debounce_ms=5, latency_warn_ms=1000)
+    yield executor
+    executor.close()
+
+
+def hold(executor):
+    """Blocks the executor thread until the returned event is set (so edges queue up)"""
+    release = threading.Event()
+    started = threading.Event()
+    executor.submit(lambda: (started.set(), release.wait()))
+    started.wait()
+    return release
+
+
+def test_call_returns_result_in_order(executor):
+    ran = []
+    for i in range(5):
+        executor.submit(ran.append, i)
+    assert executor.call(lambda: 42) == 42
+    assert ran == [0, 1, 2, 3, 4]
+
+
+def test_call_raises_handler_error(executor):
+    def fail():
+        raise ValueError('bad')
+    with pytest.raises(ValueError):
+        executor.call(fail)
+
+
+def test_call_runs_inline_on_executor_thread(executor):
+    assert executor.call(lambda: executor.call(lambda: 'nested')) == 'nested'
+
+
+def test_repeated_edges_are_coalesced(executor):
+    ran = []
+    release = hold(executor)
+    executor.submit_edge('go', lambda: ran.append('first'), issued_ns=1_000_000)
+    executor.submit_edge('go', lambda: ran.append('bounce'), issued_ns=2_000_000)
+    release.set()
+    executor.call(lambda: None)
+    assert ran == ['bounce']
+    assert executor.counts['coalesced'] == 1
+
+
+def test_repeat_of_last_edge_is_dropped(executor):
+    ran = []
+    executor.submit_edge('go', lambda: ran.append('go'), issued_ns=1_000_000)
+    executor.call(lambda: None)
+    executor.submit_edge('go', lambda: ran.append('repeat'), issued_ns=3_000_000)
+    executor.call(lambda: None)
+    assert ran == ['go']
+
+
+def test_glitch_pulse_drops_both_edges(executor):
+    ran = []
+    release = hold(executor)
+    executor.submit_edge('prepare', lambda: ran.append('prepare'), issued_ns=1_000_000)
+    executor.submit_edge('go', lambda: ran.append('go'), issued_ns=2_000_000)
+    release.set()
+    executor.call(lambda: None)
+    assert ran == []
+    assert executor.counts['coalesced'] == 2
+
+
+def test_edges_far_apart_both_run(executor):
+    ran = []
+    release = hold(executor)
+    executor.submit_edge('prepare', lambda: ran.append('prepare'), issued_ns=1_000_000)
+    executor.submit_edge('go', lambda: ran.append('go'), issued_ns=100_000_000)
+    release.set()
+    executor.call(lambda: None)
+    assert ran == ['prepare', 'go']
+
+
+def test_out_of_order_edge_is_rejected(executor):
+    ran = []
+    executor.submit_edge('go', lambda: ran.append('new'), issued_ns=100_000_000)
+    executor.call(lambda: None)
+    executor.submit_edge('prepare', lambda: ran.append('old'), issued_ns=50_000_000)
+    executor.call(lambda: None)
+    assert ran == ['new']
+    assert executor.counts['rejected'] == 1
+
+
+def test_closed_executor_raises(executor):
+    executor.close()
+    with pytest.raises(RuntimeError):
+        executor.call(lambda: None)
+    with pytest.raises(RuntimeError):
+        executor.submit(lambda: None)
+
+
+def test_close_fails_waiting_calls(executor):
+    release = hold(executor)
+    errors = []
+
+    def waiting_call():
+        try:
+            executor.call(lambda: None)
+        except RuntimeError as e:
+            errors.append(e)
+    thread = threading.Thread(target=waiting_call)
+    thread.start()
+    while not executor.queue:
+        pass
+    executor.close()
+    release.set()
+    thread.join(timeout=2)
+    assert len(errors) == 1
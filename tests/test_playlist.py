@@ -0,0 +1,71 @@
+import pi_gpio_synced_player as sp
+
+
+class StandbyPlayer:
+    """Stands in for a DoubleBufferedPlayer - just the standby media bookkeeping"""
+    def __init__(self, standby_media):
+        self.standby_media = standby_media
+        self.next_media = None
+        self.changes = []
+
+    def change_media(self, media_file):
+        self.changes.append(media_file)
+        self.standby_media = media_file
+
+
+ITEMS = ['a.mp4', 'b.mp4', 'c.mp4']
+
+
+def test_loop_index_picks_the_item():
+    playlist = sp.Playlist(ITEMS, StandbyPlayer('a.mp4'))
+    assert [playlist.item(loop_index) for loop_index in range(5)] == ['a.mp4', 'b.mp4', 'c.mp4', 'a.mp4', 'b.mp4']
+    # Pin protocol loop indexes are 24 bits - every node wraps the same way
+    assert playlist.index(2 ** 24 + 4) == playlist.index(4)
+
+
+def test_prepare_in_step_queues_the_next_item(config):
+    player = StandbyPlayer('b.mp4')
+    playlist = sp.Playlist(ITEMS, player)
+    playlist.prepare(1)
+    assert player.next_media == 'c.mp4'
+    assert player.changes == []
+
+
+def test_prepare_without_an_index_counts_loops(config):
+    player = StandbyPlayer('a.mp4')
+    playlist = sp.Playlist(ITEMS, player)
+    for expected_next in ['b.mp4', 'c.mp4', 'a.mp4']:
+        playlist.prepare()
+        player.standby_media = player.next_media
+        assert player.next_media == expected_next
+    assert playlist.loop_index == 2
+
+
+def test_prepare_out_of_step_catches_up_on_the_next_loop(config):
+    # Joined at loop 7 (item 1), with item 0 loaded
+    player = StandbyPlayer('a.mp4')
+    playlist = sp.Playlist(ITEMS, player)
+    playlist.prepare(7)
+    assert player.changes == ['c.mp4']
+    player.standby_media = player.changes[-1]
+    playlist.prepare(8)
+    assert player.next_media == 'a.mp4'
+    assert player.changes == ['c.mp4']
+
+
+def test_set_items_takes_effect_from_the_next_loop(config):
+    player = StandbyPlayer('b.mp4')
+    playlist = sp.Playlist(ITEMS, player)
+    playlist.prepare(1)
+    playlist.set_items(['x.mp4', 'y.mp4'])
+    assert playlist.items == ['x.mp4', 'y.mp4']
+    assert player.changes == ['x.mp4']
+
+
+def test_playlist_prepare_without_a_playlist(config, monkeypatch):
+    monkeypatch.setattr(sp, 'playlist', None)
+    sp.playlist_prepare(3)
+    player = StandbyPlayer('b.mp4')
+    monkeypatch.setattr(sp, 'playlist', sp.Playlist(ITEMS, player))
+    sp.playlist_prepare(1)
+    assert player.next_media == 'c.mp4'
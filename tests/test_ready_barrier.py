@@ -0,0 +1,65 @@
+import pi_gpio_synced_player as sp
+
+
+def test_report_names_the_missing_nodes():
+    assert sp.ready_barrier_report(['left', 'right', 'rear'], {'right'}) == ['left', 'rear']
+    assert sp.ready_barrier_report(['left'], {'left', 'extra'}) == []
+
+
+def test_report_counts_unnamed_nodes():
+    assert sp.ready_barrier_report(['3'], {'left'}) == ['(unnamed node 1)', '(unnamed node 2)']
+    assert sp.ready_barrier_report(['1'], {'left', 'right'}) == []
+
+
+def test_udp_barrier_opens_when_the_last_node_is_ready(virtual_clock, udp_port):
+    primary = sp.UdpSyncPrimary(group='239.0.0.1', port=udp_port, interface='127.0.0.1')
+    virtual_clock.call_at(1_000_000_000, lambda: primary.ready_nodes.update(left=virtual_clock.now_ns()))
+    virtual_clock.call_at(2_500_000_000, lambda: primary.ready_nodes.update(right=virtual_clock.now_ns()))
+    try:
+        assert primary.wait_for_ready(['left', 'right'], timeout_sec=10) == []
+    finally:
+        primary.close()
+    assert 2_500_000_000 <= virtual_clock.now_ns() < 2_600_000_000
+
+
+def test_udp_barrier_times_out(virtual_clock, udp_port):
+    primary = sp.UdpSyncPrimary(group='239.0.0.1', port=udp_port, interface='127.0.0.1')
+    primary.ready_nodes['left'] = 0
+    try:
+        assert primary.wait_for_ready(['left', 'right'], timeout_sec=5) == ['right']
+    finally:
+        primary.close()
+    assert 5_000_000_000 <= virtual_clock.now_ns() < 5_100_000_000
+
+
+def test_udp_barrier_needs_expected_nodes(virtual_clock, udp_port):
+    primary = sp.UdpSyncPrimary(group='239.0.0.1', port=udp_port, interface='127.0.0.1')
+    try:
+        assert primary.wait_for_ready([], timeout_sec=5) == []
+    finally:
+        primary.close()
+    assert virtual_clock.now_ns() == 0
+
+
+class ReadyLine:
+    """Stands in for the ready line's DigitalInputDevice"""
+    def __init__(self, released):
+        self.released = released
+        self.timeouts = []
+
+    def wait_for_inactive(self, timeout):
+        self.timeouts.append(timeout)
+        return self.released
+
+
+def test_gpio_barrier_waits_for_the_ready_line(config):
+    ready_line = ReadyLine(released=True)
+    transmitter = sp.GpioTransmitter(transmit_pins=None, ready_pin=ready_line)
+    assert transmitter.wait_for_ready(['left'], timeout_sec=30) == []
+    assert ready_line.timeouts == [30]
+
+
+def test_gpio_barrier_times_out(config):
+    transmitter = sp.GpioTransmitter(transmit_pins=None, ready_pin=ReadyLine(released=False))
+    assert transmitter.wait_for_ready(['left'], timeout_sec=30) == [
+        '(ready line still held low by at least one secondary)']
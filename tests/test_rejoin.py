@@ -0,0 +1,99 @@
+import pi_gpio_synced_player as sp
+
+
+class StubPlayer:
+    """Reports a fixed position, & records seeks & resumes"""
+    def __init__(self, position_ms=0, state=sp.PLAYER_STATE_PLAYING):
+        self.position_ms = position_ms
+        self.playback_state = state
+        self.seeks = []
+        self.resumes = 0
+
+    def position(self):
+        return self.position_ms
+
+    def state(self):
+        return self.playback_state
+
+    def seek(self, time_ms):
+        self.seeks.append(time_ms)
+
+    def resume(self):
+        self.resumes += 1
+        self.playback_state = sp.PLAYER_STATE_PLAYING
+
+
+def rejoin(**kwargs):
+    return sp.SecondaryRejoin(duration=60_000, threshold_ms=200, seek_latency_ms=100, **kwargs)
+
+
+def test_small_errors_are_left_alone(virtual_clock):
+    player = StubPlayer(position_ms=5150)
+    assert rejoin().on_position(player, position_ms=5000, at_ns=virtual_clock.now_ns()) == -150
+    assert player.seeks == []
+
+
+def test_errors_over_the_threshold_are_seeked_away(virtual_clock):
+    player = StubPlayer(position_ms=5000)
+    hot_join = rejoin()
+    virtual_clock.sleep(0.5)
+    # The beacon is 500ms old - the primary's moved on since
+    assert hot_join.on_position(player, position_ms=5000, at_ns=0) == 500
+    assert player.seeks == [5600]
+    assert player.resumes == 0
+    assert hot_join.rejoin_count == 1
+
+
+def test_paused_player_hot_joins(virtual_clock):
+    player = StubPlayer(state=sp.PLAYER_STATE_PAUSED)
+    hot_join = rejoin()
+    assert hot_join.on_position(player, position_ms=20_000, at_ns=virtual_clock.now_ns()) is None
+    assert player.seeks == [20_100]
+    assert player.resumes == 1
+
+
+def test_seek_latency_is_learned_from_the_next_beacon(virtual_clock):
+    player = StubPlayer(state=sp.PLAYER_STATE_PAUSED)
+    hot_join = rejoin()
+    hot_join.on_position(player, position_ms=20_000, at_ns=virtual_clock.now_ns())
+    # Still 40ms behind after the rejoin - half of that is added to the estimate
+    player.position_ms = 29_960
+    assert hot_join.on_position(player, position_ms=30_000, at_ns=virtual_clock.now_ns()) == 40
+    assert hot_join.seek_latency_ms == 120
+    assert player.seeks == [20_100]
+
+
+def test_resync_request_lowers_the_threshold_once(virtual_clock):
+    player = StubPlayer(position_ms=4940)
+    hot_join = rejoin()
+    hot_join.request_resync()
+    # Over half the seek latency: worth seeking for
+    hot_join.on_position(player, position_ms=5000, at_ns=virtual_clock.now_ns())
+    assert player.seeks == [5100]
+    player.position_ms = 5040
+    hot_join.on_position(player, position_ms=5100, at_ns=virtual_clock.now_ns())
+    assert player.seeks == [5100]
+
+
+def test_no_rejoin_near_the_end(virtual_clock):
+    player = StubPlayer(state=sp.PLAYER_STATE_PAUSED)
+    assert rejoin().on_position(player, position_ms=59_500, at_ns=virtual_clock.now_ns()) is None
+    assert player.seeks == []
+
+
+def test_beacons_between_prepare_and_go_are_ignored(virtual_clock):
+    player = sp.SimPlayer(duration=60_000)
+    player.resume()
+    virtual_clock.sleep(10)
+    hot_join = rejoin()
+    sp.secondary_on_prepare(player, rejoin=hot_join)
+    virtual_clock.sleep(1)
+    assert player.state() == sp.PLAYER_STATE_PAUSED
+    # A beacon sent before the primary restarted, arriving late - the player's paused at 0 on purpose
+    assert hot_join.on_position(player, position_ms=10_000, at_ns=virtual_clock.now_ns()) is None
+    assert hot_join.rejoin_count == 0
+    sp.secondary_on_go(player, go_ns=virtual_clock.now_ns(), rejoin=hot_join)
+    virtual_clock.sleep(1)
+    assert not hot_join.prepared
+    hot_join.on_position(player, position_ms=30_000, at_ns=virtual_clock.now_ns())
+    assert hot_join.rejoin_count == 1
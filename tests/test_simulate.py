@@ -0,0 +1,34 @@
+import pytest
+
+import pi_gpio_synced_player as sp
+
+
+@pytest.mark.parametrize('primary_timing', ['sleep', 'deadline'])
+def test_simulate_stays_in_sync(monkeypatch, virtual_clock, primary_timing):
+    monkeypatch.setattr(sp, 'PRIMARY_TIMING', primary_timing)
+    result = sp.simulate(secondaries=3, loops=2, duration_ms=5000, seed=7)
+    assert result['nodes'] == 4
+    assert result['loops'] == 2
+    assert len(result['start_skew_ms']) == 2
+    for skew in result['start_skew_ms']:
+        assert 0 <= skew['spread'] < 50
+        assert abs(skew['worst']) < 50
+    errors = result['position_error_ms']
+    assert errors['samples'] > 0
+    assert errors['p50'] <= errors['p95'] <= errors['max'] < 50
+
+
+def test_simulate_is_deterministic(virtual_clock, monkeypatch):
+    first = sp.simulate(secondaries=3, loops=2, duration_ms=5000, seed=3)
+    monkeypatch.setattr(sp, 'clock', sp.VirtualClock())
+    assert sp.simulate(secondaries=3, loops=2, duration_ms=5000, seed=3) == first
+
+
+def test_virtual_clock_runs_timers_in_order(virtual_clock):
+    fired = []
+    start_ns = virtual_clock.now_ns()
+    virtual_clock.call_later(2_000_000, lambda: fired.append(('b', virtual_clock.now_ns() - start_ns)))
+    virtual_clock.call_later(1_000_000, lambda: fired.append(('a', virtual_clock.now_ns() - start_ns)))
+    virtual_clock.sleep(0.003)
+    assert fired == [('a', 1_000_000), ('b', 2_000_000)]
+    assert virtual_clock.now_ns() - start_ns == 3_000_000
@@ -0,0 +1,69 @@
+import pytest
+
+import pi_gpio_synced_player as sp
+
+SECOND_NS = 1_000_000_000
+
+
+def record(event, real_ns, value=0):
+    return {'seq': 0, 'mono_ns': real_ns, 'real_ns': real_ns, 'value': value, 'loop': 0, 'aux': 0, 'event': event}
+
+
+def node_trace(node, mode, clock_offset_ns, start_offset_ns, loops=3, loop_sec=10):
+    """A node's trace: a go every loop_sec, & position samples every second after it"""
+    records = []
+    for loop in range(loops):
+        go_ns = loop * loop_sec * SECOND_NS + clock_offset_ns
+        records.append(record('go', go_ns))
+        for second in range(1, loop_sec):
+            t_ns = go_ns + second * SECOND_NS
+            records.append(record('position', t_ns, value=(second * SECOND_NS - start_offset_ns) // 1_000_000))
+    return {'node': node, 'mode': mode, 'records': records}
+
+
+def test_trace_analyze_offsets_and_skew():
+    analysis = sp.trace_analyze([
+        node_trace('secondary-1', 'secondary', clock_offset_ns=250_000_000, start_offset_ns=5_000_000),
+        node_trace('primary', 'primary', clock_offset_ns=0, start_offset_ns=0),
+    ])
+    assert analysis['reference'] == 'primary'
+    assert analysis['offsets_ms'] == {'secondary-1': 250, 'primary': 0}
+    assert [loop['loop'] for loop in analysis['loops']] == [0, 1, 2]
+    for loop in analysis['loops']:
+        assert loop['starts_ms']['primary'] == 0
+        assert loop['starts_ms']['secondary-1'] == pytest.approx(5)
+        assert loop['skew_ms'] == pytest.approx(5)
+    assert analysis['drift']['secondary-1']
+    assert all(drift_ms == pytest.approx(-5) for _, _, drift_ms in analysis['drift']['secondary-1'])
+
+
+def test_trace_analyze_needs_reference_gos():
+    trace = node_trace('primary', 'primary', 0, 0)
+    trace['records'] = [r for r in trace['records'] if r['event'] != 'go']
+    with pytest.raises(ValueError):
+        sp.trace_analyze([trace])
+    with pytest.raises(ValueError):
+        sp.trace_analyze([])
+
+
+def test_trace_recorder_round_trip(tmp_path):
+    trace_file = str(tmp_path / 'node.trace')
+    for session in range(2):
+        recorder = sp.TraceRecorder(trace_file, node_name='node-1', mode='secondary', size=16)
+        recorder.record(sp.TRACE_GO, t_ns=1_000)
+        recorder.record(sp.TRACE_POSITION, value=1234, t_ns=2_000)
+        recorder.close()
+    trace = sp.trace_load(trace_file)
+    assert trace['node'] == 'node-1'
+    assert trace['mode'] == 'secondary'
+    # The second session's header is skipped
+    assert [r['event'] for r in trace['records']] == ['go', 'position'] * 2
+    assert trace['records'][1]['value'] == 1234
+    assert trace['records'][1]['mono_ns'] == 2_000
+
+
+def test_trace_load_rejects_other_files(tmp_path):
+    other_file = tmp_path / 'other.bin'
+    other_file.write_bytes(b'\0' * 100)
+    with pytest.raises(ValueError):
+        sp.trace_load(str(other_file))
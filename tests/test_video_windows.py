@@ -0,0 +1,25 @@
+import pytest
+
+import pi_gpio_synced_player as sp
+
+# No X server answers on this display
+NO_DISPLAY = ':4242'
+
+
+def test_no_windows_needed_without_vlc_full_screen():
+    assert sp.double_buffering_video_setup('mpv', fullscreen=True, playlist=[]) == (True, None)
+    assert sp.double_buffering_video_setup('vlc', fullscreen=False, playlist=[]) == (True, None)
+
+
+def test_no_x_display_turns_double_buffering_off(monkeypatch, capsys):
+    monkeypatch.setenv('DISPLAY', NO_DISPLAY)
+    assert sp.double_buffering_video_setup('vlc', fullscreen=True, playlist=[], display_name=NO_DISPLAY) == (
+        False, None)
+    assert 'DoubleBufferedPlayers is off' in capsys.readouterr().out
+
+
+def test_no_x_display_is_an_error_with_a_playlist(monkeypatch):
+    monkeypatch.setenv('DISPLAY', NO_DISPLAY)
+    with pytest.raises(ValueError, match='Playlist .* needs an X display'):
+        sp.double_buffering_video_setup('vlc', fullscreen=True, playlist=['a.mp4', 'b.mp4'],
+                                        display_name=NO_DISPLAY)
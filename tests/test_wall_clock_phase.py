@@ -0,0 +1,65 @@
+import pytest
+
+import pi_gpio_synced_player as sp
+
+
+def test_phase_within_the_first_loop(virtual_clock):
+    phase = sp.WallClockPhase(epoch_ns=0, duration=10_000, source='monotonic')
+    virtual_clock.sleep(2.5)
+    assert phase.now() == (2_500_000_000, 2500, 0)
+
+
+def test_phase_wraps_at_the_end_of_each_loop(virtual_clock):
+    phase = sp.WallClockPhase(epoch_ns=1_000_000_000, duration=10_000, source='monotonic')
+    virtual_clock.sleep(31)
+    assert phase.now()[1:] == (0, 3)
+    virtual_clock.sleep(9.999)
+    assert phase.now()[1:] == (pytest.approx(9999), 3)
+    # Before the epoch, the loops count back (loop -1 ends at the epoch)
+    assert sp.WallClockPhase(epoch_ns=50_000_000_000, duration=10_000, source='monotonic').now()[1:] == (
+        pytest.approx(999), -1)
+
+
+def test_offset_shifts_the_phase(virtual_clock):
+    phase = sp.WallClockPhase(epoch_ns=0, duration=10_000, source='monotonic', offset_ns=-3_000_000_000)
+    virtual_clock.sleep(2)
+    assert phase.now()[1:] == (9000, -1)
+
+
+def test_loop_start_by_our_clock(virtual_clock):
+    phase = sp.WallClockPhase(epoch_ns=0, duration=10_000, source='monotonic')
+    virtual_clock.sleep(12)
+    assert phase.loop_start_ns(2) == 20_000_000_000
+    assert phase.loop_start_ns(0) == 0
+
+
+def test_realtime_source_follows_a_clock_step(virtual_clock, monkeypatch):
+    wall_ns = [1_700_000_004_000_000_000]
+    monkeypatch.setattr(sp.time, 'time_ns', lambda: wall_ns[0])
+    phase = sp.WallClockPhase(epoch_ns=1_700_000_000_000_000_000, duration=10_000)
+    virtual_clock.sleep(1)
+    assert phase.now()[1:] == (4000, 0)
+    assert phase.loop_start_ns(1) == virtual_clock.now_ns() + 6_000_000_000
+    # The wall clock is stepped forward 2s (eg, by chrony) - the next loop starts 2s sooner by our clock
+    wall_ns[0] += 2_000_000_000
+    assert phase.now()[1:] == (6000, 0)
+    assert phase.loop_start_ns(1) == virtual_clock.now_ns() + 4_000_000_000
+
+
+def test_phase_error_goes_the_short_way_round():
+    assert sp.phase_error_ms(100, 10_000) == 100
+    assert sp.phase_error_ms(9_900, 10_000) == -100
+    assert sp.phase_error_ms(-9_900, 10_000) == 100
+    assert sp.phase_error_ms(4_999, 10_000) == 4_999
+
+
+def test_clock_mode_joins_mid_loop_then_restarts_on_the_loop_start(virtual_clock):
+    player = sp.SimPlayer(duration=10_000, seek_latency_ms=0, decode_latency_ms=0, jitter_ms=0)
+    phase = sp.WallClockPhase(epoch_ns=0, duration=10_000, source='monotonic')
+    drift = sp.DriftController(duration=10_000, wrap=True)
+    virtual_clock.sleep(4)
+    sp.clock_mode_run(player, phase, drift, lead_ms=500, seek_latency_ms=50, loops=1)
+    assert virtual_clock.now_ns() == 10_000_000_000
+    assert player.state() == sp.PLAYER_STATE_PLAYING
+    virtual_clock.sleep(1)
+    assert player.position() == pytest.approx(1000, abs=1)